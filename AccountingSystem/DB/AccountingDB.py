@@ -10,6 +10,7 @@ from DIRAC import S_OK, S_ERROR, gMonitor, gConfig
 from DIRAC.Core.Utilities import List, ThreadSafe, Time, DEncode
 from DIRAC.AccountingSystem.private.TypeLoader import TypeLoader
 from DIRAC.Core.Utilities.ThreadPool import ThreadPool
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 
 gSynchro = ThreadSafe.Synchronizer()
 
@@ -32,6 +33,14 @@ class AccountingDB( DB ):
     maxParallelInsertions = self.getCSOption( "ParallelRecordInsertions", 10 )
     self.__threadPool = ThreadPool( 1, maxParallelInsertions )
     self.__threadPool.daemonize()
+    #Records coming from the IN tables are merged in memory during this number of seconds
+    #and written in one transaction per type. 0 writes each record on its own
+    self.__aggregationWindow = self.getCSOption( "BucketAggregationWindow", 30 )
+    self.__aggregationMaxRecords = self.getCSOption( "BucketAggregationMaxRecords", 10000 )
+    self.__aggregationRowsPerQuery = 1000
+    self.__aggregationLock = threading.Lock()
+    self.__aggregationBuffer = {}
+    self.__aggregationTaskId = False
     self.catalogTableName = _getTableName( "catalog", "Types" )
     self._createTables( { self.catalogTableName : { 'Fields' : { 'name' : "VARCHAR(64) UNIQUE NOT NULL",
                                                           'keyFields' : "VARCHAR(255) NOT NULL",
@@ -609,6 +618,8 @@ class AccountingDB( DB ):
     Do the real insert and delete from the in buffer table
     """
     self.log.verbose( "Received bundle to process", "of %s elements" % len( recordTuples ) )
+    if self.__aggregationWindow > 0:
+      return self.__aggregateFromINTable( recordTuples )
     for record in recordTuples:
       iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
       result = self.insertRecordDirectly( typeName, startTime, endTime, valuesList )
@@ -633,15 +644,9 @@ class AccountingDB( DB ):
     self.log.info( "Adding record", "for type %s\n [%s -> %s]" % ( typeName, Time.fromEpoch( startTime ), Time.fromEpoch( endTime ) ) )
     if not typeName in self.dbCatalog:
       return S_ERROR( "Type %s has not been defined in the db" % typeName )
-    #Discover key indexes
-    for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
-      keyName = self.dbCatalog[ typeName ][ 'keys' ][ keyPos ]
-      keyValue = valuesList[ keyPos ]
-      retVal = self.__addKeyValue( typeName, keyName, keyValue )
-      if not retVal[ 'OK' ]:
-        return retVal
-      self.log.verbose( "Value %s for key %s has id %s" % ( keyValue, keyName, retVal[ 'Value' ] ) )
-      valuesList[ keyPos ] = retVal[ 'Value' ]
+    retVal = self.__setKeyIds( typeName, valuesList )
+    if not retVal[ 'OK' ]:
+      return retVal
     insertList = list( valuesList )
     insertList.append( startTime )
     insertList.append( endTime )
@@ -669,6 +674,174 @@ class AccountingDB( DB ):
     finally:
       connObj.close()
 
+  def __setKeyIds( self, typeName, valuesList ):
+    """
+    Replace the key values of a record by their ids
+    """
+    for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
+      keyName = self.dbCatalog[ typeName ][ 'keys' ][ keyPos ]
+      keyValue = valuesList[ keyPos ]
+      retVal = self.__addKeyValue( typeName, keyName, keyValue )
+      if not retVal[ 'OK' ]:
+        return retVal
+      self.log.verbose( "Value %s for key %s has id %s" % ( keyValue, keyName, retVal[ 'Value' ] ) )
+      valuesList[ keyPos ] = retVal[ 'Value' ]
+    return S_OK()
+
+  def __aggregateFromINTable( self, recordTuples ):
+    """
+    Merge the records in the aggregation buffer. They will be written to the type
+    and bucket tables and deleted from the IN table by __flushAggregatedBuckets
+    """
+    if self.__readOnly:
+      return S_ERROR( "ReadOnly mode enabled. No modification allowed" )
+    typesToFlush = set()
+    for record in recordTuples:
+      iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
+      if not typeName in self.dbCatalog:
+        self.log.error( "Can't insert row", "Type %s has not been defined in the db" % typeName )
+        continue
+      result = self.__setKeyIds( typeName, valuesList )
+      if not result[ 'OK' ]:
+        self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
+        self.log.error( "Can't insert row", result[ 'Message' ] )
+        continue
+      numKeys = len( self.dbCatalog[ typeName ][ 'keys' ] )
+      keyValues = tuple( valuesList[ :numKeys ] )
+      #HACK: One more value to be able to count total entries
+      bucketValues = [ float( value ) for value in valuesList[ numKeys: ] ] + [ 1.0 ]
+      buckets = self.calculateBuckets( typeName, startTime, endTime )
+      self.__aggregationLock.acquire()
+      try:
+        if typeName not in self.__aggregationBuffer:
+          self.__aggregationBuffer[ typeName ] = { 'buckets' : {}, 'records' : [], 'ids' : [], 'epochs' : [] }
+        typeBuffer = self.__aggregationBuffer[ typeName ]
+        typeBuffer[ 'records' ].append( list( valuesList ) + [ startTime, endTime ] )
+        typeBuffer[ 'ids' ].append( iD )
+        typeBuffer[ 'epochs' ].append( insertionEpoch )
+        for bStartTime, bProportion, bLength in buckets:
+          bucketKey = ( bStartTime, bLength, keyValues )
+          if bucketKey not in typeBuffer[ 'buckets' ]:
+            typeBuffer[ 'buckets' ][ bucketKey ] = [ 0.0 ] * len( bucketValues )
+          bucketSums = typeBuffer[ 'buckets' ][ bucketKey ]
+          for valPos in range( len( bucketValues ) ):
+            bucketSums[ valPos ] += bucketValues[ valPos ] * bProportion
+        if len( typeBuffer[ 'ids' ] ) >= self.__aggregationMaxRecords:
+          typesToFlush.add( typeName )
+        if not self.__aggregationTaskId:
+          result = gThreadScheduler.addPeriodicTask( self.__aggregationWindow, self.__flushAggregatedBuckets )
+          if result[ 'OK' ]:
+            self.__aggregationTaskId = result[ 'Value' ]
+      finally:
+        self.__aggregationLock.release()
+    for typeName in typesToFlush:
+      self.__flushAggregatedBuckets( typeName )
+    return S_OK()
+
+  def __flushAggregatedBuckets( self, typeToFlush = False ):
+    """
+    Write the aggregation buffer. For each type the raw records, the merged buckets
+    and the deletion of the records from the IN table go in the same transaction
+    """
+    self.__aggregationLock.acquire()
+    try:
+      if typeToFlush:
+        typesToFlush = [ typeToFlush ]
+      else:
+        typesToFlush = list( self.__aggregationBuffer )
+      toFlush = {}
+      for typeName in typesToFlush:
+        if typeName in self.__aggregationBuffer:
+          toFlush[ typeName ] = self.__aggregationBuffer.pop( typeName )
+    finally:
+      self.__aggregationLock.release()
+    for typeName in toFlush:
+      typeBuffer = toFlush[ typeName ]
+      inTable = _getTableName( "in", typeName )
+      idList = ", ".join( [ str( iD ) for iD in typeBuffer[ 'ids' ] ] )
+      for _i in range( max( 1, self.__deadLockRetries ) ):
+        result = self.__writeAggregatedBuffer( typeName, typeBuffer, idList )
+        if result[ 'OK' ] or result[ 'Message' ].find( "try restarting transaction" ) == -1:
+          break
+      if not result[ 'OK' ]:
+        self.log.error( "Can't write aggregated buckets", "for %s: %s" % ( typeName, result[ 'Message' ] ) )
+        #Records are still in the IN table, let them be loaded again
+        self._update( "UPDATE `%s` SET taken=0 WHERE id in (%s)" % ( inTable, idList ) )
+        continue
+      self.log.verbose( "Flushed aggregated buckets", "for %s: %s records in %s buckets" % ( typeName,
+                                                                                           len( typeBuffer[ 'ids' ] ),
+                                                                                           len( typeBuffer[ 'buckets' ] ) ) )
+      now = Time.toEpoch()
+      gMonitor.addMark( "registeradded", len( typeBuffer[ 'ids' ] ) )
+      gMonitor.addMark( "registeradded:%s" % typeName, len( typeBuffer[ 'ids' ] ) )
+      for insertionEpoch in typeBuffer[ 'epochs' ]:
+        gMonitor.addMark( "insertiontime", now - insertionEpoch )
+    return S_OK()
+
+  def __writeAggregatedBuffer( self, typeName, typeBuffer, idList ):
+    """
+    Insert the records and upsert the buckets of a type and delete the records from the IN table
+    """
+    retVal = self._getConnection()
+    if not retVal[ 'OK' ]:
+      return retVal
+    connObj = retVal[ 'Value' ]
+    try:
+      retVal = self.__startTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        return retVal
+      rowsList = []
+      for record in typeBuffer[ 'records' ]:
+        retVal = self._escapeValues( record )
+        if not retVal[ 'OK' ]:
+          self.__rollbackTransaction( connObj )
+          return retVal
+        rowsList.append( "( %s )" % ", ".join( [ str( value ) for value in retVal[ 'Value' ] ] ) )
+      cmd = "INSERT INTO `%s` ( %s ) VALUES " % ( _getTableName( "type", typeName ),
+                                                  ", ".join( [ "`%s`" % f for f in self.dbCatalog[ typeName ][ 'typeFields' ] ] ) )
+      #Split in several statements so they don't hit max_allowed_packet
+      for iPos in range( 0, len( rowsList ), self.__aggregationRowsPerQuery ):
+        retVal = self._update( cmd + ", ".join( rowsList[ iPos : iPos + self.__aggregationRowsPerQuery ] ), conn = connObj )
+        if not retVal[ 'OK' ]:
+          self.__rollbackTransaction( connObj )
+          return retVal
+      #Same statement as __writeBuckets, with one row per merged bucket
+      sqlFields = [ '`startTime`', '`bucketLength`', '`entriesInBucket`' ]
+      sqlFields.extend( [ "`%s`" % keyField for keyField in self.dbCatalog[ typeName ][ 'keys' ] ] )
+      sqlUpData = [ "`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)" ]
+      for valueField in self.dbCatalog[ typeName ][ 'values' ]:
+        sqlFields.append( "`%s`" % valueField )
+        sqlUpData.append( "`%s`=`%s`+VALUES(`%s`)" % ( valueField, valueField, valueField ) )
+      valuesGroups = []
+      #Sorted to lock the bucket rows always in the same order
+      for bucketKey in sorted( typeBuffer[ 'buckets' ] ):
+        bStartTime, bLength, keyValues = bucketKey
+        bucketSums = typeBuffer[ 'buckets' ][ bucketKey ]
+        sqlValues = [ bStartTime, bLength, repr( bucketSums[-1] ) ]
+        sqlValues.extend( keyValues )
+        sqlValues.extend( [ repr( value ) for value in bucketSums[:-1] ] )
+        valuesGroups.append( "( %s )" % ",".join( [ str( val ) for val in sqlValues ] ) )
+      cmd = "INSERT INTO `%s` ( %s ) VALUES %%s ON DUPLICATE KEY UPDATE %s" % ( _getTableName( "bucket", typeName ),
+                                                                                ", ".join( sqlFields ),
+                                                                                ", ".join( sqlUpData ) )
+      for iPos in range( 0, len( valuesGroups ), self.__aggregationRowsPerQuery ):
+        retVal = self._update( cmd % ", ".join( valuesGroups[ iPos : iPos + self.__aggregationRowsPerQuery ] ),
+                               conn = connObj )
+        if not retVal[ 'OK' ]:
+          self.__rollbackTransaction( connObj )
+          return retVal
+      retVal = self._update( "DELETE FROM `%s` WHERE id in (%s)" % ( _getTableName( "in", typeName ), idList ),
+                             conn = connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+      retVal = self.__commitTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+      return retVal
+    finally:
+      connObj.close()
+
   def deleteRecord( self, typeName, startTime, endTime, valuesList ):
     """
     Add an entry to the type contents
@@ -1,8 +1,16 @@
 import types
 from DIRAC.Core.Utilities import Time
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 class DBUtils:
 
+  #Below this number of rows the pure python rebinning is faster than building the arrays
+  _NUMPY_MIN_ROWS = 1000
+
   def __init__( self, db, setup ):
     self._acDB = db
     self._setup = setup
@@ -143,6 +151,90 @@ class DBUtils:
       del( normData[ bDate ][-1] )
     return normData
 
+  def _spanDictToGranularity( self, granularity, dataDict, average = False ):
+    """
+    Convert to granularity the buckets of all the keys at once
+      - dataDict = { 'key' : bucketsData, 'key2'.. } where bucketsData is as in _spanToGranularity
+      - average -> divide the values by the sum of proportions instead of summing them
+    Out
+      - dataDict = { 'key' : { bucketEpoch : [ field1, field2.. ] }, 'key2'.. }
+    """
+    numRows = 0
+    for key in dataDict:
+      numRows += len( dataDict[ key ] )
+    if numpy and numRows >= self._NUMPY_MIN_ROWS:
+      return self._spanArraysToGranularity( granularity, dataDict, average )
+    for key in dataDict:
+      if average:
+        dataDict[ key ] = self._averageToGranularity( granularity, dataDict[ key ] )
+      else:
+        dataDict[ key ] = self._sumToGranularity( granularity, dataDict[ key ] )
+    return dataDict
+
+  def _spanArraysToGranularity( self, granularity, dataDict, average = False ):
+    """
+    NumPy version of _spanDictToGranularity. The rows of all the keys are put in
+    ( key x time ) arrays and split among the new buckets with array operations.
+    Values are added in the same order as in _spanToGranularity, so results are identical
+    """
+    keys = []
+    rowKeys = []
+    starts = []
+    lengths = []
+    values = []
+    for key in dataDict:
+      iKey = len( keys )
+      keys.append( key )
+      for row in dataDict[ key ]:
+        rowKeys.append( iKey )
+        starts.append( row[0] )
+        lengths.append( row[1] )
+        values.append( [ val if val is not None else 0 for val in row[2:] ] )
+    if not values:
+      return dict( [ ( key, {} ) for key in keys ] )
+    rowKeys = numpy.array( rowKeys, dtype = numpy.int64 )
+    starts = numpy.array( starts, dtype = numpy.int64 )
+    lengths = numpy.array( lengths, dtype = numpy.int64 )
+    values = numpy.array( values, dtype = numpy.float64 )
+    ends = starts + lengths
+    #Rows with the same length as the granularity keep their bucket, the rest are split
+    toSplit = ( lengths != granularity ) & ( lengths > 0 )
+    firstBuckets = numpy.where( lengths == granularity, starts, starts - starts % granularity )
+    numBuckets = numpy.ones( len( starts ), dtype = numpy.int64 )
+    numBuckets[ toSplit ] = ( ends[ toSplit ] - firstBuckets[ toSplit ] + granularity - 1 ) // granularity
+    #One entry per ( row, new bucket )
+    rowIndex = numpy.repeat( numpy.arange( len( starts ) ), numBuckets )
+    rowOffsets = numpy.cumsum( numBuckets ) - numBuckets
+    bucketEpochs = firstBuckets[ rowIndex ] + ( numpy.arange( len( rowIndex ) ) - rowOffsets[ rowIndex ] ) * granularity
+    proportions = numpy.ones( len( rowIndex ), dtype = numpy.float64 )
+    splitEntries = toSplit[ rowIndex ]
+    splitRows = rowIndex[ splitEntries ]
+    spanStart = numpy.maximum( bucketEpochs[ splitEntries ], starts[ splitRows ] )
+    spanEnd = numpy.minimum( bucketEpochs[ splitEntries ] + granularity, ends[ splitRows ] )
+    proportions[ splitEntries ] = ( spanEnd - spanStart ).astype( numpy.float64 ) / lengths[ splitRows ]
+    #Accumulate in ( key x time ) cells. bincount adds in input order, same as the python loop
+    timeEpochs, timeIndex = numpy.unique( bucketEpochs, return_inverse = True )
+    numTimes = len( timeEpochs )
+    numCells = len( keys ) * numTimes
+    cells = rowKeys[ rowIndex ] * numTimes + timeIndex
+    numFields = values.shape[1]
+    sums = numpy.empty( ( numFields, numCells ), dtype = numpy.float64 )
+    for iField in range( numFields ):
+      sums[ iField ] = numpy.bincount( cells, weights = values[ rowIndex, iField ] * proportions, minlength = numCells )
+    usedCells = numpy.unique( cells )
+    sums = sums[ :, usedCells ]
+    if average:
+      sums /= numpy.bincount( cells, weights = proportions, minlength = numCells )[ usedCells ]
+    #Back to the dicts the plotters use. Cells are sorted by key, and dataDict is
+    #reused so keys are iterated in the same order as with the python code
+    cellValues = sums.T.tolist()
+    cellTimes = timeEpochs[ usedCells % numTimes ].tolist()
+    keyLimits = numpy.searchsorted( usedCells // numTimes, numpy.arange( len( keys ) + 1 ) ).tolist()
+    for iKey in range( len( keys ) ):
+      firstCell, lastCell = keyLimits[ iKey ], keyLimits[ iKey + 1 ]
+      dataDict[ keys[ iKey ] ] = dict( zip( cellTimes[ firstCell:lastCell ], cellValues[ firstCell:lastCell ] ) )
+    return dataDict
+
   def _convertNoneToZero( self, bucketsData ):
     """
     Convert None to 0
@@ -164,11 +256,12 @@ class DBUtils:
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
     startBucketEpoch = startEpoch - startEpoch % granularity
+    timeEpochs = range( int( startBucketEpoch ), int( endEpoch ), granularity )
     for key in dataDict:
       currentDict = dataDict[ key ]
-      for timeEpoch in range( int( startBucketEpoch ), int( endEpoch ), granularity ):
-        if timeEpoch not in currentDict:
-          currentDict[ timeEpoch ] = 0
+      filledDict = dict.fromkeys( timeEpochs, 0 )
+      filledDict.update( currentDict )
+      currentDict.update( filledDict )
     return dataDict
 
   def _getAccumulationMaxValue( self, dataDict ):
@@ -176,16 +269,14 @@ class DBUtils:
     Divide by factor the values and get the maximum value
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
-    maxValue = 0
     maxEpoch = 0
     for key in dataDict:
-      currentDict = dataDict[ key ]
-      for timeEpoch in currentDict:
-        if timeEpoch > maxEpoch:
-          maxEpoch = timeEpoch
-          maxValue = 0
-        if timeEpoch == maxEpoch:
-          maxValue += currentDict[ timeEpoch ]
+      if dataDict[ key ]:
+        maxEpoch = max( maxEpoch, max( dataDict[ key ] ) )
+    maxValue = 0
+    for key in dataDict:
+      if maxEpoch in dataDict[ key ]:
+        maxValue += dataDict[ key ][ maxEpoch ]
     return maxValue
 
   def _getMaxValue( self, dataDict ):
@@ -159,13 +159,12 @@ class BaseReporter( DBUtils ):
     dataDict = self._groupByField( 0, retVal[ 'Value' ] )
     coarsestGranularity = self._getBucketLengthForTime( self._typeName, startTime )
     #Transform!
-    for keyField in dataDict:
-      if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+    if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+      for keyField in dataDict:
         dataDict[ keyField ] = self._convertNoneToZero( dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "average":
-        dataDict[ keyField ] = self._averageToGranularity( coarsestGranularity, dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "sum":
-        dataDict[ keyField ] = self._sumToGranularity( coarsestGranularity, dataDict[ keyField ] )
+    dataDict = self._spanDictToGranularity( coarsestGranularity, dataDict,
+                                            average = metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "average" )
+    for keyField in dataDict:
       if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
         dataDict[ keyField ] = self._executeConsolidation( metadataDict[ self._PARAM_CONSOLIDATION_FUNCTION ], dataDict[ keyField ] )
     if metadataDict[ self._PARAM_CALCULATE_PROPORTIONAL_GAUGES ]:
@@ -0,0 +1,83 @@
+########################################################################
+# $HeadURL $
+# File: RebinBenchmark.py
+########################################################################
+"""
+  Time spent by DBUtils converting accounting buckets to the plot granularity,
+  with the pure python code and with NumPy, for reports shaped like a year long
+  JobPlotter report: many grouping keys and buckets of several lengths. Both
+  implementations must give exactly the same results. Usage:
+
+    python RebinBenchmark.py [ number of keys ] [ days ]
+"""
+
+__RCSID__ = "$Id $"
+
+import sys
+import time
+import copy
+import random
+from decimal import Decimal
+
+from DIRAC.AccountingSystem.private import DBUtils as DBUtilsModule
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+
+def bucketRows( numKeys, days, endEpoch ):
+  """
+  Rows as returned by retrieveBucketedData once grouped by key: recent data in
+  hour buckets, older data in day buckets and some week buckets in between
+  """
+  startEpoch = endEpoch - days * 86400
+  dataDict = {}
+  for iKey in range( numKeys ):
+    rows = []
+    bucketStart = startEpoch - startEpoch % 86400
+    while bucketStart < endEpoch:
+      if bucketStart < endEpoch - 90 * 86400:
+        bucketLength = random.choice( [ 86400, 86400, 604800 ] )
+      else:
+        bucketLength = 3600
+      if random.random() < 0.8:
+        value = random.choice( [ random.random() * 1000, Decimal( random.randint( 0, 100000 ) ), None ] )
+        rows.append( [ bucketStart, bucketLength, value, random.randint( 0, 100 ) ] )
+      bucketStart += bucketLength
+    dataDict[ 'LCG.Site%03d.org' % iKey ] = rows
+  return dataDict
+
+def report( dbUtils, granularity, startEpoch, endEpoch, dataDict, average ):
+  """ same steps as a cumulative JobPlotter report """
+  dataDict = dbUtils._spanDictToGranularity( granularity, dataDict, average )
+  dbUtils.stripDataField( dataDict, 0 )
+  dataDict = dbUtils._fillWithZero( granularity, startEpoch, endEpoch, dataDict )
+  dataDict = dbUtils._accumulate( granularity, startEpoch, endEpoch, dataDict )
+  return dataDict, dbUtils._getAccumulationMaxValue( dataDict )
+
+if __name__ == "__main__":
+  numKeys = 200
+  days = 365
+  if len( sys.argv ) > 1:
+    numKeys = int( sys.argv[1] )
+  if len( sys.argv ) > 2:
+    days = int( sys.argv[2] )
+  if not DBUtilsModule.numpy:
+    print "ERROR: NumPy is not available"
+    sys.exit( 1 )
+  endEpoch = int( time.time() )
+  startEpoch = endEpoch - days * 86400
+  dataDict = bucketRows( numKeys, days, endEpoch )
+  print "%s keys, %s rows" % ( numKeys, sum( [ len( rows ) for rows in dataDict.values() ] ) )
+  print "%-12s %-11s %10s" % ( "Granularity", "Mode", "Time (s)" )
+  for granularity in ( 3600, 86400 ):
+    for average in ( False, True ):
+      results = {}
+      for mode, minRows in ( ( "python", sys.maxint ), ( "numpy", 0 ) ):
+        dbUtils = DBUtils( None, None )
+        dbUtils._NUMPY_MIN_ROWS = minRows
+        data = copy.deepcopy( dataDict )
+        start = time.time()
+        results[ mode ] = report( dbUtils, granularity, startEpoch, endEpoch, data, average )
+        print "%-12s %-11s %10.3f" % ( granularity, "%s%s" % ( mode, ( average and "/avg" ) or "" ), time.time() - start )
+      if results[ "python" ] != results[ "numpy" ]:
+        print "ERROR: results differ for granularity %s" % granularity
+        sys.exit( 1 )
+  print "Results are identical"
@@ -6,6 +6,7 @@ import zlib
 import zipfile
 import threading, thread
 import time
+import types
 import DIRAC
 from DIRAC.Core.Utilities import List, Time
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
@@ -28,6 +29,8 @@ class ConfigurationData:
     self.localCFG = CFG()
     self.remoteCFG = CFG()
     self.mergedCFG = CFG()
+    #Flat index of the merged options: "/Section/Subsection/Option" -> value
+    self.__optionsIndex = {}
     self.remoteServerList = []
     if loadDefaultCFG:
       defaultCFGFile = os.path.join( DIRAC.rootPath, "etc", "dirac.cfg" )
@@ -42,7 +45,11 @@ class ConfigurationData:
 
   def sync( self ):
     gLogger.debug( "Updating configuration internals" )
-    self.mergedCFG = self.remoteCFG.mergeWith( self.localCFG )
+    mergedCFG = self.remoteCFG.mergeWith( self.localCFG )
+    optionsIndex = self.__indexOptions( mergedCFG )
+    #Readers don't lock, so replace both as a whole once they are ready
+    self.mergedCFG = mergedCFG
+    self.__optionsIndex = optionsIndex
     self.remoteServerList = []
     localServers = self.extractOptionFromCFG( "%s/Servers" % self.configurationPath,
                                         self.localCFG,
@@ -57,6 +64,22 @@ class ConfigurationData:
     self.remoteServerList = List.uniqueElements( self.remoteServerList )
     self.compressedConfigurationData = zlib.compress( str( self.remoteCFG ), 9 )
 
+  def __indexOptions( self, cfg ):
+    """
+    Get a dict with the full path of all the options in cfg as keys
+    """
+    optionsIndex = {}
+    sectionsToIndex = [ ( "", cfg ) ]
+    while sectionsToIndex:
+      sectionPath, section = sectionsToIndex.pop()
+      for key in section.listAll():
+        value = section[ key ]
+        if type( value ) == types.StringType:
+          optionsIndex[ "%s/%s" % ( sectionPath, key ) ] = value
+        else:
+          sectionsToIndex.append( ( "%s/%s" % ( sectionPath, key ), value ) )
+    return optionsIndex
+
   def loadFile( self, fileName ):
     try:
       fileCFG = CFG()
@@ -144,7 +167,14 @@ class ConfigurationData:
 
   def extractOptionFromCFG( self, path, cfg = False, disableDangerZones = False ):
     if not cfg:
-      cfg = self.mergedCFG
+      #The index is never modified, only replaced, so no need to lock
+      optionsIndex = self.__optionsIndex
+      try:
+        if path in optionsIndex:
+          return optionsIndex[ path ]
+        return optionsIndex.get( "/%s" % "/".join( [ level.strip() for level in path.split( "/" ) if level.strip() != "" ] ) )
+      except Exception:
+        return None
     if not disableDangerZones:
       self.dangerZoneStart()
     try:
@@ -0,0 +1,96 @@
+########################################################################
+# $HeadURL $
+# File: ConfigBenchmark.py
+########################################################################
+"""
+  Throughput of gConfig.getValue on a configuration of realistic size. Options
+  are read at several depths, existing and missing, from several threads at once.
+  The same paths are also extracted by walking the CFG tree, which is what every
+  lookup did before the options index. Usage:
+
+    python ConfigBenchmark.py [ -t threads ] [ -n lookups per thread ]
+"""
+
+__RCSID__ = "$Id $"
+
+from DIRAC.Core.Base import Script
+from DIRAC import S_OK
+
+numThreads = 4
+def setNumThreads( value ):
+  global numThreads
+  numThreads = int( value )
+  return S_OK()
+
+numLookups = 200000
+def setNumLookups( value ):
+  global numLookups
+  numLookups = int( value )
+  return S_OK()
+
+Script.registerSwitch( "t:", "threads=", "Number of reading threads (default %s)" % numThreads, setNumThreads )
+Script.registerSwitch( "n:", "lookups=", "Lookups per thread (default %s)" % numLookups, setNumLookups )
+Script.setUsageMessage( __doc__ )
+Script.parseCommandLine( ignoreErrors = True )
+
+import time
+import threading
+
+from DIRAC import gConfig
+from DIRAC.Core.Utilities.CFG import CFG
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+
+def buildCFG():
+  """ systems x instances x services and agents, plus a registry with many users """
+  cfg = CFG()
+  for iSystem in range( 10 ):
+    for component in [ "Services/Service%s" % i for i in range( 10 ) ] + [ "Agents/Agent%s" % i for i in range( 10 ) ]:
+      for iOption in range( 10 ):
+        cfg.setOption( "Systems/System%s/Benchmark/%s/Option%s" % ( iSystem, component, iOption ), "value%s" % iOption )
+  for iUser in range( 2000 ):
+    cfg.setOption( "Registry/Users/user%s/DN" % iUser, "/DC=org/DC=benchmark/CN=user%s" % iUser )
+    cfg.setOption( "Registry/Users/user%s/Email" % iUser, "user%s@benchmark.org" % iUser )
+  return cfg
+
+lookupPaths = [ "/DIRAC/Setup",
+                "/Systems/System5/Benchmark/Services/Service5/Option5",
+                "/Systems/System9/Benchmark/Agents/Agent9/Option9",
+                "/Registry/Users/user1999/DN",
+                "/Systems/System5/Benchmark/Services/Service5/Missing",
+                "/Resources/Sites/LCG/Missing/CE" ]
+
+def getValueLoop( results ):
+  start = time.time()
+  for _ in xrange( numLookups / len( lookupPaths ) ):
+    for path in lookupPaths:
+      gConfig.getValue( path, "default" )
+  results.append( time.time() - start )
+
+def walkLoop( results ):
+  start = time.time()
+  for _ in xrange( numLookups / len( lookupPaths ) ):
+    for path in lookupPaths:
+      gConfigurationData.extractOptionFromCFG( path, gConfigurationData.mergedCFG )
+  results.append( time.time() - start )
+
+def runThreads( func ):
+  results = []
+  threads = [ threading.Thread( target = func, args = ( results, ) ) for _ in range( numThreads ) ]
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.time() - start
+  return numThreads * ( numLookups / len( lookupPaths ) ) * len( lookupPaths ) / elapsed
+
+gConfig.loadCFG( buildCFG() )
+for path in lookupPaths:
+  walkedValue = gConfigurationData.extractOptionFromCFG( path, gConfigurationData.mergedCFG )
+  if walkedValue is None:
+    walkedValue = "default"
+  if gConfig.getValue( path, "default" ) != walkedValue:
+    print "ERROR: gConfig.getValue and the CFG disagree for %s" % path
+print "%s threads x %s lookups" % ( numThreads, numLookups )
+print "  gConfig.getValue: %12.0f lookups/s" % runThreads( getValueLoop )
+print "  CFG tree walk:    %12.0f lookups/s" % runThreads( walkLoop )
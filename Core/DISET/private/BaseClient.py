@@ -1,17 +1,19 @@
 # $HeadURL$
 __RCSID__ = "$Id$"
 
+import os
 import types
 import thread
 import DIRAC
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
-from DIRAC.Core.Utilities import List, Network
+from DIRAC.Core.Utilities import List, Network, BinEncode
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURL
-from DIRAC.Core.Security import CS
+from DIRAC.Core.Security import CS, Locations
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.ConnectionPool import getGlobalConnectionPool
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
 
 class BaseClient:
@@ -31,6 +33,7 @@ class BaseClient:
   KW_PROXY_CHAIN = "proxyChain"
   KW_SKIP_CA_CHECK = "skipCACheck"
   KW_KEEP_ALIVE_LAPSE = "keepAliveLapse"
+  KW_REUSE_CONNECTIONS = "reuseConnections"
 
   __threadConfig = ThreadConfig()
 
@@ -45,10 +48,11 @@ class BaseClient:
     self.__idDict = {}
     self.__extraCredentials = ""
     self.__enableThreadCheck = False
+    self.__connectionPoolKeys = {}
     for initFunc in ( self.__discoverSetup, self.__discoverVO, self.__discoverTimeout,
                       self.__discoverURL, self.__discoverCredentialsToUse,
                       self.__checkTransportSanity,
-                      self.__setKeepAliveLapse ):
+                      self.__setKeepAliveLapse, self.__discoverConnectionReuse ):
       result = initFunc()
       if not result[ 'OK' ] and self.__initStatus[ 'OK' ]:
         self.__initStatus = result
@@ -165,6 +169,38 @@ class BaseClient:
 
     return S_OK()
 
+  def __discoverConnectionReuse( self ):
+    #Can connections be kept open and reused by other clients?
+    if self.KW_REUSE_CONNECTIONS in self.kwargs:
+      self.reuseConnections = self.kwargs[ self.KW_REUSE_CONNECTIONS ]
+    else:
+      self.reuseConnections = gConfig.getValue( "/DIRAC/ConnectionPool/Enabled", False )
+    return S_OK()
+
+  def __getLocalCredentials( self ):
+    """
+    Credentials the transport will authenticate with. They are resolved here the same way
+    the transport does, so a change of X509_USER_PROXY or of the proxy file gives a new key
+    """
+    if self.useCertificates:
+      return ( "cert", Locations.getHostCertificateAndKeyLocation() )
+    if self.KW_PROXY_STRING in self.kwargs:
+      return ( "string", self.kwargs[ self.KW_PROXY_STRING ] )
+    if self.KW_PROXY_LOCATION in self.kwargs:
+      proxyPath = self.kwargs[ self.KW_PROXY_LOCATION ]
+    else:
+      proxyPath = Locations.getProxyLocation()
+    try:
+      proxyMTime = os.stat( proxyPath ).st_mtime
+    except Exception:
+      proxyMTime = None
+    return ( "proxy", proxyPath, proxyMTime )
+
+  def __getConnectionPoolKey( self ):
+    return ( self.serviceURL, self.setup, self.vo, self.useCertificates,
+             self.__getLocalCredentials(), str( self.__extraCredentials ),
+             self.timeout, self.kwargs.get( self.KW_SKIP_CA_CHECK ) )
+
   def __findServiceURL( self ):
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
@@ -219,12 +255,31 @@ and this is thread %s
       #raise Exception( msgTxt )
 
 
-  def _connect( self ):
+  def _connect( self, reuseConnection = False, poolConnection = False ):
+    """
+    Connect to the service
+
+    :param reuseConnection: take an idle connection from the connection pool if there's one.
+                            The returned structure then has the 'reused' flag set
+    :param poolConnection: the connection may go back to the connection pool on _disconnect
+    """
     self.__discoverExtraCredentials()
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
     if self.__enableThreadCheck:
       self.__checkThreadID()
+    poolKey = False
+    if self.reuseConnections and ( reuseConnection or poolConnection ):
+      poolKey = self.__getConnectionPoolKey()
+    if reuseConnection and poolKey:
+      transport = getGlobalConnectionPool().get( poolKey )
+      if transport:
+        gLogger.debug( "Reusing connection to: %s" % self.serviceURL )
+        trid = getGlobalTransportPool().add( transport )
+        self.__connectionPoolKeys[ trid ] = poolKey
+        result = S_OK( ( trid, transport ) )
+        result[ 'reused' ] = True
+        return result
     gLogger.debug( "Connecting to: %s" % self.serviceURL )
     try:
       transport = gProtocolDict[ self.__URLTuple[0] ][ 'transport' ]( self.__URLTuple[1:3], **self.kwargs )
@@ -234,17 +289,38 @@ and this is thread %s
     except Exception, e:
       return S_ERROR( "Can't connect to %s: %s" % ( self.serviceURL, e ) )
     trid = getGlobalTransportPool().add( transport )
+    if poolKey:
+      self.__connectionPoolKeys[ trid ] = poolKey
     return S_OK( ( trid, transport ) )
 
-  def _disconnect( self, trid ):
+  def _disconnect( self, trid, keepConnection = False ):
+    """
+    Close the connection or, if the service keeps it open, give it back to the connection pool
+    """
+    #The key is the one computed when connecting, the credentials may have changed since
+    poolKey = self.__connectionPoolKeys.pop( trid, False )
+    if keepConnection and poolKey:
+      trPool = getGlobalTransportPool()
+      transport = trPool.get( trid )
+      if transport:
+        trPool.remove( trid )
+        getGlobalConnectionPool().put( poolKey, transport )
+        return
     getGlobalTransportPool().close( trid )
 
   def _proposeAction( self, transport, action ):
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
+    #The fourth field announces the encodings we understand. Old servers ignore it and
+    #new ones start answering with BinEncode, which the transport then uses for the rest
+    #of the connection. It also asks the server to keep the connection open after RPCs
+    connectionOptions = { 'codecs' : [ BinEncode.CODEC_NAME ] }
+    if action[0] == "RPC" and self.reuseConnections:
+      connectionOptions[ 'keepConnection' ] = True
     stConnectionInfo = ( ( self.__URLTuple[3], self.setup, self.vo ),
                          action,
-                         self.__extraCredentials )
+                         self.__extraCredentials,
+                         connectionOptions )
     retVal = transport.sendData( S_OK( stConnectionInfo ) )
     if not retVal[ 'OK' ]:
       return retVal
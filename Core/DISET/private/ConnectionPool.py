@@ -0,0 +1,154 @@
+# $HeadURL$
+"""
+  Pool of idle client transports. Services that support it keep the connection open
+  after answering an RPC, so the transport can be reused by the next call to the same
+  URL with the same credentials, saving the TCP connection and the SSL handshake.
+"""
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+from DIRAC import gLogger, gConfig
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
+
+class ConnectionPool:
+
+  def __init__( self, maxIdleTime = 60, maxIdlePerHost = 10 ):
+    """
+    :param maxIdleTime: seconds an idle connection is kept in the pool
+    :param maxIdlePerHost: maximum number of idle connections to the same host and port
+    """
+    self.__maxIdleTime = maxIdleTime
+    self.__maxIdlePerHost = maxIdlePerHost
+    self.__lock = threading.Lock()
+    #poolKey -> list of ( transport, lastUseTime ), most recently used last
+    self.__idle = {}
+    #( host, port ) -> number of idle connections
+    self.__idlePerHost = {}
+    self.__stats = { 'Hits' : 0, 'Misses' : 0, 'HandshakesAvoided' : 0, 'Expired' : 0, 'Dropped' : 0 }
+    gThreadScheduler.addPeriodicTask( max( 5, maxIdleTime / 2 ), self.purgeExpired )
+
+  def __hostKey( self, transport ):
+    return tuple( transport.stServerAddress[:2] )
+
+  def __removeIdle( self, poolKey, pos ):
+    """
+    Remove an idle connection from the pool. Lock must be held
+    """
+    transport = self.__idle[ poolKey ].pop( pos )[0]
+    if not self.__idle[ poolKey ]:
+      del self.__idle[ poolKey ]
+    hostKey = self.__hostKey( transport )
+    self.__idlePerHost[ hostKey ] -= 1
+    if not self.__idlePerHost[ hostKey ]:
+      del self.__idlePerHost[ hostKey ]
+    return transport
+
+  def get( self, poolKey ):
+    """
+    Get an idle connection
+
+    :param poolKey: tuple starting with the URL and including everything that identifies the client
+    :return: transport or None
+    """
+    expired = []
+    transport = None
+    self.__lock.acquire()
+    try:
+      limit = time.time() - self.__maxIdleTime
+      while poolKey in self.__idle:
+        lastUse = self.__idle[ poolKey ][-1][1]
+        candidate = self.__removeIdle( poolKey, -1 )
+        if lastUse < limit:
+          expired.append( candidate )
+          continue
+        transport = candidate
+        break
+      if transport:
+        self.__stats[ 'Hits' ] += 1
+        if poolKey[0].find( "dips://" ) == 0:
+          self.__stats[ 'HandshakesAvoided' ] += 1
+      else:
+        self.__stats[ 'Misses' ] += 1
+      self.__stats[ 'Expired' ] += len( expired )
+    finally:
+      self.__lock.release()
+    self.__closeAll( expired )
+    return transport
+
+  def put( self, poolKey, transport ):
+    """
+    Give back a connection that can be reused
+
+    :return: True if the connection has been kept, False if it has been closed
+    """
+    hostKey = self.__hostKey( transport )
+    self.__lock.acquire()
+    try:
+      if self.__idlePerHost.get( hostKey, 0 ) < self.__maxIdlePerHost:
+        self.__idle.setdefault( poolKey, [] ).append( ( transport, time.time() ) )
+        self.__idlePerHost[ hostKey ] = self.__idlePerHost.get( hostKey, 0 ) + 1
+        return True
+      self.__stats[ 'Dropped' ] += 1
+    finally:
+      self.__lock.release()
+    self.__closeAll( [ transport ] )
+    return False
+
+  def purgeExpired( self ):
+    """
+    Close the connections that have been idle for too long
+    """
+    expired = []
+    self.__lock.acquire()
+    try:
+      limit = time.time() - self.__maxIdleTime
+      for poolKey in list( self.__idle ):
+        #Connections are sorted by last use
+        while poolKey in self.__idle and self.__idle[ poolKey ][0][1] < limit:
+          expired.append( self.__removeIdle( poolKey, 0 ) )
+      self.__stats[ 'Expired' ] += len( expired )
+    finally:
+      self.__lock.release()
+    self.__closeAll( expired )
+    if expired:
+      gLogger.verbose( "Connection pool stats", str( self.getStats() ) )
+
+  def clear( self ):
+    """
+    Close all the idle connections
+    """
+    self.__lock.acquire()
+    try:
+      idle = [ transport for poolKey in self.__idle for transport, _lastUse in self.__idle[ poolKey ] ]
+      self.__idle = {}
+      self.__idlePerHost = {}
+    finally:
+      self.__lock.release()
+    self.__closeAll( idle )
+
+  def __closeAll( self, transports ):
+    for transport in transports:
+      try:
+        transport.close()
+      except Exception:
+        pass
+
+  def getStats( self ):
+    """
+    Get the pool counters. Every hit saves a TCP connection and, for dips, an SSL handshake
+
+    :return: dict with Hits, Misses, HandshakesAvoided, Expired, Dropped and Idle
+    """
+    stats = dict( self.__stats )
+    stats[ 'Idle' ] = sum( self.__idlePerHost.values() )
+    return stats
+
+gConnectionPool = None
+def getGlobalConnectionPool():
+  global gConnectionPool
+  if not gConnectionPool:
+    gConnectionPool = ConnectionPool( maxIdleTime = gConfig.getValue( "/DIRAC/ConnectionPool/MaxIdleTime", 60 ),
+                                      maxIdlePerHost = gConfig.getValue( "/DIRAC/ConnectionPool/MaxIdlePerHost", 10 ) )
+  return gConnectionPool
@@ -10,23 +10,32 @@ class InnerRPCClient( BaseClient ):
 
   def executeRPC( self, functionName, args ):
     stub = ( self._getBaseStub(), functionName, args )
-    retVal = self._connect()
-    if not retVal[ 'OK' ]:
-      retVal[ 'rpcStub' ] = stub
-      return retVal
-    trid, transport = retVal[ 'Value' ]
-    try:
+    for reuseConnection in ( True, False ):
+      retVal = self._connect( reuseConnection = reuseConnection, poolConnection = True )
+      if not retVal[ 'OK' ]:
+        retVal[ 'rpcStub' ] = stub
+        return retVal
+      reused = retVal.get( 'reused', False )
+      trid, transport = retVal[ 'Value' ]
       retVal = self._proposeAction( transport, ( "RPC", functionName ) )
+      if retVal[ 'OK' ] or not reused:
+        break
+      #The service may have closed the idle connection. Try again with a new one
+      self._disconnect( trid )
+    keepConnection = False
+    try:
       if not retVal[ 'OK' ]:
         retVal[ 'rpcStub' ] = stub
         return retVal
+      serviceKeepsConnection = retVal.get( 'keepConnection', False )
       retVal = transport.sendData( S_OK( args ) )
       if not retVal[ 'OK' ]:
         return retVal
       receivedData = transport.receiveData()
       if type( receivedData ) == types.DictType:
         receivedData[ 'rpcStub' ] = stub
+        #Errors can also come from the connection, so only reuse it after successful calls
+        keepConnection = serviceKeepsConnection and receivedData.get( 'OK', False )
       return receivedData
     finally:
-      self._disconnect( trid )
-
+      self._disconnect( trid, keepConnection )
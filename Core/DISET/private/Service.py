@@ -1,15 +1,17 @@
 
 import os
 import time
+import types
 import DIRAC
 import threading
 from DIRAC import gConfig, gLogger, S_OK, S_ERROR, gMonitor
-from DIRAC.Core.Utilities import List, Time, MemStat
+from DIRAC.Core.Utilities import List, Time, MemStat, BinEncode
 from DIRAC.Core.DISET.private.LockManager import LockManager
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
 from DIRAC.Core.DISET.private.ServiceConfiguration import ServiceConfiguration
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
 from DIRAC.Core.DISET.private.MessageBroker import MessageBroker, MessageSender
+from DIRAC.Core.DISET.private.ServiceEventLoop import getGlobalServiceEventLoop
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.Core.Utilities.ThreadPool import ThreadPool
@@ -45,6 +47,7 @@ class Service:
     self._transportPool = getGlobalTransportPool()
     self.__cloneId = 0
     self.__maxFD = 0
+    self._eventDriven = False
 
   def setCloneProcessId( self, cloneId ):
     self.__cloneId = cloneId
@@ -74,6 +77,9 @@ class Service:
                                    max( 0, self._cfg.getMaxThreads() ),
                                    self._cfg.getMaxWaitingPetitions() )
     self._threadPool.daemonize()
+    self._eventDriven = self._cfg.getEventDriven()
+    if self._eventDriven:
+      gLogger.info( "Connections will be handled by the event loop" )
     self._msgBroker = MessageBroker( "%sMSB" % self._name, threadPool = self._threadPool )
     #Create static dict
     self._serviceInfoDict = { 'serviceName' : self._name,
@@ -276,6 +282,15 @@ class Service:
   def handleConnection( self, clientTransport ):
     self._stats[ 'connections' ] += 1
     self._monitor.setComponentExtraParam( 'queries', self._stats[ 'connections' ] )
+    if self._eventDriven:
+      #The handshake blocks, so it's done by the threads before handing over to the event loop
+      result = self._threadPool.generateJobAndQueueIt( self._handshakeInThread,
+                                                        args = ( clientTransport, ),
+                                                        blocking = False )
+      if not result[ 'OK' ]:
+        gLogger.warn( "Cannot queue handshake", result[ 'Message' ] )
+        clientTransport.close()
+      return
     self._threadPool.generateJobAndQueueIt( self._processInThread,
                                              args = ( clientTransport, ) )
 
@@ -305,26 +320,71 @@ class Service:
       if not result[ 'OK' ]:
         self._transportPool.sendAndClose( trid, result )
         return
-      proposalTuple = result[ 'Value' ]
-      #Instantiate handler
-      result = self._instantiateHandler( trid, proposalTuple )
-      if not result[ 'OK' ]:
-        self._transportPool.sendAndClose( trid, result )
-        return
-      handlerObj = result[ 'Value' ]
-      #Execute the action
-      result = self._processProposal( trid, proposalTuple, handlerObj )
-      #Close the connection if required
-      if result[ 'closeTransport' ] or not result[ 'OK' ]:
-        if not result[ 'OK' ]:
-          gLogger.error( "Error processing proposal", result[ 'Message' ] )
-        self._transportPool.close( trid )
-      return result
+      return self.__handleProposal( trid, result[ 'Value' ] )
+    finally:
+      self._lockManager.unlockGlobal()
+      if monReport:
+        self.__endReportToMonitoring( *monReport )
+
+  #Threaded handshake for the event driven mode
+  def _handshakeInThread( self, clientTransport ):
+    self.__maxFD = max( self.__maxFD, clientTransport.oSocket.fileno() )
+    try:
+      result = clientTransport.handshake()
+    except Exception, e:
+      result = S_ERROR( "Exception during handshake: %s" % str( e ) )
+    if not result[ 'OK' ]:
+      gLogger.verbose( "Handshake failed", result[ 'Message' ] )
+      clientTransport.close()
+      return
+    trid = self._transportPool.add( clientTransport )
+    if not trid:
+      return
+    getGlobalServiceEventLoop().addConnection( self, clientTransport, trid )
+
+  def _queueProposal( self, trid, proposalTuple, proposalAcked ):
+    """
+    Used by the event loop to hand over a connection with an accepted proposal
+    """
+    return self._threadPool.generateJobAndQueueIt( self._processProposalInThread,
+                                                    args = ( trid, proposalTuple, proposalAcked ),
+                                                    blocking = False )
+
+  #Threaded process function for the event driven mode
+  def _processProposalInThread( self, trid, proposalTuple, proposalAcked ):
+    self._lockManager.lockGlobal()
+    try:
+      monReport = self.__startReportToMonitoring()
+    except Exception, e:
+      monReport = False
+    try:
+      return self.__handleProposal( trid, proposalTuple, proposalAcked )
     finally:
       self._lockManager.unlockGlobal()
       if monReport:
         self.__endReportToMonitoring( *monReport )
 
+  def __handleProposal( self, trid, proposalTuple, proposalAcked = False ):
+    #Instantiate handler
+    result = self._instantiateHandler( trid, proposalTuple )
+    if not result[ 'OK' ]:
+      self._transportPool.sendAndClose( trid, result )
+      return
+    handlerObj = result[ 'Value' ]
+    #Execute the action
+    result = self._processProposal( trid, proposalTuple, handlerObj, proposalAcked )
+    #Wait for the next request in the event loop if the client reuses the connection
+    if self._eventDriven and result[ 'OK' ] and result[ 'closeTransport' ] and \
+       self._transportPool.getAssociatedData( trid, 'keepConnection' ):
+      getGlobalServiceEventLoop().addConnection( self, self._transportPool.get( trid ), trid )
+      return result
+    #Close the connection if required
+    if result[ 'closeTransport' ] or not result[ 'OK' ]:
+      if not result[ 'OK' ]:
+        gLogger.error( "Error processing proposal", result[ 'Message' ] )
+      self._transportPool.close( trid )
+    return result
+
 
   def _createIdentityString( self, credDict, clientTransport = None ):
     if 'username' in credDict:
@@ -358,6 +418,17 @@ class Service:
     #Check if there are extra credentials
     if proposalTuple[2]:
       clientTransport.setExtraCredentials( proposalTuple[2] )
+    #Use BinEncode if the client supports it and keep RPC connections open if asked to.
+    #Only event driven services keep connections, they wait for the next request in the
+    #event loop. Threaded services close them after the RPC as always.
+    #Old clients only send three fields
+    keepConnection = False
+    if len( proposalTuple ) > 3 and type( proposalTuple[3] ) == types.DictType:
+      if BinEncode.CODEC_NAME in proposalTuple[3].get( 'codecs', [] ):
+        clientTransport.enableBinEncode()
+      keepConnection = self._eventDriven and proposalTuple[1][0] == "RPC" and \
+                       proposalTuple[3].get( 'keepConnection', False )
+    self._transportPool.associateData( trid, 'keepConnection', keepConnection )
     #Check if this is the requested service
     requestedService = proposalTuple[0][0]
     if requestedService not in self._validNames:
@@ -446,11 +517,21 @@ class Service:
       return S_ERROR( "Server error while loading handler" )
     return S_OK( handlerInstance )
 
-  def _processProposal( self, trid, proposalTuple, handlerObj ):
-    #Notify the client we're ready to execute the action
-    retVal = self._transportPool.send( trid, S_OK() )
-    if not retVal[ 'OK' ]:
-      return retVal
+  def _getProposalAck( self, trid ):
+    """
+    Message telling the client the proposal has been accepted
+    """
+    ack = S_OK()
+    if self._transportPool.getAssociatedData( trid, 'keepConnection' ):
+      ack[ 'keepConnection' ] = True
+    return ack
+
+  def _processProposal( self, trid, proposalTuple, handlerObj, proposalAcked = False ):
+    #Notify the client we're ready to execute the action (unless the event loop already did)
+    if not proposalAcked:
+      retVal = self._transportPool.send( trid, self._getProposalAck( trid ) )
+      if not retVal[ 'OK' ]:
+        return retVal
 
     messageConnection = False
     if proposalTuple[1] == ( 'Connection', 'new' ):
@@ -80,6 +80,12 @@ class ServiceConfiguration:
     except:
       return 15
 
+  def getEventDriven( self ):
+    optionValue = self.getOption( "EventDriven" )
+    if optionValue:
+      return optionValue.lower() in ( "y", "yes", "true", "1" )
+    return False
+
   def getCloneProcesses( self ):
     try:
       return int( self.getOption( "CloneProcesses" ) )
@@ -0,0 +1,209 @@
+# $HeadURL$
+"""
+  Event loop for the event driven services. The connections are watched with epoll
+  (poll where epoll is not available) while the proposal and the RPC arguments are
+  received. Only then the request is handed over to the thread pool of the service, so
+  no handler thread waits for slow clients. Connections kept open by clients that reuse
+  them also wait here for their next request.
+
+  The GSI handshake is blocking and takes several round trips, so it is done by the
+  service threads before the connection is added to the loop. A client stalling in the
+  middle of it only holds one of those threads instead of the loop shared by all the
+  event driven services of the process.
+"""
+__RCSID__ = "$Id$"
+
+import os
+import time
+import errno
+import select
+import threading
+
+from DIRAC import gLogger, S_OK, S_ERROR
+
+class ServiceEventLoop:
+
+  #Connection stages
+  STAGE_PROPOSAL = 1
+  STAGE_REQUEST = 2
+
+  #Seconds a connection can stay in the loop without sending anything
+  MAX_IDLE_TIME = 600
+
+  def __init__( self ):
+    self.__log = gLogger.getSubLogger( "EventLoop" )
+    self.__connections = {}
+    self.__newConnections = []
+    self.__newConnectionsLock = threading.Lock()
+    self.__lastIdleCheck = time.time()
+    if hasattr( select, "epoll" ):
+      self.__poller = select.epoll()
+      self.__pollTimeout = 1
+      self.__readMask = select.EPOLLIN
+      self.__errorMask = select.EPOLLERR | select.EPOLLHUP
+    else:
+      self.__poller = select.poll()
+      self.__pollTimeout = 1000
+      self.__readMask = select.POLLIN
+      self.__errorMask = select.POLLERR | select.POLLHUP | select.POLLNVAL
+    #Writing to this pipe wakes up the loop when there are new connections
+    self.__wakeUpRead, self.__wakeUpWrite = os.pipe()
+    self.__poller.register( self.__wakeUpRead, self.__readMask )
+    self.__loopThread = threading.Thread( target = self.__loop )
+    self.__loopThread.setDaemon( True )
+    self.__loopThread.start()
+
+  def getNumConnections( self ):
+    return len( self.__connections ) + len( self.__newConnections )
+
+  def addConnection( self, service, clientTransport, trid ):
+    """
+    Wait for the next proposal of a connection of a service
+
+    :param trid: id in the transport pool of the connection, whose handshake is already done
+    """
+    self.__newConnectionsLock.acquire()
+    try:
+      self.__newConnections.append( ( service, clientTransport, trid ) )
+    finally:
+      self.__newConnectionsLock.release()
+    os.write( self.__wakeUpWrite, "c" )
+    return S_OK()
+
+  def __registerNewConnections( self ):
+    self.__newConnectionsLock.acquire()
+    try:
+      newConnections = self.__newConnections
+      self.__newConnections = []
+    finally:
+      self.__newConnectionsLock.release()
+    for service, clientTransport, trid in newConnections:
+      try:
+        fd = clientTransport.getSocket().fileno()
+        self.__poller.register( fd, self.__readMask )
+      except Exception, e:
+        self.__log.warn( "Cannot watch connection", str( e ) )
+        service._transportPool.close( trid )
+        continue
+      self.__connections[ fd ] = { 'service' : service,
+                                   'transport' : clientTransport,
+                                   'stage' : ServiceEventLoop.STAGE_PROPOSAL,
+                                   'trid' : trid,
+                                   'proposal' : None,
+                                   'lastActivity' : time.time() }
+      #Data might have arrived together with the end of the handshake. It is held
+      #by the SSL layer and won't make the socket readable
+      if clientTransport._pendingBytes():
+        try:
+          self.__processEvent( fd, self.__readMask )
+        except Exception:
+          self.__log.exception( "Exception while processing connection" )
+          self.__close( fd )
+
+  def __forget( self, fd ):
+    try:
+      self.__poller.unregister( fd )
+    except Exception:
+      pass
+    return self.__connections.pop( fd, None )
+
+  def __close( self, fd, errorToSend = None ):
+    """
+    Close a connection, optionally sending a last message to the client
+    """
+    connection = self.__forget( fd )
+    if not connection:
+      return
+    trPool = connection[ 'service' ]._transportPool
+    if errorToSend:
+      trPool.send( connection[ 'trid' ], errorToSend )
+    trPool.close( connection[ 'trid' ] )
+
+  def __closeIdleConnections( self ):
+    now = time.time()
+    if now - self.__lastIdleCheck < 10:
+      return
+    self.__lastIdleCheck = now
+    for fd in [ fd for fd in self.__connections
+                if now - self.__connections[ fd ][ 'lastActivity' ] > ServiceEventLoop.MAX_IDLE_TIME ]:
+      self.__log.verbose( "Closing idle connection", str( self.__connections[ fd ][ 'transport' ].getRemoteAddress() ) )
+      self.__close( fd )
+
+  def __loop( self ):
+    while True:
+      try:
+        events = self.__poller.poll( self.__pollTimeout )
+      except ( IOError, OSError, select.error ), e:
+        if e.args[0] == errno.EINTR:
+          continue
+        self.__log.exception( "Error while polling connections" )
+        time.sleep( 0.1 )
+        continue
+      for fd, event in events:
+        if fd == self.__wakeUpRead:
+          os.read( self.__wakeUpRead, 4096 )
+          continue
+        try:
+          self.__processEvent( fd, event )
+        except Exception:
+          self.__log.exception( "Exception while processing connection" )
+          self.__close( fd )
+      self.__registerNewConnections()
+      self.__closeIdleConnections()
+
+  def __processEvent( self, fd, event ):
+    connection = self.__connections.get( fd )
+    if not connection:
+      return
+    if event & self.__errorMask and not event & self.__readMask:
+      self.__close( fd )
+      return
+    connection[ 'lastActivity' ] = time.time()
+    service = connection[ 'service' ]
+    clientTransport = connection[ 'transport' ]
+    #Wait until the whole message is there
+    result = clientTransport.bufferIncomingData()
+    if not result[ 'OK' ]:
+      self.__close( fd )
+      return
+    if not result[ 'Value' ]:
+      return
+    trid = connection[ 'trid' ]
+    if connection[ 'stage' ] == ServiceEventLoop.STAGE_PROPOSAL:
+      result = service._receiveAndCheckProposal( trid )
+      if not result[ 'OK' ]:
+        self.__close( fd, result )
+        return
+      proposalTuple = result[ 'Value' ]
+      if proposalTuple[1][0] != "RPC":
+        #Transfers and messaging connections are handled by the threads as usual
+        self.__dispatch( fd, proposalTuple, proposalAcked = False )
+        return
+      #Ask for the RPC arguments and wait for them here
+      result = service._transportPool.send( trid, service._getProposalAck( trid ) )
+      if not result[ 'OK' ]:
+        self.__close( fd )
+        return
+      connection[ 'proposal' ] = proposalTuple
+      connection[ 'stage' ] = ServiceEventLoop.STAGE_REQUEST
+    else:
+      self.__dispatch( fd, connection[ 'proposal' ], proposalAcked = True )
+
+  def __dispatch( self, fd, proposalTuple, proposalAcked ):
+    """
+    Hand over the connection to the service threads
+    """
+    connection = self.__forget( fd )
+    result = connection[ 'service' ]._queueProposal( connection[ 'trid' ], proposalTuple, proposalAcked )
+    if not result[ 'OK' ]:
+      self.__log.warn( "Cannot queue request", result[ 'Message' ] )
+      trPool = connection[ 'service' ]._transportPool
+      trPool.send( connection[ 'trid' ], S_ERROR( "Server is too busy" ) )
+      trPool.close( connection[ 'trid' ] )
+
+gServiceEventLoop = None
+def getGlobalServiceEventLoop():
+  global gServiceEventLoop
+  if not gServiceEventLoop:
+    gServiceEventLoop = ServiceEventLoop()
+  return gServiceEventLoop
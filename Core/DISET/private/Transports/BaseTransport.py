@@ -3,14 +3,13 @@ __RCSID__ = "$Id$"
 
 import time
 import select
-import cStringIO
 try:
   from hashlib import md5
 except:
   from md5 import md5
 
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
-from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.Utilities import DEncode, BinEncode
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 
 class BaseTransport:
@@ -18,12 +17,17 @@ class BaseTransport:
   bAllowReuseAddress = True
   iListenQueueSize = 5
   iReadTimeout = 600
+  iReceiveBufferSize = 16384
   keepAliveMagic = "dka"
 
   def __init__( self, stServerAddress, bServerMode = False, **kwargs ):
     self.bServerMode = bServerMode
     self.extraArgsDict = kwargs
-    self.byteStream = ""
+    #Received data waiting to be processed lives in __rcvBuffer[ __rcvStart : __rcvEnd ]
+    self.__rcvBuffer = bytearray( self.iReceiveBufferSize )
+    self.__rcvView = memoryview( self.__rcvBuffer )
+    self.__rcvStart = 0
+    self.__rcvEnd = 0
     self.packetSize = 1048576 #1MiB
     self.stServerAddress = stServerAddress
     self.peerCredentials = {}
@@ -36,6 +40,7 @@ class BaseTransport:
     self.waitingForKeepAlivePong = False
     self.__keepAliveLapse = 0
     self.oSocket = None
+    self.__binEncode = False
     if 'keepAliveLapse' in kwargs:
       try:
         self.__keepAliveLapse = max( 150, int( kwargs[ 'keepAliveLapse' ] ) )
@@ -78,6 +83,16 @@ class BaseTransport:
   def setExtraCredentials( self, group ):
     self.peerCredentials[ 'extraCredentials' ] = group
 
+  def enableBinEncode( self ):
+    """
+    Send data using BinEncode instead of DEncode. Only to be used once the peer
+    has announced it can decode it
+    """
+    self.__binEncode = True
+
+  def usesBinEncode( self ):
+    return self.__binEncode
+
   def serverMode( self ):
     return self.bServerMode
 
@@ -116,7 +131,10 @@ class BaseTransport:
 
   def sendData( self, uData, prefix = False ):
     self.__updateLastActionTimestamp()
-    sCodedData = DEncode.encode( uData )
+    if self.__binEncode:
+      sCodedData = BinEncode.encode( uData )
+    else:
+      sCodedData = DEncode.encode( uData )
     if prefix:
       dataToSend = "%s%s:%s" % ( prefix, len( sCodedData ), sCodedData )
     else:
@@ -138,6 +156,97 @@ class BaseTransport:
     return S_OK()
 
 
+  def __findHeader( self ):
+    """
+    Look for the message length separator or the keep alive magic string at the
+    beginning of the pending data
+    """
+    rcvStart = self.__rcvStart
+    if self.__rcvBuffer.startswith( BaseTransport.keepAliveMagic, rcvStart, self.__rcvEnd ):
+      return -1, True
+    return self.__rcvBuffer.find( ":", rcvStart, min( self.__rcvEnd, rcvStart + 10 ) ), False
+
+  def __fillReceiveBuffer( self, skipReadyCheck = False ):
+    """
+    Read more data from the peer into the free tail of the receive buffer.
+    Pending data is moved to the front of the buffer if there's no room left
+    """
+    if self.__rcvStart == self.__rcvEnd:
+      self.__rcvStart = self.__rcvEnd = 0
+    elif self.__rcvEnd == len( self.__rcvBuffer ):
+      pending = self.__rcvEnd - self.__rcvStart
+      self.__rcvView[ :pending ] = self.__rcvView[ self.__rcvStart : self.__rcvEnd ]
+      self.__rcvStart = 0
+      self.__rcvEnd = pending
+    retVal = self._readInto( self.__rcvView[ self.__rcvEnd: ], skipReadyCheck = skipReadyCheck )
+    if not retVal[ 'OK' ]:
+      return retVal
+    if not retVal[ 'Value' ]:
+      return S_ERROR( "Peer closed connection" )
+    self.__rcvEnd += retVal[ 'Value' ]
+    return retVal
+
+  def _readInto( self, view, skipReadyCheck = False ):
+    """
+    Read data from the peer into a writable memoryview.
+    Transports that can read directly into a buffer should overload this method
+
+    :return: S_OK( number of bytes read ), 0 bytes means the peer closed the connection
+    """
+    retVal = self._read( len( view ), skipReadyCheck = skipReadyCheck )
+    if not retVal[ 'OK' ]:
+      return retVal
+    data = retVal[ 'Value' ]
+    view[ :len( data ) ] = data
+    return S_OK( len( data ) )
+
+  def _pendingBytes( self ):
+    """
+    Number of bytes already read from the socket but buffered by the transport layer
+    (decrypted SSL data for instance) that won't make the socket readable
+    """
+    return 0
+
+  def __isMessageBuffered( self ):
+    """
+    Check if the next message can be received without blocking
+    """
+    iSeparatorPosition, isKeepAlive = self.__findHeader()
+    if isKeepAlive:
+      return True
+    if iSeparatorPosition == -1:
+      #No header in the first 10 bytes means garbage. Let receiveData complain
+      return self.__rcvEnd - self.__rcvStart >= 10
+    try:
+      pkgSize = int( self.__rcvView[ self.__rcvStart : iSeparatorPosition ].tobytes() )
+    except ValueError:
+      return True
+    if pkgSize > len( self.__rcvBuffer ):
+      #Big messages are read straight into their own buffer by receiveData
+      return True
+    return self.__rcvEnd - iSeparatorPosition - 1 >= pkgSize
+
+  def bufferIncomingData( self ):
+    """
+    Read the data sent by the peer without waiting for more. To be called once the
+    socket is readable, so event loops can wait for whole messages before calling receiveData
+
+    :return: S_OK( True ) if the next message (or just its header for messages bigger
+             than the receive buffer) is buffered
+    """
+    self.__updateLastActionTimestamp()
+    if self.receivedMessages or self.__isMessageBuffered():
+      return S_OK( True )
+    try:
+      retVal = self.__fillReceiveBuffer( skipReadyCheck = True )
+      while retVal[ 'OK' ] and self._pendingBytes() and self.__rcvEnd < len( self.__rcvBuffer ):
+        retVal = self.__fillReceiveBuffer( skipReadyCheck = True )
+    except Exception, e:
+      return S_ERROR( "Network error while receiving data: %s" % str( e ) )
+    if not retVal[ 'OK' ]:
+      return retVal
+    return S_OK( self.__isMessageBuffered() )
+
   def receiveData( self, maxBufferSize = 0, blockAfterKeepAlive = True, idleReceive = False ):
     self.__updateLastActionTimestamp()
     if self.receivedMessages:
@@ -146,67 +255,65 @@ class BaseTransport:
     maxBufferSize = max( maxBufferSize, 0 )
     try:
       #Look either for message length of keep alive magic string
-      iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
-      keepAliveMagicLen = len( BaseTransport.keepAliveMagic )
-      isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
+      iSeparatorPosition, isKeepAlive = self.__findHeader()
       #While not found the message length or the ka, keep receiving
       while iSeparatorPosition == -1 and not isKeepAlive:
-        retVal = self._read( 16384 )
-        #If error return
+        retVal = self.__fillReceiveBuffer()
+        #If error or closed return
         if not retVal[ 'OK' ]:
           return retVal
-        #If closed return error
-        if not retVal[ 'Value' ]:
-          return S_ERROR( "Peer closed connection" )
-        #New data!
-        self.byteStream += retVal[ 'Value' ]
         #Look again for either message length of ka magic string
-        iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
-        isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
+        iSeparatorPosition, isKeepAlive = self.__findHeader()
         #Over the limit?
-        if maxBufferSize and len( self.byteStream ) > maxBufferSize and iSeparatorPosition == -1 :
+        if maxBufferSize and self.__rcvEnd - self.__rcvStart > maxBufferSize and iSeparatorPosition == -1 :
           return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
       #Keep alive magic!
       if isKeepAlive:
         gLogger.debug( "Received keep alive header" )
         #Remove the ka magic from the buffer and process the keep alive
-        self.byteStream = self.byteStream[ keepAliveMagicLen: ]
+        self.__rcvStart += len( BaseTransport.keepAliveMagic )
         return self.__processKeepAlive( maxBufferSize, blockAfterKeepAlive )
       #From here it must be a real message!
-      #Process the size and remove the msg length from the bytestream
-      pkgSize = int( self.byteStream[ :iSeparatorPosition ] )
-      pkgData = self.byteStream[ iSeparatorPosition + 1: ]
-      readSize = len( pkgData )
-      if readSize >= pkgSize:
-        #If we already have all the data we need
-        data = pkgData[ :pkgSize ]
-        self.byteStream = pkgData[ pkgSize: ]
+      #Process the size and remove the msg length from the buffer
+      pkgSize = int( self.__rcvView[ self.__rcvStart : iSeparatorPosition ].tobytes() )
+      self.__rcvStart = iSeparatorPosition + 1
+      if maxBufferSize and pkgSize > maxBufferSize:
+        return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+      if pkgSize <= len( self.__rcvBuffer ):
+        #The message fits in the receive buffer
+        while self.__rcvEnd - self.__rcvStart < pkgSize:
+          retVal = self.__fillReceiveBuffer( skipReadyCheck = True )
+          if not retVal[ 'OK' ]:
+            return retVal
+        data = self.__rcvView[ self.__rcvStart : self.__rcvStart + pkgSize ].tobytes()
+        self.__rcvStart += pkgSize
       else:
-        #If we still need to read stuff
-        pkgMem = cStringIO.StringIO()
-        pkgMem.write( pkgData )
+        #Big message. Read it straight into a buffer of its size
+        pkgBuffer = bytearray( pkgSize )
+        pkgView = memoryview( pkgBuffer )
+        readSize = self.__rcvEnd - self.__rcvStart
+        pkgView[ :readSize ] = self.__rcvView[ self.__rcvStart : self.__rcvEnd ]
+        self.__rcvStart = self.__rcvEnd = 0
         #Receive while there's still data to be received
         while readSize < pkgSize:
-          retVal = self._read( pkgSize - readSize, skipReadyCheck = True )
+          retVal = self._readInto( pkgView[ readSize: ], skipReadyCheck = True )
           if not retVal[ 'OK' ]:
             return retVal
           if not retVal[ 'Value' ]:
             return S_ERROR( "Peer closed connection" )
-          rcvData = retVal[ 'Value' ]
-          readSize += len( rcvData )
-          pkgMem.write( rcvData )
-          if maxBufferSize and readSize > maxBufferSize:
-            return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
-        #Data is here! take it out from the bytestream, dencode and return
-        if readSize == pkgSize:
-          data = pkgMem.getvalue()
-          self.byteStream = ""
-        else: #readSize > pkgSize:
-          pkgMem.seek( 0, 0 )
-          data = pkgMem.read( pkgSize )
-          self.byteStream = pkgMem.read()
+          readSize += retVal[ 'Value' ]
+        del pkgView
+        #The decoders work on strings, this is the only copy of the data
+        data = str( pkgBuffer )
+        del pkgBuffer
+      #Data is here! dencode and return
       try:
-        data = DEncode.decode( data )[0]
+        if BinEncode.isBinEncoded( data ):
+          data = BinEncode.decode( data )[0]
+          #The peer only sends BinEncoded data if we offered it, so reply in kind
+          self.__binEncode = True
+        else:
+          data = DEncode.decode( data )[0]
       except Exception, e:
         return S_ERROR( "Could not decode received data: %s" % str( e ) )
       if idleReceive:
@@ -84,6 +84,25 @@ class PlainTransport( BaseTransport ):
       except Exception, e:
         return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
 
+  def _readInto( self, view, skipReadyCheck = False ):
+    start = time.time()
+    timeout = False
+    if 'timeout' in self.extraArgsDict:
+      timeout = self.extraArgsDict[ 'timeout' ]
+    while True:
+      if timeout:
+        if time.time() - start > timeout:
+          return S_ERROR( "Socket read timeout exceeded" )
+      try:
+        return S_OK( self.oSocket.recv_into( view ) )
+      except socket.error, e:
+        if e[0] == 11:
+          time.sleep( 0.001 )
+        else:
+          return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+      except Exception, e:
+        return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+
   def _write( self, buffer ):
     sentBytes = 0
     timeout = False
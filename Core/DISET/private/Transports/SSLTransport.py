@@ -137,6 +137,12 @@ class SSLTransport( BaseTransport ):
     finally:
       self.__unlock()
 
+  def _pendingBytes( self ):
+    try:
+      return self.oSocket.pending()
+    except Exception:
+      return 0
+
   def isLocked( self ):
     return self.__locked
 
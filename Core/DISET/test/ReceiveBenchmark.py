@@ -0,0 +1,91 @@
+########################################################################
+# $HeadURL $
+# File: ReceiveBenchmark.py
+########################################################################
+"""
+  Throughput and peak memory of BaseTransport.receiveData for big messages sent
+  over a PlainTransport connection to localhost. Every message size is received by
+  a freshly forked process so its peak RSS can be measured. Usage:
+
+    python ReceiveBenchmark.py [ size in MB ] ...
+
+  By default 1, 10, 100 and 500 MB messages are sent.
+"""
+
+__RCSID__ = "$Id $"
+
+import os
+import sys
+import time
+import resource
+
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+def maxRSSMB():
+  """ peak resident memory of this process in MB """
+  return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024.0
+
+def receive( serverTransport, resultFD ):
+  """ receive one message and write the stats to resultFD """
+  result = serverTransport.acceptConnection()
+  if not result[ 'OK' ]:
+    os.write( resultFD, "ERROR %s" % result[ 'Message' ] )
+    return
+  clientTransport = result[ 'Value' ]
+  initialRSS = maxRSSMB()
+  start = time.time()
+  result = clientTransport.receiveData()
+  elapsed = time.time() - start
+  if not result[ 'OK' ]:
+    os.write( resultFD, "ERROR %s" % result[ 'Message' ] )
+    return
+  msgSize = len( result[ 'Value' ] )
+  del result
+  clientTransport.sendData( { 'OK' : True } )
+  clientTransport.close()
+  os.write( resultFD, "%s %s %s" % ( msgSize, elapsed, maxRSSMB() - initialRSS ) )
+
+def benchmark( sizeMB ):
+  """ send a message of sizeMB to a forked receiver """
+  serverTransport = PlainTransport( ( "127.0.0.1", 0 ), bServerMode = True )
+  serverTransport.initAsServer()
+  address = serverTransport.getLocalAddress()
+  resultR, resultW = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    try:
+      receive( serverTransport, resultW )
+    finally:
+      os._exit( 0 )
+  #Don't shutdown the listening socket, the child is still using it
+  serverTransport.getSocket().close()
+  os.close( resultW )
+  clientTransport = PlainTransport( address, timeout = 600 )
+  result = clientTransport.initAsClient()
+  if not result[ 'OK' ]:
+    print "ERROR: Can't connect: %s" % result[ 'Message' ]
+    sys.exit( 1 )
+  payload = "x" * ( sizeMB * 1048576 )
+  result = clientTransport.sendData( { 'OK' : True, 'Value' : payload } )
+  del payload
+  if not result[ 'OK' ]:
+    print "ERROR: Can't send: %s" % result[ 'Message' ]
+    sys.exit( 1 )
+  clientTransport.receiveData()
+  clientTransport.close()
+  os.waitpid( pid, 0 )
+  stats = os.read( resultR, 1024 ).split()
+  os.close( resultR )
+  if stats[0] == "ERROR":
+    print "ERROR: %s" % " ".join( stats[1:] )
+    sys.exit( 1 )
+  elapsed = float( stats[1] )
+  print "%10s %12.3f %12.1f %18.1f" % ( sizeMB, elapsed, sizeMB / elapsed, float( stats[2] ) )
+
+if __name__ == "__main__":
+  sizes = [ int( arg ) for arg in sys.argv[1:] ]
+  if not sizes:
+    sizes = [ 1, 10, 100, 500 ]
+  print "%10s %12s %12s %18s" % ( "Size (MB)", "Time (s)", "MB/s", "Peak RSS inc (MB)" )
+  for sizeMB in sizes:
+    benchmark( sizeMB )
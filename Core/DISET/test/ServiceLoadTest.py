@@ -0,0 +1,116 @@
+########################################################################
+# $HeadURL$
+# File :    ServiceLoadTest.py
+########################################################################
+"""
+  Load test for DISET services. Many concurrent RPCClients (spread over several
+  processes to avoid the client side GIL) call the ping method that every handler
+  exports, and the request rate and latency percentiles are reported for each URL.
+
+  To compare the threaded and the event driven modes run the same service twice,
+  one of them with EventDriven = yes in its CS section, and pass both URLs:
+
+    python ServiceLoadTest.py -c 500 -n 20 dips://host:9190/Test/Threaded dips://host:9191/Test/Events
+"""
+__RCSID__ = "$Id$"
+
+from DIRAC.Core.Base import Script
+from DIRAC import S_OK
+
+numClients = 100
+def setNumClients( value ):
+  global numClients
+  numClients = int( value )
+  return S_OK()
+
+numCalls = 10
+def setNumCalls( value ):
+  global numCalls
+  numCalls = int( value )
+  return S_OK()
+
+numProcesses = 8
+def setNumProcesses( value ):
+  global numProcesses
+  numProcesses = int( value )
+  return S_OK()
+
+Script.registerSwitch( "c:", "clients=", "Number of concurrent clients (default %s)" % numClients, setNumClients )
+Script.registerSwitch( "n:", "calls=", "Number of calls per client (default %s)" % numCalls, setNumCalls )
+Script.registerSwitch( "p:", "processes=", "Number of client processes (default %s)" % numProcesses, setNumProcesses )
+Script.setUsageMessage( __doc__ )
+Script.parseCommandLine( ignoreErrors = True )
+
+import sys
+import time
+import threading
+import multiprocessing
+
+from DIRAC.Core.DISET.RPCClient import RPCClient
+
+def clientThread( url, calls, latencies, errors ):
+  """ do sequential calls, each one in a new connection """
+  for _ in range( calls ):
+    start = time.time()
+    result = RPCClient( url ).ping()
+    if result[ 'OK' ]:
+      latencies.append( time.time() - start )
+    else:
+      errors.append( result[ 'Message' ] )
+
+def clientProcess( url, clients, calls, resultQueue ):
+  """ run a bunch of client threads """
+  latencies = []
+  errors = []
+  threads = [ threading.Thread( target = clientThread, args = ( url, calls, latencies, errors ) )
+              for _ in range( clients ) ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  resultQueue.put( ( latencies, errors[:10], len( errors ) ) )
+
+def loadTest( url ):
+  resultQueue = multiprocessing.Queue()
+  processes = []
+  for iProc in range( numProcesses ):
+    clients = numClients / numProcesses + ( iProc < numClients % numProcesses )
+    if clients:
+      processes.append( multiprocessing.Process( target = clientProcess,
+                                                 args = ( url, clients, numCalls, resultQueue ) ) )
+  start = time.time()
+  for process in processes:
+    process.start()
+  latencies = []
+  numErrors = 0
+  sampleErrors = []
+  for _ in processes:
+    procLatencies, procSampleErrors, procErrors = resultQueue.get()
+    latencies.extend( procLatencies )
+    sampleErrors.extend( procSampleErrors )
+    numErrors += procErrors
+  elapsed = time.time() - start
+  for process in processes:
+    process.join()
+  if not latencies:
+    print "%s: all requests failed: %s" % ( url, sampleErrors[:1] )
+    return
+  latencies.sort()
+  num = len( latencies )
+  print "%s" % url
+  print "  %s requests in %.2f secs: %.1f requests/s, %s errors" % ( num, elapsed, num / elapsed, numErrors )
+  print "  latency: median %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms" % ( 1000 * latencies[ num / 2 ],
+                                                                              1000 * latencies[ int( num * 0.9 ) ],
+                                                                              1000 * latencies[ int( num * 0.99 ) ],
+                                                                              1000 * latencies[-1] )
+  for error in sampleErrors[:3]:
+    print "  error: %s" % error
+
+urls = Script.getPositionalArgs()
+if not urls:
+  Script.showHelp()
+  sys.exit( 1 )
+
+print "%s clients x %s calls in %s processes" % ( numClients, numCalls, numProcesses )
+for url in urls:
+  loadTest( url )
@@ -0,0 +1,283 @@
+# $HeadURL$
+"""
+Length prefixed binary encoding for dirac. Handles the same types as DEncode but
+numbers are packed with struct and every string and container carries its length,
+so decoding never has to scan the data looking for terminators.
+
+Encoded data always starts with MAGIC, which can't be the first character of a
+DEncoded stream. Ids:
+ i -> int (32 bits)
+ q -> int (64 bits)
+ J -> long (64 bits)
+ I -> long (arbitrary size, as decimal string)
+ f -> float
+ T -> True
+ F -> False
+ S -> string (up to 255 chars)
+ s -> string
+ u -> unicode
+ a -> datetime
+ D -> date
+ M -> time
+ n -> none
+ l -> list
+ t -> tuple
+ d -> dictionary
+"""
+__RCSID__ = "$Id$"
+
+import types
+import struct
+import datetime
+
+CODEC_NAME = "BinEncode1"
+MAGIC = "\x00"
+
+_int32 = struct.Struct( "!i" )
+_int64 = struct.Struct( "!q" )
+_uint8 = struct.Struct( "!B" )
+_uint32 = struct.Struct( "!I" )
+_double = struct.Struct( "!d" )
+_dateTime = struct.Struct( "!HBBBBBI" )
+_date = struct.Struct( "!HBB" )
+_time = struct.Struct( "!BBBI" )
+
+_INT32_MIN = -2 ** 31
+_INT32_MAX = 2 ** 31 - 1
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+g_bEncodeFunctions = {}
+g_bDecodeFunctions = {}
+
+#Encoding and decoding ints
+def encodeInt( iValue, eList ):
+  if _INT32_MIN <= iValue <= _INT32_MAX:
+    eList.append( "i" + _int32.pack( iValue ) )
+  elif _INT64_MIN <= iValue <= _INT64_MAX:
+    eList.append( "q" + _int64.pack( iValue ) )
+  else:
+    #ints can be 64 bits wide in some platforms and narrower in others
+    encodeLong( iValue, eList )
+
+def decodeInt( data, i ):
+  return ( _int32.unpack_from( data, i + 1 )[0], i + 5 )
+
+def decodeInt64( data, i ):
+  return ( int( _int64.unpack_from( data, i + 1 )[0] ), i + 9 )
+
+g_bEncodeFunctions[ types.IntType ] = encodeInt
+g_bDecodeFunctions[ "i" ] = decodeInt
+g_bDecodeFunctions[ "q" ] = decodeInt64
+
+#Encoding and decoding longs
+def encodeLong( iValue, eList ):
+  if _INT64_MIN <= iValue <= _INT64_MAX:
+    eList.append( "J" + _int64.pack( iValue ) )
+  else:
+    sValue = str( iValue )
+    eList.append( "I" + _uint32.pack( len( sValue ) ) + sValue )
+
+def decodeLong64( data, i ):
+  return ( long( _int64.unpack_from( data, i + 1 )[0] ), i + 9 )
+
+def decodeLong( data, i ):
+  end = i + 5 + _uint32.unpack_from( data, i + 1 )[0]
+  return ( long( data[ i + 5 : end ] ), end )
+
+g_bEncodeFunctions[ types.LongType ] = encodeLong
+g_bDecodeFunctions[ "J" ] = decodeLong64
+g_bDecodeFunctions[ "I" ] = decodeLong
+
+#Encoding and decoding floats
+def encodeFloat( fValue, eList ):
+  eList.append( "f" + _double.pack( fValue ) )
+
+def decodeFloat( data, i ):
+  return ( _double.unpack_from( data, i + 1 )[0], i + 9 )
+
+g_bEncodeFunctions[ types.FloatType ] = encodeFloat
+g_bDecodeFunctions[ "f" ] = decodeFloat
+
+#Encoding and decoding booleans
+def encodeBool( bValue, eList ):
+  if bValue:
+    eList.append( "T" )
+  else:
+    eList.append( "F" )
+
+def decodeTrue( data, i ):
+  return ( True, i + 1 )
+
+def decodeFalse( data, i ):
+  return ( False, i + 1 )
+
+g_bEncodeFunctions[ types.BooleanType ] = encodeBool
+g_bDecodeFunctions[ "T" ] = decodeTrue
+g_bDecodeFunctions[ "F" ] = decodeFalse
+
+#Encoding and decoding strings
+def encodeString( sValue, eList ):
+  sLen = len( sValue )
+  if sLen < 256:
+    eList.append( "S" + _uint8.pack( sLen ) )
+  else:
+    eList.append( "s" + _uint32.pack( sLen ) )
+  eList.append( sValue )
+
+def decodeShortString( data, i ):
+  end = i + 2 + ord( data[ i + 1 ] )
+  return ( data[ i + 2 : end ], end )
+
+def decodeString( data, i ):
+  end = i + 5 + _uint32.unpack_from( data, i + 1 )[0]
+  return ( data[ i + 5 : end ], end )
+
+g_bEncodeFunctions[ types.StringType ] = encodeString
+g_bDecodeFunctions[ "S" ] = decodeShortString
+g_bDecodeFunctions[ "s" ] = decodeString
+
+#Encoding and decoding unicode strings
+def encodeUnicode( uValue, eList ):
+  valueStr = uValue.encode( 'utf-8' )
+  eList.append( "u" + _uint32.pack( len( valueStr ) ) )
+  eList.append( valueStr )
+
+def decodeUnicode( data, i ):
+  end = i + 5 + _uint32.unpack_from( data, i + 1 )[0]
+  return ( unicode( data[ i + 5 : end ], 'utf-8' ), end )
+
+g_bEncodeFunctions[ types.UnicodeType ] = encodeUnicode
+g_bDecodeFunctions[ "u" ] = decodeUnicode
+
+#Encoding and decoding datetime
+def _checkNoTZ( oValue ):
+  if oValue.tzinfo is not None:
+    raise Exception( "Can't encode timezone aware object %s" % str( oValue ) )
+
+def encodeDateTime( oValue, eList ):
+  _checkNoTZ( oValue )
+  eList.append( "a" + _dateTime.pack( oValue.year, oValue.month, oValue.day,
+                                       oValue.hour, oValue.minute, oValue.second,
+                                       oValue.microsecond ) )
+
+def decodeDateTime( data, i ):
+  return ( datetime.datetime( *_dateTime.unpack_from( data, i + 1 ) ), i + 1 + _dateTime.size )
+
+def encodeDate( oValue, eList ):
+  eList.append( "D" + _date.pack( oValue.year, oValue.month, oValue.day ) )
+
+def decodeDate( data, i ):
+  return ( datetime.date( *_date.unpack_from( data, i + 1 ) ), i + 1 + _date.size )
+
+def encodeTime( oValue, eList ):
+  _checkNoTZ( oValue )
+  eList.append( "M" + _time.pack( oValue.hour, oValue.minute, oValue.second, oValue.microsecond ) )
+
+def decodeTime( data, i ):
+  return ( datetime.time( *_time.unpack_from( data, i + 1 ) ), i + 1 + _time.size )
+
+g_bEncodeFunctions[ datetime.datetime ] = encodeDateTime
+g_bEncodeFunctions[ datetime.date ] = encodeDate
+g_bEncodeFunctions[ datetime.time ] = encodeTime
+g_bDecodeFunctions[ "a" ] = decodeDateTime
+g_bDecodeFunctions[ "D" ] = decodeDate
+g_bDecodeFunctions[ "M" ] = decodeTime
+
+#Encoding and decoding None
+def encodeNone( oValue, eList ):
+  eList.append( "n" )
+
+def decodeNone( data, i ):
+  return ( None, i + 1 )
+
+g_bEncodeFunctions[ types.NoneType ] = encodeNone
+g_bDecodeFunctions[ "n" ] = decodeNone
+
+#Encode and decode a list
+def encodeList( lValue, eList ):
+  eList.append( "l" + _uint32.pack( len( lValue ) ) )
+  encFuncs = g_bEncodeFunctions
+  for uObject in lValue:
+    encFuncs[ type( uObject ) ]( uObject, eList )
+
+def decodeList( data, i ):
+  num = _uint32.unpack_from( data, i + 1 )[0]
+  i += 5
+  oL = []
+  decFuncs = g_bDecodeFunctions
+  for _ in xrange( num ):
+    ob, i = decFuncs[ data[ i ] ]( data, i )
+    oL.append( ob )
+  return ( oL, i )
+
+g_bEncodeFunctions[ types.ListType ] = encodeList
+g_bDecodeFunctions[ "l" ] = decodeList
+
+#Encode and decode a tuple
+def encodeTuple( tValue, eList ):
+  eList.append( "t" + _uint32.pack( len( tValue ) ) )
+  encFuncs = g_bEncodeFunctions
+  for uObject in tValue:
+    encFuncs[ type( uObject ) ]( uObject, eList )
+
+def decodeTuple( data, i ):
+  oL, i = decodeList( data, i )
+  return ( tuple( oL ), i )
+
+g_bEncodeFunctions[ types.TupleType ] = encodeTuple
+g_bDecodeFunctions[ "t" ] = decodeTuple
+
+#Encode and decode a dictionary
+def encodeDict( dValue, eList ):
+  eList.append( "d" + _uint32.pack( len( dValue ) ) )
+  encFuncs = g_bEncodeFunctions
+  for key, value in dValue.iteritems():
+    encFuncs[ type( key ) ]( key, eList )
+    encFuncs[ type( value ) ]( value, eList )
+
+def decodeDict( data, i ):
+  num = _uint32.unpack_from( data, i + 1 )[0]
+  i += 5
+  oD = {}
+  decFuncs = g_bDecodeFunctions
+  for _ in xrange( num ):
+    k, i = decFuncs[ data[ i ] ]( data, i )
+    oD[ k ], i = decFuncs[ data[ i ] ]( data, i )
+  return ( oD, i )
+
+g_bEncodeFunctions[ types.DictType ] = encodeDict
+g_bDecodeFunctions[ "d" ] = decodeDict
+
+
+def isBinEncoded( data ):
+  """
+  Check if the data has been encoded with BinEncode (rather than with DEncode)
+  """
+  return data[ :1 ] == MAGIC
+
+#Encode function
+def encode( uObject ):
+  eList = [ MAGIC ]
+  g_bEncodeFunctions[ type( uObject ) ]( uObject, eList )
+  return "".join( eList )
+
+def decode( data ):
+  """
+  Decode data encoded with encode
+
+  :return: tuple with the decoded object and the length of the consumed data, as DEncode does
+  """
+  if not data:
+    return data
+  if data[0] != MAGIC:
+    raise Exception( "Data is not BinEncoded" )
+  return g_bDecodeFunctions[ data[ 1 ] ]( data, 1 )
+
+
+if __name__ == "__main__":
+  gObject = { 2 : "3", True : ( 3, None ), 2.0 * 10 ** 20 : 2.0 * 10 ** -10, 'now' : datetime.datetime.utcnow() }
+  print "Initial: %s" % gObject
+  gData = encode( gObject )
+  print "Encoded: %s" % repr( gData )
+  print "Decoded: %s, [%s]" % decode( gData )
@@ -1,5 +1,5 @@
 
-import threading, time, types
+import threading, time, types, collections, heapq
 from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.ReturnValues import isReturnStructure
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
@@ -134,6 +134,12 @@ class ExecutorState:
       self.__lock.release()
 
 class ExecutorQueues:
+  """
+  Waiting queues of tasks per executor type. Each queue is a deque of ( taskId, seq ) entries,
+  a task is in a queue only while __taskInQueue maps it to that type and seq. Deleted tasks
+  leave their entry behind and are skipped when popped, so pushing, popping and deleting are O(1).
+  The queues are compacted when they hold more deleted entries than tasks
+  """
 
   def __init__( self, log = False ):
     if log:
@@ -143,12 +149,16 @@ class ExecutorQueues:
     self.__lock = threading.Lock()
     self.__queues = {}
     self.__lastUse = {}
+    # taskId -> ( eType, seq )
     self.__taskInQueue = {}
+    # eType -> number of tasks in the queue
+    self.__queueSize = {}
+    self.__seq = 0
 
   def _internals( self ):
-    return { 'queues' : dict( self.__queues ),
+    return { 'queues' : self.getState(),
              'lastUse' : dict( self.__lastUse ),
-             'taskInQueue' : dict( self.__taskInQueue ),
+             'taskInQueue' : dict( [ ( taskId, self.__taskInQueue[ taskId ][0] ) for taskId in self.__taskInQueue ] ),
              'locked' : self.__lock.locked() }
 
   def getExecutorList( self ):
@@ -159,22 +169,25 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       if taskId in self.__taskInQueue:
-        if self.__taskInQueue[ taskId ] != eType:
+        if self.__taskInQueue[ taskId ][0] != eType:
           errMsg = "Task %s cannot be queued because it's already queued for %s" % ( taskId,
-                                                                                    self.__taskInQueue[ taskId ] )
+                                                                                    self.__taskInQueue[ taskId ][0] )
           self.__log.fatal( errMsg )
           return 0
         else:
-          return len( self.__queues[ eType ] )
+          return self.__queueSize[ eType ]
       if eType not in self.__queues:
-        self.__queues[ eType ] = []
+        self.__queues[ eType ] = collections.deque()
+        self.__queueSize[ eType ] = 0
       self.__lastUse[ eType ] = time.time()
+      self.__seq += 1
       if ahead:
-        self.__queues[ eType ].insert( 0, taskId )
+        self.__queues[ eType ].appendleft( ( taskId, self.__seq ) )
       else:
-        self.__queues[ eType ].append( taskId )
-      self.__taskInQueue[ taskId ] = eType
-      return len( self.__queues[ eType ] )
+        self.__queues[ eType ].append( ( taskId, self.__seq ) )
+      self.__taskInQueue[ taskId ] = ( eType, self.__seq )
+      self.__queueSize[ eType ] += 1
+      return self.__queueSize[ eType ]
     finally:
       self.__lock.release()
 
@@ -182,21 +195,25 @@ class ExecutorQueues:
     if type( eTypes ) not in ( types.ListType, types.TupleType ):
       eTypes = [ eTypes ]
     self.__lock.acquire()
-    for eType in eTypes:
-      try:
-        taskId = self.__queues[ eType ].pop( 0 )
-        del( self.__taskInQueue[ taskId ] )
-        #Found! release and return!
-        self.__lock.release()
-        self.__lastUse[ eType ] = time.time()
-        self.__log.verbose( "Popped task %s from executor %s waiting queue" % ( taskId, eType ) )
-        return ( taskId, eType )
-      except IndexError:
-        continue
-      except KeyError:
-        continue
-    self.__lock.release()
-    #Not found. release and return None
+    try:
+      for eType in eTypes:
+        try:
+          queue = self.__queues[ eType ]
+        except KeyError:
+          continue
+        while queue:
+          taskId, seq = queue.popleft()
+          if self.__taskInQueue.get( taskId ) != ( eType, seq ):
+            #Deleted entry
+            continue
+          del( self.__taskInQueue[ taskId ] )
+          self.__queueSize[ eType ] -= 1
+          self.__lastUse[ eType ] = time.time()
+          self.__log.verbose( "Popped task %s from executor %s waiting queue" % ( taskId, eType ) )
+          return ( taskId, eType )
+    finally:
+      self.__lock.release()
+    #Not found
     return None
 
   def getState( self ):
@@ -204,7 +221,8 @@ class ExecutorQueues:
     try:
       qInfo = {}
       for qName in self.__queues:
-        qInfo[ qName ] = list( self.__queues[ qName ] )
+        qInfo[ qName ] = [ taskId for taskId, seq in self.__queues[ qName ]
+                           if self.__taskInQueue.get( taskId ) == ( qName, seq ) ]
     finally:
       self.__lock.release()
     return qInfo
@@ -214,16 +232,15 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       try:
-        eType = self.__taskInQueue[ taskId ]
-        del( self.__taskInQueue[ taskId ] )
-        self.__lastUse[ eType ] = time.time()
+        eType = self.__taskInQueue.pop( taskId )[0]
       except KeyError:
         return False
-      try:
-        iPos = self.__queues[ eType ].index( taskId )
-      except ValueError:
-        return False
-      del( self.__queues[ eType ][ iPos ] )
+      self.__lastUse[ eType ] = time.time()
+      self.__queueSize[ eType ] -= 1
+      queue = self.__queues[ eType ]
+      if len( queue ) > 2 * self.__queueSize[ eType ] + 1000:
+        self.__queues[ eType ] = collections.deque( [ entry for entry in queue
+                                                      if self.__taskInQueue.get( entry[0] ) == ( eType, entry[1] ) ] )
       return True
     finally:
       self.__lock.release()
@@ -232,7 +249,7 @@ class ExecutorQueues:
     self.__lock.acquire()
     try:
       try:
-        return len( self.__queues[ eType ] )
+        return self.__queueSize[ eType ]
       except KeyError:
         return 0
     finally:
@@ -292,7 +309,12 @@ class ExecutorDispatcher:
     self.__freezerLock = threading.Lock()
     self.__tasks = {}
     self.__log = gLogger.getSubLogger( "ExecMind" )
-    self.__taskFreezer = []
+    #Frozen tasks: taskId -> ( eType, thawTime, seq ), and a min-heap of ( thawTime, seq, taskId )
+    #per eType. Entries of tasks no longer in __taskFreezer with the same seq are skipped
+    self.__taskFreezer = {}
+    self.__freezerHeaps = {}
+    self.__freezerEntries = 0
+    self.__freezerSeq = 0
     self.__queues = ExecutorQueues( self.__log )
     self.__states = ExecutorState( self.__log )
     self.__cbHolder = ExecutorDispatcherCallbacks()
@@ -326,7 +348,7 @@ class ExecutorDispatcher:
     return { 'idMap' : dict( self.__idMap ),
              'execTypes' : dict( self.__execTypes ),
              'tasks' : sorted( self.__tasks ),
-             'freezer' : list( self.__taskFreezer ),
+             'freezer' : sorted( self.__taskFreezer, key = lambda taskId: self.__taskFreezer[ taskId ][1:] ),
              'queues' : self.__queues._internals(),
              'states' : self.__states._internals(),
              'locked' : { 'exec' : self.__executorsLock.locked(),
@@ -426,7 +448,7 @@ class ExecutorDispatcher:
       eTask.eType = eType
       isFrozen = False
       if eTask.frozenCount < 10:
-        self.__taskFreezer.append( taskId )
+        self.__pushToFreezer( taskId, eType, eTask.frozenSince + freezeTime )
         isFrozen = True
     finally:
       self.__freezerLock.release()
@@ -437,17 +459,29 @@ class ExecutorDispatcher:
       return False
     return True
 
+  def __pushToFreezer( self, taskId, eType, thawTime ):
+    #Freezer lock must be held
+    self.__freezerSeq += 1
+    self.__taskFreezer[ taskId ] = ( eType, thawTime, self.__freezerSeq )
+    heapq.heappush( self.__freezerHeaps.setdefault( eType, [] ), ( thawTime, self.__freezerSeq, taskId ) )
+    self.__freezerEntries += 1
+    if self.__freezerEntries > 2 * len( self.__taskFreezer ) + 1000:
+      #Too many entries of tasks already out of the freezer, rebuild the heaps
+      self.__freezerHeaps = {}
+      for frozenId, ( frozenType, frozenThaw, frozenSeq ) in self.__taskFreezer.items():
+        self.__freezerHeaps.setdefault( frozenType, [] ).append( ( frozenThaw, frozenSeq, frozenId ) )
+      for heap in self.__freezerHeaps.values():
+        heapq.heapify( heap )
+      self.__freezerEntries = len( self.__taskFreezer )
+
   def __isFrozen( self, taskId ):
     return taskId in self.__taskFreezer
 
   def __removeFromFreezer( self, taskId ):
     self.__freezerLock.acquire()
     try:
-      try:
-        iP = self.__taskFreezer.index( taskId )
-      except ValueError:
+      if self.__taskFreezer.pop( taskId, None ) is None:
         return False
-      self.__taskFreezer.pop( iP )
       try:
         eTask = self.__tasks[ taskId ]
       except KeyError:
@@ -458,31 +492,36 @@ class ExecutorDispatcher:
     return True
 
   def __unfreezeTasks( self, eType = False ):
-    iP = 0
-    while iP < len( self.__taskFreezer ):
-      self.__freezerLock.acquire()
-      try:
-        try:
-          taskId = self.__taskFreezer[ iP ]
-        except IndexError:
-          return
-        try:
-          eTask = self.__tasks[ taskId ]
-        except KeyError:
-          self.__log.notice( "Removing task %s from the freezer. Somebody has removed the task" % taskId )
-          self.__taskFreezer.pop( iP )
-          continue
-        #Current taskId/eTask is the one to defrost
-        if eType and eType != eTask.eType:
-          iP += 1
-          continue
-        if time.time() - eTask.frozenSince < eTask.freezeTime:
-          iP += 1
-          continue
-        self.__taskFreezer.pop( iP )
-      finally:
-        self.__freezerLock.release()
-      #Out of the lock zone to minimize zone of exclusion
+    if not self.__taskFreezer:
+      return
+    now = time.time()
+    thawed = []
+    self.__freezerLock.acquire()
+    try:
+      if eType:
+        heaps = [ self.__freezerHeaps.get( eType, [] ) ]
+      else:
+        heaps = self.__freezerHeaps.values()
+      for heap in heaps:
+        #Only the tasks whose thaw time has passed are looked at
+        while heap and heap[0][0] <= now:
+          thawTime, seq, taskId = heapq.heappop( heap )
+          self.__freezerEntries -= 1
+          frozen = self.__taskFreezer.get( taskId )
+          if not frozen or frozen[2] != seq:
+            #Already out of the freezer
+            continue
+          del( self.__taskFreezer[ taskId ] )
+          try:
+            eTask = self.__tasks[ taskId ]
+          except KeyError:
+            self.__log.notice( "Removing task %s from the freezer. Somebody has removed the task" % taskId )
+            continue
+          thawed.append( ( taskId, eTask ) )
+    finally:
+      self.__freezerLock.release()
+    #Out of the lock zone to minimize zone of exclusion
+    for taskId, eTask in thawed:
       eTask.frozenTime += time.time() - eTask.frozenSince
       self.__log.verbose( "Unfreezed task %s" % taskId )
       self.__dispatchTask( taskId, defrozeIfNeeded = False )
@@ -620,12 +659,7 @@ class ExecutorDispatcher:
     self.__states.removeTask( taskId )
     self.__freezerLock.acquire()
     try:
-      try:
-        self.__taskFreezer.pop( self.__taskFreezer.index( taskId ) )
-      except KeyError:
-        pass
-      except ValueError:
-        pass
+      self.__taskFreezer.pop( taskId, None )
     finally:
       self.__freezerLock.release()
     if eId:
@@ -0,0 +1,132 @@
+# $HeadURL$
+"""
+  LRUCache.
+"""
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+class LRUCache( object ):
+  """
+  .. class:: LRUCache
+
+  size bounded cache with optional time to live. When the cache is full the least
+  recently used records are evicted.
+  """
+
+  def __init__( self, maxSize = 1000, validSeconds = 0 ):
+    """
+    Initialize the cache
+
+    :param maxSize: maximum number of records in the cache
+    :param validSeconds: life time of the records, 0 means records don't expire
+    """
+    self.__maxSize = max( 1, maxSize )
+    self.__validSeconds = validSeconds
+    self.__lock = threading.Lock()
+    #key -> [ value, expirationTime, lastUseTick ]
+    self.__cache = {}
+    self.__tick = 0
+    self.__hits = 0
+    self.__misses = 0
+
+  def __len__( self ):
+    return len( self.__cache )
+
+  def __contains__( self, cKey ):
+    return self.get( cKey, countStats = False ) is not None
+
+  def get( self, cKey, default = None, countStats = True ):
+    """
+    Get a record from the cache
+
+    :param cKey: identification key of the record
+    :param default: value to return if the record is not in the cache or has expired
+    """
+    self.__lock.acquire()
+    try:
+      record = self.__cache.get( cKey )
+      if record is not None and record[1] and record[1] < time.time():
+        del self.__cache[ cKey ]
+        record = None
+      if record is None:
+        if countStats:
+          self.__misses += 1
+        return default
+      if countStats:
+        self.__hits += 1
+      self.__tick += 1
+      record[2] = self.__tick
+      return record[0]
+    finally:
+      self.__lock.release()
+
+  def add( self, cKey, value, validSeconds = None ):
+    """
+    Add a record to the cache
+
+    :param cKey: identification key of the record
+    :param value: value of the record
+    :param validSeconds: life time of this record, by default the one of the cache
+    """
+    if validSeconds is None:
+      validSeconds = self.__validSeconds
+    if validSeconds:
+      expirationTime = time.time() + validSeconds
+    else:
+      expirationTime = 0
+    self.__lock.acquire()
+    try:
+      self.__tick += 1
+      self.__cache[ cKey ] = [ value, expirationTime, self.__tick ]
+      if len( self.__cache ) > self.__maxSize:
+        self.__evict()
+    finally:
+      self.__lock.release()
+
+  def __evict( self ):
+    """
+    Remove the expired records and, if still needed, the least recently used ones.
+    A tenth of the cache is freed at once so the sorting cost is amortized
+    """
+    now = time.time()
+    for cKey in [ cKey for cKey, record in self.__cache.iteritems() if record[1] and record[1] < now ]:
+      del self.__cache[ cKey ]
+    toRemove = len( self.__cache ) - self.__maxSize
+    if toRemove <= 0:
+      return
+    toRemove += self.__maxSize / 10
+    byUse = sorted( [ ( record[2], cKey ) for cKey, record in self.__cache.iteritems() ] )
+    for _, cKey in byUse[ :toRemove ]:
+      del self.__cache[ cKey ]
+
+  def delete( self, cKey ):
+    """
+    Delete a record from the cache
+
+    :param cKey: identification key of the record
+    """
+    self.__lock.acquire()
+    try:
+      self.__cache.pop( cKey, None )
+    finally:
+      self.__lock.release()
+
+  def purgeAll( self ):
+    """
+    Delete all the records
+    """
+    self.__lock.acquire()
+    try:
+      self.__cache = {}
+    finally:
+      self.__lock.release()
+
+  def getStats( self ):
+    """
+    Get the hit and miss counters
+
+    :return: dict with Hits, Misses and Size
+    """
+    return { 'Hits' : self.__hits, 'Misses' : self.__misses, 'Size' : len( self.__cache ) }
@@ -145,6 +145,38 @@
       Get distinct values of a table attribute under specified conditions
 
 
+    insertMany( self, tableName, inFields, rows, conn = None, ignore = False, chunkSize = BULKCHUNKSIZE ):
+
+      Insert the "rows" (lists of values of the "inFields") in "tableName" with
+      multi-row INSERT statements of at most "chunkSize" rows.
+      return S_OK( number of inserted rows )
+
+
+    upsertMany( self, tableName, inFields, rows, updateFields = None, updateExpressions = None,
+                conn = None, chunkSize = BULKCHUNKSIZE ):
+
+      Same as insertMany, the rows whose unique key already exists are updated
+      instead: the "updateFields" (all "inFields" by default) get the new values
+      and the fields of the "updateExpressions" dictionary are set to the given
+      SQL expressions.
+      return S_OK( number of affected rows, as counted by MySQL )
+
+
+    updateMany( self, tableName, keyFields, updateDicts, updateDict = None, onlyIfNull = None,
+                conn = None, chunkSize = BULKCHUNKSIZE ):
+
+      Update rows of "tableName" with different values each, "updateDicts" is a
+      { key : { field : value } } dictionary, the key being the value of the only
+      "keyFields" field or the tuple of their values. The rows are updated with
+      UPDATE ... CASE statements of at most "chunkSize" rows. The "updateDict"
+      values are set in all the rows, the fields in "onlyIfNull" only where NULL.
+      return S_OK( number of updated rows )
+
+    The statements of insertMany, upsertMany and updateMany are executed in a
+    single transaction, which is retried if it fails with a deadlock or a lock
+    wait timeout. Values are escaped, None is written as NULL.
+
+
 """
 
 __RCSID__ = "$Id$"
@@ -168,9 +200,16 @@ gDebugFile = None
 import collections
 import time
 import threading
-from types import StringTypes, DictType, ListType, TupleType, BooleanType
+from types import StringTypes, DictType, ListType, TupleType, BooleanType, IntType, LongType, FloatType
 
 MAXCONNECTRETRY = 10
+# Rows per statement of insertMany, upsertMany and updateMany
+BULKCHUNKSIZE = 1000
+# Retries of their transaction on deadlock and lock wait timeout
+BULKRETRIES = 3
+# MySQL error codes of the retried transactions: lock wait timeout, deadlock
+RETRYERRORS = ( 1205, 1213 )
+SPECIALVALUES = ( 'UTC_TIMESTAMP', 'TIMESTAMPADD', 'TIMESTAMPDIFF' )
 
 def _checkQueueSize( maxQueueSize ):
   """
@@ -240,6 +279,8 @@ class MySQL:
       self.__maxSpares = 10
       self.__lastClean = 0
       self.__assigned = {}
+      #Connections with a transaction opened by transactionStart
+      self.__inTransaction = set()
 
     @property
     def __thid( self ):
@@ -358,15 +399,18 @@ class MySQL:
         return result
       conn = result[ 'Value' ]
       try:
-        return S_OK( self.__execute( conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT" ) )
+        result = S_OK( self.__execute( conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT" ) )
       except MySQLdb.MySQLError, excp:
         return S_ERROR( "Could not begin transaction: %s" % excp )
+      self.__inTransaction.add( conn )
+      return result
 
     def transactionCommit( self, dbName ):
       result = self.get( dbName )
       if not result[ 'OK' ]:
         return result
       conn = result[ 'Value' ]
+      self.__inTransaction.discard( conn )
       try:
         result = self.__execute( conn, "COMMIT" )
         return S_OK( result )
@@ -378,12 +422,19 @@ class MySQL:
       if not result[ 'OK' ]:
         return result
       conn = result[ 'Value' ]
+      self.__inTransaction.discard( conn )
       try:
         result = self.__execute( conn, "ROLLBACK" )
         return S_OK( result )
       except MySQLdb.MySQLError, excp:
         return S_ERROR( "Could not rollback transaction: %s" % excp )
 
+    def isInTransaction( self, conn ):
+      """
+      Check if a transaction has been opened in the connection with transactionStart
+      """
+      return conn in self.__inTransaction
+
   __connectionPools = {}
 
   def __init__( self, hostName, userName, passwd, dbName, port = 3306, maxQueueSize = 3, debug = False ):
@@ -463,15 +514,13 @@ class MySQL:
       return retDict
     connection = retDict['Value']
 
-    specialValues = ( 'UTC_TIMESTAMP', 'TIMESTAMPADD', 'TIMESTAMPDIFF' )
-
     try:
       myString = str( myString )
     except ValueError:
       return S_ERROR( "Cannot escape value!" )
 
     try:
-      for sV in specialValues:
+      for sV in SPECIALVALUES:
         if myString.find( sV ) == 0:
           return S_OK( myString )
       escape_string = connection.escape_string( str( myString ) )
@@ -1473,6 +1522,261 @@ class MySQL:
                          ( table, inFieldString, inValueString ), conn, debug = True )
 
 
+#############################################################################
+  def insertMany( self, tableName, inFields, rows, conn = None, ignore = False, chunkSize = BULKCHUNKSIZE ):
+    """
+      Insert the "rows" (lists of values of the "inFields") in "tableName" with
+      multi-row INSERT statements in one transaction. The rows already there are
+      skipped if ignore is True.
+      return S_OK( number of inserted rows )
+    """
+    return self.__insertMany( 'insertMany', tableName, inFields, rows, conn = conn, ignore = ignore,
+                              chunkSize = chunkSize )
+
+#############################################################################
+  def upsertMany( self, tableName, inFields, rows, updateFields = None, updateExpressions = None,
+                  conn = None, chunkSize = BULKCHUNKSIZE ):
+    """
+      Insert the "rows" in "tableName", updating the rows whose unique key is
+      already there: the "updateFields" (all the "inFields" by default) get the
+      new values, the fields of the "updateExpressions" dictionary are set to
+      their SQL expression (e.g. { 'ErrorCount' : 'ErrorCount+1' }).
+      return S_OK( number of affected rows, 1 per inserted row and 2 per updated one )
+    """
+    if updateFields is None:
+      updateFields = inFields
+    onDuplicate = [ '%s=VALUES(%s)' % ( _quotedList( [field] ), _quotedList( [field] ) )
+                    for field in updateFields if not updateExpressions or field not in updateExpressions ]
+    if updateExpressions:
+      onDuplicate += [ '%s=%s' % ( _quotedList( [field] ), expression )
+                       for field, expression in updateExpressions.items() ]
+    if not onDuplicate:
+      error = 'Nothing to update'
+      self.log.warn( 'upsertMany:', error )
+      return S_ERROR( error )
+    return self.__insertMany( 'upsertMany', tableName, inFields, rows, conn = conn,
+                              onDuplicate = ', '.join( onDuplicate ), chunkSize = chunkSize )
+
+#############################################################################
+  def updateMany( self, tableName, keyFields, updateDicts, updateDict = None, onlyIfNull = None,
+                  conn = None, chunkSize = BULKCHUNKSIZE ):
+    """
+      Update several rows of "tableName" with different values in one transaction.
+      updateDicts is a { key : { field : value } } dictionary, where key is the value
+      of the "keyFields" field if there is only one, or the tuple of their values.
+      The rows do not need to set the same fields. The fields of updateDict are set
+      to the same value in all the rows, those in onlyIfNull only where still NULL.
+      return S_OK( number of updated rows )
+    """
+    if not updateDicts:
+      return S_OK( 0 )
+
+    table = _quotedList( [tableName] )
+    if not table:
+      error = 'Invalid tableName argument'
+      self.log.warn( 'updateMany:', error )
+      return S_ERROR( error )
+    if type( keyFields ) in StringTypes:
+      keyFields = [ keyFields ]
+    keyString = _quotedList( keyFields )
+    if not keyString:
+      error = 'Invalid keyFields argument'
+      self.log.warn( 'updateMany:', error )
+      return S_ERROR( error )
+    if len( keyFields ) > 1:
+      keyString = '(%s)' % keyString
+    if not onlyIfNull:
+      onlyIfNull = []
+
+    retDict = self.__getConnection( conn = conn )
+    if not retDict['OK']:
+      return retDict
+    connection = retDict['Value']
+
+    cmdList = []
+    try:
+      escape = self.__escapeValue
+      constants = []
+      for field, value in ( updateDict or {} ).items():
+        constants.append( '%s=%s' % ( _quotedList( [field] ), escape( connection, value ) ) )
+      keys = updateDicts.keys()
+      for start in xrange( 0, len( keys ), chunkSize ):
+        fieldCases = {}
+        keyValues = []
+        for key in keys[start:start + chunkSize]:
+          if len( keyFields ) > 1:
+            if len( key ) != len( keyFields ):
+              raise ValueError( 'Key %s does not match the keyFields' % str( key ) )
+            keyValue = '(%s)' % ', '.join( [ escape( connection, value ) for value in key ] )
+            when = ' AND '.join( [ '%s=%s' % ( _quotedList( [keyFields[i]] ), escape( connection, key[i] ) )
+                                   for i in range( len( keyFields ) ) ] )
+          else:
+            keyValue = escape( connection, key )
+            when = '%s=%s' % ( keyString, keyValue )
+          keyValues.append( keyValue )
+          for field, value in updateDicts[key].items():
+            fieldCases.setdefault( field, [] ).append( 'WHEN %s THEN %s' % ( when, escape( connection, value ) ) )
+        assignments = []
+        for field, cases in fieldCases.items():
+          quotedField = _quotedList( [field] )
+          if field in onlyIfNull:
+            assignments.append( '%s=IFNULL(%s,CASE %s END)' % ( quotedField, quotedField, ' '.join( cases ) ) )
+          else:
+            assignments.append( '%s=CASE %s ELSE %s END' % ( quotedField, ' '.join( cases ), quotedField ) )
+        assignments += constants
+        if not assignments:
+          continue
+        cmdList.append( 'UPDATE %s SET %s WHERE %s IN ( %s )' % ( table, ', '.join( assignments ), keyString,
+                                                                    ', '.join( keyValues ) ) )
+    except Exception, x:
+      return self._except( 'updateMany', x, 'Could not build statements' )
+
+    self.log.verbose( 'updateMany:', 'updating %d rows of table %s with %d statements' %
+                      ( len( keys ), table, len( cmdList ) ) )
+    return self.__executeMany( 'updateMany', cmdList, connection )
+
+  def __insertMany( self, methodName, tableName, inFields, rows, conn = None, ignore = False,
+                    onDuplicate = None, chunkSize = BULKCHUNKSIZE ):
+    """
+      Build and execute the multi-row INSERT statements of insertMany and upsertMany
+    """
+    if not rows:
+      return S_OK( 0 )
+
+    table = _quotedList( [tableName] )
+    if not table:
+      error = 'Invalid tableName argument'
+      self.log.warn( '%s:' % methodName, error )
+      return S_ERROR( error )
+    inFieldString = _quotedList( inFields )
+    if inFieldString == None:
+      error = 'Invalid inFields arguments'
+      self.log.warn( '%s:' % methodName, error )
+      return S_ERROR( error )
+
+    retDict = self.__getConnection( conn = conn )
+    if not retDict['OK']:
+      return retDict
+    connection = retDict['Value']
+
+    head = 'INSERT %sINTO %s ( %s ) VALUES ' % ( 'IGNORE ' if ignore else '', table, inFieldString )
+    tail = ''
+    if onDuplicate:
+      tail = ' ON DUPLICATE KEY UPDATE %s' % onDuplicate
+    cmdList = []
+    try:
+      escape = self.__escapeValue
+      for start in xrange( 0, len( rows ), chunkSize ):
+        values = []
+        for row in rows[start:start + chunkSize]:
+          if len( row ) != len( inFields ):
+            return S_ERROR( 'Mismatch between inFields and row values.' )
+          values.append( '(%s)' % ', '.join( [ escape( connection, value ) for value in row ] ) )
+        cmdList.append( head + ', '.join( values ) + tail )
+    except Exception, x:
+      return self._except( methodName, x, 'Could not build statements' )
+
+    self.log.verbose( '%s:' % methodName, 'inserting %d rows into table %s with %d statements' %
+                      ( len( rows ), table, len( cmdList ) ) )
+    return self.__executeMany( methodName, cmdList, connection )
+
+  def __escapeValue( self, connection, value ):
+    """
+      SQL literal of a value for the bulk statements, escaped with the given
+      connection: NULL for None, numbers as they are, the special values like
+      UTC_TIMESTAMP() unchanged and everything else as a quoted string
+    """
+    if value is None:
+      return 'NULL'
+    valueType = type( value )
+    if valueType in ( IntType, LongType, FloatType, BooleanType ):
+      return str( int( value ) if valueType == BooleanType else value )
+    value = str( value )
+    for sV in SPECIALVALUES:
+      if value.startswith( sV ):
+        return value
+    return '"%s"' % connection.escape_string( value )
+
+  def __executeMany( self, methodName, cmdList, connection ):
+    """
+      Execute the statements in one transaction, retried on deadlock or lock wait timeout.
+      If a transaction has already been opened with transactionStart, the statements are
+      just executed in it: committing or rolling it back is left to the caller
+      return S_OK( total number of affected rows )
+    """
+    if not cmdList:
+      return S_OK( 0 )
+
+    if gDebugFile:
+      start = time.time()
+
+    if self.__connectionPool.isInTransaction( connection ):
+      retDict = self.__executeInTransaction( methodName, cmdList, connection )
+      if gDebugFile:
+        print >> gDebugFile, time.time() - start, '%s: %d statements' % ( methodName, len( cmdList ) )
+        gDebugFile.flush()
+      return retDict
+
+    retries = BULKRETRIES
+    while True:
+      affected = 0
+      cursor = None
+      try:
+        cursor = connection.cursor()
+        cursor.execute( 'START TRANSACTION' )
+        for cmd in cmdList:
+          affected += cursor.execute( cmd )
+        connection.commit()
+        retDict = S_OK( affected )
+      except MySQLdb.Error, x:
+        try:
+          connection.rollback()
+        except Exception:
+          pass
+        if x.args and x.args[0] in RETRYERRORS and retries > 0:
+          retries -= 1
+          self.log.warn( '%s: retrying transaction' % methodName, '%d: %s' % ( x.args[0], x.args[1] ) )
+          time.sleep( 0.1 * ( BULKRETRIES - retries ) )
+          continue
+        retDict = self._except( methodName, x, 'Execution failed.' )
+      except Exception, x:
+        try:
+          connection.rollback()
+        except Exception:
+          pass
+        retDict = self._except( methodName, x, 'Execution failed.' )
+      try:
+        cursor.close()
+      except Exception:
+        pass
+      break
+
+    if gDebugFile:
+      print >> gDebugFile, time.time() - start, '%s: %d statements' % ( methodName, len( cmdList ) )
+      gDebugFile.flush()
+
+    return retDict
+
+  def __executeInTransaction( self, methodName, cmdList, connection ):
+    """
+      Execute the statements in the transaction already open in the connection
+      return S_OK( total number of affected rows )
+    """
+    affected = 0
+    cursor = None
+    try:
+      cursor = connection.cursor()
+      for cmd in cmdList:
+        affected += cursor.execute( cmd )
+      retDict = S_OK( affected )
+    except Exception, x:
+      retDict = self._except( methodName, x, 'Execution failed.' )
+    try:
+      cursor.close()
+    except Exception:
+      pass
+    return retDict
+
   def executeStoredProcedure( self, packageName, parameters, outputIds, output = True, array = None, conn = False ):
     conDict = self._getConnection()
     if not conDict['OK']:
@@ -0,0 +1,365 @@
+# $HeadURL$
+"""
+  PatternFilter matches a string against many regular expressions at once and returns
+  the keys of all the expressions found in it, as re.search would do one by one.
+
+  The expressions are precompiled in a few structures so that the cost of a match does
+  not grow with the number of expressions:
+
+  - expressions anchored with '^' and starting with a literal prefix are stored in a
+    character trie, walked once along the string
+  - expressions containing literals are indexed by a trigram of one of them, so only
+    those whose literal is in the string are evaluated
+  - the remaining expressions are combined in alternation regexes with a named group
+    per expression (at most MAX_GROUPS groups each, the limit of the re module)
+  - expressions with back references, named groups or flags are evaluated one by one
+
+  The structures are updated incrementally when expressions are added or removed.
+"""
+__RCSID__ = "$Id$"
+
+import re
+import sre_parse
+import sre_constants
+import threading
+
+class PatternFilter( object ):
+  """
+  .. class:: PatternFilter
+
+  set of regular expressions identified by a key
+  """
+
+  # Groups per combined regex, the re module does not support more than 100
+  MAX_GROUPS = 99
+  # Length of the literal fragments used to index the expressions
+  GRAM_SIZE = 3
+
+  __anchors = ( sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING )
+  __notCombinable = re.compile( r'\\[1-9]|\(\?P|\(\?\(' )
+
+  def __init__( self, patterns = None ):
+    """
+    Initialize the filter
+
+    :param patterns: list of ( key, regular expression ) tuples
+    """
+    self.__lock = threading.Lock()
+    # key -> ( expression, compiled, order, kind, prefix or gram )
+    self.__patterns = {}
+    self.__order = 0
+    # char -> node, the keys of the prefixes ending in a node are in node[None]
+    self.__trie = {}
+    # gram -> { key : literal }
+    self.__grams = {}
+    # gram -> number of expressions with it in their literals
+    self.__gramCounts = {}
+    # list of combined regexes: { 'keys' : [], 'groups' : int, 'regex' : compiled or None
+    # while the chunk changes }
+    self.__chunks = []
+    self.__single = ()
+    if patterns:
+      self.update( patterns )
+
+  def __len__( self ):
+    return len( self.__patterns )
+
+  def __contains__( self, key ):
+    return key in self.__patterns
+
+  def keys( self ):
+    """
+    Get the keys in the order the expressions were added
+    """
+    patterns = self.__patterns
+    return sorted( patterns, key = lambda key: patterns[key][2] )
+
+  def getPattern( self, key ):
+    """
+    Get the compiled expression of a key, None if it is not there
+    """
+    record = self.__patterns.get( key )
+    if record:
+      return record[1]
+    return None
+
+  def items( self ):
+    """
+    Get the ( key, compiled expression ) tuples in the order the expressions were added
+    """
+    return [ ( key, self.__patterns[key][1] ) for key in self.keys() ]
+
+  def add( self, key, pattern ):
+    """
+    Add or replace the expression of a key. Raises re.error if the expression is not valid
+    """
+    compiled = re.compile( pattern )
+    self.__lock.acquire()
+    try:
+      order = None
+      if key in self.__patterns:
+        if self.__patterns[key][0] == pattern:
+          return
+        order = self.__remove( key )
+      kind, literal = self.__classify( pattern, compiled )
+      if kind == 'gram':
+        self.__countGrams( literal, 1 )
+      self.__add( key, pattern, compiled, kind, literal, order )
+      self.__compileChunks()
+    finally:
+      self.__lock.release()
+
+  def remove( self, key ):
+    """
+    Remove the expression of a key
+    """
+    self.__lock.acquire()
+    try:
+      if key in self.__patterns:
+        self.__remove( key )
+        self.__compileChunks()
+    finally:
+      self.__lock.release()
+
+  def update( self, patterns ):
+    """
+    Set the list of ( key, regular expression ) tuples. Only the expressions that
+    changed are recompiled. Raises re.error if an expression is not valid and then
+    nothing is changed
+
+    :return: number of expressions added, changed or removed
+    """
+    newPatterns = []
+    for key, pattern in patterns:
+      compiled = None
+      if self.__patterns.get( key, ( None, ) )[0] != pattern:
+        compiled = re.compile( pattern )
+      newPatterns.append( ( key, pattern, compiled ) )
+    self.__lock.acquire()
+    try:
+      newKeys = set( [ key for key, _pattern, _compiled in newPatterns ] )
+      removed = 0
+      for key in [ key for key in self.__patterns if key not in newKeys ]:
+        self.__remove( key )
+        removed += 1
+      toAdd = []
+      for key, pattern, compiled in newPatterns:
+        order = None
+        if key in self.__patterns:
+          if self.__patterns[key][0] == pattern:
+            continue
+          order = self.__remove( key )
+        if not compiled:
+          # Changed by another thread meanwhile
+          compiled = re.compile( pattern )
+        kind, literal = self.__classify( pattern, compiled )
+        if kind == 'gram':
+          self.__countGrams( literal, 1 )
+        toAdd.append( ( key, pattern, compiled, kind, literal, order ) )
+      # Added once all the grams are counted, to index them by the rarest ones
+      for key, pattern, compiled, kind, literal, order in toAdd:
+        self.__add( key, pattern, compiled, kind, literal, order )
+      self.__compileChunks()
+      return removed + len( toAdd )
+    finally:
+      self.__lock.release()
+
+  def match( self, string ):
+    """
+    Get the keys of the expressions found in the string, in the order they were added
+    """
+    # Expressions can be removed meanwhile, so their records are got with get
+    patterns = self.__patterns
+    found = set()
+
+    node = self.__trie
+    for char in string:
+      node = node.get( char )
+      if node is None:
+        break
+      for key in node.get( None, () ):
+        record = patterns.get( key )
+        if record and record[1].search( string ):
+          found.add( key )
+
+    grams = self.__grams
+    if grams:
+      gramSize = self.GRAM_SIZE
+      for gram in set( [ string[i:i + gramSize] for i in xrange( len( string ) - gramSize + 1 ) ] ):
+        for key, literal in grams.get( gram, {} ).items():
+          if key not in found and literal in string:
+            record = patterns.get( key )
+            if record and record[1].search( string ):
+              found.add( key )
+
+    for chunk in self.__chunks:
+      # The alternation only tells that one of the expressions matches, the chunk is small
+      # enough to check them one by one then
+      if chunk['regex'] is None or chunk['regex'].search( string ):
+        for key in chunk['keys']:
+          record = patterns.get( key )
+          if record and record[1].search( string ):
+            found.add( key )
+
+    for key in self.__single:
+      record = patterns.get( key )
+      if record and record[1].search( string ):
+        found.add( key )
+
+    if len( found ) > 1:
+      return sorted( found, key = lambda key: patterns.get( key, ( 0, 0, 0 ) )[2] )
+    return list( found )
+
+  def __classify( self, pattern, compiled ):
+    """
+    Get the structure where an expression goes: ( 'trie', prefix ), ( 'gram', literals ),
+    ( 'chunk', None ) or ( 'single', None )
+    """
+    if compiled.flags or self.__notCombinable.search( pattern ):
+      return ( 'single', None )
+    try:
+      ops = list( sre_parse.parse( pattern ) )
+    except Exception:
+      return ( 'single', None )
+
+    # Literal prefix of an anchored expression
+    if ops and ops[0][0] == sre_constants.AT and ops[0][1] in self.__anchors:
+      prefix = []
+      for op, value in ops[1:]:
+        if op != sre_constants.LITERAL:
+          break
+        prefix.append( unichr( value ) if value > 255 else chr( value ) )
+      if len( prefix ) >= self.GRAM_SIZE:
+        return ( 'trie', ''.join( prefix ) )
+
+    # Literals the string must contain
+    literals = []
+    current = []
+    for op, value in ops + [ ( None, None ) ]:
+      if op == sre_constants.LITERAL:
+        current.append( unichr( value ) if value > 255 else chr( value ) )
+      else:
+        if len( current ) >= self.GRAM_SIZE:
+          literals.append( ''.join( current ) )
+        current = []
+    if literals:
+      return ( 'gram', literals )
+
+    if compiled.groups + 1 > self.MAX_GROUPS:
+      return ( 'single', None )
+    return ( 'chunk', None )
+
+  def __add( self, key, pattern, compiled, kind, literal, order = None ):
+    """
+    Add a classified expression, at the end of the order unless given. The grams of
+    its literals must be counted. Lock must be held
+    """
+    if order is None:
+      self.__order += 1
+      order = self.__order
+    if kind == 'gram':
+      literal = self.__selectGram( literal )
+    # The record goes first, match skips the keys without it
+    self.__patterns[key] = ( pattern, compiled, order, kind, literal )
+
+    if kind == 'trie':
+      node = self.__trie
+      for char in literal:
+        node = node.setdefault( char, {} )
+      node[None] = node.get( None, () ) + ( key, )
+    elif kind == 'gram':
+      entries = dict( self.__grams.get( literal[0], {} ) )
+      entries[key] = literal[1][0]
+      # Replace instead of modifying the dictionaries being read by match
+      self.__grams[literal[0]] = entries
+    elif kind == 'chunk':
+      groups = compiled.groups + 1
+      for index, chunk in enumerate( self.__chunks ):
+        if chunk['groups'] + groups <= self.MAX_GROUPS:
+          self.__chunks[index] = { 'keys' : chunk['keys'] + [ key ],
+                                   'groups' : chunk['groups'] + groups,
+                                   'regex' : None }
+          break
+      else:
+        self.__chunks = self.__chunks + [ { 'keys' : [ key ], 'groups' : groups, 'regex' : None } ]
+    else:
+      self.__single = self.__single + ( key, )
+
+  def __getGrams( self, literal ):
+    gramSize = self.GRAM_SIZE
+    return [ literal[i:i + gramSize] for i in xrange( len( literal ) - gramSize + 1 ) ]
+
+  def __countGrams( self, literals, increment ):
+    """
+    Count the grams of the literals of an expression
+    """
+    grams = set()
+    for literal in literals:
+      grams.update( self.__getGrams( literal ) )
+    for gram in grams:
+      count = self.__gramCounts.get( gram, 0 ) + increment
+      if count:
+        self.__gramCounts[gram] = count
+      else:
+        del self.__gramCounts[gram]
+
+  def __selectGram( self, literals ):
+    """
+    Get the ( gram, ( literal, literals ) ) to index an expression: the rarest gram of its
+    literals, so that the common parts like the VO path are not used
+    """
+    candidates = []
+    for literal in literals:
+      for gram in self.__getGrams( literal ):
+        candidates.append( ( self.__gramCounts.get( gram, 0 ), len( self.__grams.get( gram, () ) ),
+                             -len( literal ), gram, literal ) )
+    _count, _used, _length, gram, literal = min( candidates )
+    return ( gram, ( literal, literals ) )
+
+  def __remove( self, key ):
+    """
+    Remove an expression and return its order. Lock must be held
+    """
+    _pattern, compiled, order, kind, literal = self.__patterns[key]
+    if kind == 'trie':
+      node = self.__trie
+      for char in literal:
+        node = node[char]
+      node[None] = tuple( [ nodeKey for nodeKey in node[None] if nodeKey != key ] )
+    elif kind == 'gram':
+      self.__countGrams( literal[1][1], -1 )
+      entries = dict( self.__grams[literal[0]] )
+      del entries[key]
+      if entries:
+        self.__grams[literal[0]] = entries
+      else:
+        del self.__grams[literal[0]]
+    elif kind == 'chunk':
+      for index, chunk in enumerate( self.__chunks ):
+        if key in chunk['keys']:
+          self.__chunks[index] = { 'keys' : [ chunkKey for chunkKey in chunk['keys'] if chunkKey != key ],
+                                   'groups' : chunk['groups'] - compiled.groups - 1,
+                                   'regex' : None }
+          break
+    else:
+      self.__single = tuple( [ singleKey for singleKey in self.__single if singleKey != key ] )
+    del self.__patterns[key]
+    return order
+
+  def __compileChunks( self ):
+    """
+    Compile the combined regexes of the chunks that changed, once all the changes are
+    done. Lock must be held
+    """
+    chunks = []
+    for chunk in self.__chunks:
+      if not chunk['keys']:
+        continue
+      if chunk['regex'] is None:
+        alternatives = [ '(?P<p%d>%s)' % ( index, self.__patterns[key][0] )
+                         for index, key in enumerate( chunk['keys'] ) ]
+        chunk = { 'keys' : chunk['keys'],
+                  'groups' : chunk['groups'],
+                  'regex' : re.compile( '|'.join( alternatives ) ) }
+      chunks.append( chunk )
+    self.__chunks = chunks
@@ -7,23 +7,41 @@
 """ The Process Monitor utility allows to calculate cumulative CPU time and memory 
     for a given PID and it's process group.  This is only implemented for linux /proc 
     file systems but could feasibly be extended in the future.
+
+    Each sample reads /proc/[pid]/stat once for all the processes, indexes them by
+    parent and sums the process tree of the PID plus the orphans of its process group.
+    The last CPU seen of each process is kept between samples, so that the CPU of the
+    processes that ended without being waited for by the tree is not lost.
 """
 
 from DIRAC import gLogger, S_OK, S_ERROR
-from DIRAC.Core.Utilities.Subprocess import shellCall
 
 __RCSID__ = "$Id$"
 
-import os, re, platform
+import os, re, platform, time
 
 class ProcessMonitor:
 
   #############################################################################
-  def __init__( self ):
+  def __init__( self, procRoot = '/proc', maxSampleAge = 1 ):
     """ Standard constructor
+
+    :param str procRoot: mount point of the proc file system
+    :param float maxSampleAge: seconds during which a sample is reused for the same PID,
+                               so that the CPU and memory checks of a cycle share it
     """
     self.log = gLogger.getSubLogger( 'ProcessMonitor' )
     self.osType = platform.uname()
+    self.procRoot = procRoot
+    self.maxSampleAge = maxSampleAge
+    self.pageSize = os.sysconf( 'SC_PAGESIZE' )
+    self.clockTicks = float( os.sysconf( 'SC_CLK_TCK' ) )
+    # ( pid, sample time, resources ) of the last sample
+    self.__lastSample = None
+    # pid -> { ( pid, starttime ) : ( CPU ticks, children CPU ticks ) } of the processes seen in its tree
+    self.__procCache = {}
+    # pid -> CPU ticks of the processes of its tree that ended without being accounted by their parent
+    self.__lostTicks = {}
 
   #############################################################################
   def getCPUConsumed( self, pid ):
@@ -49,18 +67,24 @@ class ProcessMonitor:
   def getResourceConsumedLinux( self, pid ):
     """Returns the CPU consumed given a PID assuming a proc file system exists.
     """
-    pid = str( pid )
-    masterProcPath = '/proc/%s/stat' % ( pid )
+    pid = int( pid )
+    masterProcPath = os.path.join( self.procRoot, str( pid ), 'stat' )
     if not os.path.exists( masterProcPath ):
       return S_ERROR( 'Process %s does not exist' % ( pid ) )
 
-    #Get the current process list
-    pidListResult = self.__getProcListLinux()
-    if not pidListResult['OK']:
-      return pidListResult
+    now = time.time()
+    if self.__lastSample and self.__lastSample[0] == pid and now - self.__lastSample[1] < self.maxSampleAge:
+      return S_OK( dict( self.__lastSample[2] ) )
 
-    pidList = pidListResult['Value']
-    return self.__getChildResourceConsumedLinux( pid, pidList )
+    #Get the current process table
+    procTable = self.__getProcTableLinux()
+    if not procTable['OK']:
+      return procTable
+
+    result = self.__getTreeResourceConsumedLinux( pid, procTable['Value'] )
+    if result['OK']:
+      self.__lastSample = ( pid, now, dict( result['Value'] ) )
+    return result
 
   #############################################################################
   def getCPUConsumedLinux( self, pid ):
@@ -91,88 +115,88 @@ class ProcessMonitor:
   def __getProcListLinux( self ):
     """Gets list of process IDs from /proc/*.
     """
-    result = shellCall( 10, 'ls -d /proc/[0-9]*' )
+    try:
+      procList = [ entry for entry in os.listdir( self.procRoot ) if entry.isdigit() ]
+    except OSError, x:
+      return S_ERROR( 'Could not list %s: %s' % ( self.procRoot, str( x ) ) )
+    return S_OK( procList )
 
+  #############################################################################
+  def __getProcTableLinux( self ):
+    """Reads the stat of all the processes in one pass.
+       Returns { pid : ( ppid, pgrp, starttime, CPU ticks, children CPU ticks, vsize, rss pages, comm ) }
+    """
+    result = self.__getProcListLinux()
     if not result['OK']:
-      if not 'Value' in result:
-        return result
-    procList = result['Value'][1].replace( '/proc/', '' ).split( '\n' )
-
-    return S_OK( procList )
+      return result
+    procTable = {}
+    for pid in result['Value']:
+      info = self.__getProcInfoLinux( pid )
+      # The process may have ended meanwhile
+      if info['OK']:
+        procTable[int( pid )] = info['Value']
+    return S_OK( procTable )
 
   #############################################################################
-  def __getChildResourceConsumedLinux( self, pid, pidList, infoDict = None ):
-    """Adds contributions to CPU total from child processes recursively.
+  def __getTreeResourceConsumedLinux( self, pid, procTable ):
+    """Adds the CPU and memory of the process, its descendants and the orphan processes
+       of its process group, with their descendants.
     """
-    childCPU = 0
+    children = {}
+    for childPID, info in procTable.items():
+      children.setdefault( info[0], [] ).append( childPID )
+
+    treePIDs = []
+    if pid in procTable:
+      treePIDs.append( pid )
+      procGroup = procTable[pid][1]
+      #Orphan processes of the same process group were reparented to init
+      treePIDs += [ orphanPID for orphanPID in children.get( 1, [] )
+                    if orphanPID != pid and procTable[orphanPID][1] == procGroup ]
+    index = 0
+    while index < len( treePIDs ):
+      treePIDs += children.get( treePIDs[index], [] )
+      index += 1
+
+    cpuTicks = 0
     vsize = 0
     rss = 0
-    pageSize = os.sysconf('SC_PAGESIZE')
-    if not infoDict:
-      infoDict = {}
-      for pidCheck in pidList:
-        info = self.__getProcInfoLinux( pidCheck )
-        if info['OK']:
-          infoDict[pidCheck] = info['Value']
-
-    procGroup = self.__getProcGroupLinux( pid )
-    if not procGroup['OK']:
-      return procGroup
-
-    procGroup = procGroup['Value'].strip()
-
-    for pidCheck, info in infoDict.items():
-      if pidCheck in infoDict and info[3] == pid:
-        contribution = float( info[13] ) / 100 + float( info[14] ) / 100 + float( info[15] ) / 100 + float( info[16] ) / 100
-        childCPU += contribution
-        vsize += float( info[22] )
-        rss += float( info[23] ) * pageSize
-        self.log.debug( 'Added %s to CPU total (now %s) from child PID %s %s' % ( contribution, childCPU, info[0], info[1] ) )
-        del infoDict[pidCheck]
-        result = self.__getChildResourceConsumedLinux( pidCheck, pidList, infoDict )
-        if result['OK']:
-          childCPU += result['Value']['CPU']
-          vsize += result['Value']['Vsize']
-          rss += result['Value']['RSS'] 
-
-
-    #Next add any contributions from orphan processes in same process group
-    for pidCheck, info in infoDict.items():
-      if pidCheck in infoDict and info[3] == 1 and info[4] == procGroup:
-        contribution = float( info[13] ) / 100 + float( info[14] ) / 100 + float( info[15] ) / 100 + float( info[16] ) / 100
-        childCPU += contribution
-        vsize += float( info[22] )
-        rss += float( info[23] ) * pageSize
-        self.log.debug( 'Added %s to CPU total (now %s) from orphan PID %s %s' % ( contribution, childCPU, info[0], info[1] ) )
-        del infoDict[pidCheck]
-
-    #Finally add the parent itself
-    if pid in infoDict:
-      info = infoDict[pid]
-      contribution = float( info[13] ) / 100 + float( info[14] ) / 100 + float( info[15] ) / 100 + float( info[16] ) / 100
-      childCPU += contribution
-      vsize += float( info[22] )
-      rss += float( info[23] ) * pageSize
-      self.log.debug( 'Added %s to CPU total (now %s) from PID %s %s' % ( contribution, childCPU, info[0], info[1] ) )
-      del infoDict[pid]
-
-      # Some debug printout if 0 CPU is determined
-      if childCPU == 0:
-        self.log.error( 'Consumed CPU is found to be 0. Contributing processes:' )
-        for pidCheck in pidList:
-          if pidCheck not in infoDict:
-            info = self.__getProcInfoLinux( pidCheck )
-            if info['OK']:
-              self.log.error( '  PID:', info['Value'] )
-
-    return S_OK( { "CPU": childCPU,
-                   "Vsize": vsize,
-                   "RSS": rss } )
-
+    lastProcCache = self.__procCache.get( pid, {} )
+    procCache = {}
+    childrenIncrease = 0
+    for treePID in treePIDs:
+      _ppid, _pgrp, startTime, ownTicks, childrenTicks, procVsize, procRSS, comm = procTable[treePID]
+      cpuTicks += ownTicks + childrenTicks
+      vsize += procVsize
+      rss += procRSS * self.pageSize
+      key = ( treePID, startTime )
+      procCache[key] = ( ownTicks, childrenTicks )
+      if key in lastProcCache:
+        #The CPU of the children waited for since the last sample
+        childrenIncrease += childrenTicks - lastProcCache[key][1]
+      self.log.debug( 'Added %s to CPU total (now %s) from PID %s %s' % ( ( ownTicks + childrenTicks ) / self.clockTicks,
+                                                                      cpuTicks / self.clockTicks, treePID, comm ) )
+
+    #The processes gone since the last sample that were not waited for by the tree
+    goneTicks = sum( [ sum( ticks ) for key, ticks in lastProcCache.items() if key not in procCache ] )
+    self.__lostTicks[pid] = self.__lostTicks.get( pid, 0 ) + max( 0, goneTicks - childrenIncrease )
+    self.__procCache[pid] = procCache
+    cpuTicks += self.__lostTicks[pid]
+
+    # Some debug printout if 0 CPU is determined
+    if treePIDs and cpuTicks == 0:
+      self.log.error( 'Consumed CPU is found to be 0. Contributing processes:' )
+      for treePID in treePIDs:
+        self.log.error( '  PID:', ( treePID, ) + tuple( procTable[treePID] ) )
+
+    return S_OK( { "CPU": cpuTicks / self.clockTicks,
+                   "Vsize": float( vsize ),
+                   "RSS": float( rss ) } )
 
   #############################################################################
   def __getProcInfoLinux( self, pid ):
-    """Attempts to read /proc/PID/stat and returns list of items if ok.
+    """Attempts to read /proc/PID/stat and returns
+       ( ppid, pgrp, starttime, utime + stime, cutime + cstime, vsize, rss, comm ) if ok.
        /proc/[pid]/stat
               Status information about the process.  This is used by ps(1).
               It is defined in /usr/src/linux/fs/proc/array.c.
@@ -383,25 +407,20 @@ class ProcessMonitor:
                           measured in clock ticks (divide by
                           sysconf(_SC_CLK_TCK)).
     """
-    procPath = '/proc/%s/stat' % ( pid )
+    procPath = os.path.join( self.procRoot, str( pid ), 'stat' )
     try:
       fopen = open( procPath, 'r' )
       procStat = fopen.readline()
       fopen.close()
+      # comm can contain spaces and parentheses, the other fields follow the last ')'
+      commEnd = procStat.rindex( ')' )
+      comm = procStat[procStat.index( '(' ) + 1:commEnd]
+      fields = procStat[commEnd + 2:].split()
+      return S_OK( ( int( fields[1] ), int( fields[2] ), int( fields[19] ),
+                     int( fields[11] ) + int( fields[12] ), int( fields[13] ) + int( fields[14] ),
+                     int( fields[20] ), int( fields[21] ), comm ) )
     except Exception:
       return S_ERROR( 'Not able to check %s' % pid )
-    return S_OK( procStat.split( ' ' ) )
-
-  #############################################################################
-  def __getProcGroupLinux( self, pid ):
-    """Returns UID for given PID.
-    """
-    result = shellCall( 10, 'ps --no-headers -o pgrp -p %s' % ( pid ) )
-    if not result['OK']:
-      if  not 'Value' in result:
-        return result
-
-    return S_OK( result['Value'][1] )
 
   #############################################################################
   def __checkCurrentOS( self ):
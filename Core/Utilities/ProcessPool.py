@@ -586,7 +586,7 @@ class ProcessPool( object ):
   """
   def __init__( self, minSize = 2, maxSize = 0, maxQueuedRequests = 10,
                 strictLimits = True, poolCallback=None, poolExceptionCallback=None,
-                keepProcessesRunning=True ):
+                keepProcessesRunning=True, throttle = 0.1 ):
     """ c'tor
 
     :param self: self reference
@@ -596,6 +596,8 @@ class ProcessPool( object ):
     :param bool strictLimits: flag to workers overcommitment
     :param callable poolCallbak: results callback
     :param callable poolExceptionCallback: exception callback
+    :param float throttle: seconds to wait after queueing a task for the workers to update their
+                           state, 0 if the caller does not rely on getFreeSlots or isWorking
     """
     ## min workers
     self.__minSize = max( 1, minSize )
@@ -619,6 +621,8 @@ class ProcessPool( object ):
     self.__stopEvent = multiprocessing.Event()
     ## keep processes running flag
     self.__keepRunning = keepProcessesRunning
+    ## sleep after queueing a task
+    self.__throttle = throttle
     ## lock 
     self.__prListLock = threading.Lock()
     
@@ -800,7 +804,8 @@ class ProcessPool( object ):
 
     self.__spawnNeededWorkingProcesses()
     ## throttle a bit to allow task state propagation
-    time.sleep( 0.1 )
+    if self.__throttle:
+      time.sleep( self.__throttle )
     return S_OK()
 
   def createAndQueueTask( self,
@@ -877,19 +882,28 @@ class ProcessPool( object ):
       ## get task
       task = self.__resultsQueue.get()
       ## execute callbacks
-      try:
-        task.doExceptionCallback()
-        task.doCallback()
-        if task.usePoolCallbacks():
-          if self.__poolExceptionCallback and task.exceptionRaised():
-            self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
-          if self.__poolCallback and task.taskResults():
-            self.__poolCallback( task.getTaskID(), task.taskResults() )
-      except Exception, error:
-        pass
+      self.__executeCallbacks( task )
       processed += 1
     return processed
 
+  def __executeCallbacks( self, task ):
+    """ 
+    Execute callbacks of a task taken from the results queue
+
+    :param self: self reference
+    :param ProcessTask task: processed task
+    """
+    try:
+      task.doExceptionCallback()
+      task.doCallback()
+      if task.usePoolCallbacks():
+        if self.__poolExceptionCallback and task.exceptionRaised():
+          self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
+        if self.__poolCallback and task.taskResults():
+          self.__poolCallback( task.getTaskID(), task.taskResults() )
+    except Exception, error:
+      pass
+
   def processAllResults( self, timeout=10 ):
     """ 
     Process all enqueued tasks at once
@@ -968,13 +982,25 @@ class ProcessPool( object ):
     """ 
     Daemon thread target
 
+    Waits on the results queue, so callbacks are executed as soon as the tasks are done
+
     :param self: self reference
     """
     while True:
       if self.__draining:
         return
-      self.processResults()
-      time.sleep( 1 )
+      try:
+        task = self.__resultsQueue.get( block = True, timeout = 1 )
+      except Queue.Empty:
+        task = None
+      except ( IOError, EOFError ):
+        ## queue closed at exit
+        return
+      self.__cleanDeadProcesses()
+      if not self.__pendingQueue.empty():
+        self.__spawnNeededWorkingProcesses()
+      if task:
+        self.__executeCallbacks( task )
 
   def __del__( self ):
     """ 
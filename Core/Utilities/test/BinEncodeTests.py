@@ -0,0 +1,70 @@
+########################################################################
+# $HeadURL $
+# File: BinEncodeTests.py
+########################################################################
+
+""" :mod: BinEncodeTests
+    ====================
+
+    .. module: BinEncodeTests
+    :synopsis: unit tests for BinEncode
+
+    unit tests for BinEncode
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import sys
+import datetime
+import unittest
+## SUT
+from DIRAC.Core.Utilities import BinEncode, DEncode
+
+########################################################################
+class BinEncodeTestCase( unittest.TestCase ):
+  """
+  .. class:: BinEncodeTestCase
+
+  """
+
+  def setUp( self ):
+    """ test setup """
+    self.testObject = { 'ints' : [ 0, -1, 2 ** 31, -2 ** 31 - 1, sys.maxint, -sys.maxint - 1 ],
+                        'longs' : [ 0L, 10L, 2 ** 63, -2 ** 70 ],
+                        'floats' : ( 0.0, -1.5, 2.0 * 10 ** 20, 2.0 * 10 ** -10 ),
+                        'bools' : [ True, False ],
+                        'strings' : [ "", "a", "x" * 255, "y" * 256, "\x00:e" ],
+                        'unicode' : u"\xe9t\xe9",
+                        'dates' : [ datetime.datetime( 2013, 2, 3, 4, 5, 6, 7 ),
+                                    datetime.date( 2013, 2, 3 ),
+                                    datetime.time( 4, 5, 6, 7 ) ],
+                        'none' : None,
+                        1 : { ( 1, 'a' ) : [], 2.5 : {} },
+                        'tuple' : () }
+
+  def test01roundTrip( self ):
+    """ encode and decode """
+    data = BinEncode.encode( self.testObject )
+    decoded, length = BinEncode.decode( data )
+    self.assertEqual( decoded, self.testObject )
+    self.assertEqual( length, len( data ) )
+    self.assertEqual( type( decoded[ 'longs' ][0] ), long )
+    self.assertEqual( type( decoded[ 'ints' ][0] ), int )
+    self.assertEqual( type( decoded[ 'floats' ] ), tuple )
+    self.assertEqual( type( decoded[ 'unicode' ] ), unicode )
+
+  def test02compatibility( self ):
+    """ same result as DEncode and both encodings can be told apart """
+    binData = BinEncode.encode( self.testObject )
+    dData = DEncode.encode( self.testObject )
+    self.assertEqual( BinEncode.isBinEncoded( binData ), True )
+    self.assertEqual( BinEncode.isBinEncoded( dData ), False )
+    self.assertEqual( BinEncode.decode( binData )[0], DEncode.decode( dData )[0] )
+    self.assertRaises( Exception, BinEncode.decode, dData )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( BinEncodeTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -0,0 +1,102 @@
+########################################################################
+# $HeadURL $
+# File: EncodeBenchmark.py
+########################################################################
+"""
+  Encoding and decoding throughput of DEncode and BinEncode for payloads shaped
+  like the biggest DISET answers: job parameters, catalog directory listings and
+  accounting reports. Usage:
+
+    python EncodeBenchmark.py [ scale ]
+"""
+
+__RCSID__ = "$Id $"
+
+import sys
+import time
+import random
+import datetime
+
+from DIRAC.Core.Utilities import DEncode, BinEncode
+
+def jobsParameters( numJobs ):
+  """ getJobsParameters like answer """
+  now = datetime.datetime.utcnow()
+  result = {}
+  for jobID in xrange( 1000000, 1000000 + numJobs ):
+    result[ long( jobID ) ] = { 'JobID' : long( jobID ),
+                                'Status' : random.choice( [ 'Waiting', 'Running', 'Done', 'Failed' ] ),
+                                'MinorStatus' : 'Application Finished Successfully',
+                                'Site' : 'LCG.CERN.ch',
+                                'Owner' : 'someuser',
+                                'OwnerDN' : '/DC=ch/DC=cern/OU=Users/CN=someuser',
+                                'OwnerGroup' : 'dirac_user',
+                                'JobName' : 'Job_%s' % jobID,
+                                'SubmissionTime' : now,
+                                'LastUpdateTime' : now,
+                                'CPUTime' : random.random() * 100000,
+                                'RescheduleCounter' : 0 }
+  return { 'OK' : True, 'Value' : result }
+
+def listDirectory( numFiles ):
+  """ FileCatalog listDirectory like answer """
+  now = datetime.datetime.utcnow()
+  files = {}
+  for iFile in xrange( numFiles ):
+    lfn = '/vo/data/2013/RAW/FULL/run%06d/file_%08d.raw' % ( iFile / 100, iFile )
+    files[ lfn ] = { 'MetaData' : { 'Size' : long( random.randint( 1, 2 ** 32 ) ),
+                                    'Checksum' : '%08x' % random.randint( 0, 2 ** 31 ),
+                                    'ChecksumType' : 'AD',
+                                    'GUID' : '%032X' % random.getrandbits( 128 ),
+                                    'Mode' : 509,
+                                    'Owner' : 'someuser',
+                                    'OwnerGroup' : 'dirac_prod',
+                                    'Status' : 'AprioriGood',
+                                    'CreationDate' : now,
+                                    'ModificationDate' : now } }
+  return { 'OK' : True,
+           'Value' : { 'Successful' : { '/vo/data/2013/RAW' : { 'Files' : files, 'SubDirs' : {}, 'Links' : {} } },
+                       'Failed' : {} } }
+
+def accountingReport( numBuckets ):
+  """ accounting plot data like answer """
+  start = 1356998400
+  data = {}
+  for iKey in range( 50 ):
+    data[ 'LCG.Site%02d.org' % iKey ] = dict( [ ( start + 3600 * i, random.random() * 1000 )
+                                                for i in xrange( numBuckets ) ] )
+  return { 'OK' : True, 'Value' : { 'data' : data, 'granularity' : 3600, 'unit' : 'jobs' } }
+
+def timeIt( func, arg, minTime = 1.0 ):
+  """ run func until minTime has passed, return the time per call """
+  iterations = 0
+  start = time.time()
+  while True:
+    func( arg )
+    iterations += 1
+    elapsed = time.time() - start
+    if elapsed >= minTime:
+      return elapsed / iterations
+
+if __name__ == "__main__":
+  scale = 1
+  if len( sys.argv ) > 1:
+    scale = int( sys.argv[1] )
+  payloads = [ ( "jobsParameters", jobsParameters( 1000 * scale ) ),
+               ( "listDirectory", listDirectory( 5000 * scale ) ),
+               ( "accountingReport", accountingReport( 200 * scale ) ) ]
+  print "%-17s %-10s %10s %12s %12s %12s %12s" % ( "Payload", "Codec", "Size (KB)",
+                                                   "Enc (ms)", "Enc (MB/s)", "Dec (ms)", "Dec (MB/s)" )
+  for name, payload in payloads:
+    for codecName, codec in ( ( "DEncode", DEncode ), ( "BinEncode", BinEncode ) ):
+      data = codec.encode( payload )
+      #DEncode writes floats with str(), which drops precision, so only BinEncode round trips exactly
+      if codec == BinEncode and codec.decode( data )[0] != payload:
+        print "ERROR: %s does not round trip %s" % ( codecName, name )
+        sys.exit( 1 )
+      encTime = timeIt( codec.encode, payload )
+      decTime = timeIt( codec.decode, data )
+      sizeMB = len( data ) / 1048576.0
+      print "%-17s %-10s %10.1f %12.2f %12.2f %12.2f %12.2f" % ( name, codecName, len( data ) / 1024.0,
+                                                                 encTime * 1000, sizeMB / encTime,
+                                                                 decTime * 1000, sizeMB / decTime )
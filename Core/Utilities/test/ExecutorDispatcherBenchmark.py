@@ -0,0 +1,123 @@
+########################################################################
+# $HeadURL $
+# File: ExecutorDispatcherBenchmark.py
+########################################################################
+"""
+  Stress of the waiting queues and the freezer of the ExecutorDispatcher, as after
+  a mass submission to the OptimizationMind:
+
+  - ExecutorQueues: push the tasks in several executor types, a part of them ahead,
+    delete a quarter of them and pop the rest
+  - ExecutorDispatcher: add the tasks while their executor type is not connected so
+    that they are frozen, remove a quarter of them, then connect an executor, which
+    thaws and sends them, and mark them processed
+
+  Usage:
+
+    python ExecutorDispatcherBenchmark.py [ numTasks ]
+"""
+
+__RCSID__ = "$Id $"
+
+import sys
+import time
+import random
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorQueues, ExecutorDispatcher, ExecutorDispatcherCallbacks
+
+ETYPES = [ 'InputData', 'JobPath', 'JobScheduling', 'JobSanity' ]
+
+class BenchmarkCallbacks( ExecutorDispatcherCallbacks ):
+  """ every task goes through one executor type and is sent without any network """
+
+  def __init__( self ):
+    self.sent = []
+
+  def cbDispatch( self, taskId, taskObj, pathExecuted ):
+    if pathExecuted:
+      return S_OK()
+    return S_OK( taskObj )
+
+  def cbSendTask( self, taskId, taskObj, eId, eType ):
+    self.sent.append( taskId )
+    return S_OK()
+
+  def cbTaskError( self, taskId, taskObj, errorMsg ):
+    print "ERROR: task %s: %s" % ( taskId, errorMsg )
+    sys.exit( 1 )
+
+def benchmarkQueues( numTasks ):
+  """ ( operation, seconds, count ) list """
+  timings = []
+  queues = ExecutorQueues()
+  taskTypes = [ random.choice( ETYPES ) for _taskId in xrange( numTasks ) ]
+
+  start = time.time()
+  for taskId in xrange( numTasks ):
+    queues.pushTask( taskTypes[taskId], taskId, ahead = taskId % 10 == 0 )
+  timings.append( ( 'push', time.time() - start, numTasks ) )
+
+  toDelete = random.sample( xrange( numTasks ), numTasks / 4 )
+  start = time.time()
+  for taskId in toDelete:
+    if not queues.deleteTask( taskId ):
+      print "ERROR: task %s was not queued" % taskId
+      sys.exit( 1 )
+  timings.append( ( 'delete', time.time() - start, len( toDelete ) ) )
+
+  start = time.time()
+  popped = 0
+  while queues.popTask( ETYPES ):
+    popped += 1
+  timings.append( ( 'pop', time.time() - start, popped ) )
+  if popped != numTasks - len( toDelete ):
+    print "ERROR: popped %d tasks instead of %d" % ( popped, numTasks - len( toDelete ) )
+    sys.exit( 1 )
+  return timings
+
+def benchmarkDispatcher( numTasks ):
+  """ ( operation, seconds, count ) list """
+  timings = []
+  callbacks = BenchmarkCallbacks()
+  dispatcher = ExecutorDispatcher()
+  dispatcher.setCallbacks( callbacks )
+
+  start = time.time()
+  for taskId in xrange( numTasks ):
+    dispatcher.addTask( taskId, random.choice( ETYPES ) )
+  timings.append( ( 'add+freeze', time.time() - start, numTasks ) )
+
+  toRemove = random.sample( xrange( numTasks ), numTasks / 4 )
+  start = time.time()
+  for taskId in toRemove:
+    dispatcher.removeTask( taskId )
+  timings.append( ( 'remove', time.time() - start, len( toRemove ) ) )
+
+  start = time.time()
+  dispatcher.addExecutor( 'executor', ETYPES, maxTasks = numTasks )
+  timings.append( ( 'thaw+send', time.time() - start, len( callbacks.sent ) ) )
+  if len( callbacks.sent ) != numTasks - len( toRemove ):
+    print "ERROR: sent %d tasks instead of %d" % ( len( callbacks.sent ), numTasks - len( toRemove ) )
+    sys.exit( 1 )
+
+  start = time.time()
+  for taskId in callbacks.sent:
+    dispatcher.taskProcessed( 'executor', taskId )
+  timings.append( ( 'processed', time.time() - start, len( callbacks.sent ) ) )
+  if dispatcher.getTaskIds():
+    print "ERROR: %d tasks left in the dispatcher" % len( dispatcher.getTaskIds() )
+    sys.exit( 1 )
+  return timings
+
+if __name__ == "__main__":
+  numTasks = 1000000
+  if len( sys.argv ) > 1:
+    numTasks = int( sys.argv[1] )
+  random.seed( 12345 )
+
+  print "%d tasks" % numTasks
+  print "%-12s %-12s %12s %12s %12s" % ( "", "operation", "count", "total (s)", "per task (us)" )
+  for name, benchmark in ( ( "queues", benchmarkQueues ), ( "dispatcher", benchmarkDispatcher ) ):
+    for operation, seconds, count in benchmark( numTasks ):
+      print "%-12s %-12s %12d %12.2f %12.2f" % ( name, operation, count, seconds, seconds * 1e6 / max( count, 1 ) )
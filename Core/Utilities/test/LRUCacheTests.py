@@ -0,0 +1,71 @@
+########################################################################
+# $HeadURL $
+# File: LRUCacheTests.py
+########################################################################
+
+""" :mod: LRUCacheTests
+    ===================
+
+    .. module: LRUCacheTests
+    :synopsis: unit tests for LRUCache
+
+    unit tests for LRUCache
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import time
+import unittest
+## SUT
+from DIRAC.Core.Utilities.LRUCache import LRUCache
+
+########################################################################
+class LRUCacheTestCase( unittest.TestCase ):
+  """
+  .. class:: LRUCacheTestCase
+
+  """
+
+  def test01addGet( self ):
+    """ add and get """
+    cache = LRUCache( maxSize = 10 )
+    cache.add( "a", 1 )
+    cache.add( ( "b", 2 ), [ 2 ] )
+    self.assertEqual( cache.get( "a" ), 1 )
+    self.assertEqual( cache.get( ( "b", 2 ) ), [ 2 ] )
+    self.assertEqual( cache.get( "c" ), None )
+    self.assertEqual( cache.get( "c", False ), False )
+    self.assertEqual( cache.getStats(), { 'Hits' : 2, 'Misses' : 2, 'Size' : 2 } )
+    cache.delete( "a" )
+    self.assertEqual( "a" in cache, False )
+    cache.purgeAll()
+    self.assertEqual( len( cache ), 0 )
+
+  def test02eviction( self ):
+    """ least recently used records go first """
+    cache = LRUCache( maxSize = 10 )
+    for i in range( 10 ):
+      cache.add( i, i )
+    # 0 is now the most recently used
+    cache.get( 0 )
+    cache.add( 10, 10 )
+    self.assertEqual( len( cache ) <= 10, True )
+    self.assertEqual( 0 in cache, True )
+    self.assertEqual( 1 in cache, False )
+    self.assertEqual( 10 in cache, True )
+
+  def test03expiration( self ):
+    """ records expire """
+    cache = LRUCache( maxSize = 10, validSeconds = 1 )
+    cache.add( "a", 1 )
+    cache.add( "b", 2, validSeconds = 100 )
+    time.sleep( 1.1 )
+    self.assertEqual( cache.get( "a" ), None )
+    self.assertEqual( cache.get( "b" ), 2 )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( LRUCacheTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -0,0 +1,111 @@
+########################################################################
+# $HeadURL $
+# File: MySQLBulkBenchmark.py
+########################################################################
+"""
+  Time to insert, upsert and update rows of a table of a local MySQL/MariaDB
+  server one by one, as the DBs did before, and with insertMany, upsertMany and
+  updateMany. The table looks like TransformationFiles, it is created in the
+  given database and dropped at the end. Usage:
+
+    python MySQLBulkBenchmark.py host user password dbName [ numRows ]
+"""
+
+__RCSID__ = "$Id $"
+
+import sys
+import time
+import random
+
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+TABLE = 'BulkBenchmark'
+STATUSES = [ 'Unused', 'Assigned', 'Processed', 'MaxReset', 'Problematic' ]
+
+def timeIt( function, *args ):
+  """ ( seconds, value ) of a call returning S_OK """
+  start = time.time()
+  result = function( *args )
+  elapsed = time.time() - start
+  if not result['OK']:
+    print "ERROR:", result['Message']
+    sys.exit( 1 )
+  return elapsed, result['Value']
+
+def createTable( db ):
+  """ empty benchmark table """
+  for cmd in ( 'DROP TABLE IF EXISTS `%s`' % TABLE,
+               'CREATE TABLE `%s` ( `TransformationID` INTEGER NOT NULL, `FileID` INTEGER NOT NULL, '
+               '`Status` VARCHAR(32) DEFAULT "Unused", `ErrorCount` INT(4) NOT NULL DEFAULT 0, '
+               '`LastUpdate` DATETIME, PRIMARY KEY ( `TransformationID`, `FileID` ) ) ENGINE=InnoDB' % TABLE ):
+    result = db._update( cmd )
+    if not result['OK']:
+      print "ERROR:", result['Message']
+      sys.exit( 1 )
+
+def insertOneByOne( db, rows ):
+  """ one insertFields per row """
+  for row in rows:
+    result = db.insertFields( TABLE, [ 'TransformationID', 'FileID', 'Status', 'LastUpdate' ], list( row ) )
+    if not result['OK']:
+      return result
+  return result
+
+def upsertOneByOne( db, rows ):
+  """ one INSERT ... ON DUPLICATE KEY UPDATE per row """
+  for transID, fileID, status, _lastUpdate in rows:
+    result = db._update( "INSERT INTO `%s` ( TransformationID, FileID, Status, LastUpdate ) VALUES "
+                         "( %d, %d, '%s', UTC_TIMESTAMP() ) ON DUPLICATE KEY UPDATE Status=VALUES(Status), "
+                         "ErrorCount=ErrorCount+1, LastUpdate=VALUES(LastUpdate)" % ( TABLE, transID, fileID, status ) )
+    if not result['OK']:
+      return result
+  return result
+
+def updateOneByOne( db, updateDicts ):
+  """ one updateFields per row """
+  for ( transID, fileID ), updateDict in updateDicts.items():
+    result = db.updateFields( TABLE, updateDict = updateDict,
+                              condDict = { 'TransformationID' : transID, 'FileID' : fileID } )
+    if not result['OK']:
+      return result
+  return result
+
+if __name__ == "__main__":
+  if len( sys.argv ) < 5:
+    print __doc__
+    sys.exit( 1 )
+  host, user, passwd, dbName = sys.argv[1:5]
+  numRows = 10000
+  if len( sys.argv ) > 5:
+    numRows = int( sys.argv[5] )
+  random.seed( 12345 )
+  db = MySQL( host, user, passwd, dbName )
+  fields = [ 'TransformationID', 'FileID', 'Status', 'LastUpdate' ]
+  rows = [ ( 1, fileID, 'Unused', 'UTC_TIMESTAMP()' ) for fileID in xrange( numRows ) ]
+  newRows = [ ( 1, fileID, random.choice( STATUSES ), 'UTC_TIMESTAMP()' ) for fileID in xrange( numRows ) ]
+  updateDicts = dict( [ ( ( 1, fileID ), { 'Status' : random.choice( STATUSES ) } ) for fileID in xrange( numRows ) ] )
+
+  timings = []
+  createTable( db )
+  loopTime, _result = timeIt( insertOneByOne, db, rows )
+  createTable( db )
+  bulkTime, inserted = timeIt( db.insertMany, TABLE, fields, rows )
+  timings.append( ( 'insert', loopTime, bulkTime, inserted ) )
+
+  loopTime, _result = timeIt( upsertOneByOne, db, newRows )
+  bulkTime, upserted = timeIt( db.upsertMany, TABLE, fields, newRows, [ 'Status', 'LastUpdate' ],
+                               { 'ErrorCount' : 'ErrorCount+1' } )
+  timings.append( ( 'upsert', loopTime, bulkTime, upserted ) )
+
+  loopTime, _result = timeIt( updateOneByOne, db, updateDicts )
+  for updateDict in updateDicts.values():
+    updateDict['Status'] = random.choice( STATUSES )
+  bulkTime, updated = timeIt( db.updateMany, TABLE, [ 'TransformationID', 'FileID' ], updateDicts )
+  timings.append( ( 'update', loopTime, bulkTime, updated ) )
+
+  db._update( 'DROP TABLE IF EXISTS `%s`' % TABLE )
+
+  print "%d rows" % numRows
+  print "%-8s %14s %14s %10s %14s" % ( "", "one by one (s)", "bulk (s)", "speedup", "affected rows" )
+  for name, loopTime, bulkTime, affected in timings:
+    print "%-8s %14.2f %14.2f %10.1f %14d" % ( name, loopTime, bulkTime, loopTime / max( bulkTime, 1e-6 ), affected )
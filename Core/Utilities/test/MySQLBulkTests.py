@@ -0,0 +1,192 @@
+########################################################################
+# $HeadURL $
+# File: MySQLBulkTests.py
+########################################################################
+
+""" :mod: MySQLBulkTests
+    ====================
+
+    .. module: MySQLBulkTests
+    :synopsis: unit tests for the bulk statements of MySQL
+
+    unit tests for MySQL.insertMany, upsertMany and updateMany, run against
+    a fake connection recording the executed statements
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import unittest
+from mock import patch
+## SUT
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+########################################################################
+class FakeCursor( object ):
+  """ cursor recording the statements in its connection """
+
+  def __init__( self, connection ):
+    self.connection = connection
+
+  def execute( self, cmd ):
+    self.connection.log.append( cmd )
+    return 1
+
+  def close( self ):
+    pass
+
+class FakeConnection( object ):
+  """ connection of the fake MySQL server """
+
+  def __init__( self ):
+    self.log = []
+
+  def cursor( self ):
+    return FakeCursor( self )
+
+  def commit( self ):
+    self.log.append( "COMMIT" )
+
+  def rollback( self ):
+    self.log.append( "ROLLBACK" )
+
+  def ping( self, reconnect ):
+    pass
+
+  def select_db( self, dbName ):
+    pass
+
+  def escape_string( self, value ):
+    return value.replace( "\\", "\\\\" ).replace( '"', '\\"' ).replace( "'", "\\'" )
+
+########################################################################
+class MySQLBulkTestCase( unittest.TestCase ):
+  """
+  .. class:: MySQLBulkTestCase
+
+  """
+  hostCount = 0
+
+  def setUp( self ):
+    """ MySQL object with a connection pool of its own giving a fake connection """
+    self.connection = FakeConnection()
+    MySQLBulkTestCase.hostCount += 1
+    with patch( "DIRAC.Core.Utilities.MySQL.MySQLdb.connect", return_value = self.connection ):
+      self.db = MySQL( "bulk%s.example.org" % MySQLBulkTestCase.hostCount, "user", "passwd", "TestDB" )
+      # # the connection is created on first use
+      self.db._getConnection()
+    del self.connection.log[:]
+
+  def statements( self ):
+    """ statements sent to the server, without the transaction ones """
+    return [ cmd for cmd in self.connection.log if cmd not in ( "START TRANSACTION", "COMMIT" ) ]
+
+  def test01insertMany( self ):
+    """ multi-row INSERT, NULL and escaping """
+    result = self.db.insertMany( "Files", [ "FileID", "LFN", "Size" ],
+                                 [ ( 1, '/a"b', None ), ( 2L, "c'd\\e", 2.5 ) ] )
+    self.assertEqual( result, { "OK" : True, "Value" : 1 } )
+    self.assertEqual( self.connection.log,
+                      [ "START TRANSACTION",
+                        'INSERT INTO `Files` ( `FileID`, `LFN`, `Size` ) VALUES '
+                        '(1, "/a\\"b", NULL), (2, "c\\\'d\\\\e", 2.5)',
+                        "COMMIT" ] )
+    # # ignore, booleans and special values
+    self.db.insertMany( "Files", [ "FileID", "Flag", "Date" ], [ ( 3, True, "UTC_TIMESTAMP()" ) ], ignore = True )
+    self.assertEqual( self.statements()[-1],
+                      'INSERT IGNORE INTO `Files` ( `FileID`, `Flag`, `Date` ) VALUES (3, 1, UTC_TIMESTAMP())' )
+    # # nothing to do
+    del self.connection.log[:]
+    self.assertEqual( self.db.insertMany( "Files", [ "FileID" ], [] ), { "OK" : True, "Value" : 0 } )
+    self.assertEqual( self.connection.log, [] )
+    # # rows not matching the fields
+    self.assertEqual( self.db.insertMany( "Files", [ "FileID", "LFN" ], [ ( 1, ) ] )["OK"], False )
+
+  def test02chunks( self ):
+    """ one statement per chunk, all in the same transaction """
+    result = self.db.insertMany( "Files", [ "FileID" ], [ ( i, ) for i in range( 5 ) ], chunkSize = 2 )
+    self.assertEqual( result, { "OK" : True, "Value" : 3 } )
+    self.assertEqual( self.connection.log,
+                      [ "START TRANSACTION",
+                        "INSERT INTO `Files` ( `FileID` ) VALUES (0), (1)",
+                        "INSERT INTO `Files` ( `FileID` ) VALUES (2), (3)",
+                        "INSERT INTO `Files` ( `FileID` ) VALUES (4)",
+                        "COMMIT" ] )
+
+  def test03upsertMany( self ):
+    """ ON DUPLICATE KEY UPDATE with values and expressions """
+    self.db.upsertMany( "Files", [ "FileID", "Status", "ErrorCount" ], [ ( 1, "New", 0 ) ],
+                        updateFields = [ "Status", "ErrorCount" ],
+                        updateExpressions = { "ErrorCount" : "ErrorCount+1" } )
+    self.assertEqual( self.statements(),
+                      [ 'INSERT INTO `Files` ( `FileID`, `Status`, `ErrorCount` ) VALUES (1, "New", 0)'
+                        ' ON DUPLICATE KEY UPDATE `Status`=VALUES(`Status`), `ErrorCount`=ErrorCount+1' ] )
+    # # all the fields by default
+    self.db.upsertMany( "Files", [ "FileID", "Status" ], [ ( 1, "New" ) ] )
+    self.assertEqual( self.statements()[-1],
+                      'INSERT INTO `Files` ( `FileID`, `Status` ) VALUES (1, "New")'
+                      ' ON DUPLICATE KEY UPDATE `FileID`=VALUES(`FileID`), `Status`=VALUES(`Status`)' )
+    self.assertEqual( self.db.upsertMany( "Files", [ "FileID" ], [ ( 1, ) ], updateFields = [] )["OK"], False )
+
+  def test04updateMany( self ):
+    """ CASE per field, constants and IFNULL """
+    result = self.db.updateMany( "Jobs", "JobID", { 1 : { "Status" : "Done" } },
+                                 updateDict = { "LastUpdate" : "UTC_TIMESTAMP()" },
+                                 onlyIfNull = [ "EndTime" ] )
+    self.assertEqual( result, { "OK" : True, "Value" : 1 } )
+    self.assertEqual( self.statements(),
+                      [ 'UPDATE `Jobs` SET `Status`=CASE WHEN `JobID`=1 THEN "Done" ELSE `Status` END, '
+                        '`LastUpdate`=UTC_TIMESTAMP() WHERE `JobID` IN ( 1 )' ] )
+    del self.connection.log[:]
+    self.db.updateMany( "Jobs", "JobID", { 2 : { "EndTime" : "2014-01-01", "Site" : None } },
+                        onlyIfNull = [ "EndTime" ] )
+    statement = self.statements()[0]
+    self.assertEqual( "`EndTime`=IFNULL(`EndTime`,CASE WHEN `JobID`=2 THEN \"2014-01-01\" END)" in statement, True )
+    self.assertEqual( "`Site`=CASE WHEN `JobID`=2 THEN NULL ELSE `Site` END" in statement, True )
+    self.assertEqual( statement.endswith( "WHERE `JobID` IN ( 2 )" ), True )
+    # # rows setting different fields
+    del self.connection.log[:]
+    self.db.updateMany( "Jobs", [ "JobID" ], { 1 : { "Status" : "Done" }, 2 : { "Site" : "S" } } )
+    statement = self.statements()[0]
+    self.assertEqual( "`Status`=CASE WHEN `JobID`=1 THEN \"Done\" ELSE `Status` END" in statement, True )
+    self.assertEqual( "`Site`=CASE WHEN `JobID`=2 THEN \"S\" ELSE `Site` END" in statement, True )
+    self.assertEqual( self.db.updateMany( "Jobs", "JobID", {} ), { "OK" : True, "Value" : 0 } )
+
+  def test05compositeKeys( self ):
+    """ keys made of several fields, chunked """
+    updateDicts = { ( 1, 10 ) : { "Status" : 'a"b' }, ( 1, 11 ) : { "Status" : "c" }, ( 2, 10 ) : { "Status" : "d" } }
+    result = self.db.updateMany( "Tasks", [ "TransformationID", "TaskID" ], updateDicts, chunkSize = 2 )
+    self.assertEqual( result, { "OK" : True, "Value" : 2 } )
+    statements = self.statements()
+    self.assertEqual( len( statements ), 2 )
+    allWhens = " ".join( statements )
+    self.assertEqual( '`TransformationID`=1 AND `TaskID`=10 THEN "a\\"b"' in allWhens, True )
+    self.assertEqual( '`TransformationID`=2 AND `TaskID`=10 THEN "d"' in allWhens, True )
+    for statement in statements:
+      self.assertEqual( "WHERE (`TransformationID`, `TaskID`) IN ( (" in statement, True )
+    self.assertEqual( "(1, 11)" in allWhens, True )
+    # # keys not matching the key fields
+    result = self.db.updateMany( "Tasks", [ "TransformationID", "TaskID" ], { ( 1, ) : { "Status" : "a" } } )
+    self.assertEqual( result["OK"], False )
+
+  def test06callerTransaction( self ):
+    """ no implicit commit of a transaction opened with transactionStart """
+    self.assertEqual( self.db.transactionStart()["OK"], True )
+    del self.connection.log[:]
+    self.db.insertMany( "Files", [ "FileID" ], [ ( 1, ) ] )
+    self.db.updateMany( "Files", "FileID", { 1 : { "Status" : "Done" } } )
+    self.assertEqual( [ cmd for cmd in self.connection.log if cmd in ( "START TRANSACTION", "COMMIT", "ROLLBACK" ) ],
+                      [] )
+    self.assertEqual( len( self.connection.log ), 2 )
+    self.db.transactionCommit()
+    # # after the caller's transaction the bulk methods open their own again
+    del self.connection.log[:]
+    self.db.insertMany( "Files", [ "FileID" ], [ ( 2, ) ] )
+    self.assertEqual( self.connection.log[0], "START TRANSACTION" )
+    self.assertEqual( self.connection.log[-1], "COMMIT" )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( MySQLBulkTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
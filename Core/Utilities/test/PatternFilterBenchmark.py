@@ -0,0 +1,109 @@
+########################################################################
+# $HeadURL $
+# File: PatternFilterBenchmark.py
+########################################################################
+"""
+  Time to find the transformations whose FileMask matches each LFN of a bulk
+  registration, with PatternFilter and with one re.search per mask as done before.
+  The masks mix the shapes found in the Transformations table: production paths,
+  anchored or not, file types and run ranges. The plain loop is only timed on a
+  sample of the LFNs, both must give the same transformations. Usage:
+
+    python PatternFilterBenchmark.py [ numLFNs [ numMasks ] ]
+"""
+
+__RCSID__ = "$Id $"
+
+import re
+import sys
+import time
+import random
+
+from DIRAC.Core.Utilities.PatternFilter import PatternFilter
+
+VO = '/vo'
+CONFIGS = [ 'MC/2011', 'MC/2012', 'MC/Dev', 'data/2011', 'data/2012', 'validation/Collision12' ]
+FILETYPES = [ 'ALLSTREAMS.DST', 'BHADRON.MDST', 'CHARM.MDST', 'DIMUON.DST', 'SDST', 'RAW', 'FULL.DST', 'LOG', 'HIST' ]
+# Plain loop LFNs
+SAMPLE = 2000
+
+def generateMasks( numMasks ):
+  """ ( transID, mask ) list """
+  masks = []
+  for transID in xrange( 1, numMasks + 1 ):
+    config = random.choice( CONFIGS )
+    fileType = random.choice( FILETYPES )
+    prod = random.randint( 1, 99999 )
+    shape = random.randint( 0, 9 )
+    if shape < 4:
+      mask = '^%s/%s/%s/%08d/' % ( VO, config, fileType, prod )
+    elif shape < 6:
+      mask = '%s/%s/.*/%08d_.*\.%s$' % ( VO, config, prod, fileType.lower() )
+    elif shape == 6:
+      mask = '%s/%08d/[0-9]{4}/' % ( fileType, prod )
+    elif shape == 7:
+      mask = '^%s/%s/%s/%08d/000[0-4]/' % ( VO, config, fileType, prod )
+    elif shape == 8:
+      mask = '(%s|%s)/%08d' % ( fileType, random.choice( FILETYPES ), prod )
+    else:
+      mask = '[0-9]/%08d_[0-9]+_[12]' % prod
+    masks.append( ( transID, mask ) )
+  return masks
+
+def generateLFNs( numLFNs, masks ):
+  """ LFNs, a part of them in the productions of the masks """
+  prods = [ int( re.search( '[0-9]{8}', mask ).group() ) for _transID, mask in masks ]
+  lfns = []
+  for iFile in xrange( numLFNs ):
+    config = random.choice( CONFIGS )
+    fileType = random.choice( FILETYPES )
+    if prods and random.random() < 0.5:
+      prod = random.choice( prods )
+    else:
+      prod = random.randint( 1, 99999 )
+    lfns.append( '%s/%s/%s/%08d/%04d/%08d_%08d_1.%s' % ( VO, config, fileType, prod, iFile / 10000,
+                                                         prod, iFile, fileType.lower() ) )
+  return lfns
+
+if __name__ == "__main__":
+  numLFNs = 1000000
+  numMasks = 5000
+  if len( sys.argv ) > 1:
+    numLFNs = int( sys.argv[1] )
+  if len( sys.argv ) > 2:
+    numMasks = int( sys.argv[2] )
+  random.seed( 12345 )
+  masks = generateMasks( numMasks )
+  lfns = generateLFNs( numLFNs, masks )
+
+  start = time.time()
+  patternFilter = PatternFilter( masks )
+  buildTime = time.time() - start
+  filters = [ ( transID, re.compile( mask ) ) for transID, mask in masks ]
+
+  sample = lfns[:SAMPLE]
+  start = time.time()
+  expected = [ [ transID for transID, refilter in filters if refilter.search( lfn ) ] for lfn in sample ]
+  loopTime = ( time.time() - start ) / len( sample )
+  if [ patternFilter.match( lfn ) for lfn in sample ] != expected:
+    print "ERROR: PatternFilter and the plain loop do not give the same transformations"
+    sys.exit( 1 )
+
+  start = time.time()
+  matches = 0
+  for lfn in lfns:
+    matches += len( patternFilter.match( lfn ) )
+  filterTime = ( time.time() - start ) / len( lfns )
+
+  # Incremental update: 1% of the transformations are replaced by new ones
+  numChanged = max( 1, numMasks / 100 )
+  changed = masks[numChanged:] + [ ( transID + numMasks, mask ) for transID, mask in generateMasks( numChanged ) ]
+  start = time.time()
+  patternFilter.update( changed )
+  updateTime = time.time() - start
+
+  print "%d LFNs, %d masks, %.2f matches per LFN" % ( len( lfns ), len( masks ), float( matches ) / len( lfns ) )
+  print "%-14s %14s %14s" % ( "", "per LFN (us)", "total (s)" )
+  print "%-14s %14.1f %14.1f" % ( "plain loop", loopTime * 1e6, loopTime * len( lfns ) )
+  print "%-14s %14.1f %14.1f" % ( "PatternFilter", filterTime * 1e6, filterTime * len( lfns ) )
+  print "build %.2f s, update of %d masks %.3f s" % ( buildTime, 2 * numChanged, updateTime )
@@ -0,0 +1,96 @@
+########################################################################
+# $HeadURL $
+# File: PatternFilterTests.py
+########################################################################
+
+""" :mod: PatternFilterTests
+    ========================
+
+    .. module: PatternFilterTests
+    :synopsis: unit tests for PatternFilter
+
+    unit tests for PatternFilter
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import re
+import random
+import unittest
+## SUT
+from DIRAC.Core.Utilities.PatternFilter import PatternFilter
+
+########################################################################
+class PatternFilterTestCase( unittest.TestCase ):
+  """
+  .. class:: PatternFilterTestCase
+
+  """
+
+  masks = [ ( 0, '^/vo/MC/2012/' ),
+            ( 1, '^/vo/MC/2012/ALLSTREAMS.DST/' ),
+            ( 2, r'/data/.*\.raw$' ),
+            ( 3, 'DST|SDST' ),
+            ( 4, '.*' ),
+            ( 5, '(?i)allstreams' ),
+            ( 6, r'(a)\1' ),
+            ( 7, '[0-9]{8}_' ),
+            ( 8, '' ) ]
+
+  lfns = [ '/vo/MC/2012/ALLSTREAMS.DST/00012345/0000/00012345_00000001_1.allstreams.dst',
+           '/vo/MC/2011/SDST/00012345/0000/00012345_00000001_1.sdst',
+           '/vo/data/2012/RAW/FULL/LHCb/COLLISION12/114753/114753_0000000296.raw',
+           '/vo/user/s/someone/aa.txt',
+           '' ]
+
+  def assertSameAsSearch( self, patternFilter, masks ):
+    """ match gives the same as re.search with every mask """
+    for lfn in self.lfns:
+      self.assertEqual( patternFilter.match( lfn ),
+                        [ key for key, mask in masks if re.search( mask, lfn ) ] )
+
+  def test01match( self ):
+    """ same keys and order as one search per expression """
+    patternFilter = PatternFilter( self.masks )
+    self.assertEqual( len( patternFilter ), len( self.masks ) )
+    self.assertEqual( patternFilter.keys(), [ key for key, _mask in self.masks ] )
+    self.assertSameAsSearch( patternFilter, self.masks )
+
+  def test02update( self ):
+    """ incremental changes """
+    patternFilter = PatternFilter( self.masks )
+    masks = self.masks[3:] + [ ( 1, 'RAW' ), ( 10, '^/vo/user/' ) ]
+    # 0 and 2 removed, 1 changed, 10 added
+    self.assertEqual( patternFilter.update( masks ), 4 )
+    self.assertEqual( patternFilter.update( masks ), 0 )
+    masks.sort()
+    self.assertSameAsSearch( patternFilter, masks )
+    patternFilter.remove( 10 )
+    patternFilter.add( 11, '^/vo/MC/' )
+    self.assertEqual( 10 in patternFilter, False )
+    self.assertEqual( patternFilter.getPattern( 11 ).pattern, '^/vo/MC/' )
+    self.assertRaises( re.error, patternFilter.update, [ ( 12, '(' ) ] )
+    self.assertEqual( 11 in patternFilter, True )
+
+  def test03manyExpressions( self ):
+    """ more expressions than groups in a regex """
+    random.seed( 1 )
+    words = [ 'vo', 'MC', 'DST', 'data', '0001', 'raw', 'a' ]
+    masks = []
+    for key in range( 500 ):
+      mask = '/'.join( random.sample( words, 2 ) )
+      mask = random.choice( [ '^/%s', '%s', '(%s)?x', '[a-z]%s', '%s|%s' % ( random.choice( words ), '%s' ) ] ) % mask
+      masks.append( ( key, mask ) )
+    patternFilter = PatternFilter( masks )
+    compiled = [ ( key, re.compile( mask ) ) for key, mask in masks ]
+    for _i in range( 200 ):
+      lfn = '/' + '/'.join( [ random.choice( words ) for _j in range( 6 ) ] )
+      self.assertEqual( patternFilter.match( lfn ),
+                        [ key for key, regex in compiled if regex.search( lfn ) ] )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( PatternFilterTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
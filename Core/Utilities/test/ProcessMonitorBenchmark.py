@@ -0,0 +1,95 @@
+########################################################################
+# $HeadURL $
+# File: ProcessMonitorBenchmark.py
+########################################################################
+"""
+  Time of a ProcessMonitor sample on a fake /proc of 1k, 5k and 10k processes, a
+  tenth of them in the process tree of the payload, compared to the previous
+  recursive walk, which scanned all the processes for each process of the tree
+  (not counting the ps it forked for each of them). Usage:
+
+    python ProcessMonitorBenchmark.py [ numProcs ... ]
+"""
+
+__RCSID__ = "$Id $"
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+from DIRAC.Core.Utilities.ProcessMonitor import ProcessMonitor
+
+PAYLOAD = 1000
+
+def writeStat( procRoot, pid, ppid, pgrp ):
+  """ /proc/[pid]/stat with some CPU and memory """
+  os.mkdir( os.path.join( procRoot, str( pid ) ) )
+  fields = [ 'S', ppid, pgrp, pgrp, 0, -1, 0, 0, 0, 0, 0, random.randint( 0, 1000 ), random.randint( 0, 100 ), 0, 0,
+             20, 0, 1, 0, pid, random.randint( 1, 1000 ) * 4096, random.randint( 1, 1000 ) ]
+  statFile = open( os.path.join( procRoot, str( pid ), 'stat' ), 'w' )
+  statFile.write( '%d (proc %d) %s\n' % ( pid, pid, ' '.join( [ str( field ) for field in fields ] ) ) )
+  statFile.close()
+
+def makeProcTree( procRoot, numProcs ):
+  """ init, the payload and its tree, and unrelated processes """
+  writeStat( procRoot, 1, 0, 1 )
+  writeStat( procRoot, PAYLOAD, 1, PAYLOAD )
+  treePIDs = [ PAYLOAD ]
+  for pid in xrange( PAYLOAD + 1, PAYLOAD + numProcs - 1 ):
+    if random.random() < 0.1:
+      writeStat( procRoot, pid, random.choice( treePIDs ), PAYLOAD )
+      treePIDs.append( pid )
+    else:
+      writeStat( procRoot, pid, 1, pid )
+  return len( treePIDs )
+
+def recursiveWalk( procTable, pid ):
+  """ previous algorithm: scan the whole table for the children of each process of the tree """
+  cpu = 0
+  for childPID, info in procTable.items():
+    if childPID in procTable and info[0] == pid:
+      cpu += info[1]
+      del procTable[childPID]
+      cpu += recursiveWalk( procTable, childPID )
+  return cpu
+
+def timeRecursiveWalk( procRoot ):
+  """ read all the stat files once, then the recursive walk """
+  start = time.time()
+  procTable = {}
+  for pid in os.listdir( procRoot ):
+    fields = open( os.path.join( procRoot, pid, 'stat' ) ).read().rsplit( ')', 1 )[1].split()
+    procTable[int( pid )] = ( int( fields[1] ), sum( [ int( field ) for field in fields[11:15] ] ) )
+  recursiveWalk( procTable, PAYLOAD )
+  return time.time() - start
+
+def timeSample( procRoot ):
+  """ one sample of a new monitor """
+  start = time.time()
+  result = ProcessMonitor( procRoot = procRoot ).getResourceConsumedLinux( PAYLOAD )
+  elapsed = time.time() - start
+  if not result['OK']:
+    print "ERROR:", result['Message']
+    sys.exit( 1 )
+  return elapsed
+
+if __name__ == "__main__":
+  sizes = [ 1000, 5000, 10000 ]
+  if len( sys.argv ) > 1:
+    sizes = [ int( arg ) for arg in sys.argv[1:] ]
+  random.seed( 12345 )
+
+  print "%10s %10s %16s %16s %10s" % ( "processes", "tree", "recursive (ms)", "one pass (ms)", "speedup" )
+  for numProcs in sizes:
+    procRoot = tempfile.mkdtemp()
+    try:
+      treeSize = makeProcTree( procRoot, numProcs )
+      recursiveTime = timeRecursiveWalk( procRoot )
+      samplingTime = timeSample( procRoot )
+    finally:
+      shutil.rmtree( procRoot )
+    print "%10d %10d %16.1f %16.1f %10.1f" % ( numProcs, treeSize, recursiveTime * 1000, samplingTime * 1000,
+                                               recursiveTime / max( samplingTime, 1e-6 ) )
@@ -0,0 +1,95 @@
+########################################################################
+# $HeadURL $
+# File: ProcessMonitorTests.py
+########################################################################
+
+""" :mod: ProcessMonitorTests
+    =========================
+
+    .. module: ProcessMonitorTests
+    :synopsis: unit tests for ProcessMonitor
+
+    unit tests for ProcessMonitor, on a fake /proc tree
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import shutil
+import tempfile
+import unittest
+## SUT
+from DIRAC.Core.Utilities.ProcessMonitor import ProcessMonitor
+
+def writeStat( procRoot, pid, ppid, pgrp, cpu = ( 0, 0, 0, 0 ), vsize = 0, rss = 0, comm = 'proc' ):
+  """ write /proc/[pid]/stat, cpu being ( utime, stime, cutime, cstime ) in clock ticks """
+  procDir = os.path.join( procRoot, str( pid ) )
+  if not os.path.isdir( procDir ):
+    os.mkdir( procDir )
+  fields = [ 'S', ppid, pgrp, pgrp, 0, -1, 0, 0, 0, 0, 0 ] + list( cpu ) + [ 20, 0, 1, 0, pid, vsize, rss ]
+  statFile = open( os.path.join( procDir, 'stat' ), 'w' )
+  statFile.write( '%d (%s) %s\n' % ( pid, comm, ' '.join( [ str( field ) for field in fields ] ) ) )
+  statFile.close()
+
+########################################################################
+class ProcessMonitorTestCase( unittest.TestCase ):
+  """
+  .. class:: ProcessMonitorTestCase
+
+  """
+
+  def setUp( self ):
+    self.procRoot = tempfile.mkdtemp()
+    self.monitor = ProcessMonitor( procRoot = self.procRoot, maxSampleAge = 0 )
+    self.ticks = self.monitor.clockTicks
+    self.pageSize = self.monitor.pageSize
+    writeStat( self.procRoot, 1, 0, 1, comm = 'init' )
+    # wrapper 5 -> payload 10 -> 11 -> 12, orphan 20 of the payload group, unrelated 30 -> 31
+    writeStat( self.procRoot, 5, 1, 5, comm = 'wrapper' )
+    writeStat( self.procRoot, 10, 5, 10, ( 100, 0, 0, 0 ), 1000, 1 )
+    writeStat( self.procRoot, 11, 10, 10, ( 50, 50, 0, 0 ), 2000, 2, comm = 'a (b) c' )
+    writeStat( self.procRoot, 12, 11, 10, ( 10, 0, 0, 0 ), 3000, 3 )
+    writeStat( self.procRoot, 20, 1, 10, ( 20, 0, 0, 0 ), 4000, 4 )
+    writeStat( self.procRoot, 30, 1, 30, ( 500, 0, 0, 0 ), 5000, 5 )
+    writeStat( self.procRoot, 31, 30, 30, ( 500, 0, 0, 0 ), 6000, 6 )
+
+  def tearDown( self ):
+    shutil.rmtree( self.procRoot )
+
+  def test01tree( self ):
+    """ process tree and orphans of the process group """
+    result = self.monitor.getResourceConsumedLinux( 10 )
+    self.assertEqual( result['OK'], True )
+    self.assertAlmostEqual( result['Value']['CPU'], 230 / self.ticks )
+    self.assertEqual( result['Value']['Vsize'], 10000 )
+    self.assertEqual( result['Value']['RSS'], 10 * self.pageSize )
+    # the orphans are those of the process group of the PID
+    result = self.monitor.getMemoryConsumedLinux( 11 )
+    self.assertEqual( result['Value'], { 'Vsize' : 9000, 'RSS' : 9 * self.pageSize } )
+    self.assertEqual( self.monitor.getResourceConsumedLinux( 40 )['OK'], False )
+
+  def test02goneProcesses( self ):
+    """ CPU of the processes gone between samples """
+    self.monitor.getResourceConsumedLinux( 10 )
+    # 12 waited for by 11
+    shutil.rmtree( os.path.join( self.procRoot, '12' ) )
+    writeStat( self.procRoot, 11, 10, 10, ( 60, 50, 10, 0 ), 2000, 2 )
+    self.assertAlmostEqual( self.monitor.getCPUConsumedLinux( 10 )['Value'], 240 / self.ticks )
+    # orphan 20 gone without anybody waiting for it
+    shutil.rmtree( os.path.join( self.procRoot, '20' ) )
+    self.assertAlmostEqual( self.monitor.getCPUConsumedLinux( 10 )['Value'], 240 / self.ticks )
+
+  def test03sampleReuse( self ):
+    """ samples of the same PID reused during maxSampleAge """
+    monitor = ProcessMonitor( procRoot = self.procRoot, maxSampleAge = 3600 )
+    cpu = monitor.getCPUConsumedLinux( 10 )['Value']
+    writeStat( self.procRoot, 10, 5, 10, ( 200, 0, 0, 0 ), 1000, 1 )
+    self.assertEqual( monitor.getCPUConsumedLinux( 10 )['Value'], cpu )
+    self.assertAlmostEqual( monitor.getCPUConsumedLinux( 30 )['Value'], 1000 / self.ticks )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( ProcessMonitorTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
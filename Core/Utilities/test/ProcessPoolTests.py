@@ -246,6 +246,45 @@ class ProcessPoolCallbacksTests( unittest.TestCase ):
     self.processPool.finalize( 2 )
 
 
+########################################################################
+class ProcessPoolNoThrottleTests( unittest.TestCase ):
+  """
+  .. class:: ProcessPoolNoThrottleTests
+  test case for ProcessPool without throttle, callbacks executed by the daemon thread
+  """
+
+  def setUp( self ):
+    """c'tor
+
+    :param self: self reference
+    """
+    self.done = []
+    self.allDone = threading.Event()
+    self.processPool = ProcessPool( 4, 4, 20, poolCallback = self.poolCallback, throttle = 0 )
+    self.processPool.daemonize()
+
+  def poolCallback( self, taskID, taskResult ):
+    self.done.append( taskID )
+    if len( self.done ) == 100:
+      self.allDone.set()
+
+  def testCallableFunc( self ):
+    """ 100 short tasks done and called back without waiting between them """
+    start = time.time()
+    for i in range( 100 ):
+      result = self.processPool.createAndQueueTask( CallableFunc,
+                                                    taskID = i,
+                                                    args = ( i, 0.01 ),
+                                                    usePoolCallbacks = True,
+                                                    blocking = True )
+      self.assertEqual( result["OK"], True )
+    self.allDone.wait( 60 )
+    self.assertEqual( sorted( self.done ), range( 100 ) )
+    ## 0.1 s per task with the default throttle
+    self.assert_( time.time() - start < 10 )
+    self.processPool.finalize( 2 )
+
+
 ########################################################################
 class TaskTimeOutTests( unittest.TestCase ):
   """
@@ -370,6 +409,7 @@ if __name__ == "__main__":
   suitePPCT = testLoader.loadTestsFromTestCase( ProcessPoolCallbacksTests )  
   suiteTCT = testLoader.loadTestsFromTestCase( TaskCallbacksTests )
   suiteTTOT = testLoader.loadTestsFromTestCase( TaskTimeOutTests )
-  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT ] )
+  suitePPNTT = testLoader.loadTestsFromTestCase( ProcessPoolNoThrottleTests )
+  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT, suitePPNTT ] )
   unittest.TextTestRunner(verbosity=3).run(suite)
 
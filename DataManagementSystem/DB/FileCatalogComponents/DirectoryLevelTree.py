@@ -12,6 +12,7 @@ __RCSID__ = "$Id$"
 import os
 from types import ListType, StringTypes
 from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.LRUCache import LRUCache
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryTreeBase import DirectoryTreeBase
 
 MAX_LEVELS = 15
@@ -24,6 +25,66 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def __init__(self,database=None):
     DirectoryTreeBase.__init__(self,database)
     self.treeTable = 'FC_DirectoryLevelTree'
+    # DirName -> ( DirID, Level ) and DirID -> DirName of the existing directories. The entries
+    # expire as other service instances can remove the directories
+    cacheSize = getattr( database, 'directoryCacheSize', 100000 )
+    cacheTime = getattr( database, 'directoryCacheTime', 300 )
+    self.pathCache = LRUCache( cacheSize, cacheTime )
+    self.idCache = LRUCache( cacheSize, cacheTime )
+
+  def __cacheDir( self, dirName, dirID, level ):
+    """ Keep the translation of an existing directory in both directions
+    """
+    self.pathCache.add( dirName, ( int( dirID ), level ) )
+    self.idCache.add( int( dirID ), dirName )
+
+  def invalidateDirectoryCache( self, dirNames = None, dirIDs = None ):
+    """ Forget the cached translations of the given directory names and IDs, all if none is given
+    """
+    if dirNames is None and dirIDs is None:
+      self.pathCache.purgeAll()
+      self.idCache.purgeAll()
+      return
+    for dirName in dirNames or []:
+      cached = self.pathCache.get( dirName, countStats = False )
+      if cached:
+        self.idCache.delete( cached[0] )
+      self.pathCache.delete( dirName )
+    for dirID in dirIDs or []:
+      dirName = self.idCache.get( int( dirID ), countStats = False )
+      if dirName:
+        self.pathCache.delete( dirName )
+      self.idCache.delete( int( dirID ) )
+
+  def getDirectoryCacheStats( self ):
+    """ Get the hits, misses and size of the path and ID caches, with the overall hit rate in percent
+    """
+    resultDict = {}
+    hits = 0
+    lookups = 0
+    for name, cache in ( ( 'Path', self.pathCache ), ( 'ID', self.idCache ) ):
+      stats = cache.getStats()
+      for key, value in stats.items():
+        resultDict['%s%s' % ( name, key )] = value
+      hits += stats['Hits']
+      lookups += stats['Hits'] + stats['Misses']
+    resultDict['HitRate'] = 0.
+    if lookups:
+      resultDict['HitRate'] = round( 100. * hits / lookups, 1 )
+    return S_OK( resultDict )
+
+  def getDirectoryCounters( self, connection = False ):
+    """ Get the total number of directories, with the directory cache statistics
+    """
+    result = DirectoryTreeBase.getDirectoryCounters( self, connection )
+    if not result['OK']:
+      return result
+    resultDict = result['Value']
+    stats = self.getDirectoryCacheStats()['Value']
+    resultDict['Directory Cache Hits'] = stats['PathHits'] + stats['IDHits']
+    resultDict['Directory Cache Misses'] = stats['PathMisses'] + stats['IDMisses']
+    resultDict['Directory Cache Hit Rate'] = stats['HitRate']
+    return S_OK( resultDict )
 
   def getTreeType(self):
     
@@ -34,6 +95,12 @@ class DirectoryLevelTree(DirectoryTreeBase):
     """
     
     dpath = os.path.normpath( path )    
+    cached = self.pathCache.get( dpath )
+    if cached:
+      res = S_OK( cached[0] )
+      res['Level'] = cached[1]
+      return res
+
     req = "SELECT DirID,Level from FC_DirectoryLevelTree WHERE DirName='%s'" % dpath
     result = self.db._query(req,connection)
     if not result['OK']:
@@ -42,6 +109,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not result['Value']:
       return S_OK('')
     
+    self.__cacheDir( dpath, result['Value'][0][0], result['Value'][0][1] )
     res = S_OK(result['Value'][0][0])  
     res['Level'] = result['Value'][0][1]
     return res
@@ -49,13 +117,25 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def findDirs( self, paths, connection=False ):
     """ Find DirIDs for the given path list
     """
-    dpaths = ','.join( [ "'"+os.path.normpath( path )+"'" for path in paths ] )
-    req = "SELECT DirName,DirID from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
+    dirDict = {}
+    missing = []
+    for path in paths:
+      dpath = os.path.normpath( path )
+      cached = self.pathCache.get( dpath )
+      if cached:
+        dirDict[dpath] = cached[0]
+      else:
+        missing.append( dpath )
+    if not missing:
+      return S_OK( dirDict )
+
+    dpaths = ','.join( [ "'"+dpath+"'" for dpath in missing ] )
+    req = "SELECT DirName,DirID,Level from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
     result = self.db._query(req,connection)
     if not result['OK']:
       return result
-    dirDict = {}
-    for dirName, dirID in result['Value']:
+    for dirName, dirID, level in result['Value']:
+      self.__cacheDir( dirName, dirID, level )
       dirDict[dirName] = dirID
 
     return S_OK( dirDict )
@@ -75,6 +155,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
     dirID = result['Value']
     req = "DELETE FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
     result = self.db._update(req)
+    self.invalidateDirectoryCache( [ os.path.normpath( path ) ], [ dirID ] )
     result['DirID'] = dirID
     return result
 
@@ -182,6 +263,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
     else:
       result = self.db._query( "ROLLBACK;", conn )
       
+    self.__cacheDir( path, dirID, level )
     result = S_OK(dirID)
     result['NewDirectory'] = True
     return result  
@@ -231,13 +313,18 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def getDirectoryPath(self,dirID):
     """ Get directory name by directory ID
     """
-    req = "SELECT DirName FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
+    dirName = self.idCache.get( int( dirID ) )
+    if dirName:
+      return S_OK( dirName )
+
+    req = "SELECT DirName,Level FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
     result = self.db._query(req)
     if not result['OK']:
       return result
     if not result['Value']:
       return S_ERROR('Directory with id %d not found' % int(dirID) )
     
+    self.__cacheDir( result['Value'][0][0], dirID, result['Value'][0][1] )
     return S_OK(result['Value'][0][0])
 
   def getDirectoryPaths(self,dirIDList):
@@ -250,18 +337,29 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not dirs:
       return S_OK( {} )
       
-    dirListString = ','.join( [ str( d ) for d in dirs ] )
+    resultDict = {}
+    missing = []
+    for dirID in dirs:
+      dirName = self.idCache.get( int( dirID ) )
+      if dirName:
+        resultDict[int( dirID )] = dirName
+      else:
+        missing.append( dirID )
+    if not missing:
+      return S_OK( resultDict )
+
+    dirListString = ','.join( [ str( d ) for d in missing ] )
 
-    req = "SELECT DirID,DirName FROM FC_DirectoryLevelTree WHERE DirID in ( %s )" % dirListString
+    req = "SELECT DirID,DirName,Level FROM FC_DirectoryLevelTree WHERE DirID in ( %s )" % dirListString
     result = self.db._query(req)
     if not result['OK']:
       return result
-    if not result['Value']:
+    if not result['Value'] and not resultDict:
       return S_ERROR('Directories not found: %s' % dirListString )
 
-    resultDict = {}
-    for row in result['Value']:
-      resultDict[int(row[0])] = row[1]
+    for dirID, dirName, level in result['Value']:
+      self.__cacheDir( dirName, dirID, level )
+      resultDict[int(dirID)] = dirName
 
     return S_OK(resultDict) 
  
@@ -288,15 +386,28 @@ class DirectoryLevelTree(DirectoryTreeBase):
       pelements.append(dPath)
     pelements.append( '/' )  
       
-    pathString = [ "'"+p+"'" for p in pelements ]
-    req = "SELECT DirID FROM FC_DirectoryLevelTree WHERE DirName in (%s) ORDER BY DirID" % ','.join(pathString)
-    result = self.db._query(req)
-    if not result['OK']:
-      return result
-    if not result['Value']:
+    dirIDs = []
+    missing = []
+    for p in set( pelements ):
+      cached = self.pathCache.get( p )
+      if cached:
+        dirIDs.append( cached[0] )
+      else:
+        missing.append( p )
+
+    if missing:
+      pathString = [ "'"+p+"'" for p in missing ]
+      req = "SELECT DirName,DirID,Level FROM FC_DirectoryLevelTree WHERE DirName in (%s)" % ','.join(pathString)
+      result = self.db._query(req)
+      if not result['OK']:
+        return result
+      for dirName, dirID, level in result['Value']:
+        self.__cacheDir( dirName, dirID, level )
+        dirIDs.append( int( dirID ) )
+    if not dirIDs:
       return S_ERROR('Directory %s not found' % path)
        
-    return S_OK([ x[0] for x in result['Value'] ])
+    return S_OK( sorted( dirIDs ) )
   
   def getPathIDsByID_old(self,dirID):
     """ Get IDs of all the directories in the parent hierarchy for a directory
@@ -485,6 +596,8 @@ class DirectoryLevelTree(DirectoryTreeBase):
     for parentPath, dirDict in parentDict.items():
       dirIDList = dirDict['DirList']
       oldParentID = dirDict['OldParentID']
+      # The parent is gone, whatever the cache says, e.g. if removed by another service instance
+      self.invalidateDirectoryCache( [ parentPath ], [ oldParentID ] )
       result = self.findDir( parentPath )
       if not result['OK']:
         continue
@@ -504,6 +617,8 @@ class DirectoryLevelTree(DirectoryTreeBase):
           continue
         req = "UPDATE FC_DirectoryInfo SET DirID=%s WHERE DirID=%s" % ( oldParentID, parentID )
         result = self.db._update( req )
+        self.invalidatePermissions( [ oldParentID, parentID ] )
+        self.invalidateDirectoryCache( [ parentPath ], [ oldParentID, parentID ] )
         
         parentID = oldParentID        
         # We have to change also the ownership of the new directory to the most likely one
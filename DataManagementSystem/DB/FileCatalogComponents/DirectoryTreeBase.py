@@ -6,6 +6,7 @@
 __RCSID__ = "$Id$"
 
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities  import checkArgumentFormat
+from DIRAC.Core.Utilities.LRUCache                                  import LRUCache
 from DIRAC                                                          import S_OK, S_ERROR, gLogger
 import time, threading, os
 from types import StringTypes, ListType
@@ -20,6 +21,9 @@ class DirectoryTreeBase:
     self.db = database
     self.lock = threading.Lock()
     self.treeTable = ''
+    # DirID -> ( UID, GID, Mode ). Other service instances can change them, hence the expiration
+    self.permissionCache = LRUCache( getattr( database, 'permissionCacheSize', 10000 ),
+                                     getattr( database, 'permissionCacheTime', 60 ) )
 
 ############################################################################
 #
@@ -61,6 +65,18 @@ class DirectoryTreeBase:
     """
     return S_ERROR( "To be implemented on derived class" )
 
+  def _getDirectoriesModes( self, dirIDs ):
+    """ Get the owner, group and mode of the given directories with a single query
+
+        :returns S_OK( { dirID : ( UID, GID, Mode ) } ) for the directories found
+    """
+    req = "SELECT DirID,UID,GID,Mode FROM FC_DirectoryInfo WHERE DirID IN ( %s )" % ','.join( [ str( dirID ) for dirID in dirIDs ] )
+    result = self.db._query( req )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( dirID ), ( int( uid ), int( gid ), int( mode ) ) )
+                         for dirID, uid, gid, mode in result['Value'] ] ) )
+
 ##########################################################################
 
 
@@ -107,6 +123,7 @@ class DirectoryTreeBase:
       return result
     dirID = result['Value']
     if result['NewDirectory']:
+      self.invalidatePermissions( [ dirID ] )
       req = "INSERT INTO FC_DirectoryInfo (DirID,UID,GID,CreationDate,ModificationDate,Mode,Status) Values "
       req = req + "(%d,%d,%d,UTC_TIMESTAMP(),UTC_TIMESTAMP(),%d,%d)" % ( dirID, l_uid, l_gid, self.db.umask, status )
       result = self.db._update( req )
@@ -343,6 +360,7 @@ class DirectoryTreeBase:
     dirID = result['Value']
     req = "UPDATE FC_DirectoryInfo SET %s=%d WHERE DirID=%d" % ( pname, pvalue, dirID )
     result = self.db._update( req )
+    self.invalidatePermissions( [ dirID ] )
     return result
 
 #####################################################################
@@ -396,6 +414,7 @@ class DirectoryTreeBase:
         failed[path] = result['Message']
       else:
         successful[path] = True
+    self.invalidatePermissions()
 
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
@@ -438,6 +457,7 @@ class DirectoryTreeBase:
         failed[path] = result['Message']
       else:
         successful[path] = True
+    self.invalidatePermissions()
 
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
@@ -472,6 +492,7 @@ class DirectoryTreeBase:
         failed[path] = result['Message']
       else:
         successful[path] = True
+    self.invalidatePermissions()
 
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
@@ -482,16 +503,52 @@ class DirectoryTreeBase:
     return self._setDirectoryParameter( path, 'Status', status )
 
   def getPathPermissions( self, lfns, credDict ):
-    """ Get permissions for the given user/group to manipulate the given lfns 
+    """ Get permissions for the given user/group to manipulate the given lfns.
+        The paths are resolved all together: the directories still to be found are looked
+        up with one query per level, going up to the parent of those which do not exist,
+        and their owner, group and mode are taken from the cache or with one query
     """
+    result = self.db.ugManager.getUserAndGroupID( credDict )
+    if not result['OK']:
+      return result
+    uid, gid = result['Value']
+
     successful = {}
     failed = {}
-    for path in lfns:
-      result = self.getDirectoryPermissions( path, credDict )
+    # Path to look up -> lfns taking its permissions
+    toResolve = {}
+    for lfn in lfns:
+      toResolve.setdefault( lfn, [] ).append( lfn )
+    while toResolve:
+      result = self.__findDirIDs( toResolve.keys() )
       if not result['OK']:
-        failed[path] = result['Message']
-      else:
-        successful[path] = result['Value']
+        return result
+      dirIDs = result['Value']
+      result = self.__getDirectoriesModes( dirIDs.values() )
+      if not result['OK']:
+        return result
+      dirModes = result['Value']
+
+      parents = {}
+      for path, resolvedPaths in toResolve.items():
+        dirMode = dirModes.get( dirIDs.get( os.path.normpath( path ) ) )
+        if dirMode:
+          permissions = self.__getPermissions( uid, gid, dirMode )
+        elif path == '/':
+          # Nothing yet exists, starting from the scratch
+          permissions = { 'Read' : True, 'Write' : True, 'Execute' : True }
+        else:
+          # If the directory does not exist, check the nearest parent for the permissions
+          parent = os.path.dirname( path )
+          if parent == path or not parent:
+            for resolvedPath in resolvedPaths:
+              failed[resolvedPath] = 'Not an absolute path'
+          else:
+            parents.setdefault( parent, [] ).extend( resolvedPaths )
+          continue
+        for resolvedPath in resolvedPaths:
+          successful[resolvedPath] = dict( permissions )
+      toResolve = parents
 
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
@@ -499,32 +556,63 @@ class DirectoryTreeBase:
   def getDirectoryPermissions( self, path, credDict ):
     """ Get permissions for the given user/group to manipulate the given directory 
     """
-    result = self.db.ugManager.getUserAndGroupID( credDict )
+    result = self.getPathPermissions( [ path ], credDict )
     if not result['OK']:
       return result
-    uid, gid = result['Value']
+    if path in result['Value']['Failed']:
+      return S_ERROR( result['Value']['Failed'][path] )
+    return S_OK( result['Value']['Successful'][path] )
 
-    result = self.getDirectoryParameters( path )
-    if not result['OK']:
-      if "not found" in result['Message'] or "not exist" in result['Message']:
-        # If the directory does not exist, check the nearest parent for the permissions
-        if path == '/':
-          # Nothing yet exists, starting from the scratch
-          resultDict = {}  
-          resultDict['Write'] = True
-          resultDict['Read'] = True 
-          resultDict['Execute'] = True
-          return S_OK( resultDict )
-        else:
-          pDir = os.path.dirname( path )
-          result = self.getDirectoryPermissions( pDir, credDict )
-          return result
+  def invalidatePermissions( self, dirIDs = None ):
+    """ Forget the cached owner, group and mode of the given directories, of all if None
+    """
+    if dirIDs is None:
+      self.permissionCache.purgeAll()
+      return
+    for dirID in dirIDs:
+      self.permissionCache.delete( int( dirID ) )
+
+  def __findDirIDs( self, paths ):
+    """ Get the IDs of the existing directories, keyed by their normalized path
+    """
+    result = self.findDirs( paths )
+    if result['OK']:
+      return result
+    # Not all the directory trees implement findDirs
+    dirIDs = {}
+    for path in paths:
+      result = self.findDir( path )
+      if not result['OK']:
+        return result
+      if result['Value']:
+        dirIDs[os.path.normpath( path )] = result['Value']
+    return S_OK( dirIDs )
+
+  def __getDirectoriesModes( self, dirIDs ):
+    """ Get the owner, group and mode of the directories from the cache, or from the database
+        for those which are not there
+    """
+    dirModes = {}
+    missing = []
+    for dirID in dirIDs:
+      dirMode = self.permissionCache.get( int( dirID ) )
+      if dirMode:
+        dirModes[int( dirID )] = dirMode
       else:
+        missing.append( int( dirID ) )
+    if missing:
+      result = self._getDirectoriesModes( missing )
+      if not result['OK']:
         return result
+      for dirID, dirMode in result['Value'].items():
+        self.permissionCache.add( dirID, dirMode )
+        dirModes[dirID] = dirMode
+    return S_OK( dirModes )
 
-    dUid = result['Value']['UID']
-    dGid = result['Value']['GID']
-    mode = result['Value']['Mode']
+  def __getPermissions( self, uid, gid, dirMode ):
+    """ Get the permissions of a user/group given the ( UID, GID, Mode ) of a directory
+    """
+    dUid, dGid, mode = dirMode
 
     owner = uid == dUid
     group = gid == dGid
@@ -545,7 +633,7 @@ class DirectoryTreeBase:
                             or ( group and mode & stat.S_IXGRP > 0 )\
                             or mode & stat.S_IXOTH > 0
 
-    return S_OK( resultDict )
+    return resultDict
 
   def getFileIDsInDirectory( self, dirID, credDict, startItem = 1, maxItems = 25 ):
     """ Get file IDs for the given directory
@@ -515,6 +515,8 @@ class DirectoryClosure( DirectoryTreeBase ):
       if not affected:
         return S_ERROR( 'Directory does not exist: %s' % path )
 
+      # We are given the path, not the id of the directory
+      self.invalidatePermissions()
       return S_OK( affected )
 
 
@@ -524,6 +526,20 @@ class DirectoryClosure( DirectoryTreeBase ):
 
 
 
+  def _getDirectoriesModes( self, dirIDs ):
+    """ Get the owner, group and mode of the given directories with a single query
+
+        :param dirIDs : list of directory ids
+
+        :returns S_OK( { dirID : ( UID, GID, Mode ) } ) for the directories found
+    """
+    req = "SELECT DirID, UID, GID, Mode FROM FC_DirectoryList WHERE DirID IN ( %s )" % intListToString( dirIDs )
+    result = self.db._query( req )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( dirID ), ( int( uid ), int( gid ), int( mode ) ) )
+                         for dirID, uid, gid, mode in result['Value'] ] ) )
+
   def setDirectoryGroup( self, path, gname ):
     """ Set the directory owner
     """
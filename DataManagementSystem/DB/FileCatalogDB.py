@@ -62,6 +62,12 @@ class FileCatalogDB(DB):
     self.validReplicaStatus = databaseConfig['ValidReplicaStatus']
     self.visibleFileStatus = databaseConfig['VisibleFileStatus']
     self.visibleReplicaStatus = databaseConfig['VisibleReplicaStatus']
+    # Directory owner, group and mode cached for the permission checks
+    self.permissionCacheSize = databaseConfig.get( 'PermissionCacheSize', 10000 )
+    self.permissionCacheTime = databaseConfig.get( 'PermissionCacheTime', 60 )
+    # Directory name <-> ID translations cached by the directory tree
+    self.directoryCacheSize = databaseConfig.get( 'DirectoryCacheSize', 100000 )
+    self.directoryCacheTime = databaseConfig.get( 'DirectoryCacheTime', 300 )
 
     try:
       # Obtain the plugins to be used for DB interaction
@@ -0,0 +1,130 @@
+########################################################################
+# $HeadURL $
+# File: DirectoryLevelTreeCacheTests.py
+########################################################################
+
+""" :mod: DirectoryLevelTreeCacheTests
+    ==================================
+
+    .. module: DirectoryLevelTreeCacheTests
+    :synopsis: unit tests for the directory name <-> ID caches of DirectoryLevelTree
+
+    unit tests for the pathCache and idCache of DirectoryLevelTree, run on
+    the in memory sqlite database of DirectoryPermissionsTests
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import time
+import unittest
+from mock import patch
+## SUT
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryLevelTree import DirectoryLevelTree
+from DIRAC.DataManagementSystem.DB.test.DirectoryPermissionsTests import SQLiteFileCatalogDB
+
+CREDDICT = { "username" : "alice", "group" : "lhcb_user" }
+
+########################################################################
+class DirectoryLevelTreeCacheTestCase( unittest.TestCase ):
+  """
+  .. class:: DirectoryLevelTreeCacheTestCase
+
+  """
+
+  def setUp( self ):
+    """ /vo/a/b and /vo/c """
+    self.db = SQLiteFileCatalogDB()
+    self.tree = DirectoryLevelTree( self.db )
+    self.dirIDs = {}
+    for path in [ "/vo/a/b", "/vo/c" ]:
+      self.assertEqual( self.tree.makeDirectories( path, CREDDICT )["OK"], True )
+    for path in [ "/", "/vo", "/vo/a", "/vo/a/b", "/vo/c" ]:
+      self.dirIDs[path] = self.tree.findDir( path )["Value"]
+    del self.db.log[:]
+
+  def treeQueries( self ):
+    """ SELECTs on the tree table """
+    return self.db.queries( "FC_DirectoryLevelTree" )
+
+  def test01cached( self ):
+    """ the lookups of existing directories are served from the caches """
+    self.assertEqual( self.tree.findDir( "/vo/a/" )["Value"], self.dirIDs["/vo/a"] )
+    self.assertEqual( self.tree.findDirs( [ "/vo/a/b", "/vo/c" ] )["Value"],
+                      { "/vo/a/b" : self.dirIDs["/vo/a/b"], "/vo/c" : self.dirIDs["/vo/c"] } )
+    self.assertEqual( self.tree.getDirectoryPath( self.dirIDs["/vo/c"] )["Value"], "/vo/c" )
+    self.assertEqual( self.tree.getDirectoryPaths( [ self.dirIDs["/vo"], self.dirIDs["/vo/a"] ] )["Value"],
+                      { self.dirIDs["/vo"] : "/vo", self.dirIDs["/vo/a"] : "/vo/a" } )
+    self.assertEqual( self.tree.getPathIDs( "/vo/a/b" )["Value"],
+                      sorted( [ self.dirIDs[path] for path in [ "/", "/vo", "/vo/a", "/vo/a/b" ] ] ) )
+    self.assertEqual( self.treeQueries(), [] )
+    # # not existing directories are not cached
+    self.assertEqual( self.tree.findDir( "/vo/x" )["Value"], "" )
+    self.assertEqual( self.tree.findDir( "/vo/x" )["Value"], "" )
+    self.assertEqual( len( self.treeQueries() ), 2 )
+    stats = self.tree.getDirectoryCacheStats()["Value"]
+    self.assertEqual( stats["PathMisses"] >= 2, True )
+
+  def test02removeDir( self ):
+    """ removeDir evicts both translations """
+    dirID = self.dirIDs["/vo/a/b"]
+    self.assertEqual( self.tree.removeDir( "/vo/a/b" )["OK"], True )
+    self.assertEqual( "/vo/a/b" in self.tree.pathCache, False )
+    self.assertEqual( dirID in self.tree.idCache, False )
+    self.assertEqual( self.tree.findDir( "/vo/a/b" )["Value"], "" )
+    self.assertEqual( self.tree.getDirectoryPath( dirID )["OK"], False )
+    self.assertEqual( self.tree.findDirs( [ "/vo/a/b", "/vo/c" ] )["Value"], { "/vo/c" : self.dirIDs["/vo/c"] } )
+
+  def test03recreated( self ):
+    """ a directory removed and created again with a new ID is not served with the old one """
+    oldID = self.dirIDs["/vo/a/b"]
+    self.tree.removeDir( "/vo/a/b" )
+    self.tree.makeDirectories( "/vo/d", CREDDICT )
+    self.tree.makeDirectories( "/vo/a/b", CREDDICT )
+    newID = self.db._query( "SELECT DirID FROM FC_DirectoryLevelTree WHERE DirName='/vo/a/b'" )["Value"][0][0]
+    self.assertNotEqual( newID, oldID )
+    self.assertEqual( self.tree.findDir( "/vo/a/b" )["Value"], newID )
+    self.assertEqual( self.tree.findDirs( [ "/vo/a/b" ] )["Value"], { "/vo/a/b" : newID } )
+    self.assertEqual( self.tree.getDirectoryPath( newID )["Value"], "/vo/a/b" )
+    self.assertEqual( self.tree.getDirectoryPath( oldID )["OK"], False )
+    self.assertEqual( newID in self.tree.getPathIDs( "/vo/a/b" )["Value"], True )
+    self.assertEqual( oldID in self.tree.getPathIDs( "/vo/a/b" )["Value"], False )
+
+  def test04otherInstance( self ):
+    """ the translations of directories changed by another service instance expire """
+    otherTree = DirectoryLevelTree( self.db )
+    oldID = self.dirIDs["/vo/a/b"]
+    otherTree.removeDir( "/vo/a/b" )
+    otherTree.makeDirectories( "/vo/d", CREDDICT )
+    otherTree.makeDirectories( "/vo/a/b", CREDDICT )
+    self.assertEqual( self.tree.findDir( "/vo/a/b" )["Value"], oldID )
+    with patch( "DIRAC.Core.Utilities.LRUCache.time.time", return_value = time.time() + 301 ):
+      newID = self.tree.findDir( "/vo/a/b" )["Value"]
+      self.assertNotEqual( newID, oldID )
+      self.assertEqual( self.tree.getDirectoryPath( oldID )["OK"], False )
+
+  def test05recoverOrphan( self ):
+    """ recoverOrphanDirectories evicts the entries of the lost parent, even if removed elsewhere """
+    lostID = self.dirIDs["/vo/a"]
+    # # removed by another service instance, this one still has it in the caches
+    otherTree = DirectoryLevelTree( self.db )
+    otherTree.removeDir( "/vo/a" )
+    self.db._update( "DELETE FROM FC_DirectoryInfo WHERE DirID=%d" % lostID )
+    self.assertEqual( self.tree.findDir( "/vo/a" )["Value"], lostID )
+    self.assertEqual( self.tree.recoverOrphanDirectories( CREDDICT )["OK"], True )
+    # # the recovered parent keeps the old ID and the ID given at its creation is forgotten
+    result = self.db._query( "SELECT DirID,Parent FROM FC_DirectoryLevelTree WHERE DirName IN ('/vo/a','/vo/a/b')" )
+    self.assertEqual( sorted( result["Value"] ), sorted( [ ( lostID, self.dirIDs["/vo"] ),
+                                                           ( self.dirIDs["/vo/a/b"], lostID ) ] ) )
+    self.assertEqual( self.tree.findDir( "/vo/a" )["Value"], lostID )
+    self.assertEqual( self.tree.getDirectoryPath( lostID )["Value"], "/vo/a" )
+    self.assertEqual( self.tree.getDirectoryParameters( "/vo/a" )["OK"], True )
+    self.assertEqual( [ dirID for dirID, dirName in self.tree.getDirectoryPaths( range( 1, 20 ) )["Value"].items()
+                        if dirName == "/vo/a" ], [ lostID ] )
+    self.assertEqual( self.tree.getChildren( "/vo/a" )["Value"], [ self.dirIDs["/vo/a/b"] ] )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( DirectoryLevelTreeCacheTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
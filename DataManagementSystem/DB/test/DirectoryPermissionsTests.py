@@ -0,0 +1,254 @@
+########################################################################
+# $HeadURL $
+# File: DirectoryPermissionsTests.py
+########################################################################
+
+""" :mod: DirectoryPermissionsTests
+    ===============================
+
+    .. module: DirectoryPermissionsTests
+    :synopsis: unit tests for the batch path permissions of the FileCatalog directory trees
+
+    unit tests for DirectoryTreeBase.getPathPermissions and the directory mode cache,
+    run on a DirectoryLevelTree backed by an in memory sqlite database
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import re
+import stat
+import sqlite3
+import unittest
+from mock import patch
+## from DIRAC
+from DIRAC import S_OK, S_ERROR
+## SUT
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryLevelTree import DirectoryLevelTree
+
+########################################################################
+class FakeUserGroupManager( object ):
+  """ fixed users and groups """
+  users = { "alice" : 1, "bob" : 2, "carol" : 3 }
+  groups = { "lhcb_user" : 1, "lhcb_prod" : 2 }
+
+  def getUserAndGroupID( self, credDict ):
+    return S_OK( ( self.users[credDict["username"]], self.groups[credDict["group"]] ) )
+
+  def findUser( self, user ):
+    return S_OK( self.users.get( user, 0 ) )
+
+  def findGroup( self, group ):
+    return S_OK( self.groups.get( group, 0 ) )
+
+  def getUserName( self, uid ):
+    return S_OK( dict( [ ( value, key ) for key, value in self.users.items() ] ).get( uid, "root" ) )
+
+  def getGroupName( self, gid ):
+    return S_OK( dict( [ ( value, key ) for key, value in self.groups.items() ] ).get( gid, "root" ) )
+
+class SQLiteFileCatalogDB( object ):
+  """ the FileCatalogDB methods used by the directory trees, on an in memory sqlite database.
+      The MySQL only statements are translated or ignored, the executed ones are kept in log
+  """
+  umask = 0775
+  globalReadAccess = False
+
+  def __init__( self ):
+    self.connection = sqlite3.connect( ":memory:" )
+    self.connection.isolation_level = None
+    lpaths = ", ".join( [ "LPATH%d INTEGER NOT NULL DEFAULT 0" % ( i + 1 ) for i in range( 15 ) ] )
+    self.connection.execute( "CREATE TABLE FC_DirectoryLevelTree ( DirID INTEGER PRIMARY KEY, "
+                             "DirName VARCHAR(255) NOT NULL UNIQUE, Parent INTEGER NOT NULL DEFAULT 0, "
+                             "Level INTEGER NOT NULL, %s )" % lpaths )
+    self.connection.execute( "CREATE TABLE FC_DirectoryInfo ( DirID INTEGER PRIMARY KEY, UID INTEGER, GID INTEGER, "
+                             "CreationDate DATETIME, ModificationDate DATETIME, Mode INTEGER, Status INTEGER )" )
+    self.ugManager = FakeUserGroupManager()
+    self.tmpVar = None
+    self.log = []
+
+  def _getConnection( self ):
+    return S_OK( self.connection )
+
+  def __execute( self, cmd, params = () ):
+    cmd = cmd.strip().rstrip( ";" ).strip()
+    if re.match( "(START TRANSACTION|COMMIT|ROLLBACK|LOCK TABLES|UNLOCK TABLES)", cmd ):
+      return S_OK( () )
+    if "@tmpvar:=" in cmd:
+      cmd = cmd.replace( "@tmpvar:=", "" ).replace( " FOR UPDATE", "" )
+      self.tmpVar = self.connection.execute( cmd ).fetchone()[0]
+      return S_OK( ( ( self.tmpVar, ), ) )
+    cmd = cmd.replace( "@tmpvar", str( self.tmpVar ) ).replace( "UTC_TIMESTAMP()", "CURRENT_TIMESTAMP" )
+    self.log.append( cmd )
+    try:
+      cursor = self.connection.execute( cmd, params )
+    except sqlite3.IntegrityError, error:
+      return S_ERROR( "Duplicate entry: %s" % error )
+    result = S_OK( tuple( cursor.fetchall() ) if cmd.startswith( "SELECT" ) else cursor.rowcount )
+    result["lastRowId"] = cursor.lastrowid
+    return result
+
+  def _query( self, cmd, conn = False ):
+    return self.__execute( cmd )
+
+  def _update( self, cmd, conn = False ):
+    return self.__execute( cmd )
+
+  def _insert( self, tableName, inFields = None, inValues = None, conn = None ):
+    return self.__execute( "INSERT INTO %s (%s) VALUES (%s)" % ( tableName, ",".join( inFields ),
+                                                                  ",".join( [ "?" ] * len( inValues ) ) ),
+                           tuple( inValues ) )
+
+  def queries( self, table ):
+    """ the SELECT statements executed on a table """
+    return [ cmd for cmd in self.log
+             if cmd.startswith( "SELECT" ) and "FROM %s " % table.upper() in cmd.upper() + " " ]
+
+def walkPermissions( tree, path, credDict ):
+  """ permissions of a path as getDirectoryPermissions got them before the batch resolution:
+      one directory at a time, going up to the parent of those which do not exist
+  """
+  uid, gid = tree.db.ugManager.getUserAndGroupID( credDict )["Value"]
+  result = tree.getDirectoryParameters( path )
+  if not result["OK"]:
+    if path == "/":
+      return { "Read" : True, "Write" : True, "Execute" : True }
+    return walkPermissions( tree, os.path.dirname( path ), credDict )
+  owner = uid == result["Value"]["UID"]
+  group = gid == result["Value"]["GID"]
+  mode = result["Value"]["Mode"]
+  def allowed( userBit, groupBit, otherBit ):
+    return bool( ( owner and mode & userBit ) or ( group and mode & groupBit ) or mode & otherBit )
+  return { "Read" : tree.db.globalReadAccess or allowed( stat.S_IRUSR, stat.S_IRGRP, stat.S_IROTH ),
+           "Write" : allowed( stat.S_IWUSR, stat.S_IWGRP, stat.S_IWOTH ),
+           "Execute" : allowed( stat.S_IXUSR, stat.S_IXGRP, stat.S_IXOTH ) }
+
+CREDENTIALS = [ { "username" : "alice", "group" : "lhcb_user" },
+                { "username" : "bob", "group" : "lhcb_user" },
+                { "username" : "carol", "group" : "lhcb_prod" },
+                { "username" : "bob", "group" : "lhcb_prod" } ]
+
+LFNS = [ "/", "/vo", "/vo/file", "/vo/user/bob", "/vo/user/bob/file.txt", "/vo/user/x/y/z",
+         "/vo/data/", "/vo//data/run/1/f", "/vo/open/f", "/vo/private/f", "/vo/private/sub/f", "/new/path/f" ]
+
+########################################################################
+class DirectoryPermissionsTestCase( unittest.TestCase ):
+  """
+  .. class:: DirectoryPermissionsTestCase
+
+  """
+
+  def setUp( self ):
+    """ a small tree with various owners and modes """
+    self.db = SQLiteFileCatalogDB()
+    self.tree = DirectoryLevelTree( self.db )
+    for path, user, group, mode in [ ( "/vo", "alice", "lhcb_user", 0755 ),
+                                     ( "/vo/user", "alice", "lhcb_user", 0755 ),
+                                     ( "/vo/user/bob", "bob", "lhcb_user", 0700 ),
+                                     ( "/vo/data", "alice", "lhcb_prod", 0775 ),
+                                     ( "/vo/open", "carol", "lhcb_prod", 0777 ),
+                                     ( "/vo/private", "alice", "lhcb_user", 0700 ),
+                                     ( "/vo/private/sub", "alice", "lhcb_user", 0777 ) ]:
+      self.makeDir( path, user, group, mode )
+    del self.db.log[:]
+
+  def makeDir( self, path, user, group, mode ):
+    """ create a directory with its owner, group and mode """
+    result = self.tree.makeDirectories( path, { "username" : user, "group" : group } )
+    self.assertEqual( result["OK"], True )
+    self.assertEqual( self.tree.setDirectoryMode( path, mode )["OK"], True )
+    return result["Value"]
+
+  def assertSameAsWalk( self, lfns ):
+    """ the batch resolution gives the permissions of the level by level walk for all the credentials """
+    for credDict in CREDENTIALS:
+      result = self.tree.getPathPermissions( lfns, credDict )
+      self.assertEqual( result["OK"], True )
+      self.assertEqual( result["Value"]["Failed"], {} )
+      self.assertEqual( result["Value"]["Successful"],
+                        dict( [ ( lfn, walkPermissions( self.tree, lfn, credDict ) ) for lfn in lfns ] ) )
+
+  def permissions( self, lfn, credDict ):
+    """ batch permissions of a single lfn """
+    return self.tree.getPathPermissions( [ lfn ], credDict )["Value"]["Successful"][lfn]
+
+  def test01sameAsWalk( self ):
+    """ same permissions as the level by level walk """
+    self.assertSameAsWalk( LFNS )
+    self.db.globalReadAccess = True
+    self.assertSameAsWalk( LFNS )
+    # # the single directory call
+    for lfn in LFNS:
+      self.assertEqual( self.tree.getDirectoryPermissions( lfn, CREDENTIALS[1] ),
+                        { "OK" : True, "Value" : walkPermissions( self.tree, lfn, CREDENTIALS[1] ) } )
+
+  def test02findDirFallback( self ):
+    """ trees without findDirs are resolved with findDir """
+    with patch.object( self.tree, "findDirs", return_value = S_ERROR( "To be implemented on derived class" ) ):
+      self.assertSameAsWalk( LFNS )
+
+  def test03modeCache( self ):
+    """ one query per level at most, none when the modes are cached """
+    self.tree.getPathPermissions( LFNS, CREDENTIALS[0] )
+    self.assertEqual( len( self.db.queries( "FC_DirectoryInfo" ) ) <= 6, True )
+    del self.db.log[:]
+    self.tree.getPathPermissions( LFNS, CREDENTIALS[1] )
+    self.assertEqual( self.db.queries( "FC_DirectoryInfo" ), [] )
+    # # relative paths
+    result = self.tree.getPathPermissions( [ "vo/file" ], CREDENTIALS[0] )
+    self.assertEqual( result["Value"], { "Successful" : {}, "Failed" : { "vo/file" : "Not an absolute path" } } )
+
+  def test04change( self ):
+    """ chmod, chown and chgrp invalidate the cached modes """
+    bob = CREDENTIALS[1]
+    self.assertSameAsWalk( LFNS )
+    self.assertEqual( self.permissions( "/vo/private/f", bob )["Read"], False )
+    result = self.tree.changeDirectoryMode( { "/vo/private" : 0755 } )
+    self.assertEqual( result["Value"]["Successful"], { "/vo/private" : True } )
+    self.assertEqual( self.permissions( "/vo/private/f", bob )["Read"], True )
+    self.assertSameAsWalk( LFNS )
+
+    self.assertEqual( self.permissions( "/vo/private/f", bob )["Write"], False )
+    self.tree.changeDirectoryOwner( { "/vo/private" : "bob" } )
+    self.assertEqual( self.permissions( "/vo/private/f", bob )["Write"], True )
+    self.assertSameAsWalk( LFNS )
+
+    self.assertEqual( self.permissions( "/vo/data/f", bob )["Write"], False )
+    self.tree.changeDirectoryGroup( { "/vo/data" : "lhcb_user" } )
+    self.assertEqual( self.permissions( "/vo/data/f", bob )["Write"], True )
+    self.assertSameAsWalk( LFNS )
+
+  def test05makeDir( self ):
+    """ a directory created with the ID of a removed one does not get its cached mode """
+    carol = CREDENTIALS[2]
+    dirID = self.makeDir( "/vo/tmp", "carol", "lhcb_prod", 0777 )
+    self.assertEqual( self.permissions( "/vo/tmp/f", carol )["Write"], True )
+    self.tree.removeDir( "/vo/tmp" )
+    self.db._update( "DELETE FROM FC_DirectoryInfo WHERE DirID=%d" % dirID )
+    # # sqlite, like MySQL after a restart, gives the highest ID again
+    result = self.tree.makeDirectories( "/vo/tmp2", { "username" : "bob", "group" : "lhcb_user" } )
+    self.assertEqual( result["Value"], dirID )
+    self.assertEqual( self.permissions( "/vo/tmp2/f", carol )["Write"], False )
+    self.assertSameAsWalk( LFNS + [ "/vo/tmp2/f" ] )
+
+  def test06recoverOrphan( self ):
+    """ a lost directory recreated by recoverOrphanDirectories does not keep its cached mode """
+    alice = CREDENTIALS[0]
+    lostID = self.makeDir( "/vo/lost", "bob", "lhcb_user", 0700 )
+    self.makeDir( "/vo/lost/sub", "bob", "lhcb_user", 0777 )
+    self.assertEqual( self.permissions( "/vo/lost/f", alice )["Read"], False )
+    self.tree.removeDir( "/vo/lost" )
+    self.db._update( "DELETE FROM FC_DirectoryInfo WHERE DirID=%d" % lostID )
+    self.assertEqual( self.tree.recoverOrphanDirectories( alice )["OK"], True )
+    # # the recovered directory keeps its ID and gets the owner of its container
+    self.assertEqual( self.tree.findDir( "/vo/lost" )["Value"], lostID )
+    self.assertEqual( self.tree.getDirectoryParameters( "/vo/lost" )["Value"]["Owner"], "alice" )
+    self.assertEqual( self.permissions( "/vo/lost/f", alice )["Read"], True )
+    self.assertSameAsWalk( LFNS + [ "/vo/lost/f", "/vo/lost/sub/f" ] )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( DirectoryPermissionsTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
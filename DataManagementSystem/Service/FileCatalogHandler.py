@@ -59,7 +59,11 @@ def initializeFileCatalogHandler( serviceInfo ):
                     'ValidFileStatus'     : ['AprioriGood','Trash','Removing','Probing'],
                     'ValidReplicaStatus'  : ['AprioriGood','Trash','Removing','Probing'],
                     'VisibleFileStatus'   : ['AprioriGood'],
-                    'VisibleReplicaStatus': ['AprioriGood']}
+                    'VisibleReplicaStatus': ['AprioriGood'],
+                    'PermissionCacheSize' : 10000,
+                    'PermissionCacheTime' : 60,
+                    'DirectoryCacheSize'  : 100000,
+                    'DirectoryCacheTime'  : 300 }
   for configKey in sortList( defaultConfig.keys() ):
     defaultValue = defaultConfig[configKey]
     configValue = getServiceOption( serviceInfo, configKey, defaultValue )
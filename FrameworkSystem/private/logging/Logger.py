@@ -2,6 +2,12 @@
 __RCSID__ = "$Id$"
 """
    DIRAC Logger client
+
+   The level is checked before building any message, so that the messages that are
+   not shown cost a method call. Arguments after the variable message are formatted
+   into it only when the message is shown:
+
+     gLogger.verbose( "Extracted job", "%s from TQ %s", jobId, tqId )
 """
 
 import sys
@@ -27,6 +33,9 @@ class Logger:
     self._outputList = []
     self._subLoggersDict = {}
     self._logLevels = LogLevels()
+    # Absolute values of the levels, compared to _minLevel
+    self.__levelValues = dict( [ ( levelName, abs( self._logLevels.getLevelValue( levelName ) ) )
+                                 for levelName in self._logLevels.getLevels() ] )
     self.__backendOptions = { 'showHeaders' : True, 'showThreads' : False, 'Color' : False }
     self.__preinitialize()
     self.__initialized = False
@@ -132,108 +141,88 @@ class Logger:
     return self._logLevels.getLevel( self._minLevel )
 
   def shown( self, levelName ):
+    """ Whether the messages of the level are shown, to skip preparing the ones that would not be
+    """
     levelName = levelName.upper()
-    if levelName in self._logLevels.getLevels():
-      return self._logLevels.getLevelValue( levelName ) <= levelName
+    if levelName in self.__levelValues:
+      return self._levelShown( levelName )
     return False
 
+  def _levelShown( self, levelName ):
+    """ Level check done before building any message
+    """
+    return self.__levelValues[ levelName ] >= self._minLevel
+
   def getName( self ):
     return self._systemName
 
-  def always( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.always,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def always( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.always ):
+      return True
+    return self.__sendMessage( self._logLevels.always, sMsg, sVarMsg, varArgs )
 
-  def notice( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.notice,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def notice( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.notice ):
+      return True
+    return self.__sendMessage( self._logLevels.notice, sMsg, sVarMsg, varArgs )
 
-  def info( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.info,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def info( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.info ):
+      return True
+    return self.__sendMessage( self._logLevels.info, sMsg, sVarMsg, varArgs )
 
-  def verbose( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.verbose,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def verbose( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.verbose ):
+      return True
+    return self.__sendMessage( self._logLevels.verbose, sMsg, sVarMsg, varArgs )
 
-  def debug( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.debug,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def debug( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.debug ):
+      return True
+    return self.__sendMessage( self._logLevels.debug, sMsg, sVarMsg, varArgs )
 
-  def warn( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.warn,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def warn( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.warn ):
+      return True
+    return self.__sendMessage( self._logLevels.warn, sMsg, sVarMsg, varArgs )
 
-  def error( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.error,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+  def error( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.error ):
+      return True
+    return self.__sendMessage( self._logLevels.error, sMsg, sVarMsg, varArgs )
 
   def exception( self, sMsg = "", sVarMsg = '', lException = False, lExcInfo = False ):
+    if not self._levelShown( self._logLevels.exception ):
+      return True
     if sVarMsg:
       sVarMsg += "\n%s" % self.__getExceptionString( lException, lExcInfo )
     else:
       sVarMsg = "\n%s" % self.__getExceptionString( lException, lExcInfo )
-    messageObject = Message( self._systemName,
-                             self._logLevels.exception,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    return self.__sendMessage( self._logLevels.exception, sMsg, sVarMsg, () )
+
+  def fatal( self, sMsg, sVarMsg = '', *varArgs ):
+    if not self._levelShown( self._logLevels.fatal ):
+      return True
+    return self.__sendMessage( self._logLevels.fatal, sMsg, sVarMsg, varArgs )
 
-  def fatal( self, sMsg, sVarMsg = '' ):
+  def showStack( self ):
+    if not self._levelShown( self._logLevels.debug ):
+      return
+    self.__sendMessage( self._logLevels.debug, "", self.__getStackString(), () )
+
+  def __sendMessage( self, level, sMsg, sVarMsg, varArgs ):
+    """ Build the message of a shown level, the variable message being formatted
+        with varArgs only when a backend shows it
+    """
     messageObject = Message( self._systemName,
-                             self._logLevels.fatal,
+                             level,
                              Time.dateTime(),
                              sMsg,
                              sVarMsg,
-                             self.__discoverCallingFrame() )
+                             self.__discoverCallingFrame(),
+                             variableArgs = varArgs )
     return self.processMessage( messageObject )
 
-  def showStack( self ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.debug,
-                             Time.dateTime(),
-                             "",
-                             self.__getStackString(),
-                             self.__discoverCallingFrame() )
-    self.processMessage( messageObject )
-
   def processMessage( self, messageObject ):
     if self.__testLevel( messageObject.getLevel() ):
       if not messageObject.getName():
@@ -283,10 +272,11 @@ class Logger:
 
 
   def __discoverCallingFrame( self ):
-    if self.__testLevel( self._logLevels.debug ) and self._showCallingFrame:
+    if self._showCallingFrame and self.__testLevel( self._logLevels.debug ):
       oActualFrame = inspect.currentframe()
       lOuterFrames = inspect.getouterframes( oActualFrame )
-      lCallingFrame = lOuterFrames[2]
+      #Skip __sendMessage and the level method
+      lCallingFrame = lOuterFrames[3]
       return "%s:%s" % ( lCallingFrame[1].replace( sys.path[0], "" )[1:], lCallingFrame[2] )
     else:
       return ""
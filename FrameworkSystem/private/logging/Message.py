@@ -1,6 +1,7 @@
 # $HeadURL$
 __RCSID__ = "$Id$"
 
+import thread
 from DIRAC.Core.Utilities import Time
 
 def tupleToMessage( varTuple ):
@@ -10,13 +11,18 @@ def tupleToMessage( varTuple ):
 
 class Message:
 
-  def __init__( self, systemName, level, time, msgText, variableText, frameInfo, subSystemName = '' ):
-    import thread
+  def __init__( self, systemName, level, time, msgText, variableText, frameInfo, subSystemName = '',
+                variableArgs = () ):
     self.systemName = systemName
     self.level = level
     self.time = time
     self.msgText = str( msgText )
-    self.variableText = str( variableText )
+    if variableArgs:
+      #Formatted by getVariableMessage, only if the message is shown
+      self.variableText = variableText
+    else:
+      self.variableText = str( variableText )
+    self.variableArgs = variableArgs
     self.frameInfo = frameInfo
     self.subSystemName = subSystemName
     self.threadId = thread.get_ident()
@@ -52,6 +58,12 @@ class Message:
     return self.msgText
 
   def getVariableMessage( self ):
+    if self.variableArgs:
+      try:
+        self.variableText = str( self.variableText ) % self.variableArgs
+      except ( TypeError, ValueError, KeyError ):
+        self.variableText = " ".join( [ str( self.variableText ) ] + [ str( arg ) for arg in self.variableArgs ] )
+      self.variableArgs = ()
     if self.variableText:
       return self.variableText
     else:
@@ -74,7 +86,7 @@ class Message:
              self.level,
              Time.toString( self.time ),
              self.msgText,
-             self.variableText,
+             self.getVariableMessage(),
              self.frameInfo,
              self.subSystemName
            )
@@ -17,6 +17,9 @@ class SubSystemLogger( Logger ):
     self.__masterLogger = masterLogger
     self._subName = subName
 
+  def _levelShown( self, levelName ):
+    return self.__masterLogger._levelShown( levelName )
+
   def processMessage( self, messageObject ):
     if self.__child:
       messageObject.setSubSystemName( self._subName )
@@ -0,0 +1,231 @@
+# $HeadURL$
+__RCSID__ = "$Id$"
+"""  This backend writes the log messages to a file from a writer thread, which keeps
+     the file open and writes the messages in batches. It is configured in the
+     BackendsOptions section:
+
+       FileName         file to write to
+       QueueSize        messages waiting to be written (10000)
+       FlushSize        messages after which the waiting ones are written (100)
+       FlushTime        seconds after which the waiting messages are written (1)
+       RotationSize     MB after which the file is rotated, 0 not to rotate on size (0)
+       RotationTime     hours after which the file is rotated, 0 not to rotate on time (0)
+       RotationBackups  rotated files kept, as FileName.1 ... FileName.N (5)
+       DropLevel        when the queue is full, the messages of this level and below
+                        are dropped, the others wait for room, None to always wait (INFO)
+
+     The file is reopened on SIGHUP, after an external rotation. getCounters returns
+     the numbers of written, dropped and lost messages and of rotations.
+"""
+import os
+import time
+import signal
+import atexit
+import threading
+from collections import deque
+from DIRAC.Core.Utilities import Time
+from DIRAC.FrameworkSystem.private.logging.Message import Message
+from DIRAC.FrameworkSystem.private.logging.LogLevels import LogLevels
+from DIRAC.FrameworkSystem.private.logging.backends.BaseBackend import BaseBackend
+
+class AsyncFileBackend( BaseBackend ):
+
+  def __init__( self, optionsDictionary ):
+    BaseBackend.__init__( self, optionsDictionary )
+    self._backendName = "asyncfile"
+    self._filename = optionsDictionary[ 'FileName' ]
+    self.__queueSize = self.__getOption( 'QueueSize', 10000 )
+    self.__flushSize = self.__getOption( 'FlushSize', 100 )
+    self.__flushTime = self.__getOption( 'FlushTime', 1.0, float )
+    self.__rotationSize = self.__getOption( 'RotationSize', 0, float ) * 1024 * 1024
+    self.__rotationTime = self.__getOption( 'RotationTime', 0, float ) * 3600
+    self.__rotationBackups = self.__getOption( 'RotationBackups', 5 )
+    logLevels = LogLevels()
+    self.__levelValues = dict( [ ( levelName, logLevels.getLevelValue( levelName ) )
+                                 for levelName in logLevels.getLevels() ] )
+    # Levels of the messages that can be dropped, the error ones never are
+    dropLevel = self.__levelValues.get( str( optionsDictionary.get( 'DropLevel', 'INFO' ) ).upper() )
+    self.__droppable = set()
+    if dropLevel is not None:
+      self.__droppable = set( [ levelName for levelName, levelValue in self.__levelValues.items()
+                                if 0 <= levelValue <= dropLevel ] )
+    self.__file = None
+    self.__openTime = 0
+    self.__reopen = False
+    self.__countersLock = threading.Lock()
+    self.__droppedByLevel = {}
+    self.__droppedToReport = 0
+    self.__counters = { 'Written' : 0, 'Lost' : 0, 'Rotations' : 0, 'Errors' : 0 }
+    self.__startWriter()
+    self.__installSignalHandler()
+    atexit.register( self.__stopWriter )
+
+  def __getOption( self, optionName, defaultValue, optionType = int ):
+    """ The options coming from the CS are strings """
+    try:
+      return optionType( self._optionsDictionary.get( optionName, defaultValue ) )
+    except ( TypeError, ValueError ):
+      return defaultValue
+
+  def __startWriter( self ):
+    """ New queue and writer thread, also after a fork, which only keeps the calling thread.
+        Appending to a deque does not take any lock, the writer is woken up once the
+        messages of a batch are queued, or after FlushTime
+    """
+    self.__pid = os.getpid()
+    self.__file = None
+    self.__alive = True
+    self.__queue = deque()
+    self.__wakeUp = threading.Event()
+    self.__writer = threading.Thread( target = self.__writeLoop, name = "AsyncFileBackend" )
+    self.__writer.setDaemon( True )
+    self.__writer.start()
+
+  def __stopWriter( self ):
+    """ Write the queued messages and stop the writer before the interpreter exits """
+    if os.getpid() != self.__pid or not self.__writer.isAlive():
+      return
+    self.flush()
+    self.__alive = False
+    self.__wakeUp.set()
+    self.__writer.join( 10 )
+
+  def __installSignalHandler( self ):
+    try:
+      self.__previousHandler = signal.signal( signal.SIGHUP, self.__sigHup )
+    except ( ValueError, AttributeError ):
+      #Not in the main thread
+      self.__previousHandler = None
+
+  def __sigHup( self, signum, frame ):
+    self.__reopen = True
+    if callable( self.__previousHandler ):
+      self.__previousHandler( signum, frame )
+
+  def doMessage( self, messageObject ):
+    if os.getpid() != self.__pid:
+      self.__startWriter()
+    queue = self.__queue
+    if len( queue ) >= self.__queueSize:
+      level = messageObject.getLevel()
+      if level in self.__droppable:
+        self.__countersLock.acquire()
+        try:
+          self.__droppedByLevel[ level ] = self.__droppedByLevel.get( level, 0 ) + 1
+          self.__droppedToReport += 1
+        finally:
+          self.__countersLock.release()
+        return
+      #Wait for the writer to make room
+      while len( queue ) >= self.__queueSize and self.__writer.isAlive():
+        self.__wakeUp.set()
+        time.sleep( 0.001 )
+    queue.append( messageObject )
+    if len( queue ) >= self.__flushSize:
+      self.__wakeUp.set()
+
+  def flush( self ):
+    """ Wait until the queued messages are written """
+    if os.getpid() != self.__pid or not self.__writer.isAlive():
+      return
+    flushEvent = threading.Event()
+    self.__queue.append( flushEvent )
+    self.__wakeUp.set()
+    flushEvent.wait( 10 )
+
+  def getCounters( self ):
+    """ Numbers of written, dropped and lost messages, of rotations and of write errors
+    """
+    self.__countersLock.acquire()
+    try:
+      counters = dict( self.__counters )
+      counters[ 'DroppedByLevel' ] = dict( self.__droppedByLevel )
+      counters[ 'Dropped' ] = sum( self.__droppedByLevel.values() )
+    finally:
+      self.__countersLock.release()
+    counters[ 'Queued' ] = len( self.__queue )
+    return counters
+
+  def __writeLoop( self ):
+    queue = self.__queue
+    wakeUp = self.__wakeUp
+    while self.__alive or queue:
+      wakeUp.wait( self.__flushTime )
+      wakeUp.clear()
+      batch, flushEvents = self.__getBatch( queue )
+      try:
+        self.__writeBatch( batch )
+      except Exception, x:
+        self.__counters[ 'Errors' ] += 1
+        self.__counters[ 'Lost' ] += len( batch )
+        self.__closeFile()
+        print 'Could not write to file %s: %s' % ( self._filename, x )
+      for flushEvent in flushEvents:
+        flushEvent.set()
+
+  def __getBatch( self, queue ):
+    """ Messages queued so far and flush requests """
+    batch = []
+    flushEvents = []
+    while queue:
+      item = queue.popleft()
+      if isinstance( item, Message ):
+        batch.append( item )
+      else:
+        flushEvents.append( item )
+    return batch, flushEvents
+
+  def __writeBatch( self, batch ):
+    if self.__reopen:
+      self.__reopen = False
+      self.__closeFile()
+    if self.__file and self.__rotationTime and time.time() - self.__openTime >= self.__rotationTime:
+      self.__rotate()
+    if not batch and not self.__droppedToReport:
+      return
+    if not self.__file:
+      self.__openFile()
+    lines = []
+    if self.__droppedToReport:
+      self.__countersLock.acquire()
+      try:
+        dropped = self.__droppedToReport
+        self.__droppedToReport = 0
+      finally:
+        self.__countersLock.release()
+      lines.append( "%s UTC AsyncFileBackend   WARN: %s messages dropped with a full queue\n" %
+                    ( Time.toString( Time.dateTime() ).split( '.' )[0], dropped ) )
+    for messageObject in batch:
+      lines.append( "%s\n" % self.composeString( messageObject ) )
+    self.__file.write( "".join( lines ) )
+    self.__file.flush()
+    self.__counters[ 'Written' ] += len( batch )
+    if self.__rotationSize and os.fstat( self.__file.fileno() ).st_size >= self.__rotationSize:
+      self.__rotate()
+
+  def __openFile( self ):
+    self.__file = open( self._filename, 'a' )
+    self.__openTime = time.time()
+
+  def __closeFile( self ):
+    if self.__file:
+      try:
+        self.__file.close()
+      except IOError:
+        pass
+      self.__file = None
+
+  def __rotate( self ):
+    """ FileName.N-1 -> FileName.N ... FileName -> FileName.1 """
+    self.__closeFile()
+    if self.__rotationBackups > 0:
+      for index in range( self.__rotationBackups - 1, 0, -1 ):
+        backupName = "%s.%s" % ( self._filename, index )
+        if os.path.exists( backupName ):
+          os.rename( backupName, "%s.%s" % ( self._filename, index + 1 ) )
+      if os.path.exists( self._filename ):
+        os.rename( self._filename, "%s.1" % self._filename )
+    else:
+      open( self._filename, 'w' ).close()
+    self.__counters[ 'Rotations' ] += 1
+    self.__openFile()
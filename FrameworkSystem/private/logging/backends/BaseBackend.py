@@ -18,9 +18,11 @@ class BaseBackend:
   def doMessage( self ):
     raise Exception( "This function MUST be overloaded!!" )
 
-  def getThreadId( self ):
+  def getThreadId( self, threadId = None ):
     rid = ""
-    thid = str( threading.current_thread().ident )
+    if threadId is None:
+      threadId = threading.current_thread().ident
+    thid = str( threadId )
     segments = []
     for iP in range( len( thid ) ):
       if iP % 4 == 0:
@@ -47,7 +49,8 @@ class BaseBackend:
     lines = []
     prefix = [ timeToShow, "UTC", messageName, "%s:" % messageObject.getLevel().rjust( 6 ) ]
     if self._optionsDictionary[ 'showThreads' ]:
-      prefix[2] += "[%s]" % self.getThreadId()
+      #The thread of the message, the backend may write it from another one
+      prefix[2] += "[%s]" % self.getThreadId( messageObject.threadId )
     prefix = " ".join( prefix )
     for lineString in messageObject.getMessage().split( "\n" ):
       lines.append( "%s %s" % ( prefix, lineString ) )
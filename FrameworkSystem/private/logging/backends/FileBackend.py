@@ -6,7 +6,7 @@ from DIRAC.FrameworkSystem.private.logging.backends.BaseBackend import BaseBacke
 
 class FileBackend( BaseBackend ):
   def __init__( self, optionsDictionary ):
-    super(FileBackend, self).__init__(optionsDictionary)
+    BaseBackend.__init__( self, optionsDictionary )
     self._backendName = "file"
     self._filename = optionsDictionary[ 'FileName' ]
 
@@ -2,6 +2,7 @@
 __RCSID__ = "$Id$"
 import os
 import os.path
+import math
 try:
   import hashlib as md5
 except:
@@ -9,11 +10,13 @@ except:
 from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceSection
 from DIRAC.FrameworkSystem.private.monitoring.ColorGenerator import ColorGenerator
+from DIRAC.FrameworkSystem.private.monitoring import TimeSeriesStore
 from DIRAC.Core.Utilities import Subprocess, Time
 
 class RRDManager:
 
   __sizesList = [ [ 200, 50 ], [ 400, 100 ], [ 600, 150 ], [ 800, 200 ] ]
+  __graphSizes = [ "small", "small", "normal", "large" ]
   __logRRDCommands = False
 
   def __init__( self, rrdLocation, graphLocation ):
@@ -23,7 +26,10 @@ class RRDManager:
     self.rrdLocation = rrdLocation
     self.graphLocation = graphLocation
     self.log = gLogger.getSubLogger( "RRDManager" )
-    self.rrdExec = gConfig.getValue( "%s/RRDExec" % getServiceSection( "Framework/Monitoring" ), "rrdtool" )
+    monitoringSection = getServiceSection( "Framework/Monitoring" )
+    self.rrdExec = gConfig.getValue( "%s/RRDExec" % monitoringSection, "rrdtool" )
+    #rrdtool forks rrdtool for each update and plot, native keeps the activities in TimeSeriesStore files
+    self.__native = gConfig.getValue( "%s/TimeSeriesEngine" % monitoringSection, "rrdtool" ) == "native"
     for path in ( self.rrdLocation, self.graphLocation ):
       try:
         os.makedirs( path )
@@ -31,8 +37,19 @@ class RRDManager:
         pass
 
   def existsRRDFile( self, rrdFile ):
+    return os.path.isfile( self.__getFilePath( rrdFile ) )
+
+  def __getFilePath( self, rrdFile ):
+    """
+    Path of the file of an activity, the TimeSeriesStore one replacing the .rrd extension
+    """
     rrdFilePath = "%s/%s" % ( self.rrdLocation, rrdFile )
-    return os.path.isfile( rrdFilePath )
+    if self.__native:
+      return "%s.ts" % os.path.splitext( rrdFilePath )[0]
+    return rrdFilePath
+
+  def __openStore( self, rrdFile ):
+    return TimeSeriesStore.openStore( self.__getFilePath( rrdFile ) )
 
   def getGraphLocation( self ):
     """
@@ -99,6 +116,8 @@ class RRDManager:
     elif type in ( 'sum', 'acum', 'rate' ):
       dst = "ABSOLUTE"
       cf = "AVERAGE"
+    if self.__native:
+      return self.__createStore( rrdFile, dst, cf, bucketLength )
     cmd += " DS:value:%s:%s:U:U" % ( dst, bucketLength * 10 )
     # 1m res for 1 month
     #cmd += " RRA:%s:0.9:1:43200" % cf
@@ -106,6 +125,20 @@ class RRDManager:
     cmd += " RRA:%s:0.999:1:%s" % ( cf, 31536000 / bucketLength )
     return self.__exec( cmd, rrdFilePath )
 
+  def __createStore( self, rrdFile, dst, cf, bucketLength ):
+    """
+    Create the TimeSeriesStore of an activity, with the buckets for 1 year and hours for 5 years
+    """
+    storePath = self.__getFilePath( rrdFile )
+    if os.path.isfile( storePath ):
+      return S_OK()
+    archives = [ ( cf, 0.999, 1, 31536000 / bucketLength ) ]
+    bucketsPerHour = 3600 / bucketLength
+    if bucketsPerHour > 1:
+      archives.append( ( cf, 0.999, bucketsPerHour, 5 * 8760 ) )
+    return TimeSeriesStore.createStore( storePath, bucketLength, dst, archives,
+                                        self.getCurrentBucketTime( bucketLength ) - 86400, bucketLength * 10 )
+
   def __getLastUpdateTime( self, rrdFile ):
     """
     Get last update time from an rrd
@@ -136,6 +169,8 @@ class RRDManager:
     """
     rrdFilePath = "%s/%s" % ( self.rrdLocation, rrdFile )
     self.log.info( "Updating rrd file", rrdFilePath )
+    if self.__native:
+      return self.__updateStore( rrdFile, bucketLength, valuesList )
     if lastUpdate == 0:
       retVal = self.__getLastUpdateTime( rrdFilePath )
       if retVal[ 'OK' ]:
@@ -157,6 +192,24 @@ class RRDManager:
         self.log.warn( "Error updating rrd file", "%s rrd: %s" % ( rrdFile, retVal[ 'Message' ] ) )
     return S_OK( valuesList[-1][0] )
 
+  def __updateStore( self, rrdFile, bucketLength, valuesList ):
+    """
+    Add marks to the TimeSeriesStore of an activity, which knows its last update
+    """
+    retVal = self.__openStore( rrdFile )
+    if not retVal[ 'OK' ]:
+      return retVal
+    store = retVal[ 'Value' ]
+    try:
+      #we have to fill with 0 the db to ensure the mean is valid
+      valuesList = self.__fillWithZeros( store.getLastUpdate(), bucketLength, valuesList )
+      retVal = store.update( valuesList )
+    finally:
+      store.close()
+    if not retVal[ 'OK' ]:
+      self.log.warn( "Error updating rrd file", "%s rrd: %s" % ( rrdFile, retVal[ 'Message' ] ) )
+    return S_OK( valuesList[-1][0] )
+
   def __generateName( self, *args, **kwargs ):
     """
     Generate a random name
@@ -199,6 +252,68 @@ class RRDManager:
     else:
       return float( timeSpan ) / expectedTimeSpan
 
+  def __getPlotData( self, activity, fromSecs, toSecs, plotWidth ):
+    """
+    Read the rows of an activity and consolidate them in at most plotWidth points,
+    the unknown ones counting as 0 as in the rrdtool graph definitions
+    """
+    retVal = self.__openStore( activity.getFile() )
+    if not retVal[ 'OK' ]:
+      return retVal
+    store = retVal[ 'Value' ]
+    try:
+      retVal = store.fetch( 'AVERAGE', fromSecs, toSecs )
+    finally:
+      store.close()
+    if not retVal[ 'OK' ]:
+      return retVal
+    firstTime, rowStep, rows = retVal[ 'Value' ]
+    rowsPerPoint = max( 1, int( math.ceil( float( toSecs - fromSecs ) / ( plotWidth * rowStep ) ) ) )
+    pointStep = rowsPerPoint * rowStep
+    activity.setBucketScaleFactor( float( pointStep ) / activity.getBucketLength() )
+    rrdType = activity.getType()
+    plotData = {}
+    acum = 0
+    #Rows are labelled by their end, the plot points by their start
+    pointTime = firstTime - rowStep
+    for value in TimeSeriesStore.consolidate( rows, rowsPerPoint ):
+      if rrdType in ( "sum", "acum" ):
+        value *= pointStep
+      if rrdType == "acum":
+        acum += value
+        value = acum
+      plotData[ pointTime ] = value
+      pointTime += pointStep
+    return S_OK( ( pointStep, plotData ) )
+
+  def __nativeGraph( self, graphFilename, fromSecs, toSecs, activitiesList, stackActivities, size, title ):
+    """
+    Plot the activities with the DIRAC graphs
+    """
+    from DIRAC.Core.Utilities.Graphs import lineGraph, curveGraph
+    graphData = {}
+    for activity in activitiesList:
+      retVal = self.__getPlotData( activity, fromSecs, toSecs, self.__sizesList[ size ][0] )
+      if not retVal[ 'OK' ]:
+        return retVal
+      pointStep, graphData[ activity.getLabel() ] = retVal[ 'Value' ]
+    metadata = { 'title' : title,
+                 'starttime' : fromSecs,
+                 'endtime' : toSecs,
+                 'span' : pointStep,
+                 'ylabel' : activitiesList[0].getUnit(),
+                 'graph_size' : self.__graphSizes[ size ] }
+    graphPath = "%s/%s" % ( self.graphLocation, graphFilename )
+    try:
+      if stackActivities:
+        lineGraph( graphData, graphPath, **metadata )
+      else:
+        curveGraph( graphData, graphPath, marker = '', **metadata )
+    except Exception, e:
+      self.log.exception( "Failed to generate graph %s" % graphFilename )
+      return S_ERROR( "Failed to generate graph: %s" % str( e ) )
+    return S_OK( graphFilename )
+
   def groupPlot( self, fromSecs, toSecs, activitiesList, stackActivities, size, graphFilename = "" ):
     """
     Generate a group plot
@@ -210,6 +325,10 @@ class RRDManager:
                                                     activitiesList,
                                                     stackActivities
                                                     )
+    activitiesList.sort()
+    if self.__native:
+      return self.__nativeGraph( graphFilename, fromSecs, toSecs, activitiesList, stackActivities, size,
+                                 activitiesList[ 0 ].getGroupLabel() )
     rrdCmd = "%s graph %s/%s" % ( self.rrdExec, self.graphLocation, graphFilename )
     rrdCmd += " -s %s" % fromSecs
     rrdCmd += " -e %s" % toSecs
@@ -217,7 +336,6 @@ class RRDManager:
     rrdCmd += " -h %s" % self.__sizesList[ size ][1]
     rrdCmd += " --title '%s'" % activitiesList[ 0 ].getGroupLabel()
     colorGen = ColorGenerator()
-    activitiesList.sort()
     for idActivity in range( len( activitiesList ) ):
       activity = activitiesList[ idActivity ]
       rrdCmd += " %s" % self.__generateRRDGraphVar( idActivity, activity, plotTimeSpan, self.__sizesList[ size ][0] )
@@ -242,6 +360,9 @@ class RRDManager:
                                                     activity,
                                                     stackActivities
                                                     )
+    if self.__native:
+      return self.__nativeGraph( graphFilename, fromSecs, toSecs, [ activity ], stackActivities, size,
+                                 activity.getLabel() )
     graphVar = self.__generateRRDGraphVar( 0, activity, plotTimeSpan, self.__sizesList[ size ][0] )
     rrdCmd = "%s graph %s/%s" % ( self.rrdExec, self.graphLocation, graphFilename )
     rrdCmd += " -s %s" % fromSecs
@@ -263,6 +384,6 @@ class RRDManager:
 
   def deleteRRD( self, rrdFile ):
     try:
-      os.unlink( "%s/%s" % ( self.rrdLocation, rrdFile ) )
+      os.unlink( self.__getFilePath( rrdFile ) )
     except Exception, e:
       self.log.error( "Could not delete rrd file %s: %s" % ( rrdFile, str( e ) ) )
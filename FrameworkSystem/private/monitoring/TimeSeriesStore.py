@@ -0,0 +1,317 @@
+# $HeadURL$
+__RCSID__ = "$Id$"
+"""
+  Round robin time series store, to keep the Monitoring activities without forking
+  rrdtool. Each activity has one fixed size file, memory mapped, made of
+
+    header    magic, step, last update, heartbeat, number of archives, data source type
+    archives  consolidation function, xff, PDPs per row, rows, last row and the row
+              being consolidated of each archive
+    data      the rows of each archive, as doubles, NaN being unknown
+
+  As in rrdtool, the updates give primary data points (PDP) of step seconds, GAUGE
+  values as such and ABSOLUTE ones divided by the seconds since the previous update,
+  unknown if more than heartbeat seconds passed. Each archive consolidates pdpPerRow
+  PDPs per row with AVERAGE, MIN, MAX or LAST, the row being unknown if more than xff
+  of its PDPs are. PDPs and rows are labelled by the end of their interval.
+
+  fetch returns the rows as an array of doubles, a numpy one if numpy is installed.
+"""
+import os
+import mmap
+import fcntl
+import struct
+from array import array
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+from DIRAC import S_OK, S_ERROR
+
+MAGIC = 'DTS1'
+# magic, step, last update, heartbeat, number of archives, data source type
+HEADER = '=4sIqII8s'
+# consolidation function, xff, PDPs per row, rows, last row, pending value, pending known PDPs
+ARCHIVE = '=8sdIIIdI'
+ROW = '=d'
+ROWSIZE = struct.calcsize( ROW )
+CONSOLIDATIONS = ( 'AVERAGE', 'MIN', 'MAX', 'LAST' )
+DSTYPES = ( 'GAUGE', 'ABSOLUTE' )
+NAN = float( 'nan' )
+
+def createStore( filePath, step, dsType, archives, start, heartbeat, rowsList = None ):
+  """
+  Create a store
+
+    :param int step: seconds of a PDP
+    :param str dsType: GAUGE or ABSOLUTE
+    :param list archives: ( consolidation function, xff, PDPs per row, rows ) of each archive
+    :param int start: last update time of the new store
+    :param int heartbeat: maximum seconds between updates for the PDPs to be known
+    :param list rowsList: initial rows of each archive, the oldest first, ending at start
+  """
+  if dsType not in DSTYPES:
+    return S_ERROR( "Unknown data source type %s" % dsType )
+  for cf, _xff, pdpPerRow, rows in archives:
+    if cf not in CONSOLIDATIONS or pdpPerRow < 1 or rows < 1:
+      return S_ERROR( "Invalid archive %s" % str( ( cf, pdpPerRow, rows ) ) )
+  if rowsList and [ len( rows ) for rows in rowsList ] != [ archive[3] for archive in archives ]:
+    return S_ERROR( "The initial rows do not match the archives" )
+  start = int( start )
+  start -= start % step
+  header = [ struct.pack( HEADER, MAGIC, step, start, heartbeat, len( archives ), dsType ) ]
+  for cf, xff, pdpPerRow, rows in archives:
+    header.append( struct.pack( ARCHIVE, cf, xff, pdpPerRow, rows, rows - 1, 0., 0 ) )
+  tmpPath = "%s.tmp" % filePath
+  try:
+    dirName = os.path.dirname( filePath )
+    if dirName and not os.path.isdir( dirName ):
+      os.makedirs( dirName )
+    storeFile = open( tmpPath, 'wb' )
+    try:
+      storeFile.write( "".join( header ) )
+      unknownRows = struct.pack( ROW, NAN ) * 65536
+      for index in range( len( archives ) ):
+        rows = archives[index][3]
+        if rowsList:
+          array( 'd', rowsList[index] ).tofile( storeFile )
+          continue
+        for _chunk in range( rows // 65536 ):
+          storeFile.write( unknownRows )
+        storeFile.write( unknownRows[ : ( rows % 65536 ) * ROWSIZE ] )
+    finally:
+      storeFile.close()
+    os.rename( tmpPath, filePath )
+  except ( IOError, OSError ), x:
+    return S_ERROR( "Cannot create %s: %s" % ( filePath, x ) )
+  return S_OK()
+
+def openStore( filePath ):
+  """ Open an existing store """
+  try:
+    return S_OK( TimeSeriesStore( filePath ) )
+  except ( IOError, OSError, ValueError, struct.error, mmap.error ), x:
+    return S_ERROR( "Cannot open %s: %s" % ( filePath, x ) )
+
+def consolidate( values, rowsPerPoint ):
+  """ Average of each rowsPerPoint values, the unknown ones counting as 0, as in the
+      Monitoring plots
+  """
+  if numpy is not None:
+    values = numpy.nan_to_num( numpy.asarray( values, dtype = float ) )
+    padding = -len( values ) % rowsPerPoint
+    if padding:
+      values = numpy.concatenate( ( values, numpy.zeros( padding ) ) )
+    return ( values.reshape( -1, rowsPerPoint ).sum( axis = 1 ) / rowsPerPoint ).tolist()
+  points = []
+  for index in range( 0, len( values ), rowsPerPoint ):
+    points.append( sum( [ value for value in values[ index : index + rowsPerPoint ] if value == value ] ) / float( rowsPerPoint ) )
+  return points
+
+def createStoreFromRRDDump( dumpFile, filePath ):
+  """
+  Create a store from the XML of rrdtool dump, with the same step, archives and rows.
+  Only the first data source is kept, the rows being consolidated are not imported.
+  """
+  from xml.etree import cElementTree
+  step = None
+  lastUpdate = None
+  dsType = None
+  heartbeat = None
+  archives = []
+  rowsList = []
+  try:
+    for _event, element in cElementTree.iterparse( dumpFile ):
+      if element.tag == 'step':
+        step = int( element.text )
+      elif element.tag == 'lastupdate':
+        lastUpdate = int( element.text )
+      elif element.tag == 'ds' and dsType is None and element.find( 'type' ) is not None:
+        dsType = element.findtext( 'type' ).strip()
+        heartbeat = int( element.findtext( 'minimal_heartbeat' ) )
+      elif element.tag == 'rra':
+        archive = ( element.findtext( 'cf' ).strip(),
+                    float( element.find( 'params' ).findtext( 'xff' ) ),
+                    int( element.findtext( 'pdp_per_row' ) ) )
+        rows = array( 'd', [ float( row.findtext( 'v' ) ) for row in element.find( 'database' ) ] )
+        archives.append( archive + ( len( rows ), ) )
+        rowsList.append( rows )
+        element.clear()
+  except ( SyntaxError, AttributeError, ValueError ), x:
+    return S_ERROR( "Cannot parse rrdtool dump %s: %s" % ( dumpFile, x ) )
+  if not step or lastUpdate is None or not dsType or not archives:
+    return S_ERROR( "Incomplete rrdtool dump %s" % dumpFile )
+  return createStore( filePath, step, dsType, archives, lastUpdate, heartbeat, rowsList )
+
+class TimeSeriesStore:
+
+  def __init__( self, filePath ):
+    self.filePath = filePath
+    self.__file = open( filePath, 'r+b' )
+    try:
+      self.__map = mmap.mmap( self.__file.fileno(), 0 )
+    except:
+      self.__file.close()
+      raise
+    self.__readHeader()
+
+  def close( self ):
+    self.__map.close()
+    self.__file.close()
+
+  def __readHeader( self ):
+    """ Read the header and the state of the archives, that another process may have updated """
+    magic, self.step, self.lastUpdate, self.heartbeat, numArchives, dsType = struct.unpack_from( HEADER, self.__map, 0 )
+    if magic != MAGIC:
+      raise ValueError( "not a time series store" )
+    self.dsType = dsType.rstrip( '\0' )
+    self.archives = []
+    offset = struct.calcsize( HEADER )
+    dataOffset = offset + numArchives * struct.calcsize( ARCHIVE )
+    for _index in range( numArchives ):
+      cf, xff, pdpPerRow, rows, lastRow, pendingValue, pendingKnown = struct.unpack_from( ARCHIVE, self.__map, offset )
+      self.archives.append( { 'CF' : cf.rstrip( '\0' ), 'XFF' : xff, 'PDPPerRow' : pdpPerRow, 'Rows' : rows,
+                              'LastRow' : lastRow, 'PendingValue' : pendingValue, 'PendingKnown' : pendingKnown,
+                              'Step' : self.step * pdpPerRow, 'Offset' : offset, 'DataOffset' : dataOffset } )
+      offset += struct.calcsize( ARCHIVE )
+      dataOffset += rows * ROWSIZE
+    if dataOffset > len( self.__map ):
+      raise ValueError( "truncated time series store" )
+
+  def __writeHeader( self ):
+    struct.pack_into( HEADER, self.__map, 0, MAGIC, self.step, self.lastUpdate, self.heartbeat,
+                      len( self.archives ), self.dsType )
+    for archive in self.archives:
+      struct.pack_into( ARCHIVE, self.__map, archive[ 'Offset' ], archive[ 'CF' ], archive[ 'XFF' ],
+                        archive[ 'PDPPerRow' ], archive[ 'Rows' ], archive[ 'LastRow' ],
+                        archive[ 'PendingValue' ], archive[ 'PendingKnown' ] )
+
+  def getLastUpdate( self ):
+    return self.lastUpdate
+
+  def getArchives( self ):
+    """ ( consolidation function, xff, PDPs per row, rows ) of each archive """
+    return [ ( archive[ 'CF' ], archive[ 'XFF' ], archive[ 'PDPPerRow' ], archive[ 'Rows' ] ) for archive in self.archives ]
+
+  def update( self, valuesList ):
+    """
+    Add ( time, value ) updates, sorted by time. The updates not after the last one are skipped.
+    Returns the number of skipped updates
+    """
+    fcntl.flock( self.__file.fileno(), fcntl.LOCK_EX )
+    try:
+      self.__readHeader()
+      skipped = 0
+      for updateTime, value in valuesList:
+        updateTime = int( updateTime )
+        updateTime -= updateTime % self.step
+        if updateTime <= self.lastUpdate:
+          skipped += 1
+          continue
+        interval = updateTime - self.lastUpdate
+        pdpValue = NAN
+        if value is not None and interval <= self.heartbeat:
+          pdpValue = float( value )
+          if self.dsType == 'ABSOLUTE':
+            pdpValue /= interval
+        self.__skipUnknownPDPs( updateTime )
+        for pdpTime in xrange( self.lastUpdate + self.step, updateTime + 1, self.step ):
+          self.__addPDP( pdpTime, pdpValue )
+        self.lastUpdate = updateTime
+      self.__writeHeader()
+    finally:
+      fcntl.flock( self.__file.fileno(), fcntl.LOCK_UN )
+    return S_OK( skipped )
+
+  def __skipUnknownPDPs( self, updateTime ):
+    """ After a long gap only the last PDPs, enough to rewrite all the rows, are added """
+    maxPDPs = max( [ archive[ 'PDPPerRow' ] * archive[ 'Rows' ] for archive in self.archives ] )
+    newLastUpdate = updateTime - ( maxPDPs + 1 ) * self.step
+    if newLastUpdate <= self.lastUpdate:
+      return
+    for archive in self.archives:
+      archive[ 'LastRow' ] = ( archive[ 'LastRow' ] + ( newLastUpdate // archive[ 'Step' ] -
+                                                         self.lastUpdate // archive[ 'Step' ] ) ) % archive[ 'Rows' ]
+      archive[ 'PendingKnown' ] = 0
+    self.lastUpdate = newLastUpdate
+
+  def __addPDP( self, pdpTime, value ):
+    for archive in self.archives:
+      if value == value:
+        if not archive[ 'PendingKnown' ]:
+          archive[ 'PendingValue' ] = value
+        elif archive[ 'CF' ] == 'AVERAGE':
+          archive[ 'PendingValue' ] += value
+        elif archive[ 'CF' ] == 'MIN':
+          archive[ 'PendingValue' ] = min( archive[ 'PendingValue' ], value )
+        elif archive[ 'CF' ] == 'MAX':
+          archive[ 'PendingValue' ] = max( archive[ 'PendingValue' ], value )
+        else:
+          archive[ 'PendingValue' ] = value
+        archive[ 'PendingKnown' ] += 1
+      if pdpTime % archive[ 'Step' ] == 0:
+        known = archive[ 'PendingKnown' ]
+        rowValue = NAN
+        if known and float( archive[ 'PDPPerRow' ] - known ) / archive[ 'PDPPerRow' ] <= archive[ 'XFF' ]:
+          rowValue = archive[ 'PendingValue' ]
+          if archive[ 'CF' ] == 'AVERAGE':
+            rowValue /= known
+        archive[ 'LastRow' ] = ( archive[ 'LastRow' ] + 1 ) % archive[ 'Rows' ]
+        struct.pack_into( ROW, self.__map, archive[ 'DataOffset' ] + archive[ 'LastRow' ] * ROWSIZE, rowValue )
+        archive[ 'PendingValue' ] = 0.
+        archive[ 'PendingKnown' ] = 0
+
+  def fetch( self, cf, fromSecs, toSecs, resolution = 0 ):
+    """
+    Rows of the finest archive of the consolidation function that goes back to fromSecs,
+    with a step of at least resolution seconds, or else of the one that goes back the most.
+    Returns ( time of the first row, step, rows ), unknown rows being NaN
+    """
+    self.__readHeader()
+    candidates = [ archive for archive in self.archives if archive[ 'CF' ] == cf ]
+    if not candidates:
+      return S_ERROR( "No %s archive in %s" % ( cf, self.filePath ) )
+    candidates.sort( key = lambda archive: archive[ 'Step' ] )
+    chosen = None
+    for archive in candidates:
+      if archive[ 'Step' ] >= resolution and self.__oldestRowTime( archive ) <= fromSecs:
+        chosen = archive
+        break
+    if not chosen:
+      chosen = min( candidates, key = self.__oldestRowTime )
+    rowStep = chosen[ 'Step' ]
+    firstTime = int( fromSecs ) - int( fromSecs ) % rowStep + rowStep
+    lastTime = max( firstTime, -( -int( toSecs ) // rowStep ) * rowStep )
+    numRows = ( lastTime - firstTime ) // rowStep + 1
+    if numpy is not None:
+      rows = numpy.empty( numRows )
+      rows.fill( NAN )
+    else:
+      rows = array( 'd', [ NAN ] ) * numRows
+    # Part of the requested rows that the archive has
+    lastRowTime = self.lastUpdate - self.lastUpdate % rowStep
+    fromTime = max( firstTime, self.__oldestRowTime( chosen ) )
+    toTime = min( lastTime, lastRowTime )
+    if fromTime <= toTime:
+      startRow = ( chosen[ 'LastRow' ] - ( lastRowTime - fromTime ) // rowStep ) % chosen[ 'Rows' ]
+      position = ( fromTime - firstTime ) // rowStep
+      count = ( toTime - fromTime ) // rowStep + 1
+      while count:
+        chunk = min( count, chosen[ 'Rows' ] - startRow )
+        rows[ position : position + chunk ] = self.__readRows( chosen, startRow, chunk )
+        position += chunk
+        count -= chunk
+        startRow = 0
+    return S_OK( ( firstTime, rowStep, rows ) )
+
+  def __oldestRowTime( self, archive ):
+    lastRowTime = self.lastUpdate - self.lastUpdate % archive[ 'Step' ]
+    return lastRowTime - ( archive[ 'Rows' ] - 1 ) * archive[ 'Step' ]
+
+  def __readRows( self, archive, startRow, count ):
+    offset = archive[ 'DataOffset' ] + startRow * ROWSIZE
+    if numpy is not None:
+      return numpy.frombuffer( self.__map, dtype = numpy.float64, count = count, offset = offset )
+    return array( 'd', self.__map[ offset : offset + count * ROWSIZE ] )
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+########################################################################
+# $HeadURL$
+########################################################################
+""" Convert the rrd files of the Monitoring service to the files of the native
+    TimeSeriesEngine, by means of rrdtool dump
+"""
+__RCSID__ = "$Id$"
+import os
+import tempfile
+import DIRAC
+from DIRAC.Core.Base import Script
+
+Script.registerSwitch( "o", "overwrite", "Convert again the rrd files that already have a native file" )
+Script.registerSwitch( "R:", "rrdtool=", "rrdtool executable (default rrdtool)" )
+Script.setUsageMessage( '\n'.join( [ __doc__.split( '\n' )[1],
+                                     'Usage:',
+                                     '  %s [option|cfgfile] ... RRDDir' % Script.scriptName,
+                                     'Arguments:',
+                                     '  RRDDir:   rrd directory of the Monitoring service (DataLocation/rrd)' ] ) )
+Script.parseCommandLine( ignoreErrors = True )
+args = Script.getPositionalArgs()
+if len( args ) != 1:
+  Script.showHelp()
+
+overwrite = False
+rrdExec = "rrdtool"
+for unprocSw in Script.getUnprocessedSwitches():
+  if unprocSw[0] in ( "o", "overwrite" ):
+    overwrite = True
+  elif unprocSw[0] in ( "R", "rrdtool" ):
+    rrdExec = unprocSw[1]
+
+from DIRAC import gLogger
+from DIRAC.Core.Utilities import Subprocess
+from DIRAC.FrameworkSystem.private.monitoring.TimeSeriesStore import createStoreFromRRDDump
+
+converted = 0
+errors = 0
+fd, dumpFile = tempfile.mkstemp( suffix = ".xml" )
+os.close( fd )
+try:
+  for dirPath, dirNames, fileNames in os.walk( args[0] ):
+    for fileName in fileNames:
+      if not fileName.endswith( ".rrd" ):
+        continue
+      rrdFile = os.path.join( dirPath, fileName )
+      storeFile = "%s.ts" % rrdFile[:-4]
+      if os.path.exists( storeFile ) and not overwrite:
+        continue
+      result = Subprocess.shellCall( 0, "%s dump '%s' > '%s'" % ( rrdExec, rrdFile, dumpFile ) )
+      if result[ 'OK' ] and result[ 'Value' ][0]:
+        result = DIRAC.S_ERROR( result[ 'Value' ][2] )
+      if result[ 'OK' ]:
+        result = createStoreFromRRDDump( dumpFile, storeFile )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot convert %s" % rrdFile, result[ 'Message' ] )
+        errors += 1
+        continue
+      converted += 1
+finally:
+  os.unlink( dumpFile )
+
+gLogger.notice( "%s rrd files converted, %s errors" % ( converted, errors ) )
+DIRAC.exit( errors and 1 or 0 )
@@ -0,0 +1,98 @@
+########################################################################
+# $HeadURL $
+# File: AsyncFileBackendTests.py
+########################################################################
+
+""" :mod: AsyncFileBackendTests
+    ===========================
+
+    .. module: AsyncFileBackendTests
+    :synopsis: unit tests for AsyncFileBackend
+
+    unit tests for the asynchronous file log backend
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import signal
+import shutil
+import tempfile
+import unittest
+## from DIRAC
+from DIRAC.Core.Utilities import Time
+from DIRAC.FrameworkSystem.private.logging.Message import Message
+## SUT
+from DIRAC.FrameworkSystem.private.logging.backends.AsyncFileBackend import AsyncFileBackend
+
+def makeMessage( level, text, *varArgs ):
+  """ message as built by the Logger """
+  return Message( "Test", level, Time.dateTime(), text, "%s" if varArgs else "", "", variableArgs = varArgs )
+
+########################################################################
+class AsyncFileBackendTestCase( unittest.TestCase ):
+  """
+  .. class:: AsyncFileBackendTestCase
+
+  """
+
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.fileName = os.path.join( self.workDir, 'test.log' )
+    self.options = { 'showHeaders' : True, 'showThreads' : False, 'Color' : False, 'FileName' : self.fileName }
+
+  def tearDown( self ):
+    shutil.rmtree( self.workDir )
+
+  def readLines( self, fileName = None ):
+    logFile = open( fileName or self.fileName )
+    lines = logFile.read().splitlines()
+    logFile.close()
+    return lines
+
+  def test01write( self ):
+    """ batches written on flush, lazy arguments formatted by the writer """
+    backend = AsyncFileBackend( dict( self.options, FlushTime = '60' ) )
+    for index in range( 150 ):
+      backend.doMessage( makeMessage( 'INFO', 'message', index ) )
+    backend.flush()
+    lines = self.readLines()
+    self.assertEqual( len( lines ), 150 )
+    self.assertEqual( lines[-1].endswith( 'Test   INFO: message 149' ), True )
+    self.assertEqual( backend.getCounters()['Written'], 150 )
+
+  def test02rotation( self ):
+    """ rotation on size and reopening on SIGHUP """
+    backend = AsyncFileBackend( dict( self.options, RotationSize = '0.001', RotationBackups = '2' ) )
+    for index in range( 100 ):
+      backend.doMessage( makeMessage( 'NOTICE', 'message', index ) )
+      backend.flush()
+    self.assertEqual( sorted( os.listdir( self.workDir ) ), [ 'test.log', 'test.log.1', 'test.log.2' ] )
+    self.assertEqual( backend.getCounters()['Rotations'] > 2, True )
+    os.rename( self.fileName, self.fileName + '.old' )
+    os.kill( os.getpid(), signal.SIGHUP )
+    backend.doMessage( makeMessage( 'NOTICE', 'after HUP' ) )
+    backend.flush()
+    self.assertEqual( len( self.readLines() ), 1 )
+
+  def test03drop( self ):
+    """ messages up to DropLevel dropped when the queue is full """
+    backend = AsyncFileBackend( dict( self.options, QueueSize = '10', DropLevel = 'VERBOSE' ) )
+    for index in range( 1000 ):
+      backend.doMessage( makeMessage( 'DEBUG', 'debug', index ) )
+      backend.doMessage( makeMessage( 'ERROR', 'error', index ) )
+    backend.flush()
+    counters = backend.getCounters()
+    lines = self.readLines()
+    self.assertEqual( len( [ line for line in lines if 'ERROR: error' in line ] ), 1000 )
+    self.assertEqual( counters['Written'] + counters['Dropped'], 2000 )
+    self.assertEqual( counters['DroppedByLevel'].keys(), [ 'DEBUG' ] )
+    if counters['Dropped']:
+      self.assertEqual( 'messages dropped with a full queue' in "\n".join( lines ), True )
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( AsyncFileBackendTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -0,0 +1,59 @@
+# $HeadURL$
+__RCSID__ = "$Id$"
+"""
+  Time to log messages to a file with the file backend, which opens and closes the
+  file for each message, and with the asyncfile one, as seen by the caller and until
+  all the messages are written. Usage:
+
+    python FileBackendBenchmark.py [ numMessages ]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from DIRAC.Core.Utilities import Time
+from DIRAC.FrameworkSystem.private.logging.Message import Message
+from DIRAC.FrameworkSystem.private.logging.backends.FileBackend import FileBackend
+from DIRAC.FrameworkSystem.private.logging.backends.AsyncFileBackend import AsyncFileBackend
+
+def timeBackend( backendClass, fileName, numMessages ):
+  """ ( seconds in doMessage, seconds until written ) """
+  backend = backendClass( { 'showHeaders' : True, 'showThreads' : False, 'Color' : False,
+                            'FileName' : fileName, 'QueueSize' : numMessages } )
+  messages = [ Message( "Matcher", "INFO", Time.dateTime(), "Extracted job", "%s from TQ %s", "",
+                        variableArgs = ( jobId, 56 ) ) for jobId in xrange( numMessages ) ]
+  start = time.time()
+  for messageObject in messages:
+    backend.doMessage( messageObject )
+  callerTime = time.time() - start
+  backend.flush()
+  totalTime = time.time() - start
+  logFile = open( fileName )
+  numLines = len( logFile.readlines() )
+  logFile.close()
+  if numLines != numMessages:
+    print "ERROR: %s lines written instead of %s" % ( numLines, numMessages )
+    sys.exit( 1 )
+  return callerTime, totalTime
+
+if __name__ == "__main__":
+  numMessages = 100000
+  if len( sys.argv ) > 1:
+    numMessages = int( sys.argv[1] )
+
+  workDir = tempfile.mkdtemp()
+  try:
+    timings = []
+    for backendName, backendClass in ( ( 'file', FileBackend ), ( 'asyncfile', AsyncFileBackend ) ):
+      callerTime, totalTime = timeBackend( backendClass, os.path.join( workDir, '%s.log' % backendName ), numMessages )
+      timings.append( ( backendName, callerTime, totalTime ) )
+  finally:
+    shutil.rmtree( workDir )
+
+  print "%d messages" % numMessages
+  print "%-10s %18s %18s" % ( "backend", "caller (us/msg)", "written (us/msg)" )
+  for backendName, callerTime, totalTime in timings:
+    print "%-10s %18.2f %18.2f" % ( backendName, callerTime * 1e6 / numMessages, totalTime * 1e6 / numMessages )
@@ -0,0 +1,54 @@
+# $HeadURL$
+__RCSID__ = "$Id$"
+"""
+  Cost per call of the gLogger and of a sub logger for messages that are not shown
+  (verbose and debug at the NOTICE level) and for shown ones, with the variable
+  message formatted by the caller or given as lazy arguments. The shown messages
+  are printed to /dev/null. Usage:
+
+    python LoggerBenchmark.py [ numCalls ]
+"""
+
+import os
+import sys
+import time
+
+from DIRAC import gLogger
+
+def timeCalls( numCalls, logMethod, lazy ):
+  """ seconds per call """
+  jobId = 1234
+  tqId = 56
+  start = time.time()
+  if lazy:
+    for _i in xrange( numCalls ):
+      logMethod( "Trying to extract job", "%s from TQ %s", jobId, tqId )
+  else:
+    for _i in xrange( numCalls ):
+      logMethod( "Trying to extract job", "%s from TQ %s" % ( jobId, tqId ) )
+  return ( time.time() - start ) / numCalls
+
+if __name__ == "__main__":
+  numCalls = 100000
+  if len( sys.argv ) > 1:
+    numCalls = int( sys.argv[1] )
+
+  gLogger.setLevel( 'NOTICE' )
+  subLogger = gLogger.getSubLogger( 'Benchmark' )
+  timings = []
+  for loggerName, logger in ( ( 'gLogger', gLogger ), ( 'subLogger', subLogger ) ):
+    for methodName in ( 'debug', 'verbose', 'notice' ):
+      stdout = sys.stdout
+      sys.stdout = open( os.devnull, 'w' )
+      try:
+        eagerTime = timeCalls( numCalls, getattr( logger, methodName ), False )
+        lazyTime = timeCalls( numCalls, getattr( logger, methodName ), True )
+      finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+      timings.append( ( loggerName, methodName, gLogger.shown( methodName ), eagerTime, lazyTime ) )
+
+  print "%d calls per case, level NOTICE" % numCalls
+  print "%-10s %-8s %6s %14s %14s" % ( "logger", "method", "shown", "eager (us)", "lazy (us)" )
+  for loggerName, methodName, shown, eagerTime, lazyTime in timings:
+    print "%-10s %-8s %6s %14.2f %14.2f" % ( loggerName, methodName, shown, eagerTime * 1e6, lazyTime * 1e6 )
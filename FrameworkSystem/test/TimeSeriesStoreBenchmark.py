@@ -0,0 +1,77 @@
+# $HeadURL$
+__RCSID__ = "$Id$"
+"""
+  Time to add marks to an activity and to read a year of it with the native
+  TimeSeriesStore, and with rrdtool when it is in the PATH, as done by the Monitoring
+  service: one update per commit of marks and one fetch per plot. Usage:
+
+    python TimeSeriesStoreBenchmark.py [ numUpdates ]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from DIRAC.Core.Utilities import Subprocess
+from DIRAC.FrameworkSystem.private.monitoring.TimeSeriesStore import createStore, openStore
+
+BUCKET = 60
+YEAR = 31536000
+
+def timeNative( workDir, start, numUpdates ):
+  """ ( seconds per update, seconds per fetch ) """
+  storePath = os.path.join( workDir, 'activity.ts' )
+  createStore( storePath, BUCKET, 'ABSOLUTE', [ ( 'AVERAGE', 0.999, 1, YEAR / BUCKET ),
+                                                ( 'AVERAGE', 0.999, 3600 / BUCKET, 5 * 8760 ) ], start, BUCKET * 10 )
+  begin = time.time()
+  for index in range( 1, numUpdates + 1 ):
+    result = openStore( storePath )
+    store = result[ 'Value' ]
+    store.update( [ ( start + index * BUCKET, index ) ] )
+    store.close()
+  updateTime = ( time.time() - begin ) / numUpdates
+  begin = time.time()
+  store = openStore( storePath )[ 'Value' ]
+  store.fetch( 'AVERAGE', start + numUpdates * BUCKET - YEAR, start + numUpdates * BUCKET )
+  store.close()
+  return updateTime, time.time() - begin
+
+def timeRRDTool( workDir, start, numUpdates ):
+  """ ( seconds per update, seconds per fetch ), None without rrdtool """
+  rrdPath = os.path.join( workDir, 'activity.rrd' )
+  result = Subprocess.shellCall( 0, "rrdtool create %s --start %s --step %s DS:value:ABSOLUTE:%s:U:U RRA:AVERAGE:0.999:1:%s" %
+                                    ( rrdPath, start, BUCKET, BUCKET * 10, YEAR / BUCKET ) )
+  if not result[ 'OK' ] or result[ 'Value' ][0]:
+    return None
+  begin = time.time()
+  for index in range( 1, numUpdates + 1 ):
+    Subprocess.shellCall( 0, "rrdtool update %s %s:%s" % ( rrdPath, start + index * BUCKET, index ) )
+  updateTime = ( time.time() - begin ) / numUpdates
+  begin = time.time()
+  Subprocess.shellCall( 0, "rrdtool fetch %s AVERAGE -s %s -e %s" % ( rrdPath, start + numUpdates * BUCKET - YEAR,
+                                                                      start + numUpdates * BUCKET ) )
+  return updateTime, time.time() - begin
+
+if __name__ == "__main__":
+  numUpdates = 1000
+  if len( sys.argv ) > 1:
+    numUpdates = int( sys.argv[1] )
+
+  start = int( time.time() ) - YEAR
+  start -= start % BUCKET
+  workDir = tempfile.mkdtemp()
+  try:
+    timings = [ ( 'native', timeNative( workDir, start, numUpdates ) ),
+                ( 'rrdtool', timeRRDTool( workDir, start, numUpdates ) ) ]
+  finally:
+    shutil.rmtree( workDir )
+
+  print "%d updates, fetch of one year" % numUpdates
+  print "%-10s %16s %16s" % ( "engine", "update (us)", "fetch (ms)" )
+  for engineName, timing in timings:
+    if not timing:
+      print "%-10s %16s %16s" % ( engineName, "n/a", "n/a" )
+      continue
+    print "%-10s %16.1f %16.1f" % ( engineName, timing[0] * 1e6, timing[1] * 1e3 )
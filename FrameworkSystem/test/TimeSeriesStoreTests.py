@@ -0,0 +1,144 @@
+########################################################################
+# $HeadURL $
+# File: TimeSeriesStoreTests.py
+########################################################################
+
+""" :mod: TimeSeriesStoreTests
+    ==========================
+
+    .. module: TimeSeriesStoreTests
+    :synopsis: unit tests for TimeSeriesStore
+
+    unit tests for the round robin time series store of the Monitoring
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import shutil
+import tempfile
+import unittest
+## SUT
+from DIRAC.FrameworkSystem.private.monitoring.TimeSeriesStore import createStore, openStore, \
+     consolidate, createStoreFromRRDDump
+
+RRDDUMP = """<?xml version="1.0" encoding="utf-8"?>
+<rrd>
+  <version>0003</version>
+  <step>60</step> <!-- Seconds -->
+  <lastupdate>6000</lastupdate> <!-- 1970-01-01 01:40:00 UTC -->
+  <ds>
+    <name> value </name>
+    <type> ABSOLUTE </type>
+    <minimal_heartbeat>600</minimal_heartbeat>
+    <min>NaN</min>
+    <max>NaN</max>
+    <last_ds>UNKN</last_ds>
+    <value>0.0000000000e+00</value>
+    <unknown_sec> 0 </unknown_sec>
+  </ds>
+  <!-- Round Robin Archives -->
+  <rra>
+    <cf>AVERAGE</cf>
+    <pdp_per_row>1</pdp_per_row> <!-- 60 seconds -->
+    <params>
+    <xff>9.9900000000e-01</xff>
+    </params>
+    <cdp_prep>
+      <ds>
+      <primary_value>0.0000000000e+00</primary_value>
+      <secondary_value>0.0000000000e+00</secondary_value>
+      <value>NaN</value>
+      <unknown_datapoints>0</unknown_datapoints>
+      </ds>
+    </cdp_prep>
+    <database>
+      <!-- 1970-01-01 01:37:00 UTC / 5820 --> <row><v>NaN</v></row>
+      <!-- 1970-01-01 01:38:00 UTC / 5880 --> <row><v>1.0000000000e+00</v></row>
+      <!-- 1970-01-01 01:39:00 UTC / 5940 --> <row><v>2.0000000000e+00</v></row>
+      <!-- 1970-01-01 01:40:00 UTC / 6000 --> <row><v>3.0000000000e+00</v></row>
+    </database>
+  </rra>
+</rrd>
+"""
+
+########################################################################
+class TimeSeriesStoreTestCase( unittest.TestCase ):
+  """
+  .. class:: TimeSeriesStoreTestCase
+
+  """
+
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.storePath = os.path.join( self.workDir, 'ab', 'activity.ts' )
+
+  def tearDown( self ):
+    shutil.rmtree( self.workDir )
+
+  def openStore( self ):
+    result = openStore( self.storePath )
+    self.assertEqual( result['OK'], True )
+    return result['Value']
+
+  def test01update( self ):
+    """ ABSOLUTE values per second, consolidation, wrapping and skipped updates """
+    result = createStore( self.storePath, 60, 'ABSOLUTE', [ ( 'AVERAGE', 0.5, 1, 10 ), ( 'MAX', 0.5, 5, 4 ) ], 6000, 600 )
+    self.assertEqual( result['OK'], True )
+    store = self.openStore()
+    result = store.update( [ ( 6000 + 60 * index, 60 * index ) for index in range( 1, 16 ) ] + [ ( 6000, 1 ) ] )
+    self.assertEqual( result['Value'], 1 )
+    self.assertEqual( store.getLastUpdate(), 6900 )
+    store.close()
+
+    store = self.openStore()
+    start, step, rows = store.fetch( 'AVERAGE', 6300, 6900 )['Value']
+    self.assertEqual( ( start, step ), ( 6360, 60 ) )
+    self.assertEqual( list( rows ), [ float( index ) for index in range( 6, 16 ) ] )
+    start, step, rows = store.fetch( 'MAX', 5000, 6900 )['Value']
+    self.assertEqual( ( start, step ), ( 5100, 300 ) )
+    values = list( rows )
+    self.assertEqual( [ value for value in values[:-3] if value == value ], [] )
+    self.assertEqual( values[-3:], [ 5., 10., 15. ] )
+    self.assertEqual( store.fetch( 'MIN', 6000, 6900 )['OK'], False )
+    store.close()
+
+  def test02gaps( self ):
+    """ updates after more than heartbeat seconds unknown, long gaps skipped """
+    createStore( self.storePath, 60, 'GAUGE', [ ( 'AVERAGE', 0.5, 1, 5 ) ], 0, 120 )
+    store = self.openStore()
+    store.update( [ ( 60, 1 ), ( 240, 2 ), ( 300, 3 ) ] )
+    values = list( store.fetch( 'AVERAGE', 0, 300 )['Value'][2] )
+    self.assertEqual( values[0], 1. )
+    self.assertEqual( [ value == value for value in values[1:4] ], [ False ] * 3 )
+    self.assertEqual( values[4], 3. )
+    store.update( [ ( 6000000, 4 ), ( 6000060, 5 ) ] )
+    values = list( store.fetch( 'AVERAGE', 6000000 - 240, 6000060 )['Value'][2] )
+    self.assertEqual( [ value == value for value in values ], [ False ] * 4 + [ True ] )
+    self.assertEqual( values[-1], 5. )
+    self.assertEqual( consolidate( [ 1., float( 'nan' ), 3., 4., 5. ], 2 ), [ 0.5, 3.5, 2.5 ] )
+    store.close()
+
+  def test03rrdDump( self ):
+    """ store created from rrdtool dump """
+    dumpPath = os.path.join( self.workDir, 'dump.xml' )
+    dumpFile = open( dumpPath, 'w' )
+    dumpFile.write( RRDDUMP )
+    dumpFile.close()
+    result = createStoreFromRRDDump( dumpPath, self.storePath )
+    self.assertEqual( result['OK'], True )
+    store = self.openStore()
+    self.assertEqual( store.getArchives(), [ ( 'AVERAGE', 0.999, 1, 4 ) ] )
+    start, step, rows = store.fetch( 'AVERAGE', 5820, 6000 )['Value']
+    self.assertEqual( ( start, step ), ( 5880, 60 ) )
+    self.assertEqual( list( rows ), [ 1., 2., 3. ] )
+    store.update( [ ( 6060, 240 ) ] )
+    self.assertEqual( list( store.fetch( 'AVERAGE', 5880, 6060 )['Value'][2] ), [ 2., 3., 4. ] )
+    store.close()
+
+## test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( TimeSeriesStoreTestCase )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -12,6 +12,12 @@
     .. moduleauthor:: Krzysztof.Ciba@NOSPAMgmail.com
 
     request processing agent
+
+    In the pipelined mode (Pipelined = True) the requests are not fetched and queued cycle
+    by cycle: a prefetch thread keeps up to PrefetchSize requests assigned to the agent,
+    a dispatch thread queues them in the ProcessPool as soon as a worker slot is released
+    by the callbacks, and the long-lived workers keep their clients and operation handlers
+    from one request to the next.
 """
 
 __RCSID__ = '$Id$'
@@ -23,6 +29,8 @@ __RCSID__ = '$Id$'
 # @brief Definition of RequestExecutingAgent class.
 # # imports
 import time
+import threading
+import Queue
 # # from DIRAC
 from DIRAC import gMonitor, S_OK, S_ERROR, gConfig
 from DIRAC.Core.Base.AgentModule import AgentModule
@@ -79,6 +87,10 @@ class RequestExecutingAgent( AgentModule ):
   __requestClient = None
   # # Size of the bulk if use of getRequests. If 0, use getRequest
   __bulkRequest = 0
+  # # pipelined mode: prefetch and dispatch threads instead of the execute loop
+  __pipelined = False
+  # # requests prefetched in pipelined mode
+  __prefetchSize = 20
 
   def __init__( self, *args, **kwargs ):
     """ c'tor """
@@ -101,6 +113,11 @@ class RequestExecutingAgent( AgentModule ):
     self.log.info( "ProcessTask timeout = %d seconds" % self.__taskTimeout )
     self.__bulkRequest = self.am_getOption( "BulkRequest", 0 )
     self.log.info( "Bulk request size = %d" % self.__bulkRequest )
+    self.__pipelined = self.am_getOption( "Pipelined", self.__pipelined )
+    self.log.info( "Pipelined mode = %s" % self.__pipelined )
+    self.__prefetchSize = max( 1, int( self.am_getOption( "PrefetchSize", self.__prefetchSize ) ) )
+    if self.__pipelined:
+      self.log.info( "Prefetch size = %d" % self.__prefetchSize )
 
     # # keep config path and agent name
     self.agentName = self.am_getModuleParam( "fullName" )
@@ -153,6 +170,15 @@ class RequestExecutingAgent( AgentModule ):
     # # create request dict
     self.__requestCache = dict()
 
+    # # pipelined mode: prefetched requests, free room in the prefetch queue and free ProcessPool slots
+    self.__prefetchQueue = Queue.Queue()
+    self.__prefetchSlots = threading.Semaphore( self.__prefetchSize )
+    self.__poolSlots = threading.Semaphore( max( self.__minProcess, self.__maxProcess ) + abs( self.__queueSize ) )
+    # # wakes up the prefetch thread waiting for new requests
+    self.__wakeUp = threading.Event()
+    self.__stopPipeline = threading.Event()
+    self.__pipelineThreads = []
+
     self.FTSMode = self.am_getOption( "FTSMode", False )
 
 
@@ -170,7 +196,9 @@ class RequestExecutingAgent( AgentModule ):
                                         maxProcess,
                                         queueSize,
                                         poolCallback = self.resultCallback,
-                                        poolExceptionCallback = self.exceptionCallback )
+                                        poolExceptionCallback = self.exceptionCallback,
+                                        # # free slots are known from the callbacks in pipelined mode
+                                        throttle = 0 if self.__pipelined else 0.1 )
       self.__processPool.daemonize()
     return self.__processPool
 
@@ -235,6 +263,8 @@ class RequestExecutingAgent( AgentModule ):
   def execute( self ):
     """ read requests from RequestClient and enqueue them into ProcessPool """
     gMonitor.addMark( "Iteration", 1 )
+    if self.__pipelined:
+      return self.__executePipelined()
     # # requests (and so tasks) counter
     taskCounter = 0
     while taskCounter < self.__requestsPerCycle:
@@ -321,6 +351,131 @@ class RequestExecutingAgent( AgentModule ):
     # # clean return
     return S_OK()
 
+  def __executePipelined( self ):
+    """ start the prefetch and dispatch threads on the first cycle, wake up the prefetching at each one """
+    if not self.__pipelineThreads:
+      self.processPool()
+      for target in ( self.__prefetch, self.__dispatch ):
+        thread = threading.Thread( target = target )
+        thread.setDaemon( 1 )
+        thread.start()
+        self.__pipelineThreads.append( thread )
+    self.log.info( "execute: %d requests prefetched, %d requests being executed" % ( self.__prefetchQueue.qsize(),
+                                                                                     len( self.__requestCache ) ) )
+    self.__wakeUp.set()
+    return S_OK()
+
+  def __fetchRequests( self, numberOfRequests ):
+    """ get up to :numberOfRequests: requests from the RequestClient
+
+    :return: list of Request instances
+    """
+    if not self.__bulkRequest:
+      getRequest = self.requestClient().getRequest()
+      if not getRequest["OK"]:
+        self.log.error( "prefetch: %s" % getRequest["Message"] )
+        return []
+      return [ getRequest["Value"] ] if getRequest["Value"] else []
+    getRequests = self.requestClient().getBulkRequests( numberOfRequests )
+    if not getRequests["OK"]:
+      self.log.error( "prefetch: %s" % getRequests["Message"] )
+      return []
+    if not getRequests["Value"]:
+      return []
+    for rId in getRequests["Value"]["Failed"]:
+      self.log.error( "prefetch: %s" % getRequests["Value"]["Failed"][rId] )
+    return getRequests["Value"]["Successful"].values()
+
+  def __prefetch( self ):
+    """ prefetch thread target: keep the prefetch queue filled with requests """
+    while not self.__stopPipeline.is_set():
+      # # wait for room in the queue, then take as much as a bulk can get
+      self.__prefetchSlots.acquire()
+      slots = 1
+      while slots < self.__bulkRequest and self.__prefetchSlots.acquire( False ):
+        slots += 1
+      if self.__stopPipeline.is_set():
+        return
+      self.__wakeUp.clear()
+      try:
+        requests = self.__fetchRequests( slots )
+      except Exception, error:
+        self.log.exception( "prefetch: %s" % str( error ), lException = error )
+        requests = []
+      for request in requests:
+        self.__prefetchQueue.put( request )
+      for _slot in range( slots - len( requests ) ):
+        self.__prefetchSlots.release()
+      if len( requests ) < slots:
+        self.log.verbose( "prefetch: no more 'Waiting' requests to process" )
+        # # until the next cycle
+        self.__wakeUp.wait( self.am_getPollingTime() )
+
+  def __dispatch( self ):
+    """ dispatch thread target: queue the prefetched requests into ProcessPool as soon as a slot is free """
+    while True:
+      self.__poolSlots.acquire()
+      request = self.__prefetchQueue.get()
+      if request is None:
+        return
+      self.__prefetchSlots.release()
+      if self.__stopPipeline.is_set():
+        self.requestClient().putRequest( request )
+        return
+      try:
+        enqueue = self.__queueRequest( request )
+      except Exception, error:
+        self.log.exception( "dispatch: %s" % str( error ), lException = error )
+        enqueue = S_ERROR( str( error ) )
+      if not enqueue["OK"]:
+        self.log.error( "dispatch: %s" % enqueue["Message"] )
+        self.__poolSlots.release()
+
+  def __queueRequest( self, request ):
+    """ cache :request: and queue its task into ProcessPool, without waiting """
+    cacheRequest = self.cacheRequest( request )
+    if not cacheRequest["OK"]:
+      return cacheRequest
+    requestJSON = request.toJSON()
+    if not requestJSON["OK"]:
+      self.putRequest( request.RequestName )
+      return S_ERROR( "JSON serialization error: %s" % requestJSON["Message"] )
+    self.log.info( "spawning task for request '%s'" % request.RequestName )
+    enqueue = self.processPool().createAndQueueTask( RequestTask,
+                                                     kwargs = { "requestJSON" : requestJSON["Value"],
+                                                                "handlersDict" : self.handlersDict,
+                                                                "csPath" : self.__configPath,
+                                                                "agentName": self.agentName,
+                                                                "keepWarm" : True },
+                                                     taskID = request.RequestName,
+                                                     blocking = True,
+                                                     usePoolCallbacks = True,
+                                                     timeOut = self.getTimeout( request ) )
+    if not enqueue["OK"]:
+      self.putRequest( request.RequestName )
+      return enqueue
+    gMonitor.addMark( "Processed", 1 )
+    return S_OK()
+
+  def __stopPipelineThreads( self ):
+    """ stop the prefetch and dispatch threads and put back the prefetched requests """
+    self.__stopPipeline.set()
+    self.__wakeUp.set()
+    self.__prefetchSlots.release()
+    self.__poolSlots.release()
+    self.__prefetchQueue.put( None )
+    for thread in self.__pipelineThreads:
+      thread.join( 60 )
+    while True:
+      try:
+        request = self.__prefetchQueue.get( False )
+      except Queue.Empty:
+        break
+      if request:
+        reset = self.requestClient().putRequest( request )
+        if not reset["OK"]:
+          self.log.error( "unable to reset request %s: %s" % ( request.RequestName, reset["Message"] ) )
+
   def getTimeout( self, request ):
     """ get timeout for request """
     timeout = 0
@@ -338,6 +493,8 @@ class RequestExecutingAgent( AgentModule ):
 
   def finalize( self ):
     """ agent finalization """
+    if self.__pipelineThreads:
+      self.__stopPipelineThreads()
     if self.__processPool:
       self.processPool().finalize( timeout = self.__poolTimeout )
     self.putAllRequests()
@@ -351,6 +508,8 @@ class RequestExecutingAgent( AgentModule ):
     """
     # # clean cache
     res = self.putRequest( taskID, taskResult )
+    if self.__pipelined:
+      self.__poolSlots.release()
     self.log.info( "callback: %s result is %s(%s), put %s(%s)" % ( taskID,
                                                       "S_OK" if taskResult["OK"] else "S_ERROR",
                                                       taskResult["Value"].Status if taskResult["OK"] else taskResult["Message"],
@@ -366,3 +525,5 @@ class RequestExecutingAgent( AgentModule ):
     """
     self.log.error( "exceptionCallback: %s was hit by exception %s" % ( taskID, taskException ) )
     self.putRequest( taskID )
+    if self.__pipelined:
+      self.__poolSlots.release()
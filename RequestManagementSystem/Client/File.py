@@ -268,6 +268,42 @@ class File( Record ):
       query.append( " VALUES %s;\n" % values )
     return S_OK( "".join( query ) )
 
+  @classmethod
+  def bulkSQL( cls, files ):
+    """ get multi-row statements putting :files: of one or several operations at once: an INSERT for
+        the new ones and an INSERT ... ON DUPLICATE KEY UPDATE for the existing ones, which as in toSQL
+        leaves their empty columns untouched. The files of an operation not yet in the db get its
+        OperationID from its RequestID and Order
+
+    :param list files: File instances
+    :return: S_OK( [ query ] )
+    """
+    columns = [ column for column in cls.tableDesc()["Fields"] if column != "FileID" ]
+    newRows = []
+    existingRows = []
+    for opFile in files:
+      if not opFile._parent:
+        raise AttributeError( "File does not belong to any Operation" )
+      row = []
+      for column in columns:
+        value = getattr( opFile, column )
+        if column == "OperationID" and not value:
+          row.append( "(SELECT `OperationID` FROM `Operation` WHERE `RequestID`=%d AND `Order`=%d)" % \
+                      ( opFile._parent.RequestID, opFile._parent.Order ) )
+        elif column == "Error" or value:
+          row.append( cls._sqlValue( value ) )
+        else:
+          row.append( "NULL" if opFile.FileID else "DEFAULT" )
+      if opFile.FileID:
+        existingRows.append( [ str( opFile.FileID ) ] + row )
+      else:
+        newRows.append( row )
+    queries = cls._multiRowSQL( "File", columns, newRows )
+    onDuplicate = [ "`%s`=IFNULL(VALUES(`%s`),`%s`)" % ( column, column, column )
+                    for column in columns if column != "Error" ] + [ "`Error`=VALUES(`Error`)" ]
+    queries += cls._multiRowSQL( "File", [ "FileID" ] + columns, existingRows, onDuplicate )
+    return S_OK( queries )
+
   def toJSON( self ):
     """ get json """
     digest = dict( [( key, str( getattr( self, key ) ) if getattr( self, key ) else '' ) for key in self.__data__] )
@@ -435,6 +435,28 @@ class Operation( Record ):
 
     return S_OK( "".join( query ) )
 
+  @classmethod
+  def bulkInsertSQL( cls, operations ):
+    """ get a multi-row INSERT statement for new :operations:
+
+    :param list operations: Operation instances not yet in the db
+    :return: S_OK( [ query ] )
+    """
+    columns = [ column for column in cls.tableDesc()["Fields"]
+                if column not in ( "OperationID", "LastUpdate", "Order" ) ]
+    rows = []
+    for operation in operations:
+      if not operation._parent or not operation.RequestID:
+        raise AttributeError( "RequestID not set" )
+      if operation.OperationID:
+        raise AttributeError( "Operation %s is already in the db" % operation.OperationID )
+      row = []
+      for column in columns:
+        value = getattr( operation, column )
+        row.append( cls._sqlValue( value ) if column == "Error" or value else "DEFAULT" )
+      rows.append( row + [ "UTC_TIMESTAMP()", str( operation.Order ) ] )
+    return S_OK( cls._multiRowSQL( "Operation", columns + [ "LastUpdate", "Order" ], rows ) )
+
   def cleanUpSQL( self ):
     """ query deleting dirty records from File table """
     if self.OperationID and self.__dirty:
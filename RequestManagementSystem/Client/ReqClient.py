@@ -113,6 +113,49 @@ class ReqClient( Client ):
     errorsDict["Message"] = "ReqClient.putRequest: unable to set request '%s'" % request.RequestName
     return errorsDict
 
+  def putRequests( self, requests ):
+    """ put several requests to RequestManager in one call, the requests that could not
+    be set there are put one by one, so that they can still go to the RequestProxies
+
+    :param self: self reference
+    :param list requests: Request instances
+    :return: S_OK( { "Successful" : { requestName : requestID }, "Failed" : { requestName : errorMessage } } )
+    """
+    successful = {}
+    failed = {}
+    requestsDict = {}
+    requestJSONList = []
+    for request in requests:
+      valid = self.requestValidator().validate( request )
+      if not valid["OK"]:
+        self.log.error( "putRequests: request not valid", "%s" % valid["Message"] )
+        failed[request.RequestName] = valid["Message"]
+        continue
+      requestJSON = request.toJSON()
+      if not requestJSON["OK"]:
+        failed[request.RequestName] = requestJSON["Message"]
+        continue
+      requestsDict[request.RequestName] = request
+      requestJSONList.append( requestJSON["Value"] )
+    if requestJSONList:
+      setRequestsMgr = self.requestManager().putRequests( requestJSONList )
+      if setRequestsMgr["OK"]:
+        successful.update( setRequestsMgr["Value"]["Successful"] )
+        retry = setRequestsMgr["Value"]["Failed"].keys()
+      else:
+        self.log.warn( "putRequests: unable to set requests at RequestManager", setRequestsMgr["Message"] )
+        retry = requestsDict.keys()
+      for requestName in retry:
+        if requestName not in requestsDict:
+          failed[requestName] = setRequestsMgr["Value"]["Failed"][requestName]
+          continue
+        putRequest = self.putRequest( requestsDict[requestName] )
+        if putRequest["OK"]:
+          successful[requestName] = putRequest["Value"]
+        else:
+          failed[requestName] = putRequest["Message"]
+    return S_OK( { "Successful" : successful, "Failed" : failed } )
+
   def getRequest( self, requestName = None ):
     """ get request from RequestDB
 
@@ -157,99 +157,157 @@ class RequestDB( DB ):
     return S_OK( ReqID )
 
   def putRequest( self, request ):
-    """ update or insert request into db
+    """ update or insert request into db, the whole request tree in a single transaction
 
     :param Request request: Request instance
     """
-    query = "SELECT `RequestID`, `Status` from `Request` WHERE `RequestName` = '%s'" % request.RequestName
-    ret = self._transaction( query )
-    if not ret["OK"]:
-      self.log.error( "putRequest: %s" % ret["Message"] )
-      return ret
+    getCursorAndConnection = self.dictCursor()
+    if not getCursorAndConnection["OK"]:
+      self.log.error( "putRequest: %s" % getCursorAndConnection["Message"] )
+      return getCursorAndConnection
+    connection, cursor = getCursorAndConnection["Value"]
+    try:
+      putRequest = self.__putRequestTransaction( connection, cursor, request )
+    finally:
+      cursor.close()
+    if not putRequest["OK"]:
+      self.log.error( "putRequest: %s" % putRequest["Message"] )
+    return putRequest
 
-    reqValues = ret["Value"].get( query )
+  def putRequests( self, requests ):
+    """ update or insert several requests into db over a single connection, each in its own transaction
 
-    if reqValues:
-      existingReqID = reqValues[0].get( "RequestID" )
-      status = reqValues[0].get( "Status" )
-    else:
-      existingReqID = None
-      status = None
+    :param list requests: Request instances
+    :return: S_OK( { "Successful" : { requestName : requestID }, "Failed" : { requestName : errorMessage } } )
+    """
+    successful = {}
+    failed = {}
+    if not requests:
+      return S_OK( { "Successful" : successful, "Failed" : failed } )
+    getCursorAndConnection = self.dictCursor()
+    if not getCursorAndConnection["OK"]:
+      self.log.error( "putRequests: %s" % getCursorAndConnection["Message"] )
+      return getCursorAndConnection
+    connection, cursor = getCursorAndConnection["Value"]
+    try:
+      for request in requests:
+        putRequest = self.__putRequestTransaction( connection, cursor, request )
+        if putRequest["OK"]:
+          successful[request.RequestName] = putRequest["Value"]
+        else:
+          self.log.error( "putRequests: %s" % putRequest["Message"] )
+          failed[request.RequestName] = putRequest["Message"]
+    finally:
+      cursor.close()
+    return S_OK( { "Successful" : successful, "Failed" : failed } )
 
+  def __putRequestTransaction( self, connection, cursor, request ):
+    """ put :request: in a transaction, rolled back with the IDs set in the request if anything fails """
+    requestID = request.RequestID
+    operationIDs = [ ( operation, operation.OperationID, [ ( opFile, opFile.FileID ) for opFile in operation ] )
+                     for operation in request ]
+    connection.autocommit( False )
+    try:
+      try:
+        putRequest = self.__putRequest( cursor, request )
+        if putRequest["OK"]:
+          connection.commit()
+        else:
+          connection.rollback()
+      except MySQLdbError, error:
+        self.log.exception( error )
+        connection.rollback()
+        putRequest = S_ERROR( str( error ) )
+      except Exception, error:
+        self.log.exception( "putRequest: %s" % str( error ), lException = error )
+        connection.rollback()
+        putRequest = S_ERROR( "unable to put request '%s': %s" % ( request.RequestName, str( error ) ) )
+    finally:
+      connection.autocommit( True )
+    if not putRequest["OK"]:
+      request.RequestID = requestID
+      for operation, operationID, fileIDs in operationIDs:
+        operation.OperationID = operationID
+        for opFile, fileID in fileIDs:
+          opFile.FileID = fileID
+    return putRequest
+
+  def __putRequest( self, cursor, request ):
+    """ write the whole request tree with :cursor:, the transaction is committed by the caller:
+        the request, the updated operations one by one, the new operations and all the files with
+        multi-row statements, then the new OperationIDs and FileIDs are read back at once
+
+    :return: S_OK( requestID ) or S_ERROR
+    """
+    cursor.execute( "SELECT `RequestID`, `Status` FROM `Request` WHERE `RequestName` = '%s' FOR UPDATE;" % \
+                    request.RequestName )
+    reqValues = cursor.fetchall()
+    existingReqID = reqValues[0]["RequestID"] if reqValues else None
     if existingReqID and existingReqID != request.RequestID:
       return S_ERROR( "putRequest: request '%s' already exists in the db (RequestID=%s)"\
                        % ( request.RequestName, existingReqID ) )
-
-    if status == 'Canceled':
+    if reqValues and reqValues[0]["Status"] == "Canceled":
       self.log.info( "Request %s was canceled, don't put it back" % request.RequestName )
       return S_OK( request.RequestID )
 
     reqSQL = request.toSQL()
     if not reqSQL["OK"]:
       return reqSQL
-    reqSQL = reqSQL["Value"]
-    putRequest = self._transaction( reqSQL )
-    if not putRequest["OK"]:
-      self.log.error( "putRequest: %s" % putRequest["Message"] )
-      return putRequest
-    lastrowid = putRequest["lastrowid"]
-    putRequest = putRequest["Value"]
-
-    cleanUp = request.cleanUpSQL()
-    if cleanUp:
-      dirty = self._transaction( cleanUp )
-      if not dirty["OK"]:
-        self.log.error( "putRequest: unable to delete dirty Operation records: %s" % dirty["Message"] )
-        return dirty
-
-    # # flag for a new request
-    isNew = False
-    # # set RequestID when necessary
-    if request.RequestID == 0:
-      isNew = True
-      request.RequestID = lastrowid
+    cursor.execute( reqSQL["Value"] )
+    if not request.RequestID:
+      request.RequestID = cursor.lastrowid
+    for cleanUp in request.cleanUpSQL() or []:
+      cursor.execute( cleanUp )
 
+    newOperations = []
     for operation in request:
-
       cleanUp = operation.cleanUpSQL()
       if cleanUp:
-        dirty = self._transaction( [ cleanUp ] )
-        if not dirty["OK"]:
-          self.log.error( "putRequest: unable to delete dirty File records: %s" % dirty["Message"] )
-          return dirty
-
-      opSQL = operation.toSQL()["Value"]
-      putOperation = self._transaction( opSQL )
-      if not putOperation["OK"]:
-        self.log.error( "putRequest: unable to put operation %d: %s" % ( request.indexOf( operation ),
-                                                                         putOperation["Message"] ) )
-        if isNew:
-          deleteRequest = self.deleteRequest( request.RequestName )
-          if not deleteRequest["OK"]:
-            self.log.error( "putRequest: unable to delete request '%s': %s"\
-                             % ( request.RequestName, deleteRequest["Message"] ) )
-            return deleteRequest
-        return putOperation
-      lastrowid = putOperation["lastrowid"]
-      putOperation = putOperation["Value"]
-      if operation.OperationID == 0:
-        operation.OperationID = lastrowid
-      filesToSQL = [ opFile.toSQL()["Value"] for opFile in operation ]
-      if filesToSQL:
-        putFiles = self._transaction( filesToSQL )
-        if not putFiles["OK"]:
-          self.log.error( "putRequest: unable to put files for operation %d: %s" % ( request.indexOf( operation ),
-                                                                                    putFiles["Message"] ) )
-          if isNew:
-            deleteRequest = self.deleteRequest( request.requestName )
-            if not deleteRequest["OK"]:
-              self.log.error( "putRequest: unable to delete request '%s': %s"\
-                              % ( request.RequestName, deleteRequest["Message"] ) )
-              return deleteRequest
-          return putFiles
+        cursor.execute( cleanUp )
+      if operation.OperationID:
+        cursor.execute( operation.toSQL()["Value"] )
+      else:
+        newOperations.append( operation )
+    if newOperations:
+      for query in Operation.bulkInsertSQL( newOperations )["Value"]:
+        cursor.execute( query )
+
+    files = [ opFile for operation in request for opFile in operation ]
+    for query in File.bulkSQL( files )["Value"]:
+      cursor.execute( query )
 
+    if newOperations or [ opFile for opFile in files if not opFile.FileID ]:
+      self.__backFillIDs( cursor, request )
     return S_OK( request.RequestID )
 
+  def __backFillIDs( self, cursor, request ):
+    """ set the IDs of the operations and files just inserted, with a single query: the operations are
+        identified by their Order, the new files of an operation by their insertion order
+    """
+    cursor.execute( "SELECT o.`OperationID`, o.`Order`, f.`FileID` FROM `Operation` o "\
+                    "LEFT JOIN `File` f ON f.`OperationID` = o.`OperationID` "\
+                    "WHERE o.`RequestID` = %d ORDER BY o.`Order`, f.`FileID`;" % request.RequestID )
+    operationIDs = {}
+    fileIDs = {}
+    for row in cursor.fetchall():
+      operationIDs[row["Order"]] = row["OperationID"]
+      if row["FileID"]:
+        fileIDs.setdefault( row["Order"], [] ).append( row["FileID"] )
+    for operation in request:
+      if not operation.OperationID:
+        operation.OperationID = operationIDs.get( operation.Order, 0 )
+      newFiles = [ opFile for opFile in operation if not opFile.FileID ]
+      if not newFiles:
+        continue
+      knownIDs = set( [ opFile.FileID for opFile in operation if opFile.FileID ] )
+      newIDs = [ fileID for fileID in fileIDs.get( operation.Order, [] ) if fileID not in knownIDs ]
+      if len( newIDs ) != len( newFiles ):
+        self.log.warn( "putRequest: %d new files in the db for %d in operation %s of request %s, FileIDs not set" % \
+                       ( len( newIDs ), len( newFiles ), operation.Order, request.RequestName ) )
+        continue
+      for opFile, fileID in zip( newFiles, newIDs ):
+        opFile.FileID = fileID
+
   def getScheduledRequest( self, operationID ):
     """ read scheduled request given its FTS operationID """
     query = "SELECT `Request`.`RequestName` FROM `Request` JOIN `Operation` ON "\
@@ -85,6 +85,43 @@ class ReqManagerHandler( RequestHandler ):
     :param cls: class ref
     :param str requestJSON: request serialized to JSON format
     """
+    request = cls.__prepareRequest( requestJSON )
+    if not request["OK"]:
+      return request
+    request = request["Value"]
+    gLogger.info( "putRequest: Attempting to set request '%s'" % request.RequestName )
+    return cls.__requestDB.putRequest( request )
+
+  types_putRequests = [ ListType ]
+  @classmethod
+  def export_putRequests( cls, requestJSONList ):
+    """ put several requests into RequestDB at once
+
+    :param cls: class ref
+    :param list requestJSONList: requests serialized to JSON format
+    :return: S_OK( { "Successful" : { requestName : requestID }, "Failed" : { requestName : errorMessage } } )
+    """
+    failed = {}
+    requests = []
+    for requestJSON in requestJSONList:
+      request = cls.__prepareRequest( requestJSON )
+      if not request["OK"]:
+        failed[requestJSON.get( "RequestName", "***UNKNOWN***" )] = request["Message"]
+      else:
+        requests.append( request["Value"] )
+    gLogger.info( "putRequests: Attempting to set %d requests" % len( requests ) )
+    putRequests = cls.__requestDB.putRequests( requests )
+    if not putRequests["OK"]:
+      return putRequests
+    putRequests["Value"]["Failed"].update( failed )
+    return putRequests
+
+  @classmethod
+  def __prepareRequest( cls, requestJSON ):
+    """ build, optimize and validate the request to put
+
+    :return: S_OK( Request ) or S_ERROR
+    """
     requestName = requestJSON.get( "RequestName", "***UNKNOWN***" )
     request = Request( requestJSON )
     requestID = request.RequestID
@@ -105,9 +142,7 @@ class ReqManagerHandler( RequestHandler ):
     if not valid["OK"]:
       gLogger.error( "putRequest: request %s not valid: %s" % ( requestName, valid["Message"] ) )
       return valid
-    requestName = request.RequestName
-    gLogger.info( "putRequest: Attempting to set request '%s'" % requestName )
-    return cls.__requestDB.putRequest( request )
+    return S_OK( request )
 
   types_getScheduledRequest = [ ( IntType, LongType ) ]
   @classmethod
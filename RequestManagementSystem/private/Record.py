@@ -24,6 +24,7 @@ __RCSID__ = "$Id $"
 # @brief Definition of Record class.
 
 # # imports
+import datetime
 from DIRAC import gLogger
 
 ########################################################################
@@ -78,3 +79,32 @@ class Record( object ):
     """ remove ' and cut  """
     return str( aStr ).replace( "'", "" )[:lenght] if aStr else ""
 
+  @staticmethod
+  def _sqlValue( value ):
+    """ SQL literal for a column value, as written by toSQL """
+    if value is None:
+      return "NULL"
+    if type( value ) in ( str, datetime.datetime ):
+      return "'%s'" % value
+    return str( value )
+
+  @staticmethod
+  def _multiRowSQL( table, columns, rows, onDuplicate = None, chunkSize = 1000 ):
+    """ multi-row INSERT statements for :rows: (lists of SQL literals), :chunkSize: rows at most each
+
+    :param str table: table name
+    :param list columns: column names
+    :param list rows: one list of literals per row
+    :param list onDuplicate: "`column`=expression" assignments for ON DUPLICATE KEY UPDATE
+    :return: list of queries
+    """
+    queries = []
+    for start in range( 0, len( rows ), chunkSize ):
+      query = [ "INSERT INTO `%s` (%s) VALUES " % ( table, ",".join( [ "`%s`" % column for column in columns ] ) ) ]
+      query.append( ",".join( [ "(%s)" % ",".join( row ) for row in rows[start:start + chunkSize] ] ) )
+      if onDuplicate:
+        query.append( " ON DUPLICATE KEY UPDATE %s" % ", ".join( onDuplicate ) )
+      query.append( ";\n" )
+      queries.append( "".join( query ) )
+    return queries
+
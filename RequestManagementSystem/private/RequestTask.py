@@ -31,6 +31,7 @@ from DIRAC.FrameworkSystem.Client.ProxyManagerClient import gProxyManager
 from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.DISET.RPCClient import RPCClient
+from DIRAC.Core.DISET.private.ConnectionPool import getGlobalConnectionPool
 from DIRAC.Core.Security import CS
 
 ########################################################################
@@ -40,13 +41,20 @@ class RequestTask( object ):
 
   request's processing task
   """
+  # # clients, handlers and shifter proxies of the current process, kept across the tasks
+  # # with keepWarm when the worker processes are long-lived
+  __warmCache = {}
+  # # shifter proxies are set up again after this many seconds
+  __shifterProxiesLifetime = 600
 
-  def __init__( self, requestJSON, handlersDict, csPath, agentName, standalone = False ):
+  def __init__( self, requestJSON, handlersDict, csPath, agentName, standalone = False, keepWarm = False ):
     """c'tor
 
     :param self: self reference
     :param str requestJSON: request serialized to JSON
     :param dict opHandlers: operation handlers
+    :param bool keepWarm: reuse the clients, handlers and shifter proxies of the previous tasks
+                          executed in this process
     """
     self.request = Request( requestJSON )
     # # csPath
@@ -57,10 +65,20 @@ class RequestTask( object ):
     self.standalone = standalone
     # # handlers dict
     self.handlersDict = handlersDict
-    # # handlers class def
-    self.handlers = {}
+    # # keep warm flag
+    self.keepWarm = keepWarm
     # # own sublogger
     self.log = gLogger.getSubLogger( "pid_%s/%s" % ( os.getpid(), self.request.RequestName ) )
+
+    warmCache = self.__getWarmCache() if keepWarm else {}
+    if warmCache.get( "RequestClient" ):
+      # # same process as a previous task, all set already
+      self.handlers = warmCache["Handlers"]
+      self.requestClient = warmCache["RequestClient"]
+      return
+
+    # # handlers class def
+    self.handlers = {}
     # # get shifters info
     self.__managersDict = {}
     shifterProxies = self.__setupManagerProxies()
@@ -82,6 +100,31 @@ class RequestTask( object ):
 
     self.requestClient = ReqClient()
 
+    if keepWarm:
+      warmCache.update( { "Handlers" : self.handlers,
+                          "RequestClient" : self.requestClient,
+                          "ManagersDict" : self.__managersDict,
+                          "ManagersTime" : time.time() if shifterProxies["OK"] else 0 } )
+
+  @classmethod
+  def __getWarmCache( cls ):
+    """ get the cache of the current process, a forked process does not reuse the one of its parent """
+    if cls.__warmCache.get( "PID" ) != os.getpid():
+      cls.__warmCache = { "PID" : os.getpid() }
+    return cls.__warmCache
+
+  def __setupWarmManagerProxies( self ):
+    """ setup grid proxy for all defined managers, reusing the ones of the previous tasks while valid """
+    warmCache = self.__getWarmCache()
+    if time.time() - warmCache.get( "ManagersTime", 0 ) < self.__shifterProxiesLifetime:
+      self.__managersDict = warmCache["ManagersDict"]
+      return S_OK()
+    self.__managersDict = {}
+    shifterProxies = self.__setupManagerProxies()
+    warmCache["ManagersDict"] = self.__managersDict
+    warmCache["ManagersTime"] = time.time() if shifterProxies["OK"] else 0
+    return shifterProxies
+
   def __setupManagerProxies( self ):
     """ setup grid proxy for all defined managers """
     oHelper = Operations()
@@ -133,8 +176,11 @@ class RequestTask( object ):
 
     :return: S_OK with name of newly created owner proxy file and shifter name if any
     """
-    self.__managersDict = {}
-    shifterProxies = self.__setupManagerProxies()
+    if self.keepWarm:
+      shifterProxies = self.__setupWarmManagerProxies()
+    else:
+      self.__managersDict = {}
+      shifterProxies = self.__setupManagerProxies()
     if not shifterProxies["OK"]:
       self.log.error( shifterProxies["Message"] )
 
@@ -336,6 +382,10 @@ class RequestTask( object ):
     # # not a shifter at all? delete temp proxy file
     if not shifter:
       os.unlink( proxyFile )
+      # # the warm clients are used by the next tasks with other owners, so don't leave them
+      # # idle connections authenticated with this proxy
+      if self.keepWarm:
+        getGlobalConnectionPool().clear()
 
     gMonitor.flush()
 
@@ -253,6 +253,39 @@ class OperationTests( unittest.TestCase ):
                       "DELETE FROM `File` WHERE `OperationID` = 1 AND `FileID` IN (1,2);\n",
                       "cleanUp failed after JSON" )
 
+  def test06bulkSQL( self ):
+    """ multi-row inserts of operations and files """
+    request = Request()
+    request.RequestName = "testRequest"
+    request.RequestID = 1
+    operation = Operation()
+    operation.Type = "ReplicateAndRegister"
+    operation.addFile( File( { "LFN" : "/a/b/c", "Size" : 1 } ) )
+    operation.addFile( File( { "LFN" : "/a/b/d", "FileID" : 2 } ) )
+
+    # # no parent request set
+    self.assertRaises( AttributeError, Operation.bulkInsertSQL, [ operation ] )
+
+    request.addOperation( operation )
+    bulkSQL = Operation.bulkInsertSQL( [ operation ] )
+    self.assertEqual( bulkSQL["OK"], True, "bulkInsertSQL error" )
+    self.assertEqual( len( bulkSQL["Value"] ), 1, "one INSERT expected" )
+    self.assertEqual( bulkSQL["Value"][0].startswith( "INSERT INTO `Operation`" ), True, "wrong table" )
+
+    # # one INSERT for the new file, one INSERT ... ON DUPLICATE KEY UPDATE for the existing one
+    bulkSQL = File.bulkSQL( list( operation ) )
+    self.assertEqual( bulkSQL["OK"], True, "bulkSQL error" )
+    self.assertEqual( len( bulkSQL["Value"] ), 2, "two INSERTs expected" )
+    newFiles, existingFiles = bulkSQL["Value"]
+    self.assertEqual( "ON DUPLICATE KEY UPDATE" in newFiles, False, "new file updated" )
+    self.assertEqual( "ON DUPLICATE KEY UPDATE" in existingFiles, True, "existing file not updated" )
+    self.assertEqual( "WHERE `RequestID`=1 AND `Order`=0" in newFiles, True, "OperationID not from Order" )
+
+    # # OperationID set, used for the files
+    operation.OperationID = 3
+    self.assertRaises( AttributeError, Operation.bulkInsertSQL, [ operation ] )
+    self.assertEqual( "SELECT" in File.bulkSQL( list( operation ) )["Value"][0], False, "OperationID not used" )
+
 
 
 
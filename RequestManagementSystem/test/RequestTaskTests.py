@@ -20,7 +20,10 @@ __RCSID__ = "$Id $"
 # @date 2013/03/27 15:59:40
 # @brief Definition of RequestTaskTests class.
 # # imports
+import os
+import tempfile
 import unittest
+from contextlib import nested
 from mock import *
 # # SUT
 from DIRAC.RequestManagementSystem.private.RequestTask import RequestTask
@@ -31,6 +34,8 @@ RequestClient = Mock(spec=RequestClient)
 # # from DIRAC
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.Core.DISET.private.BaseClient import BaseClient
+from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 
 ########################################################################
 class RequestTaskTests( unittest.TestCase ):
@@ -66,9 +71,119 @@ class RequestTaskTests( unittest.TestCase ):
     self.assertEqual( ret["OK"], True , "call failed")
 
 
+########################################################################
+class OwnerCheckHandler( object ):
+  """
+  .. class:: OwnerCheckHandler
+
+  fake operation handler kept warm across the tasks, recording with which proxy
+  and connection pool key its client would talk to the services
+  """
+
+  def __init__( self ):
+    """ c'tor """
+    self.client = BaseClient( "dips://server.example.org:9140/RequestManagement/ReqManager",
+                              useCertificates = False, reuseConnections = True )
+    self.operation = None
+    self.shifter = []
+    self.calls = []
+
+  def setOperation( self, operation ):
+    """ operation setter """
+    self.operation = operation
+
+  def __call__( self ):
+    """ execute: record the credentials in use """
+    self.calls.append( ( os.environ["X509_USER_PROXY"], self.client._BaseClient__getConnectionPoolKey() ) )
+    self.operation.Status = "Done"
+    return { "OK" : True, "Value" : None }
+
+########################################################################
+class RequestTaskKeepWarmTests( unittest.TestCase ):
+  """
+  .. class:: RequestTaskKeepWarmTests
+
+  requests of different owners executed one after the other in the same worker process
+  """
+
+  def setUp( self ):
+    """ test case set up """
+    RequestTask._RequestTask__warmCache = {}
+    self.proxyFiles = {}
+    self.handler = None
+
+  def tearDown( self ):
+    """ test case tear down """
+    RequestTask._RequestTask__warmCache = {}
+    for proxyFile in self.proxyFiles.values():
+      if os.path.exists( proxyFile ):
+        os.unlink( proxyFile )
+
+  def __downloadVOMSProxy( self, ownerDN, ownerGroup ):
+    """ fake ProxyManager download, each owner proxy is dumped to its own file """
+    def dumpAllToFile():
+      fd, proxyFile = tempfile.mkstemp()
+      os.write( fd, ownerDN )
+      os.close( fd )
+      self.proxyFiles[ownerDN] = proxyFile
+      return { "OK" : True, "Value" : proxyFile }
+    chain = Mock()
+    chain.dumpAllToFile = dumpAllToFile
+    return { "OK" : True, "Value" : chain }
+
+  def __newRequest( self, name, ownerDN ):
+    """ request with one ForwardDISET operation """
+    req = Request()
+    req.RequestName = name
+    req.OwnerDN = ownerDN
+    req.OwnerGroup = "dirac_user"
+    req.addOperation( Operation( { "Type" : "ForwardDISET", "Arguments" : "tts10:helloWorldee" } ) )
+    return req.toJSON()["Value"]
+
+  def testTwoOwnersSameWorker( self ):
+    """ warm clients never use the connections of the previous owner """
+    handlersDict = { "ForwardDISET" : "DIRAC/RequestManagementSystem/private/ForwardDISET" }
+    module = "DIRAC.RequestManagementSystem.private.RequestTask"
+    operations = Mock()
+    operations.return_value.getSections.return_value = { "OK" : True, "Value" : [] }
+    proxyManager = Mock()
+    proxyManager.downloadVOMSProxy.side_effect = self.__downloadVOMSProxy
+    connectionPool = Mock()
+    with nested( patch( "%s.Operations" % module, operations ),
+                 patch( "%s.gProxyManager" % module, proxyManager ),
+                 patch( "%s.gMonitor" % module ),
+                 patch( "%s.ReqClient" % module ),
+                 patch( "%s.getGlobalConnectionPool" % module, Mock( return_value = connectionPool ) ),
+                 patch.dict( gProtocolDict["dips"], { "sanity" : lambda urlTuple, kwargs : { "OK" : True,
+                                                                                             "Value" : {} } } ) ):
+      owners = ( "/DC=org/CN=Alice", "/DC=org/CN=Bob" )
+      handlers = []
+      for i, ownerDN in enumerate( owners ):
+        task = RequestTask( self.__newRequest( "request%s" % i, ownerDN ), handlersDict,
+                            "Systems/RequestManagement/Agents/RequestExecutingAgent", "RequestExecutingAgent",
+                            keepWarm = True )
+        if not task.handlers:
+          task.handlers["ForwardDISET"] = OwnerCheckHandler()
+        handlers.append( task.handlers["ForwardDISET"] )
+        ret = task()
+        self.assertEqual( ret["OK"], True )
+        self.assertEqual( task.request.Status, "Done" )
+        # # the owner proxy file is gone and so are the connections authenticated with it
+        self.assertEqual( os.path.exists( self.proxyFiles[ownerDN] ), False )
+        self.assertEqual( connectionPool.clear.call_count, i + 1 )
+
+    # # same warm handler and client, but each owner's own proxy and pool key
+    self.assertEqual( handlers[0] is handlers[1], True )
+    calls = handlers[0].calls
+    self.assertEqual( len( calls ), 2 )
+    self.assertEqual( [ call[0] for call in calls ],
+                      [ os.path.realpath( self.proxyFiles[ownerDN] ) for ownerDN in owners ] )
+    self.assertNotEqual( calls[0][1], calls[1][1] )
+
 # # tests execution
 if __name__ == "__main__":
   testLoader = unittest.TestLoader()
   requestTaskTests = testLoader.loadTestsFromTestCase( RequestTaskTests )
-  suite = unittest.TestSuite( [ requestTaskTests ] )
+  keepWarmTests = testLoader.loadTestsFromTestCase( RequestTaskKeepWarmTests )
+  suite = unittest.TestSuite( [ requestTaskTests, keepWarmTests ] )
   unittest.TextTestRunner( verbosity = 3 ).run( suite )
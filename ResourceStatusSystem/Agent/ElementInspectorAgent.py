@@ -8,11 +8,13 @@
 import datetime
 import math
 import Queue
+import time
 
 from DIRAC                                                      import S_ERROR, S_OK
 from DIRAC.Core.Base.AgentModule                                import AgentModule
 from DIRAC.Core.Utilities.ThreadPool                            import ThreadPool
 from DIRAC.ResourceStatusSystem.Client.ResourceStatusClient     import ResourceStatusClient
+from DIRAC.ResourceStatusSystem.PolicySystem.PDP                import PDP
 from DIRAC.ResourceStatusSystem.PolicySystem.PEP                import PEP
 from DIRAC.ResourceStatusSystem.Utilities                       import Utils
 ResourceManagementClient = getattr(Utils.voimport( 'DIRAC.ResourceStatusSystem.Client.ResourceManagementClient' ),'ResourceManagementClient')
@@ -61,6 +63,9 @@ class ElementInspectorAgent( AgentModule ):
     self.threadPool          = None
     self.rsClient            = None
     self.clients             = {}
+    # Batch evaluation: command results memoized for the whole cycle
+    self.batchEvaluation     = False
+    self.commandResults      = None
 
 
   def initialize( self ):
@@ -71,6 +76,7 @@ class ElementInspectorAgent( AgentModule ):
     self.threadPool    = ThreadPool( maxNumberOfThreads, maxNumberOfThreads )
        
     self.elementType = self.am_getOption( 'elementType', self.elementType )   
+    self.batchEvaluation = self.am_getOption( 'batchEvaluation', self.batchEvaluation )
     self.rsClient    = ResourceStatusClient()
 
     self.clients[ 'ResourceStatusClient' ]     = self.rsClient
@@ -92,12 +98,30 @@ class ElementInspectorAgent( AgentModule ):
     
     """
     
+    startTime = time.time()
+    
     # Gets elements to be checked ( returns a Queue ) 
     elementsToBeChecked = self.getElementsToBeChecked()
     if not elementsToBeChecked[ 'OK' ]:
       self.log.error( elementsToBeChecked[ 'Message' ] )
       return elementsToBeChecked
     self.elementsToBeChecked = elementsToBeChecked[ 'Value' ]
+    
+    selectionTime = time.time()
+    
+    # In batch mode, the commands of all the elements are run in one go before
+    # evaluating the policies, which will use their memoized results.
+    self.commandResults = None
+    if self.batchEvaluation:
+      self.commandResults = {}
+      pdp = PDP( self.clients, self.commandResults )
+      prefetched = pdp.prefetchCommands( list( self.elementsToBeChecked.queue ) )
+      if not prefetched[ 'OK' ]:
+        self.log.error( prefetched[ 'Message' ] )
+      else:
+        self.log.info( '%d command results prefetched' % prefetched[ 'Value' ] )
+    
+    commandsTime = time.time()
        
     queueSize   = self.elementsToBeChecked.qsize()
     pollingTime = self.am_getPollingTime()
@@ -120,6 +144,14 @@ class ElementInspectorAgent( AgentModule ):
     self.elementsToBeChecked.join()
     self.log.info( 'done')  
     
+    endTime = time.time()
+    timing  = 'Cycle timing: %d elements selected in %.2f s' % ( queueSize, selectionTime - startTime )
+    if self.batchEvaluation:
+      timing += ', commands run in %.2f s' % ( commandsTime - selectionTime )
+      timing += ', %d different command results' % len( self.commandResults )
+    timing += ', policies evaluated and enforced in %.2f s' % ( endTime - commandsTime )
+    self.log.info( timing )
+    
     return S_OK()
 
 
@@ -189,7 +221,7 @@ class ElementInspectorAgent( AgentModule ):
       queue, the loop is finished.
     """
 
-    pep = PEP( clients = self.clients )
+    pep = PEP( clients = self.clients, commandResults = self.commandResults )
     
     while True:
     
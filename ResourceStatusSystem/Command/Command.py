@@ -39,8 +39,29 @@ class Command( object ):
   def doMaster( self ):
     ''' To be extended by real commands
     '''
-    return S_OK( self.metrics )   
-      
+    return S_OK( self.metrics )
+
+  @classmethod
+  def doCacheBatch( cls, commands ):
+    ''' Runs doCache for a list of commands of this class, one per element, and
+        returns the list of their results. To be extended by the commands which
+        can read the cache of all the elements with a single query.
+    '''
+    return [ command.doCache() for command in commands ]
+
+  @staticmethod
+  def _groupByName( result, nameKey ):
+    ''' Turns the result of a select on a cache table of several elements into a
+        dictionary with the rows of each element, as dictionaries. The element names,
+        taken from the <nameKey> column, are lower cased: MySQL compares them case
+        insensitively, so they have to be looked up with name.lower().
+    '''
+    rowsByName = {}
+    for row in result[ 'Value' ]:
+      rowDict = dict( zip( result[ 'Columns' ], row ) )
+      rowsByName.setdefault( rowDict[ nameKey ].lower(), [] ).append( rowDict )
+    return rowsByName
+
   def doCommand( self ):
     ''' To be extended by real commands
     '''
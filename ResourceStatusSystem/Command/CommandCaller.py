@@ -12,6 +12,9 @@ from DIRAC.ResourceStatusSystem.Utilities import Utils
 
 __RCSID__ = '$Id: $'
 
+# Decission parameters describing the status of the element, not the element itself
+STATUS_PARAMS = ( 'statusType', 'status', 'reason', 'tokenOwner', 'active' )
+
 def commandInvocation( commandTuple, pArgs = None, decissionParams = None, clients = None ):
   '''
   Returns a command object, given commandTuple
@@ -51,5 +54,17 @@ def commandInvocation( commandTuple, pArgs = None, decissionParams = None, clien
 
   return S_OK( commandObject ) 
 
+def getCommandKey( commandTuple, commandArgs ):
+  '''
+  Returns a hashable key identifying the result of a command, given its commandTuple
+  and its arguments. The decission parameters describing the status of the element
+  are not used by the commands, so they are not part of the key: commands with the
+  same key return the same result, e.g. for the several status types of an element.
+  '''
+
+  args = [ ( key, repr( value ) ) for key, value in commandArgs.items()
+           if key not in STATUS_PARAMS ]
+  return ( tuple( commandTuple ), tuple( sorted( args ) ) )
+
 ################################################################################
 #EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF
\ No newline at end of file
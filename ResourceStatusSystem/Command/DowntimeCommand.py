@@ -235,6 +235,16 @@ class DowntimeCommand( Command ):
 
     uniformResult = [ dict( zip( result[ 'Columns' ], res ) ) for res in result[ 'Value' ] ]
 
+    return S_OK( self._selectDowntime( uniformResult, hours ) )
+
+
+  @staticmethod
+  def _selectDowntime( uniformResult, hours ):
+    '''
+      Returns the downtime, out of the cached ones for an element, that applies now
+      or, if hours is defined, in the next <hours>. None if there is no such downtime.
+    '''
+
     # We return only one downtime, if its ongoing at dtDate
     dtDate = datetime.utcnow()
     result = None
@@ -268,7 +278,45 @@ class DowntimeCommand( Command ):
     elif len( dtWarnings ) > 0:
       result = dtWarnings[0]
 
-    return S_OK( result )
+    return result
+
+
+  @classmethod
+  def doCacheBatch( cls, commands ):
+    '''
+      Same as doCache for several elements, reading the cached downtimes of all
+      the elements of the same kind with a single query.
+    '''
+
+    results = [ None ] * len( commands )
+    
+    # Group the elements by the query they need
+    queries = {}
+    for index, command in enumerate( commands ):
+      params = command._prepareCommand()
+      if not params[ 'OK' ]:
+        results[ index ] = params
+        continue
+      element, elementName, hours, gocdbServiceType = params[ 'Value' ]
+      queries.setdefault( ( element, gocdbServiceType ), [] ).append( ( index, elementName, hours ) )
+
+    for ( element, gocdbServiceType ), queryElements in queries.items():
+
+      elementNames = list( set( [ elementName for _index, elementName, _hours in queryElements ] ) )
+      result = commands[ queryElements[ 0 ][ 0 ] ].rmClient.selectDowntimeCache( element = element,
+                                                                                name = elementNames,
+                                                                                gocdbServiceType = gocdbServiceType )
+      if not result[ 'OK' ]:
+        for index, _elementName, _hours in queryElements:
+          results[ index ] = result
+        continue
+
+      downtimes = cls._groupByName( result, 'Name' )
+
+      for index, elementName, hours in queryElements:
+        results[ index ] = S_OK( cls._selectDowntime( downtimes.get( elementName.lower(), [] ), hours ) )
+
+    return results
 
 
   def doMaster( self ):
@@ -130,6 +130,37 @@ class JobCommand( Command ):
       
     return result
              
+  @classmethod
+  def doCacheBatch( cls, commands ):
+    """
+      Same as doCache for several sites, reading all of them with a single query.
+    """
+
+    results = [ None ] * len( commands )
+
+    names = {}
+    for index, command in enumerate( commands ):
+      params = command._prepareCommand()
+      if not params[ 'OK' ]:
+        results[ index ] = params
+        continue
+      names[ index ] = params[ 'Value' ]
+    if not names:
+      return results
+
+    result = commands[ names.keys()[ 0 ] ].rmClient.selectJobCache( list( set( names.values() ) ) )
+    if not result[ 'OK' ]:
+      for index in names:
+        results[ index ] = result
+      return results
+
+    jobsCache = cls._groupByName( result, 'Site' )
+
+    for index, name in names.items():
+      results[ index ] = S_OK( jobsCache.get( name.lower(), [] ) )
+
+    return results
+
   def doMaster( self ):
     """
       Master method.
@@ -145,6 +145,48 @@ class PilotCommand( Command ):
       
     return result    
 
+  @classmethod
+  def doCacheBatch( cls, commands ):
+    """
+      Same as doCache for several elements, reading all the sites and all the
+      resources with a query each.
+    """
+
+    results = [ None ] * len( commands )
+
+    elements = { 'Site' : {}, 'Resource' : {} }
+    for index, command in enumerate( commands ):
+      params = command._prepareCommand()
+      if not params[ 'OK' ]:
+        results[ index ] = params
+        continue
+      element, name = params[ 'Value' ]
+      elements[ element ][ index ] = name
+
+    for element, names in elements.items():
+      if not names:
+        continue
+
+      rmClient = commands[ names.keys()[ 0 ] ].rmClient
+      # WMS returns Site entries with CE = 'Multiple'
+      if element == 'Site':
+        result = rmClient.selectPilotCache( list( set( names.values() ) ), 'Multiple' )
+        nameKey = 'Site'
+      else:
+        result = rmClient.selectPilotCache( None, list( set( names.values() ) ) )
+        nameKey = 'CE'
+      if not result[ 'OK' ]:
+        for index in names:
+          results[ index ] = result
+        continue
+
+      pilotsCache = cls._groupByName( result, nameKey )
+
+      for index, name in names.items():
+        results[ index ] = S_OK( pilotsCache.get( name.lower(), [] ) )
+
+    return results
+
   def doMaster( self ):
     
     siteNames = CSHelpers.getSites()
@@ -0,0 +1,194 @@
+""" Test_RSS_Command_CacheBatch
+
+  Checks that the batch evaluation, Command.doCacheBatch and PDP.prefetchCommands,
+  gives the same results as doCache run for each element.
+"""
+
+import mock
+import unittest
+
+from datetime import datetime, timedelta
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.ResourceStatusSystem.Command                   import CommandCaller
+from DIRAC.ResourceStatusSystem.Command.DowntimeCommand   import DowntimeCommand
+from DIRAC.ResourceStatusSystem.Command.JobCommand        import JobCommand
+from DIRAC.ResourceStatusSystem.Command.PilotCommand      import PilotCommand
+from DIRAC.ResourceStatusSystem.PolicySystem.PDP          import PDP
+
+__RCSID__ = '$Id:  $'
+
+NOW = datetime.utcnow()
+
+def matches( value, selection ):
+  """ MySQL like match of a select parameter: None matches anything, names are
+      compared case insensitively and lists are IN clauses
+  """
+  if selection is None:
+    return True
+  if not isinstance( selection, list ):
+    selection = [ selection ]
+  return value.lower() in [ selected.lower() for selected in selection ]
+
+class FakeResourceManagementClient( object ):
+  """ cache tables in memory, the select calls are recorded """
+
+  downtimeColumns = [ 'DowntimeID', 'Element', 'Name', 'StartDate', 'EndDate', 'Severity',
+                      'Description', 'Link', 'GOCDBServiceType' ]
+  jobColumns = [ 'Site', 'MaskStatus', 'Efficiency', 'Status' ]
+  pilotColumns = [ 'Site', 'CE', 'PilotsPerJob', 'PilotJobEff', 'Status' ]
+
+  def __init__( self ):
+    self.calls = []
+    self.failing = False
+    self.downtimes = [
+      ( 1, 'Site', 'GOC-A', NOW - timedelta( hours = 1 ), NOW + timedelta( hours = 1 ), 'Warning', 'd1', 'l', None ),
+      ( 2, 'Site', 'goc-a', NOW - timedelta( hours = 1 ), NOW + timedelta( hours = 2 ), 'Outage', 'd2', 'l', None ),
+      ( 3, 'Site', 'GOC-B', NOW + timedelta( hours = 5 ), NOW + timedelta( hours = 9 ), 'Outage', 'd3', 'l', None ),
+      ( 4, 'Resource', 'ce1.example.org', NOW - timedelta( hours = 3 ), NOW + timedelta( hours = 3 ),
+        'Outage', 'd4', 'l', None ),
+      ( 5, 'Resource', 'CE2.example.org', NOW - timedelta( hours = 9 ), NOW - timedelta( hours = 3 ),
+        'Outage', 'd5', 'l', None ) ]
+    self.jobs = [ ( 'LCG.A.org', 'Active', 90., 'Good' ), ( 'lcg.b.org', 'Banned', 10., 'Bad' ) ]
+    self.pilots = [ ( 'LCG.A.org', 'Multiple', 1.5, 95., 'Good' ), ( 'LCG.A.org', 'ce1.example.org', 1.2, 90., 'Good' ),
+                    ( 'LCG.B.org', 'CE2.EXAMPLE.ORG', 3., 20., 'Bad' ), ( 'LCG.B.org', 'Multiple', 3., 20., 'Bad' ) ]
+
+  def __select( self, name, columns, rows ):
+    self.calls.append( name )
+    if self.failing:
+      return S_ERROR( 'Lost connection' )
+    result = S_OK( rows )
+    result[ 'Columns' ] = columns
+    return result
+
+  def selectDowntimeCache( self, element = None, name = None, gocdbServiceType = None ):
+    return self.__select( 'DowntimeCache', self.downtimeColumns,
+                          [ row for row in self.downtimes if row[ 1 ] == element and matches( row[ 2 ], name ) and
+                                                             gocdbServiceType in ( None, row[ 8 ] ) ] )
+
+  def selectJobCache( self, site = None ):
+    return self.__select( 'JobCache', self.jobColumns, [ row for row in self.jobs if matches( row[ 0 ], site ) ] )
+
+  def selectPilotCache( self, site = None, cE = None ):
+    return self.__select( 'PilotCache', self.pilotColumns,
+                          [ row for row in self.pilots if matches( row[ 0 ], site ) and matches( row[ 1 ], cE ) ] )
+
+SITES = [ 'LCG.A.org', 'lcg.a.org', 'LCG.B.org', 'LCG.C.org' ]
+CES = [ 'ce1.example.org', 'ce2.example.org', 'CE3.example.org' ]
+
+def getGOCSiteName( siteName ):
+  """ LCG.A.org -> GOC-A, no GOC name for LCG.C.org """
+  if siteName.lower() == 'lcg.c.org':
+    return S_ERROR( 'No GOC site name for %s in CS' % siteName )
+  return S_OK( 'GOC-%s' % siteName.split( '.' )[ 1 ].upper() )
+
+def elementsArgs():
+  """ the arguments of the elements, plus one without name """
+  args = [ { 'element' : 'Site', 'name' : site, 'elementType' : 'Site' } for site in SITES ]
+  args += [ { 'element' : 'Resource', 'name' : ce, 'elementType' : 'CE' } for ce in CES ]
+  args.append( { 'element' : 'Site', 'elementType' : 'Site' } )
+  return args
+
+################################################################################
+
+class CacheBatch_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    """ the commands use the in memory cache tables """
+    self.rmClient = FakeResourceManagementClient()
+    self.clients = { 'ResourceManagementClient' : self.rmClient, 'GOCDBClient' : mock.MagicMock(),
+                     'WMSAdministrator' : mock.MagicMock() }
+    self.patcher = mock.patch( 'DIRAC.ResourceStatusSystem.Command.DowntimeCommand.getGOCSiteName',
+                               side_effect = getGOCSiteName )
+    self.patcher.start()
+
+  def tearDown( self ):
+    self.patcher.stop()
+
+  def assertSameAsDoCache( self, commandClass, argsList ):
+    """ doCacheBatch gives the doCache results in order, with one query per kind of element at most """
+    commands = [ commandClass( args, self.clients ) for args in argsList ]
+    perElement = [ command.doCache() for command in commands ]
+    del self.rmClient.calls[ : ]
+    batch = commandClass.doCacheBatch( commands )
+    self.assertEqual( batch, perElement )
+    self.assertEqual( len( self.rmClient.calls ) <= 2, True )
+    return batch
+
+  def test_groupByName( self ):
+    """ the rows are grouped by lower cased name """
+    result = S_OK( [ ( 'A', 1 ), ( 'a', 2 ), ( 'B', 3 ) ] )
+    result[ 'Columns' ] = [ 'Name', 'Value' ]
+    self.assertEqual( DowntimeCommand._groupByName( result, 'Name' ),
+                      { 'a' : [ { 'Name' : 'A', 'Value' : 1 }, { 'Name' : 'a', 'Value' : 2 } ],
+                        'b' : [ { 'Name' : 'B', 'Value' : 3 } ] } )
+
+  def test_downtimeCommand( self ):
+    """ ongoing and next hours downtimes, sites without GOC name """
+    batch = self.assertSameAsDoCache( DowntimeCommand, elementsArgs() )
+    self.assertEqual( batch[ 0 ][ 'Value' ][ 'DowntimeID' ], 2 )
+    argsList = elementsArgs()
+    for args in argsList:
+      args[ 'hours' ] = 6
+    batch = self.assertSameAsDoCache( DowntimeCommand, argsList )
+    self.assertEqual( batch[ 2 ][ 'Value' ][ 'DowntimeID' ], 3 )
+
+  def test_jobCommand( self ):
+    """ sites in any case, unknown sites """
+    batch = self.assertSameAsDoCache( JobCommand, elementsArgs() )
+    self.assertEqual( batch[ 1 ][ 'Value' ], [ dict( zip( FakeResourceManagementClient.jobColumns,
+                                                          self.rmClient.jobs[ 0 ] ) ) ] )
+
+  def test_pilotCommand( self ):
+    """ sites with the Multiple CE and CEs """
+    batch = self.assertSameAsDoCache( PilotCommand, elementsArgs() )
+    self.assertEqual( [ len( result[ 'Value' ] ) for result in batch[ :7 ] ], [ 1, 1, 1, 0, 1, 1, 0 ] )
+
+  def test_failures( self ):
+    """ a failed query fails all the elements it was for """
+    self.rmClient.failing = True
+    for commandClass in ( DowntimeCommand, JobCommand, PilotCommand ):
+      self.assertSameAsDoCache( commandClass, elementsArgs() )
+
+  def test_prefetchCommands( self ):
+    """ the memoized results are those doCommand gives for each element """
+    policies = [ { 'name' : 'DT', 'command' : ( 'DowntimeCommand', 'DowntimeCommand' ), 'args' : { 'hours' : 6 } },
+                 { 'name' : 'Job', 'command' : ( 'JobCommand', 'JobCommand' ), 'args' : { 'onlyCache' : True } },
+                 { 'name' : 'Pilot', 'command' : ( 'PilotCommand', 'PilotCommand' ), 'args' : {} },
+                 { 'name' : 'AlwaysActive', 'command' : None, 'args' : {} } ]
+    decisionParamsList = []
+    for args in elementsArgs()[ :-1 ]:
+      for statusType in ( 'ReadAccess', 'WriteAccess' ):
+        decisionParams = dict( args )
+        decisionParams.update( { 'statusType' : statusType, 'status' : 'Active' } )
+        decisionParamsList.append( decisionParams )
+
+    commandResults = {}
+    pdp = PDP( self.clients, commandResults )
+    pdp.iGetter = mock.MagicMock()
+    pdp.iGetter.getPoliciesThatApply.return_value = S_OK( policies )
+    result = pdp.prefetchCommands( decisionParamsList )
+    self.assertEqual( result[ 'OK' ], True )
+    self.assertEqual( result[ 'Value' ], len( commandResults ) )
+    # # one query per command class and kind of element
+    self.assertEqual( sorted( self.rmClient.calls ), [ 'DowntimeCache', 'DowntimeCache', 'JobCache',
+                                                       'PilotCache', 'PilotCache' ] )
+
+    for decisionParams in decisionParamsList:
+      pdp.setup( decisionParams )
+      for policyDict in policies[ :-1 ]:
+        command = CommandCaller.commandInvocation( policyDict[ 'command' ], policyDict[ 'args' ],
+                                                   pdp.decisionParams, self.clients )[ 'Value' ]
+        commandKey = CommandCaller.getCommandKey( policyDict[ 'command' ], command.args )
+        if commandKey in commandResults:
+          self.assertEqual( commandResults[ commandKey ], command.doCommand() )
+        else:
+          # # left to doCommand, which goes to the source when the cache is empty
+          cached = command.doCache()
+          self.assertEqual( cached[ 'OK' ] and not cached[ 'Value' ] and not command.args[ 'onlyCache' ], True )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( CacheBatch_TestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -9,6 +9,7 @@
 """
 
 from DIRAC                                                import gLogger, S_OK, S_ERROR 
+from DIRAC.ResourceStatusSystem.Command                   import CommandCaller
 from DIRAC.ResourceStatusSystem.PolicySystem.PolicyCaller import PolicyCaller
 from DIRAC.ResourceStatusSystem.PolicySystem.StateMachine import RSSMachine
 from DIRAC.ResourceStatusSystem.Utilities                 import RssConfiguration
@@ -20,18 +21,22 @@ class PDP:
   """ PDP ( Policy Decision Point )
   """
 
-  def __init__( self, clients = None ):
+  def __init__( self, clients = None, commandResults = None ):
     """ Constructor. 
     
     examples:
       >>> pdp  = PDP( None )
       >>> pdp1 = PDP( {} )
       >>> pdp2 = PDP( { 'Client1' : Client1Object } )
+      >>> pdp3 = PDP( {}, {} )
       
     :Parameters:
       **clients** - [ None, `dict` ]
         dictionary with Clients to be used in the Commands. If None, the Commands
         will create their own clients.
+      **commandResults** - [ None, `dict` ]
+        dictionary where the results of the Commands are memoized. If None, every
+        policy runs its own Command.
          
     """
 
@@ -40,7 +45,7 @@ class PDP:
 
     # Helpers to discover policies and RSS metadata in CS
     self.iGetter         = InfoGetter()    
-    self.pCaller         = PolicyCaller( clients )
+    self.pCaller         = PolicyCaller( clients, commandResults )
   
     # RSS State Machine, used to calculate most penalizing state while merging them
     self.rssMachine      = RSSMachine( 'Unknown' )
@@ -168,6 +173,81 @@ class PDP:
                 )
 
 
+  def prefetchCommands( self, decisionParamsList ):
+    """ batch evaluation method. It finds the policies that apply to each of the
+    elements described in <decisionParamsList> and their commands, and runs every
+    Command class once for all the elements ( see Command.doCacheBatch ). The results
+    are memoized on the commandResults dictionary, so that takeDecision does not
+    need to run them again for these elements. Results that would make the Command
+    go to its source ( empty cache and not onlyCache ) are not memoized.
+    
+    examples:
+      >>> pdp = PDP( clients, {} )
+      >>> pdp.prefetchCommands( [ { 'element' : 'Site', 'name' : 'MySite', ... }, ... ] )[ 'Value' ]
+          25
+    
+    :Parameters:
+      **decisionParamsList** - `list( dict )`
+        list with the decisionParams of the elements, as they would be passed to setup
+    
+    :return: S_OK( `int` ) / S_ERROR, number of memoized Command results
+    
+    """
+
+    commandResults = self.pCaller.commandResults
+    if commandResults is None:
+      return S_ERROR( 'PDP has no commandResults dictionary' )
+    
+    # Command objects by Command class, one per different set of arguments
+    commandsToRun = {}
+    
+    for decisionParams in decisionParamsList:
+      
+      self.setup( decisionParams )
+      
+      policiesThatApply = self.iGetter.getPoliciesThatApply( self.decisionParams )
+      if not policiesThatApply[ 'OK' ]:
+        gLogger.warn( 'prefetchCommands: %s' % policiesThatApply[ 'Message' ] )
+        continue
+      
+      for policyDict in policiesThatApply[ 'Value' ]:
+        
+        pCommand = policyDict.get( 'command' )
+        if pCommand is None:
+          continue
+        
+        command = CommandCaller.commandInvocation( pCommand, policyDict.get( 'args' ), 
+                                                   self.decisionParams, self.pCaller.clients )
+        if not command[ 'OK' ]:
+          gLogger.warn( 'prefetchCommands: %s' % command[ 'Message' ] )
+          continue
+        command = command[ 'Value' ]
+        
+        commandKey = CommandCaller.getCommandKey( pCommand, command.args )
+        if not commandKey in commandResults:
+          commandsToRun.setdefault( command.__class__, {} )[ commandKey ] = command
+    
+    prefetched = 0
+    
+    for commandClass, commands in commandsToRun.items():
+      
+      commandKeys = commands.keys()
+      results     = commandClass.doCacheBatch( [ commands[ commandKey ] for commandKey in commandKeys ] )
+      
+      # Same logic as Command.doCommand
+      for commandKey, result in zip( commandKeys, results ):
+        command = commands[ commandKey ]
+        if not result[ 'OK' ]:
+          # The same error can be shared by several commands
+          result = command.returnERROR( dict( result ) )
+        elif not ( result[ 'Value' ] or command.args[ 'onlyCache' ] ):
+          continue
+        commandResults[ commandKey ] = result
+        prefetched += 1  
+        
+    return S_OK( prefetched )
+
+
   def _runPolicies( self, policies ):
     """ Given a list of policy dictionaries, loads them making use of the PolicyCaller
     and evaluates them. This method requires to have run setup previously.
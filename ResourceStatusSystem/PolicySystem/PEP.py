@@ -24,7 +24,7 @@ class PEP:
   """ PEP ( Policy Enforcement Point )
   """
 
-  def __init__( self, clients = None ):
+  def __init__( self, clients = None, commandResults = None ):
     """ Constructor
     
     examples:
@@ -37,6 +37,8 @@ class PEP:
         dictionary with clients to be used in the commands issued by the policies.
         If not defined, the commands will import them. It is a measure to avoid
         opening the same connection every time a policy is evaluated.
+      **commandResults** - [ None, `dict` ]
+        dictionary where the PDP memoizes the results of the commands ( see PDP ).
         
     """
    
@@ -55,7 +57,7 @@ class PEP:
 
     self.clients = clients
     # Pass to the PDP the clients that are going to be used on the Commands
-    self.pdp     = PDP( clients )   
+    self.pdp     = PDP( clients, commandResults )   
 
 
   def enforce( self, decisionParams ):
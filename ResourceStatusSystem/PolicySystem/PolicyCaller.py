@@ -9,6 +9,7 @@
 from DIRAC                                import S_ERROR
 from DIRAC.ResourceStatusSystem.Utilities import Utils
 from DIRAC.ResourceStatusSystem.Command   import CommandCaller
+from DIRAC.ResourceStatusSystem.Command.Command import Command
 
 __RCSID__  = '$Id: $'
 
@@ -17,9 +18,11 @@ class PolicyCaller:
     PolicyCaller loads policies, sets commands and runs them.
   '''
   
-  def __init__( self, clients = None ):
+  def __init__( self, clients = None, commandResults = None ):
     '''
-      Constructor
+      Constructor. If commandResults is a dictionary, the results of the commands
+      are memoized on it, so that every command is run only once for an element.
+      It can be shared by several PolicyCallers, and is meant to live for a cycle.
     '''
 
     self.cCaller = CommandCaller  
@@ -28,6 +31,8 @@ class PolicyCaller:
     if clients is not None: 
       self.clients = clients       
 
+    self.commandResults = commandResults
+
   def policyInvocation( self, decissionParams, policyDict ):  
     '''
     Invokes a policy:
@@ -71,6 +76,9 @@ class PolicyCaller:
     if not command[ 'OK' ]:
       return command
     command = command[ 'Value' ]
+
+    if command is not None and self.commandResults is not None:
+      command = self.memoizeCommand( pCommand, command )
     
     evaluationResult = self.policyEvaluation( policy, command )
     
@@ -79,6 +87,18 @@ class PolicyCaller:
     
     return evaluationResult
 
+  def memoizeCommand( self, commandTuple, command ):
+    '''
+    Runs the command, unless a command with the same arguments has already been
+    run, and returns a command object returning the memoized result.
+    '''
+
+    commandKey = self.cCaller.getCommandKey( commandTuple, command.args )
+    if commandKey not in self.commandResults:
+      self.commandResults[ commandKey ] = command.doCommand()
+
+    return MemoizedCommand( self.commandResults[ commandKey ] )
+
   @staticmethod
   def policyEvaluation( policy, command ):
     '''
@@ -91,5 +111,19 @@ class PolicyCaller:
     
     return evaluationResult    
 
+class MemoizedCommand( Command ):
+  '''
+    Command returning a result obtained beforehand.
+  '''
+
+  def __init__( self, result ):
+    
+    super( MemoizedCommand, self ).__init__()
+    self.result = result
+
+  def doCommand( self ):
+    
+    return self.result
+
 ################################################################################
 #EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF#EOF
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""  ReplicaCache keeps the replicas of the input files of the transformations on disk, in a
+     sqlite database keyed by transformation and LFN, so that they are not asked again to
+     the catalog at each cycle of the TransformationAgent.
+
+     Replicas are added, removed and expired incrementally and only those of the LFNs
+     asked for are read, instead of loading and writing the whole cache of a
+     transformation each time.
+"""
+
+import time, calendar, pickle, threading
+
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+from DIRAC                          import S_OK, S_ERROR
+from DIRAC.Core.Utilities.List      import breakListIntoChunks
+
+__RCSID__ = "$Id$"
+
+# Maximum number of variables in a sqlite statement is 999
+QUERY_CHUNK = 500
+
+class ReplicaCache( object ):
+  """ Replica cache of the transformations in a sqlite file
+  """
+
+  def __init__( self, dbPath ):
+    """ c'tor
+
+    :param dbPath: path of the sqlite file, created if it does not exist
+    """
+    if not sqlite3:
+      raise ImportError( "sqlite3 is not available" )
+    self.dbPath = dbPath
+    self.__lock = threading.Lock()
+    # The agent threads share the connection, the lock serializes them
+    self.__conn = sqlite3.connect( dbPath, check_same_thread = False )
+    self.__conn.text_factory = str
+    # The cache can be rebuilt from the catalog, no need to wait for the disk
+    self.__conn.execute( "PRAGMA synchronous = OFF" )
+    self.__conn.execute( "PRAGMA journal_mode = WAL" )
+    self.__conn.execute( "CREATE TABLE IF NOT EXISTS Replicas ( TransformationID INTEGER NOT NULL, "
+                         "LFN TEXT NOT NULL, SEs TEXT NOT NULL, UpdateTime REAL NOT NULL, "
+                         "PRIMARY KEY ( TransformationID, LFN ) )" )
+    self.__conn.execute( "CREATE INDEX IF NOT EXISTS ReplicasTime ON Replicas ( TransformationID, UpdateTime )" )
+    self.__conn.commit()
+
+  def __execute( self, query, args = (), many = False ):
+    """ Execute a statement and commit it, return the cursor
+    """
+    self.__lock.acquire()
+    try:
+      if many:
+        cursor = self.__conn.executemany( query, args )
+      else:
+        cursor = self.__conn.execute( query, args )
+      self.__conn.commit()
+      return cursor
+    finally:
+      self.__lock.release()
+
+  def __query( self, query, args = () ):
+    """ Execute a select and return all the rows
+    """
+    self.__lock.acquire()
+    try:
+      return self.__conn.execute( query, args ).fetchall()
+    finally:
+      self.__lock.release()
+
+  def getReplicas( self, transID, lfns ):
+    """ Get the cached replicas of a list of LFNs of a transformation
+
+    :return: { lfn : [ SE ] } for the LFNs found in the cache
+    """
+    replicas = {}
+    for chunk in breakListIntoChunks( list( lfns ), QUERY_CHUNK ):
+      rows = self.__query( "SELECT LFN, SEs FROM Replicas WHERE TransformationID = ? AND LFN IN ( %s )" %
+                           ','.join( '?' * len( chunk ) ), [ transID ] + chunk )
+      for lfn, ses in rows:
+        replicas[lfn] = ses.split( ',' )
+    return replicas
+
+  def getLFNs( self, transID ):
+    """ Get the LFNs of a transformation in the cache
+    """
+    return [ row[0] for row in self.__query( "SELECT LFN FROM Replicas WHERE TransformationID = ?", ( transID, ) ) ]
+
+  def countReplicas( self, transID = None ):
+    """ Number of LFNs in the cache, of a transformation or of all of them
+    """
+    if transID is None:
+      return self.__query( "SELECT COUNT(*) FROM Replicas" )[0][0]
+    return self.__query( "SELECT COUNT(*) FROM Replicas WHERE TransformationID = ?", ( transID, ) )[0][0]
+
+  def addReplicas( self, transID, replicas, updateTime = None ):
+    """ Add or update the replicas of a transformation
+
+    :param replicas: { lfn : [ SE ] }
+    :param updateTime: epoch time the replicas were obtained, now by default
+    """
+    if updateTime is None:
+      updateTime = time.time()
+    self.__execute( "INSERT OR REPLACE INTO Replicas ( TransformationID, LFN, SEs, UpdateTime ) VALUES ( ?, ?, ?, ? )",
+                    [ ( transID, lfn, ','.join( ses ), updateTime ) for lfn, ses in replicas.items() if ses ],
+                    many = True )
+
+  def removeReplicas( self, transID, lfns ):
+    """ Remove LFNs of a transformation from the cache
+
+    :return: number of LFNs removed
+    """
+    removed = 0
+    for chunk in breakListIntoChunks( list( lfns ), QUERY_CHUNK ):
+      cursor = self.__execute( "DELETE FROM Replicas WHERE TransformationID = ? AND LFN IN ( %s )" %
+                               ','.join( '?' * len( chunk ) ), [ transID ] + chunk )
+      removed += cursor.rowcount
+    return removed
+
+  def expireReplicas( self, transID, validity ):
+    """ Remove the replicas of a transformation obtained more than validity seconds ago
+
+    :return: number of LFNs removed
+    """
+    cursor = self.__execute( "DELETE FROM Replicas WHERE TransformationID = ? AND UpdateTime < ?",
+                             ( transID, time.time() - validity ) )
+    return cursor.rowcount
+
+  def clear( self, transID ):
+    """ Remove all the replicas of a transformation
+
+    :return: number of LFNs removed
+    """
+    return self.__execute( "DELETE FROM Replicas WHERE TransformationID = ?", ( transID, ) ).rowcount
+
+  def importPickle( self, fileName, transID = None ):
+    """ Import a cache file written by the former versions of the TransformationAgent, either
+        { updateTime : { lfn : [ SE ] } } for a transformation or { transID : { updateTime : { lfn : [ SE ] } } }
+        if transID is not given. The update times are kept, so the replicas expire as they would have
+
+    :return: S_OK( number of LFNs imported )
+    """
+    try:
+      cacheFile = open( fileName, 'r' )
+      try:
+        cache = pickle.load( cacheFile )
+      finally:
+        cacheFile.close()
+    except Exception, e:
+      return S_ERROR( "Failed to read replica cache file %s: %s" % ( fileName, str( e ) ) )
+    if transID is not None:
+      cache = { transID : cache }
+    imported = 0
+    try:
+      for cacheTransID, transCache in cache.items():
+        # Oldest first, so the newest replicas of an LFN are kept
+        for updateTime in sorted( transCache ):
+          replicas = transCache[updateTime]
+          self.addReplicas( cacheTransID, replicas, calendar.timegm( updateTime.utctimetuple() ) )
+          imported += len( replicas )
+    except Exception, e:
+      return S_ERROR( "Failed to import replica cache file %s: %s" % ( fileName, str( e ) ) )
+    return S_OK( imported )
+
+  def close( self ):
+    """ Close the database
+    """
+    self.__lock.acquire()
+    try:
+      self.__conn.close()
+    finally:
+      self.__lock.release()
@@ -1,7 +1,7 @@
 """  TransformationAgent processes transformations found in the transformation database.
 """
 
-import time, Queue, os, datetime, pickle
+import time, Queue, os, datetime, glob
 from DIRAC                                                          import S_OK, S_ERROR
 from DIRAC.Core.Base.AgentModule                                    import AgentModule
 from DIRAC.Core.Utilities.ThreadPool                                import ThreadPool
@@ -10,6 +10,7 @@ from DIRAC.Core.Utilities.List                                      import break
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
 from DIRAC.TransformationSystem.Client.TransformationClient         import TransformationClient
 from DIRAC.TransformationSystem.Agent.TransformationAgentsUtilities import TransformationAgentsUtilities
+from DIRAC.TransformationSystem.Agent.ReplicaCache                  import ReplicaCache
 from DIRAC.DataManagementSystem.Client.DataManager                  import DataManager
 
 __RCSID__ = "$Id$"
@@ -49,8 +50,6 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     # Validity of the cache
     self.replicaCache = None
     self.replicaCacheValidity = None
-    self.writingCache = False
-    self.removedFromCache = 0
 
     self.noUnusedDelay = 0
     self.unusedFiles = {}
@@ -80,17 +79,18 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     # clients
     self.transfClient = TransformationClient()
 
-    # for caching using a pickle file
+    # for caching using a sqlite file
     self.workDirectory = self.am_getWorkDirectory()
-    self.cacheFile = os.path.join( self.workDirectory, 'ReplicaCache.pkl' )
+    self.cacheFile = os.path.join( self.workDirectory, 'ReplicaCache.db' )
     self.controlDirectory = self.am_getControlDirectory()
 
     # remember the offset if any in TS
     self.lastFileOffset = {}
 
     # Validity of the cache
-    self.replicaCache = {}
+    self.replicaCache = ReplicaCache( self.cacheFile )
     self.replicaCacheValidity = self.am_getOption( 'ReplicaCacheValidity', 2 )
+    self.__migrateCache()
 
     self.noUnusedDelay = self.am_getOption( 'NoUnusedDelay', 6 )
 
@@ -117,7 +117,7 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
       while self.transInThread:
         time.sleep( 2 )
       self._logInfo( "Threads are empty, terminating the agent..." , method = method )
-    self.__writeCache()
+    self.replicaCache.close()
     return S_OK()
 
   def execute( self ):
@@ -232,8 +232,6 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     if not transFiles['Value']:
       return S_OK()
 
-    if transID not in self.replicaCache:
-      self.__readCache( transID )
     transFiles = transFiles['Value']
     lfns = [ f['LFN'] for f in transFiles ]
     unusedFiles = len( lfns )
@@ -426,20 +424,17 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
       # If the cache needs to be cleaned
       self.__cleanCache( transID )
     startTime = time.time()
-    dataReplicas = {}
     nLfns = len( lfns )
     self._logVerbose( "Getting replicas for %d files" % nLfns, method = method, transID = transID )
-    cachedReplicaSets = self.replicaCache.get( transID, {} )
-    cachedReplicas = {}
-    # Merge all sets of replicas
-    for replicas in cachedReplicaSets.values():
-      cachedReplicas.update( replicas )
-    self._logInfo( "Number of cached replicas: %d" % len( cachedReplicas ), method = method, transID = transID )
-    setCached = set( cachedReplicas )
-    setLfns = set( lfns )
-    for lfn in setLfns & setCached:
-      dataReplicas[lfn] = cachedReplicas[lfn]
-    newLFNs = setLfns - setCached
+    # Only the replicas of the files being processed are read
+    try:
+      dataReplicas = self.replicaCache.getReplicas( transID, set( lfns ) )
+    except Exception:
+      self._logException( "Exception when reading replica cache:", method = method, transID = transID )
+      dataReplicas = {}
+    self._logVerbose( "Read %d cached replicas in %.1f seconds" % ( len( dataReplicas ), time.time() - startTime ),
+                      method = method, transID = transID )
+    newLFNs = set( lfns ) - set( dataReplicas )
     self._logInfo( "ReplicaCache hit for %d out of %d LFNs" % ( len( dataReplicas ), nLfns ),
                    method = method, transID = transID )
     if newLFNs:
@@ -462,7 +457,6 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
                       method = method, transID = transID )
       dataReplicas.update( newReplicas )
       noReplicas = newLFNs - set( dataReplicas )
-      self.__writeCache( transID )
       if noReplicas:
         self._logWarn( "Found %d files without replicas (or only in Failover)" % len( noReplicas ),
                        method = method, transID = transID )
@@ -528,22 +522,23 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
   def __updateCache( self, transID, newReplicas ):
     """ Add replicas to the cache
     """
-    self.replicaCache.setdefault( transID, {} )[datetime.datetime.utcnow()] = newReplicas
-#    if len( newReplicas ) > 5000:
-#      self.__writeCache( transID )
+    try:
+      self.replicaCache.addReplicas( transID, newReplicas )
+    except Exception:
+      self._logException( "Exception when adding replicas to the cache:", method = '__updateCache', transID = transID )
 
   def __clearCacheForTrans( self, transID ):
     """ Remove all replicas for a transformation
     """
-    self.replicaCache.pop( transID , None )
+    try:
+      self.replicaCache.clear( transID )
+    except Exception:
+      self._logException( "Exception when clearing replica cache:", method = '__clearCacheForTrans', transID = transID )
 
   def __cleanReplicas( self, transID, lfns ):
     """ Remove cached replicas that are not in a list
     """
-    cachedReplicas = set()
-    for replicas in self.replicaCache.get( transID, {} ).values():
-      cachedReplicas.update( replicas )
-    toRemove = cachedReplicas - set( lfns )
+    toRemove = set( self.replicaCache.getLFNs( transID ) ) - set( lfns )
     if toRemove:
       self._logInfo( "Remove %d files from cache" % len( toRemove ), method = '__cleanReplicas', transID = transID )
       self.__removeFromCache( transID, toRemove )
@@ -552,18 +547,10 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     """ Cleans the cache
     """
     try:
-      if transID in self.replicaCache:
-        timeLimit = datetime.datetime.utcnow() - datetime.timedelta( days = self.replicaCacheValidity )
-        for updateTime in set( self.replicaCache[transID] ):
-          nCache = len( self.replicaCache[transID][updateTime] )
-          if updateTime < timeLimit or not nCache:
-            self._logInfo( "Clear %s replicas for transformation %s, time %s" %
-                           ( '%d cached' % nCache if nCache else 'empty cache' , str( transID ), str( updateTime ) ),
-                           transID = transID, method = '__cleanCache' )
-            del self.replicaCache[transID][updateTime]
-        # Remove empty transformations
-        if not self.replicaCache[transID]:
-          del self.replicaCache[transID]
+      removed = self.replicaCache.expireReplicas( transID, self.replicaCacheValidity * 86400 )
+      if removed:
+        self._logInfo( "Cleared %d cached replicas older than %s days" % ( removed, self.replicaCacheValidity ),
+                       transID = transID, method = '__cleanCache' )
     except Exception:
       self._logException( "Exception when cleaning replica cache:" )
 
@@ -571,83 +558,45 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     removed = self.__removeFromCache( transID, lfns )
     if removed:
       self._logInfo( "Removed %d replicas from cache" % removed, method = '__removeFilesFromCache', transID = transID )
-      self.__writeCache( transID )
 
   def __removeFromCache( self, transID, lfns ):
-    if transID not in self.replicaCache:
-      return
-    removed = 0
-    if self.replicaCache[transID] and lfns:
-      for lfn in lfns:
-        for timeKey in self.replicaCache[transID]:
-          if self.replicaCache[transID][timeKey].pop( lfn, None ):
-            removed += 1
-    return removed
-
-  def __cacheFile( self, transID ):
-    return self.cacheFile.replace( '.pkl', '_%s.pkl' % str( transID ) )
-
-  @gSynchro
-  def __readCache( self, transID ):
-    """ Reads from the cache
-    """
-    if transID in self.replicaCache:
-      return
+    if not lfns:
+      return 0
     try:
-      method = '__readCache'
-      fileName = self.__cacheFile( transID )
-      if not os.path.exists( fileName ):
-        # This is as a transitory measure for migrating from single to multiple cache files
-        fileName = self.cacheFile
-        cacheFile = open( fileName, 'r' )
-        cache = pickle.load( cacheFile )
-        for id in [id for id in cache if id not in self.replicaCache]:
-          self.replicaCache[id] = cache[id]
-        self.replicaCache[transID] = cache.get( transID, {} )
-      else:
-        cacheFile = open( fileName, 'r' )
-        self.replicaCache[transID] = pickle.load( cacheFile )
-      cacheFile.close()
-      self._logInfo( "Successfully loaded replica cache from file %s (%d files)" %
-                     ( fileName, self.__filesInCache( transID ) ),
-                     method = method, transID = transID )
+      return self.replicaCache.removeReplicas( transID, lfns )
     except Exception:
-      self._logException( "Failed to load replica cache from file %s" % fileName,
-                          method = method, transID = transID )
-      self.replicaCache[transID] = {}
-
-  def __filesInCache( self, transID ):
-    cache = self.replicaCache.get( transID, {} )
-    return sum( [len( lfns ) for lfns in cache.values()] )
+      self._logException( "Exception when removing replicas from the cache:", method = '__removeFromCache',
+                          transID = transID )
+      return 0
 
   @gSynchro
-  def __writeCache( self, transID = None ):
-    """ Writes the cache
+  def __migrateCache( self ):
+    """ Imports the pickle cache files written by the former versions of the agent, the
+        one for all transformations first as the per transformation ones are newer
     """
-    method = '__writeCache'
-    try:
+    method = '__migrateCache'
+    pickleFile = self.cacheFile.replace( '.db', '.pkl' )
+    fileNames = glob.glob( pickleFile.replace( '.pkl', '_*.pkl' ) )
+    if os.path.exists( pickleFile ):
+      fileNames.insert( 0, pickleFile )
+    for fileName in fileNames:
       startTime = time.time()
-      transList = [transID] if transID else set( self.replicaCache )
-      filesInCache = 0
-      nCache = 0
-      for id in transList:
-        # Protect the copy of the cache
-        filesInCache += self.__filesInCache( id )
-        # write to a temporary file in order to avoid corrupted files
-        cacheFile = self.__cacheFile( id )
-        tmpFile = cacheFile + '.tmp'
-        f = open( tmpFile, 'w' )
-        pickle.dump( self.replicaCache.get( id, {} ), f )
-        f.close()
-        # Now rename the file as it shold
-        os.rename( tmpFile, cacheFile )
-        nCache += 1
-      self._logInfo( "Successfully wrote %d replica cache file(s) (%d files) in %.1f seconds" \
-                     % ( nCache, filesInCache, time.time() - startTime ),
-                     method = method, transID = transID if transID else None )
-    except Exception:
-      self._logException( "Could not write replica cache file %s" % cacheFile,
-                          method = method, transID = id )
+      transID = None
+      if fileName != pickleFile:
+        try:
+          transID = long( fileName[len( pickleFile ) - 3:-4] )
+        except ValueError:
+          continue
+      res = self.replicaCache.importPickle( fileName, transID )
+      if not res['OK']:
+        self._logError( "Failed to migrate replica cache:", res['Message'], method = method, transID = transID )
+        continue
+      self._logInfo( "Migrated %d cached replicas from %s in %.1f seconds" % ( res['Value'], fileName, time.time() - startTime ),
+                     method = method, transID = transID )
+      try:
+        os.remove( fileName )
+      except OSError, e:
+        self._logWarn( "Failed to remove migrated replica cache file %s:" % fileName, str( e ), method = method )
 
   def __generatePluginObject( self, plugin, clients ):
     """ This simply instantiates the TransformationPlugin class with the relevant plugin name
@@ -674,9 +623,7 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     """
     if invalidateCache:
       try:
-        if transID in self.replicaCache:
+        if self.replicaCache.clear( transID ):
           self._logInfo( "Removed cached replicas for transformation" , method = 'pluginCallBack', transID = transID )
-          self.replicaCache.pop( transID )
-          self.__writeCache( transID )
       except:
         pass
@@ -0,0 +1,57 @@
+""" Test class for the replica cache of the TransformationAgent
+"""
+
+# imports
+import unittest, os, tempfile, shutil, pickle, datetime
+
+#sut
+from DIRAC.TransformationSystem.Agent.ReplicaCache import ReplicaCache
+
+class ReplicaCacheTestCase( unittest.TestCase ):
+  """ Base class for the ReplicaCache test cases
+  """
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.cache = ReplicaCache( os.path.join( self.workDir, 'ReplicaCache.db' ) )
+
+  def tearDown( self ):
+    self.cache.close()
+    shutil.rmtree( self.workDir )
+
+class ReplicaCacheSuccess( ReplicaCacheTestCase ):
+
+  def test_addGetRemove( self ):
+    self.cache.addReplicas( 1, {'/a/1':['SE1', 'SE2'], '/a/2':['SE1'], '/a/3':[]} )
+    self.cache.addReplicas( 2, {'/a/1':['SE3']} )
+    self.assertEqual( self.cache.countReplicas( 1 ), 2 )
+    self.assertEqual( self.cache.getReplicas( 1, ['/a/1', '/a/3', '/a/4'] ), {'/a/1':['SE1', 'SE2']} )
+    self.cache.addReplicas( 1, {'/a/1':['SE2']} )
+    self.assertEqual( self.cache.getReplicas( 1, ['/a/1'] ), {'/a/1':['SE2']} )
+    self.assertEqual( self.cache.removeReplicas( 1, ['/a/1', '/a/4'] ), 1 )
+    self.assertEqual( sorted( self.cache.getLFNs( 1 ) ), ['/a/2'] )
+    self.assertEqual( self.cache.clear( 1 ), 1 )
+    self.assertEqual( self.cache.countReplicas(), 1 )
+
+  def test_expire( self ):
+    self.cache.addReplicas( 1, {'/a/1':['SE1']}, updateTime = 0 )
+    self.cache.addReplicas( 1, {'/a/2':['SE1']} )
+    self.assertEqual( self.cache.expireReplicas( 1, 86400 ), 1 )
+    self.assertEqual( self.cache.getLFNs( 1 ), ['/a/2'] )
+
+  def test_importPickle( self ):
+    now = datetime.datetime.utcnow()
+    old = now - datetime.timedelta( days = 10 )
+    fileName = os.path.join( self.workDir, 'ReplicaCache_3.pkl' )
+    f = open( fileName, 'w' )
+    pickle.dump( {old:{'/a/1':['SE1'], '/a/2':['SE1']}, now:{'/a/1':['SE2']}}, f )
+    f.close()
+    res = self.cache.importPickle( fileName, 3 )
+    self.assert_( res['OK'] )
+    self.assertEqual( res['Value'], 3 )
+    self.assertEqual( self.cache.getReplicas( 3, ['/a/1', '/a/2'] ), {'/a/1':['SE2'], '/a/2':['SE1']} )
+    self.assertEqual( self.cache.expireReplicas( 3, 2 * 86400 ), 1 )
+    self.assertFalse( self.cache.importPickle( os.path.join( self.workDir, 'missing.pkl' ) )['OK'] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ReplicaCacheSuccess )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
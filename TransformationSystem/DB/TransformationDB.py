@@ -13,10 +13,11 @@ from DIRAC                                                import gLogger, S_OK,
 from DIRAC.Core.Base.DB                                   import DB
 from DIRAC.Resources.Catalog.FileCatalog                  import FileCatalog
 from DIRAC.Core.Security.ProxyInfo                        import getProxyInfo
-from DIRAC.Core.Utilities.List                            import stringListToString, intListToString, breakListIntoChunks
+from DIRAC.Core.Utilities.List                            import stringListToString, intListToString
 from DIRAC.Core.Utilities.Shifter                         import setupShifterProxyInEnv
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations  import Operations
 from DIRAC.Core.Utilities.Subprocess                      import pythonCall
+from DIRAC.Core.Utilities.PatternFilter                   import PatternFilter
 
 __RCSID__ = "$Id$"
 
@@ -42,7 +43,7 @@ class TransformationDB( DB ):
       DB.__init__( self, dbname, dbconfig, maxQueueSize )
 
     self.lock = threading.Lock()
-    self.filters = ()
+    self.filters = PatternFilter()
     res = self.__updateFilters()
     if not res['OK']:
       gLogger.fatal( "Failed to create filters" )
@@ -173,7 +174,7 @@ class TransformationDB( DB ):
     self.lock.release()
     # If the transformation has an input data specification
     if fileMask:
-      self.filters.append( ( transID, re.compile( fileMask ) ) )
+      self.filters.add( transID, fileMask )
 
     if inheritedFrom:
       res = self._getTransformationID( inheritedFrom, connection = connection )
@@ -352,15 +353,14 @@ class TransformationDB( DB ):
 
   def __updateFilters( self, connection = False ):
     """ Get filters for all defined input streams in all the transformations.
-        If transID argument is given, get filters only for this transformation.
+        Only the filters that changed are recompiled.
     """
     resultList = []
     # Define the general filter first
     self.database_name = self.__class__.__name__
     value = Operations().getValue( 'InputDataFilter/%sFilter' % self.database_name, '' )
     if value:
-      refilter = re.compile( value )
-      resultList.append( ( 0, refilter ) )
+      resultList.append( ( 0, value ) )
     # Per transformation filters
     req = "SELECT TransformationID,FileMask FROM Transformations;"
     res = self._query( req, connection )
@@ -368,22 +368,20 @@ class TransformationDB( DB ):
       return res
     for transID, mask in res['Value']:
       if mask:
-        refilter = re.compile( mask )
-        resultList.append( ( transID, refilter ) )
-    self.filters = resultList
-    return S_OK( resultList )
+        resultList.append( ( transID, mask ) )
+    changes = self.filters.update( resultList )
+    if changes:
+      gLogger.verbose( "TransformationDB.__updateFilters: %d filters updated" % changes )
+    return S_OK( self.filters.items() )
 
   def __filterFile( self, lfn, filters = None ):
     """Pass the input file through a supplied filter or those currently active """
+    if not filters:
+      return self.filters.match( lfn )
     result = []
-    if filters:
-      for transID, refilter in filters:
-        if refilter.search( lfn ):
-          result.append( transID )
-    else:
-      for transID, refilter in self.filters:
-        if refilter.search( lfn ):
-          result.append( transID )
+    for transID, refilter in filters:
+      if refilter.search( lfn ):
+        result.append( transID )
     return result
 
   ###########################################################################
@@ -612,18 +610,10 @@ class TransformationDB( DB ):
     if not fileStatusDict:
       return S_OK()
 
-    # Building the request with "ON DUPLICATE KEY UPDATE"
-    req = "INSERT INTO TransformationFiles (TransformationID, FileID, Status, ErrorCount, LastUpdate) VALUES "
-
-    updatesList = []
-    for fileID, status in fileStatusDict.items():
-
-      updatesList.append( "(%d, %d, '%s', 0, UTC_TIMESTAMP())" % ( transID, fileID, status ) )
-
-    req += ','.join( updatesList )
-    req += " ON DUPLICATE KEY UPDATE Status=VALUES(Status),ErrorCount=ErrorCount+1,LastUpdate=VALUES(LastUpdate)"
-
-    return self._update( req, connection )
+    rows = [ ( transID, fileID, status, 0, 'UTC_TIMESTAMP()' ) for fileID, status in fileStatusDict.items() ]
+    return self.upsertMany( 'TransformationFiles', ['TransformationID', 'FileID', 'Status', 'ErrorCount', 'LastUpdate'],
+                            rows, updateFields = ['Status', 'LastUpdate'],
+                            updateExpressions = {'ErrorCount':'ErrorCount+1'}, conn = connection )
 
 
   def getTransformationStats( self, transName, connection = False ):
@@ -677,11 +667,9 @@ class TransformationDB( DB ):
       fileIDs.remove( tupleIn[0] )
     if not fileIDs:
       return S_OK( [] )
-    req = "INSERT INTO TransformationFiles (TransformationID,FileID,LastUpdate,InsertedTime) VALUES"
-    for fileID in fileIDs:
-      req = "%s (%d,%d,UTC_TIMESTAMP(),UTC_TIMESTAMP())," % ( req, transID, fileID )
-    req = req.rstrip( ',' )
-    res = self._update( req, connection )
+    res = self.insertMany( 'TransformationFiles', ['TransformationID', 'FileID', 'LastUpdate', 'InsertedTime'],
+                           [ ( transID, fileID, 'UTC_TIMESTAMP()', 'UTC_TIMESTAMP()' ) for fileID in fileIDs ],
+                           conn = connection )
     if not res['OK']:
       return res
     return S_OK( fileIDs )
@@ -689,12 +677,10 @@ class TransformationDB( DB ):
   def __addExistingFiles( self, transID, connection = False ):
     """ Add files that already exist in the DataFiles table to the transformation specified by the transID
     """
-    for tID, _filter in self.filters:
-      if tID == transID:
-        filters = [( tID, filter )]
-        break
-    if not filters:
+    refilter = self.filters.getPattern( transID )
+    if not refilter:
       return S_ERROR( 'No filters defined for transformation %d' % transID )
+    filters = [( transID, refilter )]
     res = self.__getAllFileIDs( connection = connection )
     if not res['OK']:
       return res
@@ -710,33 +696,18 @@ class TransformationDB( DB ):
     """
     gLogger.info( "Inserting %d files in TransformationFiles" % len( fileTuplesList ) )
 
-    # splitting in various chunks, in case it is too big
-    for fileTuples in breakListIntoChunks( fileTuplesList, 10000 ):
-
-      gLogger.verbose( "Adding first %d files in TransformationFiles (out of %d)" % ( len( fileTuples ),
-                                                                                      len( fileTuplesList ) ) )
-      req = "INSERT INTO TransformationFiles (TransformationID,Status,TaskID,FileID,TargetSE,UsedSE,LastUpdate) VALUES"
-      candidates = False
-
-      for ft in fileTuples:
-        _lfn, originalID, fileID, status, taskID, targetSE, usedSE, _errorCount, _lastUpdate, _insertTime = ft[:10]
-        if status not in ( 'Unused', 'Removed' ):
-          candidates = True
-          if not re.search( '-', status ):
-            status = "%s-inherited" % status
-            if taskID:
-              taskID = str( int( originalID ) ).zfill( 8 ) + '_' + str( int( taskID ) ).zfill( 8 )
-          req = "%s (%d,'%s','%s',%d,'%s','%s',UTC_TIMESTAMP())," % ( req, transID, status, taskID,
-                                                                      fileID, targetSE, usedSE )
-      if not candidates:
-        continue
+    rows = []
+    for ft in fileTuplesList:
+      _lfn, originalID, fileID, status, taskID, targetSE, usedSE, _errorCount, _lastUpdate, _insertTime = ft[:10]
+      if status not in ( 'Unused', 'Removed' ):
+        if not re.search( '-', status ):
+          status = "%s-inherited" % status
+          if taskID:
+            taskID = str( int( originalID ) ).zfill( 8 ) + '_' + str( int( taskID ) ).zfill( 8 )
+        rows.append( ( transID, status, taskID, fileID, targetSE, usedSE, 'UTC_TIMESTAMP()' ) )
 
-      req = req.rstrip( "," )
-      res = self._update( req, connection )
-      if not res['OK']:
-        return res
-
-    return S_OK()
+    return self.insertMany( 'TransformationFiles', ['TransformationID', 'Status', 'TaskID', 'FileID', 'TargetSE',
+                                                    'UsedSE', 'LastUpdate'], rows, conn = connection )
 
   def __assignTransformationFile( self, transID, taskID, se, fileIDs, connection = False ):
     """ Make necessary updates to the TransformationFiles table for the newly created task
@@ -746,11 +717,8 @@ class TransformationDB( DB ):
     res = self._update( req, connection )
     if not res['OK']:
       gLogger.error( "Failed to assign file to task", res['Message'] )
-    fileTuples = []
-    for fileID in fileIDs:
-      fileTuples.append( ( "(%d,%d,%d)" % ( transID, fileID, taskID ) ) )
-    req = "INSERT INTO TransformationFileTasks (TransformationID,FileID,TaskID) VALUES %s" % ','.join( fileTuples )
-    res = self._update( req, connection )
+    res = self.insertMany( 'TransformationFileTasks', ['TransformationID', 'FileID', 'TaskID'],
+                           [ ( transID, fileID, taskID ) for fileID in fileIDs ], conn = connection )
     if not res['OK']:
       gLogger.error( "Failed to assign file to task", res['Message'] )
     return res
@@ -946,10 +914,11 @@ class TransformationDB( DB ):
       taskIDList = [taskID]
     else:
       taskIDList = list( taskID )
-    for taskID in taskIDList:
-      res = self.__setTaskParameterValue( transID, taskID, 'ExternalStatus', status, connection = connection )
-      if not res['OK']:
-        return res
+    tasksDict = dict( [ ( ( transID, int( taskID ) ), {'ExternalStatus':status} ) for taskID in taskIDList ] )
+    res = self.updateMany( 'TransformationTasks', ['TransformationID', 'TaskID'], tasksDict,
+                           updateDict = {'LastUpdateTime':'UTC_TIMESTAMP()'}, conn = connection )
+    if not res['OK']:
+      return res
     return S_OK()
 
   def getTransformationTaskStats( self, transName = '', connection = False ):
@@ -1231,13 +1200,15 @@ class TransformationDB( DB ):
     if not res['OK']:
       return res
     _fileIDs, lfnFileIDs = res['Value']
-    for lfn in lfns:
-      if not lfn in lfnFileIDs.keys():
-        req = "INSERT INTO DataFiles (LFN,Status) VALUES ('%s','New');" % lfn
-        res = self._update( req, connection )
-        if not res['OK']:
-          return res
-        lfnFileIDs[lfn] = res['lastRowId']
+    newLFNs = [ lfn for lfn in set( lfns ) if lfn not in lfnFileIDs ]
+    if newLFNs:
+      res = self.insertMany( 'DataFiles', ['LFN', 'Status'], [ ( lfn, 'New' ) for lfn in newLFNs ], conn = connection )
+      if not res['OK']:
+        return res
+      res = self.__getFileIDsForLfns( newLFNs, connection = connection )
+      if not res['OK']:
+        return res
+      lfnFileIDs.update( res['Value'][1] )
     return S_OK( lfnFileIDs )
 
   def __setDataFileStatus( self, fileIDs, status, connection = False ):
@@ -19,7 +19,7 @@ from DIRAC.Resources.Computing.ComputingElementFactory     import ComputingEleme
 from DIRAC.WorkloadManagementSystem.Client.ServerUtils     import pilotAgentsDB, jobDB
 from DIRAC.WorkloadManagementSystem.Service.WMSUtilities   import getGridEnv
 from DIRAC.WorkloadManagementSystem.private.ConfigHelper   import findGenericPilotCredentials
-from DIRAC                                                 import S_OK, S_ERROR, gConfig
+from DIRAC                                                 import S_OK, S_ERROR, gConfig, gMonitor
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.AccountingSystem.Client.Types.Pilot             import Pilot as PilotAccounting
 from DIRAC.AccountingSystem.Client.DataStoreClient         import gDataStoreClient
@@ -28,7 +28,8 @@ from DIRAC.Core.Security                                   import CS
 from DIRAC.Core.Utilities.SiteCEMapping                    import getSiteForCE
 from DIRAC.Core.Utilities.Time                             import dateTime, second
 from DIRAC.Core.Utilities.List                             import fromChar
-import os, base64, bz2, tempfile, random, socket, types
+from DIRAC.Core.Utilities.ThreadPool                       import ThreadPool
+import os, base64, bz2, tempfile, random, socket, types, threading, time
 import DIRAC
 
 from collections import defaultdict
@@ -68,6 +69,14 @@ class SiteDirector( AgentModule ):
     self.firstPass = True
     self.maxJobsInFillMode = MAX_JOBS_IN_FILLMODE
     self.maxPilotsToSubmit = MAX_PILOTS_TO_SUBMIT
+    self.threadPool = None
+    self.submissionLock = threading.Lock()
+    self.pilotsInFlight = {}
+    self.ceSemaphores = {}
+    self.ceSemaphoresLock = threading.Lock()
+    self.queuesInProgress = set()
+    self.queueResults = {}
+    self.monitoredQueues = set()
     return S_OK()
 
   def beginExecution( self ):
@@ -124,6 +133,12 @@ class SiteDirector( AgentModule ):
     self.pilotWaitingTime = self.am_getOption( 'MaxPilotWaitingTime', 3600 )
     self.failedQueueCycleFactor = self.am_getOption( 'FailedQueueCycleFactor', 10 )
     self.pilotStatusUpdateCycleFactor = self.am_getOption( 'PilotStatusUpdateCycleFactor', 10 ) 
+    # Number of threads submitting to different queues at the same time, 0 for serial submission
+    self.submissionThreads = self.am_getOption( 'SubmissionThreads', 0 )
+    self.maxSubmissionsPerCE = self.am_getOption( 'MaxSubmissionsPerCE', 1 )
+    self.submissionTimeout = self.am_getOption( 'SubmissionTimeout', 600 )
+    if self.submissionThreads and not self.threadPool:
+      self.threadPool = ThreadPool( self.submissionThreads, self.submissionThreads )
 
     # Flags
     self.updateStatus = self.am_getOption( 'UpdatePilotStatus', True )
@@ -384,114 +399,242 @@ class SiteDirector( AgentModule ):
 
     queues = self.queueDict.keys()
     random.shuffle( queues )
-    totalSubmittedPilots = 0
-    for queue in queues:
+    result = self.__processQueues( queues, self.__submitToQueue,
+                                   ( anySite, jobSites, testSites, siteMaskList ), 'submission' )
+    if not result['OK']:
+      return result
+    totalSubmittedPilots = sum( [ submitted for submitted in result['Value'].values() if submitted ] )
 
-      # Check if the queue failed previously
-      failedCount = self.failedQueues[ queue ] % self.failedQueueCycleFactor
-      if failedCount != 0:
-        self.log.warn( "%s queue failed recently, skipping %d cycles" % ( queue, 10-failedCount ) )
-        self.failedQueues[queue] += 1
-        continue
+    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
+    return S_OK()
 
-      ce = self.queueDict[queue]['CE']
-      ceName = self.queueDict[queue]['CEName']
-      ceType = self.queueDict[queue]['CEType']
-      queueName = self.queueDict[queue]['QueueName']
-      siteName = self.queueDict[queue]['Site']
-      platform = self.queueDict[queue]['Platform']
-      siteMask = siteName in siteMaskList
+  def __processQueues( self, queues, method, args, action ):
+    """ Call method( queue, *args ) for all the queues, one after the other or, if
+        SubmissionThreads is set, with the thread pool. At most MaxSubmissionsPerCE
+        calls go to the same CE at the same time and the calls not finished after
+        SubmissionTimeout seconds are not waited for. Returns a { queue : value }
+        dictionary with the values of the successful calls
+    """
+    results = {}
+    if not self.submissionThreads:
+      for queue in queues:
+        result = self.__callForQueue( queue, method, args, action )
+        if not result['OK']:
+          return result
+        results[queue] = result['Value']
+      return S_OK( results )
 
-      if not anySite and siteName not in jobSites:
-        self.log.verbose( "Skipping queue %s at %s: no workload expected" % (queueName, siteName) )
+    queued = []
+    for queue in queues:
+      if queue in self.queuesInProgress:
+        self.log.warn( "%s: still busy with a previous cycle, skipping the %s" % ( queue, action ) )
         continue
-      if not siteMask and siteName not in testSites:
-        self.log.verbose( "Skipping queue %s at site %s not in the mask" % (queueName, siteName) )
+      self.queuesInProgress.add( queue )
+      result = self.threadPool.generateJobAndQueueIt( self.__callForQueue,
+                                                      args = ( queue, method, args, action ),
+                                                      sTJId = queue,
+                                                      oCallback = self.__queueCallback,
+                                                      oExceptionCallback = self.__queueExceptionCallback )
+      if not result['OK']:
+        self.queuesInProgress.discard( queue )
+        self.log.error( 'Failed to queue the %s for %s' % ( action, queue ), result['Message'] )
         continue
+      queued.append( queue )
+
+    deadline = time.time() + self.submissionTimeout
+    while [ queue for queue in queued if queue in self.queuesInProgress ] and time.time() < deadline:
+      self.threadPool.processResults()
+      time.sleep( 0.1 )
+    self.threadPool.processResults()
+
+    for queue in queued:
+      if queue in self.queuesInProgress:
+        self.log.warn( "%s: %s not finished after %d seconds, not waiting for it" % ( queue, action,
+                                                                                    self.submissionTimeout ) )
+        self.failedQueues[queue] += 1
+      elif queue in self.queueResults:
+        result = self.queueResults.pop( queue )
+        if not result['OK']:
+          self.log.error( 'Failed %s for queue %s' % ( action, queue ), result['Message'] )
+        else:
+          results[queue] = result['Value']
+    return S_OK( results )
 
-      if 'CPUTime' in self.queueDict[queue]['ParametersDict'] :
-        queueCPUTime = int( self.queueDict[queue]['ParametersDict']['CPUTime'] )
-      else:
-        self.log.warn( 'CPU time limit is not specified for queue %s, skipping...' % queue )
-        continue
-      if queueCPUTime > self.maxQueueLength:
-        queueCPUTime = self.maxQueueLength
-
-      # Prepare the queue description to look for eligible jobs
-      ceDict = ce.getParameterDict()
-      ceDict[ 'GridCE' ] = ceName
-      #if not siteMask and 'Site' in ceDict:
-      #  self.log.info( 'Site not in the mask %s' % siteName )
-      #  self.log.info( 'Removing "Site" from matching Dict' )
-      #  del ceDict[ 'Site' ]
-      if not siteMask:
-        ceDict['JobType'] = "Test"
-      if self.vo:
-        ceDict['Community'] = self.vo
-      if self.voGroups:
-        ceDict['OwnerGroup'] = self.voGroups
+  def __callForQueue( self, queue, method, args, action ):
+    """ Call method for the queue respecting the per CE concurrency limit,
+        recording the time it took in the monitoring
+    """
+    ceName = self.queueDict[queue]['CEName']
+    self.ceSemaphoresLock.acquire()
+    try:
+      if ceName not in self.ceSemaphores:
+        self.ceSemaphores[ceName] = threading.Semaphore( self.maxSubmissionsPerCE )
+      semaphore = self.ceSemaphores[ceName]
+    finally:
+      self.ceSemaphoresLock.release()
 
-      # This is a hack to get rid of !
-      ceDict['SubmitPool'] = self.defaultSubmitPools
-      
-      if "Tag" in ceDict and type( ceDict['Tag'] ) in types.StringTypes:
-        ceDict['Tag'] = fromChar( ceDict['Tag'] )
+    semaphore.acquire()
+    try:
+      start = time.time()
+      result = method( queue, *args )
+      elapsed = time.time() - start
+    finally:
+      semaphore.release()
+
+    activity = "%s-%s" % ( action, queue )
+    if activity not in self.monitoredQueues:
+      gMonitor.registerActivity( activity, "Time of the pilot %s to %s" % ( action, queue ),
+                                 "SiteDirector", "seconds", gMonitor.OP_MEAN )
+      self.monitoredQueues.add( activity )
+    gMonitor.addMark( activity, elapsed )
+    self.log.verbose( "%s: %s done in %.1f seconds" % ( queue, action, elapsed ) )
+    return result
+
+  def __queueCallback( self, threadedJob, result ):
+    """ Store the result of a queue processed by the thread pool
+    """
+    queue = threadedJob.jobId()
+    self.queueResults[queue] = result
+    self.queuesInProgress.discard( queue )
 
-      result = Resources.getCompatiblePlatforms( platform )
-      if not result['OK']:
-        continue
-      ceDict['Platform'] = result['Value']
+  def __queueExceptionCallback( self, threadedJob, exceptionInfo ):
+    """ Log the exception raised by a queue processed by the thread pool
+    """
+    queue = threadedJob.jobId()
+    self.log.exception( "Exception while processing queue %s" % queue, lExcInfo = exceptionInfo )
+    self.queueResults[queue] = S_ERROR( "Exception: %s" % str( exceptionInfo[1] ) )
+    self.queuesInProgress.discard( queue )
 
-      # Get the number of eligible jobs for the target site/queue
-      result = rpcMatcher.getMatchingTaskQueues( ceDict )
+  def __countWaitingPilots( self, tqIDList ):
+    """ Get the number of already waiting pilots for the task queues
+    """
+    totalWaitingPilots = 0
+    if self.pilotWaitingFlag:
+      lastUpdateTime = dateTime() - self.pilotWaitingTime * second
+      result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
+                                            'Status': WAITING_PILOT_STATUS },
+                                            None, lastUpdateTime )
       if not result['OK']:
-        self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
-        return result
-      taskQueueDict = result['Value']
-      if not taskQueueDict:
-        self.log.verbose( 'No matching TQs found for %s' % queue )
-        continue
+        self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
+        totalWaitingPilots = 0
+      else:
+        totalWaitingPilots = result['Value']
+        self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
+    return totalWaitingPilots
 
-      totalTQJobs = 0
-      tqIDList = taskQueueDict.keys()
-      for tq in taskQueueDict:
-        totalTQJobs += taskQueueDict[tq]['Jobs']
+  def __getPilotsInFlight( self, tqIDList ):
+    """ Get the number of pilots being submitted by other queues for any of the task
+        queues, not yet in the PilotAgentsDB. Submission lock must be held
+    """
+    tqIDs = set( tqIDList )
+    return sum( [ pilots for tqSet, pilots in self.pilotsInFlight.values() if tqSet & tqIDs ] )
 
-      self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
+  def __submitToQueue( self, queue, anySite, jobSites, testSites, siteMaskList ):
+    """ Submit the pilots needed for the queue, returns the number of submitted pilots
+    """
+    ce = self.queueDict[queue]['CE']
+    ceName = self.queueDict[queue]['CEName']
+    ceType = self.queueDict[queue]['CEType']
+    queueName = self.queueDict[queue]['QueueName']
+    siteName = self.queueDict[queue]['Site']
+    platform = self.queueDict[queue]['Platform']
+    siteMask = siteName in siteMaskList
+    submittedPilots = 0
+
+    # Check if the queue failed previously
+    failedCount = self.failedQueues[ queue ] % self.failedQueueCycleFactor
+    if failedCount != 0:
+      self.log.warn( "%s queue failed recently, skipping %d cycles" % ( queue, 10-failedCount ) )
+      self.failedQueues[queue] += 1
+      return S_OK( submittedPilots )
+
+    if not anySite and siteName not in jobSites:
+      self.log.verbose( "Skipping queue %s at %s: no workload expected" % (queueName, siteName) )
+      return S_OK( submittedPilots )
+    if not siteMask and siteName not in testSites:
+      self.log.verbose( "Skipping queue %s at site %s not in the mask" % (queueName, siteName) )
+      return S_OK( submittedPilots )
+
+    if 'CPUTime' in self.queueDict[queue]['ParametersDict'] :
+      queueCPUTime = int( self.queueDict[queue]['ParametersDict']['CPUTime'] )
+    else:
+      self.log.warn( 'CPU time limit is not specified for queue %s, skipping...' % queue )
+      return S_OK( submittedPilots )
+    if queueCPUTime > self.maxQueueLength:
+      queueCPUTime = self.maxQueueLength
+
+    # Prepare the queue description to look for eligible jobs
+    ceDict = ce.getParameterDict()
+    ceDict[ 'GridCE' ] = ceName
+    #if not siteMask and 'Site' in ceDict:
+    #  self.log.info( 'Site not in the mask %s' % siteName )
+    #  self.log.info( 'Removing "Site" from matching Dict' )
+    #  del ceDict[ 'Site' ]
+    if not siteMask:
+      ceDict['JobType'] = "Test"
+    if self.vo:
+      ceDict['Community'] = self.vo
+    if self.voGroups:
+      ceDict['OwnerGroup'] = self.voGroups
 
-      # Get the number of already waiting pilots for these task queues
-      totalWaitingPilots = 0
-      if self.pilotWaitingFlag:
-        lastUpdateTime = dateTime() - self.pilotWaitingTime * second
-        result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
-                                              'Status': WAITING_PILOT_STATUS },
-                                              None, lastUpdateTime )
-        if not result['OK']:
-          self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
-          totalWaitingPilots = 0
-        else:
-          totalWaitingPilots = result['Value']
-          self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
-      if totalWaitingPilots >= totalTQJobs:
-        self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
-        continue
+    # This is a hack to get rid of !
+    ceDict['SubmitPool'] = self.defaultSubmitPools
+    
+    if "Tag" in ceDict and type( ceDict['Tag'] ) in types.StringTypes:
+      ceDict['Tag'] = fromChar( ceDict['Tag'] )
 
-      self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+    result = Resources.getCompatiblePlatforms( platform )
+    if not result['OK']:
+      return S_OK( submittedPilots )
+    ceDict['Platform'] = result['Value']
 
-      # Get the working proxy
-      cpuTime = queueCPUTime + 86400
-      self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
-      result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
-      if not result['OK']:
-        return result
-      self.proxy = result['Value']
-      ce.setProxy( self.proxy, cpuTime - 60 )
+    # Get the number of eligible jobs for the target site/queue
+    rpcMatcher = RPCClient( "WorkloadManagement/Matcher" )
+    result = rpcMatcher.getMatchingTaskQueues( ceDict )
+    if not result['OK']:
+      self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
+      return result
+    taskQueueDict = result['Value']
+    if not taskQueueDict:
+      self.log.verbose( 'No matching TQs found for %s' % queue )
+      return S_OK( submittedPilots )
+
+    totalTQJobs = 0
+    tqIDList = taskQueueDict.keys()
+    for tq in taskQueueDict:
+      totalTQJobs += taskQueueDict[tq]['Jobs']
+
+    self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
+
+    # Get the number of already waiting pilots for these task queues
+    totalWaitingPilots = self.__countWaitingPilots( tqIDList )
+    if totalWaitingPilots >= totalTQJobs:
+      self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
+      return S_OK( submittedPilots )
+
+    self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+
+    # Get the working proxy
+    cpuTime = queueCPUTime + 86400
+    self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
+    result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
+    if not result['OK']:
+      return result
+    proxy = result['Value']
+    self.proxy = proxy
+    ce.setProxy( proxy, cpuTime - 60 )
 
-      # Get the number of available slots on the target site/queue
-      totalSlots = self.__getQueueSlots( queue )
-      if totalSlots == 0:
-        self.log.debug( '%s: No slots available' % queue )
-        continue
+    # Get the number of available slots on the target site/queue
+    totalSlots = self.__getQueueSlots( queue )
+    if totalSlots == 0:
+      self.log.debug( '%s: No slots available' % queue )
+      return S_OK( submittedPilots )
+
+    self.submissionLock.acquire()
+    try:
+      if self.submissionThreads:
+        # Other queues may have submitted pilots for the same task queues in the meantime
+        totalWaitingPilots = self.__countWaitingPilots( tqIDList ) + self.__getPilotsInFlight( tqIDList )
 
       pilotsToSubmit = max( 0, min( totalSlots, totalTQJobs - totalWaitingPilots ) )
       self.log.info( '%s: Slots=%d, TQ jobs=%d, Pilots: waiting %d, to submit=%d' % \
@@ -499,7 +642,12 @@ class SiteDirector( AgentModule ):
 
       # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
       pilotsToSubmit = min( self.maxPilotsToSubmit, pilotsToSubmit )
+      # Until they are in the PilotAgentsDB the pilots are accounted as in flight
+      self.pilotsInFlight[queue] = ( set( tqIDList ), pilotsToSubmit )
+    finally:
+      self.submissionLock.release()
 
+    try:
       while pilotsToSubmit > 0:
         self.log.info( 'Going to submit %d pilots to %s queue' % ( pilotsToSubmit, queue ) )
 
@@ -510,7 +658,7 @@ class SiteDirector( AgentModule ):
         jobExecDir = self.queueDict[queue]['ParametersDict'].get( 'JobExecDir', jobExecDir )          
         httpProxy = self.queueDict[queue]['ParametersDict'].get( 'HttpProxy', '' )
 
-        result = self.__getExecutable( queue, pilotsToSubmit, bundleProxy, httpProxy, jobExecDir )
+        result = self.__getExecutable( queue, pilotsToSubmit, bundleProxy, httpProxy, jobExecDir, proxy )
         if not result['OK']:
           return result
 
@@ -532,7 +680,7 @@ class SiteDirector( AgentModule ):
         # task queue priorities
         pilotList = result['Value']
         self.queueSlots[queue]['AvailableSlots'] -= len( pilotList )
-        totalSubmittedPilots += len( pilotList )
+        submittedPilots += len( pilotList )
         self.log.info( 'Submitted %d pilots to %s@%s' % ( len( pilotList ), queueName, ceName ) )
         stampDict = {}
         if result.has_key( 'PilotStampDict' ):
@@ -554,28 +702,38 @@ class SiteDirector( AgentModule ):
             tqDict[tqID] = []
           tqDict[tqID].append( pilotID )
 
-        for tqID, pilotList in tqDict.items():
-          result = pilotAgentsDB.addPilotTQReference( pilotList,
-                                                     tqID,
-                                                     self.pilotDN,
-                                                     self.pilotGroup,
-                                                     self.localhost,
-                                                     ceType,
-                                                     '',
-                                                     stampDict )
-          if not result['OK']:
-            self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
-            continue
-          for pilot in pilotList:
-            result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
-                                                  'Successfully submitted by the SiteDirector',
-                                                  siteName, queueName )
+        self.submissionLock.acquire()
+        try:
+          for tqID, pilotList in tqDict.items():
+            result = pilotAgentsDB.addPilotTQReference( pilotList,
+                                                       tqID,
+                                                       self.pilotDN,
+                                                       self.pilotGroup,
+                                                       self.localhost,
+                                                       ceType,
+                                                       '',
+                                                       stampDict )
             if not result['OK']:
-              self.log.error( 'Failed to set pilot status: ', result['Message'] )
+              self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
               continue
-
-    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
-    return S_OK()
+            for pilot in pilotList:
+              result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
+                                                    'Successfully submitted by the SiteDirector',
+                                                    siteName, queueName )
+              if not result['OK']:
+                self.log.error( 'Failed to set pilot status: ', result['Message'] )
+                continue
+          self.pilotsInFlight[queue] = ( set( tqIDList ), pilotsToSubmit )
+        finally:
+          self.submissionLock.release()
+    finally:
+      self.submissionLock.acquire()
+      try:
+        self.pilotsInFlight.pop( queue, None )
+      finally:
+        self.submissionLock.release()
+
+    return S_OK( submittedPilots )
 
   def __getQueueSlots( self, queue ):
     """ Get the number of available slots in the queue
@@ -615,13 +773,14 @@ class SiteDirector( AgentModule ):
     return totalSlots
 
 #####################################################################################
-  def __getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '' ):
+  def __getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '',
+                       pilotProxy = None ):
     """ Prepare the full executable for queue
     """
 
     proxy = None
     if bundleProxy:
-      proxy = self.proxy
+      proxy = pilotProxy or self.proxy
     pilotOptions, pilotsToSubmit = self._getPilotOptions( queue, pilotsToSubmit )
     if pilotOptions is None:
       self.log.error( "Pilot options empty, error in compilation" )
@@ -835,107 +994,9 @@ EOF
   def updatePilotStatus( self ):
     """ Update status of pilots in transient states
     """
-    for queue in self.queueDict:
-      ce = self.queueDict[queue]['CE']
-      ceName = self.queueDict[queue]['CEName']
-      queueName = self.queueDict[queue]['QueueName']
-      ceType = self.queueDict[queue]['CEType']
-      siteName = self.queueDict[queue]['Site']
-      abortedPilots = 0
-
-      result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                            'Queue':queueName,
-                                            'GridType':ceType,
-                                            'GridSite':siteName,
-                                            'Status':TRANSIENT_PILOT_STATUS,
-                                            'OwnerDN': self.pilotDN,
-                                            'OwnerGroup': self.pilotGroup } )
-      if not result['OK']:
-        self.log.error( 'Failed to select pilots: %s' % result['Message'] )
-        continue
-      pilotRefs = result['Value']
-      if not pilotRefs:
-        continue
-
-      result = pilotAgentsDB.getPilotInfo( pilotRefs )
-      if not result['OK']:
-        self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-        continue
-      pilotDict = result['Value']
-
-      stampedPilotRefs = []
-      for pRef in pilotDict:
-        if pilotDict[pRef]['PilotStamp']:
-          stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
-        else:
-          stampedPilotRefs = list( pilotRefs )
-          break
-
-      result = ce.isProxyValid()
-      if not result['OK']:
-        result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 23400 )
-        if not result['OK']:
-          return result
-        self.proxy = result['Value']
-        ce.setProxy( self.proxy, 23300 )
-
-      result = ce.getJobStatus( stampedPilotRefs )
-      if not result['OK']:
-        self.log.error( 'Failed to get pilots status from CE', '%s: %s' % ( ceName, result['Message'] ) )
-        continue
-      pilotCEDict = result['Value']
-
-      for pRef in pilotRefs:
-        newStatus = ''
-        oldStatus = pilotDict[pRef]['Status']
-        ceStatus = pilotCEDict[pRef]
-        lastUpdateTime = pilotDict[pRef]['LastUpdateTime']
-        sinceLastUpdate = dateTime() - lastUpdateTime
-
-        if oldStatus == ceStatus and ceStatus != "Unknown":
-          # Normal status did not change, continue
-          continue
-        elif ceStatus == "Unknown" and oldStatus == "Unknown":
-          if sinceLastUpdate < 3600*second:
-            # Allow 1 hour of Unknown status assuming temporary problems on the CE
-            continue
-          else:
-            newStatus = 'Aborted'
-        elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
-          # Possible problems on the CE, let's keep the Unknown status for a while
-          newStatus = 'Unknown'
-        elif ceStatus != 'Unknown' :
-          # Update the pilot status to the new value
-          newStatus = ceStatus
-
-        if newStatus:
-          self.log.info( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
-          result = pilotAgentsDB.setPilotStatus( pRef, newStatus, '', 'Updated by SiteDirector' )
-          if newStatus == "Aborted":
-            abortedPilots += 1
-        # Retrieve the pilot output now
-        if newStatus in FINAL_PILOT_STATUS:
-          if pilotDict[pRef]['OutputReady'].lower() == 'false' and self.getOutput:
-            self.log.info( 'Retrieving output for pilot %s' % pRef )
-            pilotStamp = pilotDict[pRef]['PilotStamp']
-            pRefStamp = pRef
-            if pilotStamp:
-              pRefStamp = pRef + ':::' + pilotStamp
-            result = ce.getJobOutput( pRefStamp )
-            if not result['OK']:
-              self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
-            else:
-              output, error = result['Value']
-              if output:
-                result = pilotAgentsDB.storePilotOutput( pRef, output, error )
-                if not result['OK']:
-                  self.log.error( 'Failed to store pilot output', result['Message'] )
-              else:
-                self.log.warn( 'Empty pilot output not stored to PilotDB' )
-
-      # If something wrong in the queue, make a pause for the job submission
-      if abortedPilots:
-        self.failedQueues[queue] += 1 
+    result = self.__processQueues( self.queueDict.keys(), self.__updateQueuePilotStatus, (), 'status update' )
+    if not result['OK']:
+      return result
 
     # The pilot can be in Done state set by the job agent check if the output is retrieved
     for queue in self.queueDict:
@@ -1011,6 +1072,112 @@ EOF
 
     return S_OK()
 
+  def __updateQueuePilotStatus( self, queue ):
+    """ Update status of the pilots of the queue in transient states
+    """
+    ce = self.queueDict[queue]['CE']
+    ceName = self.queueDict[queue]['CEName']
+    queueName = self.queueDict[queue]['QueueName']
+    ceType = self.queueDict[queue]['CEType']
+    siteName = self.queueDict[queue]['Site']
+    abortedPilots = 0
+
+    result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
+                                          'Queue':queueName,
+                                          'GridType':ceType,
+                                          'GridSite':siteName,
+                                          'Status':TRANSIENT_PILOT_STATUS,
+                                          'OwnerDN': self.pilotDN,
+                                          'OwnerGroup': self.pilotGroup } )
+    if not result['OK']:
+      self.log.error( 'Failed to select pilots: %s' % result['Message'] )
+      return S_OK()
+    pilotRefs = result['Value']
+    if not pilotRefs:
+      return S_OK()
+
+    result = pilotAgentsDB.getPilotInfo( pilotRefs )
+    if not result['OK']:
+      self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+      return S_OK()
+    pilotDict = result['Value']
+
+    stampedPilotRefs = []
+    for pRef in pilotDict:
+      if pilotDict[pRef]['PilotStamp']:
+        stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
+      else:
+        stampedPilotRefs = list( pilotRefs )
+        break
+
+    result = ce.isProxyValid()
+    if not result['OK']:
+      result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 23400 )
+      if not result['OK']:
+        return result
+      self.proxy = result['Value']
+      ce.setProxy( self.proxy, 23300 )
+
+    result = ce.getJobStatus( stampedPilotRefs )
+    if not result['OK']:
+      self.log.error( 'Failed to get pilots status from CE', '%s: %s' % ( ceName, result['Message'] ) )
+      return S_OK()
+    pilotCEDict = result['Value']
+
+    for pRef in pilotRefs:
+      newStatus = ''
+      oldStatus = pilotDict[pRef]['Status']
+      ceStatus = pilotCEDict[pRef]
+      lastUpdateTime = pilotDict[pRef]['LastUpdateTime']
+      sinceLastUpdate = dateTime() - lastUpdateTime
+
+      if oldStatus == ceStatus and ceStatus != "Unknown":
+        # Normal status did not change, continue
+        continue
+      elif ceStatus == "Unknown" and oldStatus == "Unknown":
+        if sinceLastUpdate < 3600*second:
+          # Allow 1 hour of Unknown status assuming temporary problems on the CE
+          continue
+        else:
+          newStatus = 'Aborted'
+      elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
+        # Possible problems on the CE, let's keep the Unknown status for a while
+        newStatus = 'Unknown'
+      elif ceStatus != 'Unknown' :
+        # Update the pilot status to the new value
+        newStatus = ceStatus
+
+      if newStatus:
+        self.log.info( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
+        result = pilotAgentsDB.setPilotStatus( pRef, newStatus, '', 'Updated by SiteDirector' )
+        if newStatus == "Aborted":
+          abortedPilots += 1
+      # Retrieve the pilot output now
+      if newStatus in FINAL_PILOT_STATUS:
+        if pilotDict[pRef]['OutputReady'].lower() == 'false' and self.getOutput:
+          self.log.info( 'Retrieving output for pilot %s' % pRef )
+          pilotStamp = pilotDict[pRef]['PilotStamp']
+          pRefStamp = pRef
+          if pilotStamp:
+            pRefStamp = pRef + ':::' + pilotStamp
+          result = ce.getJobOutput( pRefStamp )
+          if not result['OK']:
+            self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
+          else:
+            output, error = result['Value']
+            if output:
+              result = pilotAgentsDB.storePilotOutput( pRef, output, error )
+              if not result['OK']:
+                self.log.error( 'Failed to store pilot output', result['Message'] )
+            else:
+              self.log.warn( 'Empty pilot output not stored to PilotDB' )
+
+    # If something wrong in the queue, make a pause for the job submission
+    if abortedPilots:
+      self.failedQueues[queue] += 1 
+
+    return S_OK()
+
   def sendPilotAccounting( self, pilotDict ):
     """ Send pilot accounting record
     """
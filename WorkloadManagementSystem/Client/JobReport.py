@@ -8,6 +8,7 @@ __RCSID__ = "$Id$"
 from DIRAC import S_OK, S_ERROR, Time, gLogger
 from DIRAC.Core.Utilities import DEncode
 from DIRAC.Core.DISET.RPCClient import RPCClient
+from DIRAC.WorkloadManagementSystem.Client.JobStateUpdateQueue import getGlobalJobStateUpdateQueue
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 
 class JobReport( object ):
@@ -45,8 +46,8 @@ class JobReport( object ):
     if application:
       self.appStatusInfo.append( ( application.replace( "'", '' ), timeStamp ) )
     if sendFlag:
-      # and send
-      return self.sendStoredStatusInfo()
+      # and send, possibly together with other updates
+      return self.sendStoredStatusInfo( force = False )
 
     return S_OK()
 
@@ -60,8 +61,8 @@ class JobReport( object ):
     # add Application status record
     self.appStatusInfo.append( ( appStatus.replace( "'", '' ), timeStamp ) )
     if sendFlag:
-      # and send
-      return self.sendStoredStatusInfo()
+      # and send, possibly together with other updates
+      return self.sendStoredStatusInfo( force = False )
 
     return S_OK()
 
@@ -97,8 +98,9 @@ class JobReport( object ):
 
     return S_OK()
 
-  def sendStoredStatusInfo( self ):
-    """ Send the job status information stored in the internal cache
+  def sendStoredStatusInfo( self, force = True, keepOnFailure = True ):
+    """ Send the job status information stored in the internal cache. Unless forced,
+        it can be delayed to be sent with other updates by the JobStateUpdateQueue
     """
 
     statusDict = {}
@@ -114,14 +116,16 @@ class JobReport( object ):
                             'Source': self.source }
 
     if statusDict:
-      jobMonitor = RPCClient( 'WorkloadManagement/JobStateUpdate', timeout = 60 )
-      result = jobMonitor.setJobStatusBulk( self.jobID, statusDict )
-      if result['OK']:
-        # Empty the internal status containers
-        self.jobStatusInfo = []
-        self.appStatusInfo = []
+      result = getGlobalJobStateUpdateQueue().sendStatus( self.jobID, statusDict, force = force,
+                                                          keepOnFailure = keepOnFailure )
+      # The queue has taken care of the status information
+      self.jobStatusInfo = []
+      self.appStatusInfo = []
       return result
 
+    elif force:
+      # Send what other reports may have left in the queue
+      return getGlobalJobStateUpdateQueue().flush( keepOnFailure = keepOnFailure )
     else:
       return S_OK( 'Empty' )
 
@@ -187,7 +191,7 @@ class JobReport( object ):
     """
     forwardDISETOp = None
 
-    result = self.sendStoredStatusInfo()
+    result = self.sendStoredStatusInfo( keepOnFailure = False )
     if not result['OK']:
       gLogger.error( "Error while sending the job status", result['Message'] )
       if 'rpcStub' in result:
@@ -0,0 +1,152 @@
+"""
+  JobStateUpdateQueue coalesces the status updates and the heart beats of the jobs
+  handled by a process and sends them to the JobStateUpdate service with a single
+  setJobsStatusBulk call instead of one call per update.
+
+  Status updates that are not forced wait at most CoalesceTime seconds
+  (/LocalSite/JobStateUpdateCoalesceTime, 0 sends them right away) so that the ones
+  arriving in between go in the same call. Heart beats are always sent immediately,
+  together with everything pending, because the job commands come back with them.
+"""
+
+__RCSID__ = "$Id$"
+
+import atexit
+import threading
+
+from DIRAC import S_OK, S_ERROR, gConfig, gLogger
+from DIRAC.Core.DISET.RPCClient import RPCClient
+
+class JobStateUpdateQueue( object ):
+  """
+    .. class:: JobStateUpdateQueue
+  """
+
+  def __init__( self, coalesceTime = 5 ):
+    """ c'tor
+
+    :param coalesceTime: seconds a status update waits for others to be sent with
+    """
+    self.coalesceTime = coalesceTime
+    self.log = gLogger.getSubLogger( "JobStateUpdateQueue" )
+    self.__lock = threading.Lock()
+    self.__sendLock = threading.Lock()
+    self.__pending = {}
+    self.__timer = None
+
+  def __getJobEntry( self, jobID ):
+    """ Get the pending updates of a job. Lock must be held
+    """
+    return self.__pending.setdefault( int( jobID ), { 'Status' : {}, 'HeartBeats' : [] } )
+
+  def sendStatus( self, jobID, statusDict, force = True, keepOnFailure = True ):
+    """ Queue the { date : status information } dictionary of a job, as in setJobStatusBulk,
+        and send it now if forced or after the coalescing time otherwise
+    """
+    self.__lock.acquire()
+    try:
+      self.__getJobEntry( jobID )['Status'].update( statusDict )
+      if not force and self.coalesceTime > 0:
+        if not self.__timer:
+          self.__timer = threading.Timer( self.coalesceTime, self.flush )
+          self.__timer.setDaemon( True )
+          self.__timer.start()
+        return S_OK( 'Queued' )
+    finally:
+      self.__lock.release()
+
+    result = self.flush( keepOnFailure = keepOnFailure )
+    if not result['OK']:
+      return result
+    if int( jobID ) in result['Value']['Failed']:
+      return S_ERROR( result['Value']['Failed'][int( jobID )] )
+    return S_OK()
+
+  def sendHeartBeat( self, jobID, dynamicData, staticData ):
+    """ Send the heart beat of a job together with all the pending updates
+        and return the commands for the job
+    """
+    self.__lock.acquire()
+    try:
+      self.__getJobEntry( jobID )['HeartBeats'].append( ( dynamicData, staticData ) )
+    finally:
+      self.__lock.release()
+
+    result = self.flush()
+    if not result['OK']:
+      return result
+    if int( jobID ) in result['Value']['Failed']:
+      return S_ERROR( result['Value']['Failed'][int( jobID )] )
+    return S_OK( result['Value']['Successful'].get( int( jobID ), {} ) )
+
+  def flush( self, keepOnFailure = True ):
+    """ Send all the pending updates. If the call fails the status updates are kept to be
+        sent with the next call unless keepOnFailure is False, heart beats are dropped.
+        Returns the setJobsStatusBulk result, including the rpcStub if the call failed
+    """
+    # Only one call at a time, so updates of the same job are not reordered
+    self.__sendLock.acquire()
+    try:
+      self.__lock.acquire()
+      try:
+        if self.__timer:
+          self.__timer.cancel()
+          self.__timer = None
+        pending = self.__pending
+        self.__pending = {}
+      finally:
+        self.__lock.release()
+      if not pending:
+        return S_OK( { 'Successful' : {}, 'Failed' : {} } )
+
+      jobMonitor = RPCClient( 'WorkloadManagement/JobStateUpdate', timeout = 120 )
+      result = jobMonitor.setJobsStatusBulk( pending )
+      if not result['OK'] and result['Message'].find( 'Unknown method' ) == 0:
+        result = self.__sendOneByOne( jobMonitor, pending )
+    finally:
+      self.__sendLock.release()
+
+    if not result['OK']:
+      self.log.warn( 'Failed to send the updates of %d jobs' % len( pending ), result['Message'] )
+      if keepOnFailure:
+        self.__lock.acquire()
+        try:
+          for jobID, jobDict in pending.items():
+            if jobDict['Status']:
+              # Newer updates queued meanwhile have priority
+              statusDict = dict( jobDict['Status'] )
+              statusDict.update( self.__getJobEntry( jobID )['Status'] )
+              self.__getJobEntry( jobID )['Status'] = statusDict
+        finally:
+          self.__lock.release()
+    return result
+
+  def __sendOneByOne( self, jobMonitor, pending ):
+    """ Send the updates with the single job calls, for services without setJobsStatusBulk
+    """
+    successful = {}
+    failed = {}
+    for jobID, jobDict in pending.items():
+      commands = {}
+      for dynamicData, staticData in jobDict['HeartBeats']:
+        result = jobMonitor.sendHeartBeat( jobID, dynamicData, staticData )
+        if not result['OK']:
+          return result
+        commands.update( result['Value'] )
+      if jobDict['Status']:
+        result = jobMonitor.setJobStatusBulk( jobID, jobDict['Status'] )
+        if not result['OK']:
+          if 'rpcStub' in result:
+            return result
+          failed[jobID] = result['Message']
+          continue
+      successful[jobID] = commands
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+gJobStateUpdateQueue = None
+def getGlobalJobStateUpdateQueue():
+  global gJobStateUpdateQueue
+  if not gJobStateUpdateQueue:
+    gJobStateUpdateQueue = JobStateUpdateQueue( gConfig.getValue( '/LocalSite/JobStateUpdateCoalesceTime', 5 ) )
+    atexit.register( gJobStateUpdateQueue.flush )
+  return gJobStateUpdateQueue
@@ -0,0 +1,156 @@
+""" Test_JobStateUpdateQueue
+
+    unit tests for the JobStateUpdateQueue, with a mocked JobStateUpdate RPC client
+"""
+
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC.WorkloadManagementSystem.Client import JobStateUpdateQueue as JobStateUpdateQueueModule
+from DIRAC.WorkloadManagementSystem.Client.JobStateUpdateQueue import JobStateUpdateQueue
+
+__RCSID__ = '$Id:  $'
+
+def statusDict( date, status ):
+  """ { date : status information } dictionary as sent by the JobReport """
+  return { date : { 'Status' : status, 'MinorStatus' : '', 'ApplicationStatus' : '', 'Source' : 'Test' } }
+
+################################################################################
+
+class JobStateUpdateQueue_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    """ the RPC client of the module is replaced by a mock """
+    self.rpc = MagicMock()
+    self.rpc.setJobsStatusBulk.side_effect = self.__setJobsStatusBulk
+    self.patcher = patch.object( JobStateUpdateQueueModule, 'RPCClient', return_value = self.rpc )
+    self.patcher.start()
+    self.calls = []
+    self.failures = []
+    self.commands = {}
+
+  def tearDown( self ):
+    self.patcher.stop()
+
+  def __setJobsStatusBulk( self, jobsDict ):
+    """ fake service: records the calls, fails with the queued failures first """
+    self.calls.append( jobsDict )
+    if self.failures:
+      return self.failures.pop( 0 )
+    return { 'OK' : True, 'Value' : { 'Successful' : dict( [ ( jobID, self.commands.get( jobID, {} ) )
+                                                             for jobID in jobsDict ] ),
+                                      'Failed' : {} } }
+
+  def test01forced( self ):
+    """ forced updates are sent right away """
+    queue = JobStateUpdateQueue( coalesceTime = 5 )
+    result = queue.sendStatus( '123', statusDict( '2014-01-01 10:00:00', 'Running' ) )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( self.calls, [ { 123 : { 'Status' : statusDict( '2014-01-01 10:00:00', 'Running' ),
+                                              'HeartBeats' : [] } } ] )
+    # # nothing left
+    self.assertEqual( queue.flush(), { 'OK' : True, 'Value' : { 'Successful' : {}, 'Failed' : {} } } )
+    self.assertEqual( len( self.calls ), 1 )
+
+  def test02coalescing( self ):
+    """ not forced updates wait for the timer and go in the same call """
+    queue = JobStateUpdateQueue( coalesceTime = 0.2 )
+    result = queue.sendStatus( 1, statusDict( '2014-01-01 10:00:00', 'Running' ), force = False )
+    self.assertEqual( result, { 'OK' : True, 'Value' : 'Queued' } )
+    queue.sendStatus( 2, statusDict( '2014-01-01 10:00:01', 'Running' ), force = False )
+    queue.sendStatus( 1, statusDict( '2014-01-01 10:00:02', 'Completed' ), force = False )
+    self.assertEqual( self.calls, [] )
+    for _i in range( 50 ):
+      if self.calls:
+        break
+      time.sleep( 0.05 )
+    self.assertEqual( len( self.calls ), 1 )
+    self.assertEqual( sorted( self.calls[0] ), [ 1, 2 ] )
+    self.assertEqual( sorted( self.calls[0][1]['Status'] ), [ '2014-01-01 10:00:00', '2014-01-01 10:00:02' ] )
+    # # no coalescing time: sent right away even if not forced
+    queue = JobStateUpdateQueue( coalesceTime = 0 )
+    queue.sendStatus( 3, statusDict( '2014-01-01 10:00:03', 'Running' ), force = False )
+    self.assertEqual( len( self.calls ), 2 )
+
+  def test03heartBeat( self ):
+    """ heart beats flush the pending updates and get the job commands back """
+    self.commands = { 5 : { 'Kill' : '' } }
+    queue = JobStateUpdateQueue( coalesceTime = 60 )
+    queue.sendStatus( 6, statusDict( '2014-01-01 10:00:00', 'Running' ), force = False )
+    result = queue.sendHeartBeat( 5, { 'CPU' : 1 }, { 'Node' : 'wn' } )
+    self.assertEqual( result, { 'OK' : True, 'Value' : { 'Kill' : '' } } )
+    self.assertEqual( len( self.calls ), 1 )
+    self.assertEqual( self.calls[0][5]['HeartBeats'], [ ( { 'CPU' : 1 }, { 'Node' : 'wn' } ) ] )
+    self.assertEqual( self.calls[0][6]['Status'], statusDict( '2014-01-01 10:00:00', 'Running' ) )
+
+  def test04keepOnFailure( self ):
+    """ failed status updates are kept for the next call, newer ones have priority """
+    queue = JobStateUpdateQueue( coalesceTime = 60 )
+    self.failures = [ { 'OK' : False, 'Message' : 'Connection refused', 'rpcStub' : 'stub' } ]
+    queue.sendStatus( 1, statusDict( 'date1', 'Running' ), force = False )
+    # # the heart beat sends the pending status with it
+    result = queue.sendHeartBeat( 1, { 'CPU' : 1 }, {} )
+    self.assertEqual( result['OK'], False )
+    self.assertEqual( result['rpcStub'], 'stub' )
+    queue.sendStatus( 1, { 'date1' : { 'Status' : 'Failed', 'MinorStatus' : '', 'ApplicationStatus' : '',
+                                       'Source' : 'Test' } }, force = False )
+    queue.sendStatus( 1, statusDict( 'date2', 'Done' ), force = False )
+    result = queue.flush()
+    self.assertTrue( result['OK'] )
+    # # the heart beat is dropped, the status kept and updated by the newer value
+    self.assertEqual( self.calls[-1][1]['HeartBeats'], [] )
+    self.assertEqual( sorted( self.calls[-1][1]['Status'] ), [ 'date1', 'date2' ] )
+    self.assertEqual( self.calls[-1][1]['Status']['date1']['Status'], 'Failed' )
+    # # or dropped
+    self.failures = [ { 'OK' : False, 'Message' : 'Connection refused' } ]
+    queue.sendStatus( 2, statusDict( 'date3', 'Running' ), force = False )
+    self.assertEqual( queue.flush( keepOnFailure = False )['OK'], False )
+    self.assertEqual( queue.flush(), { 'OK' : True, 'Value' : { 'Successful' : {}, 'Failed' : {} } } )
+    # # the job specific errors are returned by sendStatus
+    self.failures = [ { 'OK' : True, 'Value' : { 'Successful' : {}, 'Failed' : { 3 : 'No Matching Job' } } } ]
+    self.assertEqual( queue.sendStatus( 3, statusDict( 'date4', 'Running' ) ),
+                      { 'OK' : False, 'Message' : 'No Matching Job' } )
+
+  def test05oneByOne( self ):
+    """ services without setJobsStatusBulk get the single job calls """
+    self.failures = [ { 'OK' : False, 'Message' : "Unknown method setJobsStatusBulk" } ]
+    self.rpc.sendHeartBeat.return_value = { 'OK' : True, 'Value' : { 'Kill' : '' } }
+    self.rpc.setJobStatusBulk.side_effect = lambda jobID, sDict: { 'OK' : False, 'Message' : 'No Matching Job' } \
+                                                                 if jobID == 2 else { 'OK' : True, 'Value' : '' }
+    queue = JobStateUpdateQueue( coalesceTime = 60 )
+    queue.sendStatus( 1, statusDict( 'date1', 'Running' ), force = False )
+    queue.sendStatus( 2, statusDict( 'date1', 'Running' ), force = False )
+    result = queue.sendHeartBeat( 1, { 'CPU' : 1 }, { 'Node' : 'wn' } )
+    self.assertEqual( result, { 'OK' : True, 'Value' : { 'Kill' : '' } } )
+    self.rpc.sendHeartBeat.assert_called_once_with( 1, { 'CPU' : 1 }, { 'Node' : 'wn' } )
+    self.assertEqual( sorted( [ call[0][0] for call in self.rpc.setJobStatusBulk.call_args_list ] ), [ 1, 2 ] )
+    # # a connection error stops the calls and keeps the updates
+    self.failures = [ { 'OK' : False, 'Message' : "Unknown method setJobsStatusBulk" } ]
+    self.rpc.setJobStatusBulk.side_effect = None
+    self.rpc.setJobStatusBulk.return_value = { 'OK' : False, 'Message' : 'Timeout', 'rpcStub' : 'stub' }
+    queue.sendStatus( 3, statusDict( 'date2', 'Running' ), force = False )
+    result = queue.flush()
+    self.assertEqual( result['OK'], False )
+    self.rpc.setJobStatusBulk.return_value = { 'OK' : True, 'Value' : '' }
+    self.assertEqual( queue.flush()['Value']['Successful'], { 3 : {} } )
+
+  def test06atexit( self ):
+    """ the global queue is flushed at exit """
+    with patch.object( JobStateUpdateQueueModule, 'gJobStateUpdateQueue', None ):
+      with patch.object( JobStateUpdateQueueModule.atexit, 'register' ) as register:
+        queue = JobStateUpdateQueueModule.getGlobalJobStateUpdateQueue()
+        self.assertTrue( queue is JobStateUpdateQueueModule.getGlobalJobStateUpdateQueue() )
+        register.assert_called_once_with( queue.flush )
+    queue.sendStatus( 7, statusDict( 'date1', 'Running' ), force = False )
+    self.assertEqual( self.calls, [] )
+    # # what atexit runs
+    register.call_args[0][0]()
+    self.assertEqual( self.calls[0].keys(), [ 7 ] )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobStateUpdateQueue_TestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -14,6 +14,8 @@
     getAllJobParameters()
     getInputData()
     getJobJDL()
+    getJobsJDL()
+    getJobsOptParameters()
 
     selectJobs()
     selectJobsWithStatus()
@@ -44,6 +46,7 @@ __RCSID__ = "$Id$"
 
 import sys
 import operator
+from types import ListType, TupleType
 
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight               import ClassAd
 from DIRAC                                                   import S_OK, S_ERROR, Time
@@ -509,6 +512,32 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'JobDB.getJobOptParameters: failed to retrieve parameters' )
 
+#############################################################################
+  def getJobsOptParameters( self, jobIDList, paramList = None ):
+    """ Get optimizer parameters for a list of jobs with a single query.
+        Returns S_OK( { jobID : { name : value } } )
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    resultDict = dict( [ ( int( jobID ), {} ) for jobID in jobIDList ] )
+    cmd = "SELECT JobID, Name, Value from OptimizerParameters WHERE JobID in (%s)" % \
+          ','.join( [ str( jobID ) for jobID in resultDict ] )
+    if paramList:
+      ret = self._escapeValues( paramList )
+      if not ret['OK']:
+        return ret
+      cmd += " and Name in (%s)" % ','.join( ret['Value'] )
+
+    result = self._query( cmd )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.getJobsOptParameters: failed to retrieve parameters' )
+    for jobID, name, value in result['Value']:
+      try:
+        resultDict[int( jobID )][name] = value.tostring()
+      except Exception:
+        resultDict[int( jobID )][name] = value
+    return S_OK( resultDict )
+
 #############################################################################
 
   def getInputData( self, jobID ):
@@ -532,24 +561,15 @@ class JobDB( DB ):
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
-    jobID = ret['Value']
-    cmd = 'DELETE FROM InputData WHERE JobID=%s' % ( jobID )
+    cmd = 'DELETE FROM InputData WHERE JobID=%s' % ( ret['Value'] )
     result = self._update( cmd )
     if not result['OK']:
       result = S_ERROR( 'JobDB.setInputData: operation failed.' )
 
-    for lfn in inputData:
-      # some jobs are setting empty string as InputData
-      if not lfn:
-        continue
-      ret = self._escapeString( lfn.strip() )
-      if not ret['OK']:
-        return ret
-      lfn = ret['Value']
-      cmd = 'INSERT INTO InputData (JobID,LFN) VALUES (%s, %s )' % ( jobID, lfn )
-      res = self._update( cmd )
-      if not res['OK']:
-        return res
+    # some jobs are setting empty string as InputData
+    res = self.insertMany( 'InputData', ['JobID', 'LFN'], [ ( jobID, lfn.strip() ) for lfn in inputData if lfn ] )
+    if not res['OK']:
+      return res
 
     return S_OK( 'Files added' )
 
@@ -654,13 +674,19 @@ class JobDB( DB ):
 #############################################################################
   def setJobAttributes( self, jobID, attrNames, attrValues, update = False, myDate = None ):
     """ Set an attribute value for job specified by jobID.
+        jobID can also be a list of job IDs, all of them get the same values.
         The LastUpdate time stamp is refreshed if explicitely requested
     """
 
-    ret = self._escapeString( jobID )
-    if not ret['OK']:
-      return ret
-    jobID = ret['Value']
+    if type( jobID ) in ( ListType, TupleType ):
+      if not jobID:
+        return S_ERROR( 'JobDB.setAttributes: Nothing to do' )
+      jobCond = 'JobID in ( %s )' % ','.join( [ str( int( jid ) ) for jid in jobID ] )
+    else:
+      ret = self._escapeString( jobID )
+      if not ret['OK']:
+        return ret
+      jobCond = 'JobID=%s' % ret['Value']
 
     if len( attrNames ) != len( attrValues ):
       return S_ERROR( 'JobDB.setAttributes: incompatible Argument length' )
@@ -678,7 +704,7 @@ class JobDB( DB ):
     if len( attr ) == 0:
       return S_ERROR( 'JobDB.setAttributes: Nothing to do' )
 
-    cmd = 'UPDATE Jobs SET %s WHERE JobID=%s' % ( ', '.join( attr ), jobID )
+    cmd = 'UPDATE Jobs SET %s WHERE %s' % ( ', '.join( attr ), jobCond )
 
     if myDate:
       cmd += ' AND LastUpdateTime < %s' % myDate
@@ -689,6 +715,27 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'JobDB.setAttributes: failed to set attribute' )
 
+#############################################################################
+  def setJobsAttributes( self, jobsAttrDict, update = False, onlyIfNull = None ):
+    """ Set different attribute values for several jobs with a single query.
+        jobsAttrDict is a { jobID : { attrName : attrValue } } dictionary. The attributes
+        in the onlyIfNull list are only set for the jobs where they are still NULL.
+        The LastUpdate time stamp of all the jobs is refreshed if explicitely requested
+    """
+    if not jobsAttrDict:
+      return S_OK()
+
+    # FIXME: Need to check the validity of attrNames
+    updateDict = {}
+    if update:
+      updateDict['LastUpdateTime'] = 'UTC_TIMESTAMP()'
+    jobsAttrDict = dict( [ ( int( jobID ), attrDict ) for jobID, attrDict in jobsAttrDict.items() ] )
+    res = self.updateMany( 'Jobs', 'JobID', jobsAttrDict, updateDict = updateDict, onlyIfNull = onlyIfNull )
+    if res['OK']:
+      return res
+    else:
+      return S_ERROR( 'JobDB.setJobsAttributes: failed to set attributes' )
+
 #############################################################################
   def setJobStatus( self, jobID, status = '', minor = '', application = '', appCounter = None ):
     """ Set status of the job specified by its jobID
@@ -791,20 +838,8 @@ class JobDB( DB ):
     if not parameters:
       return S_OK()
 
-    insertValueList = []
-    for name, value in parameters:
-      ret = self._escapeString( name )
-      if not ret['OK']:
-        return ret
-      e_name = ret['Value']
-      ret = self._escapeString( value )
-      if not ret['OK']:
-        return ret
-      e_value = ret['Value']
-      insertValueList.append( '(%s,%s,%s)' % ( jobID, e_name, e_value ) )
-
-    cmd = 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( insertValueList )
-    result = self._update( cmd )
+    result = self.upsertMany( 'JobParameters', ['JobID', 'Name', 'Value'],
+                              [ ( jobID, name, value ) for name, value in parameters ], updateFields = ['Value'] )
     if not result['OK']:
       return S_ERROR( 'JobDB.setJobParameters: operation failed.' )
 
@@ -1003,6 +1038,24 @@ class JobDB( DB ):
     else:
       return result
 
+#############################################################################
+  def getJobsJDL( self, jobIDList, original = False ):
+    """ Get the JDLs for a list of jobs with a single query.
+        Returns S_OK( { jobID : JDL } )
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    if original:
+      column = 'OriginalJDL'
+    else:
+      column = 'JDL'
+    cmd = "SELECT JobID, %s FROM JobJDLs WHERE JobID in (%s)" % ( column,
+                                                               ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] ) )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( jobID ), jdl ) for jobID, jdl in result['Value'] ] ) )
+
 #############################################################################
   def insertNewJobIntoDB( self, jdl, owner, ownerDN, ownerGroup, diracSetup ):
     """ Insert the initial JDL into the Job database,
@@ -1138,29 +1191,11 @@ class JobDB( DB ):
     inputData = []
     if classAdJob.lookupAttribute( 'InputData' ):
       inputData = classAdJob.getListFromExpression( 'InputData' )
-    values = []
-
-    ret = self._escapeString( jobID )
-    if not ret['OK']:
-      return ret
-    e_jobID = ret['Value']
 
-    for lfn in inputData:
-      # some jobs are setting empty string as InputData
-      if not lfn:
-        continue
-      ret = self._escapeString( lfn.strip() )
-      if not ret['OK']:
-        return ret
-      lfn = ret['Value']
-
-      values.append( '(%s, %s )' % ( e_jobID, lfn ) )
-
-    if values:
-      cmd = 'INSERT INTO InputData (JobID,LFN) VALUES %s' % ', '.join( values )
-      result = self._update( cmd )
-      if not result['OK']:
-        return result
+    # some jobs are setting empty string as InputData
+    result = self.insertMany( 'InputData', ['JobID', 'LFN'], [ ( jobID, lfn.strip() ) for lfn in inputData if lfn ] )
+    if not result['OK']:
+      return result
 
     retVal['Status'] = 'Received'
     retVal['MinorStatus'] = 'Job accepted'
@@ -2013,6 +2048,57 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'Failed to store some or all the parameters' )
 
+#####################################################################################
+  def setHeartBeatDataBulk( self, heartBeatList ):
+    """ Add the heart beat data of several jobs to the database with bulk queries.
+        heartBeatList is a list of ( jobID, staticDataDict, dynamicDataDict ) tuples
+    """
+    if not heartBeatList:
+      return S_OK()
+
+    jobIDs = set( [ int( jobID ) for jobID, _static, _dynamic in heartBeatList ] )
+    req = "UPDATE Jobs SET HeartBeatTime=UTC_TIMESTAMP(), Status='Running' WHERE JobID in (%s)" % \
+          ','.join( [ str( jobID ) for jobID in jobIDs ] )
+    result = self._update( req )
+    if not result['OK']:
+      return S_ERROR( 'Failed to set the heart beat time: ' + result['Message'] )
+
+    ok = True
+    paramList = []
+    valueList = []
+    for jobID, staticDataDict, dynamicDataDict in heartBeatList:
+      for key, value in staticDataDict.items():
+        result = self._escapeValues( [ key, value ] )
+        if not result['OK']:
+          self.log.warn( 'Failed to escape parameter ' + str( key ) )
+          continue
+        paramList.append( '(%d,%s,%s)' % ( int( jobID ), result['Value'][0], result['Value'][1] ) )
+      for key, value in dynamicDataDict.items():
+        result = self._escapeValues( [ str( key ), str( value ) ] )
+        if not result['OK']:
+          self.log.warn( 'Failed to escape string ' + str( key ) )
+          continue
+        valueList.append( "( %d, %s,%s,UTC_TIMESTAMP())" % ( int( jobID ), result['Value'][0], result['Value'][1] ) )
+
+    if paramList:
+      result = self._update( 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( paramList ) )
+      if not result['OK']:
+        ok = False
+        self.log.warn( result['Message'] )
+
+    if valueList:
+      req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES "
+      req += ','.join( valueList )
+      result = self._update( req )
+      if not result['OK']:
+        ok = False
+        self.log.warn( result['Message'] )
+
+    if ok:
+      return S_OK()
+    else:
+      return S_ERROR( 'Failed to store some or all the parameters' )
+
 #####################################################################################
   def getHeartBeatData( self, jobID ):
     """ Retrieve the job's heart beat data
@@ -2093,6 +2179,54 @@ class JobDB( DB ):
 
     return S_OK( resultDict )
 
+#####################################################################################
+  def getJobsCommands( self, jobIDs, status = 'Received' ):
+    """ Get the commands to be passed to several jobs together with their
+        next heart beat. Returns a { jobID : { command : arguments } } dictionary
+    """
+    if not jobIDs:
+      return S_OK( {} )
+
+    ret = self._escapeString( status )
+    if not ret['OK']:
+      return ret
+    status = ret['Value']
+
+    req = "SELECT JobID, Command, Arguments FROM JobCommands WHERE JobID in (%s) AND Status=%s" % \
+          ( ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] ), status )
+    result = self._query( req )
+    if not result['OK']:
+      return result
+
+    resultDict = {}
+    for jobID, command, arguments in result['Value']:
+      resultDict.setdefault( int( jobID ), {} )[command] = arguments
+
+    return S_OK( resultDict )
+
+#####################################################################################
+  def setJobsCommandsStatus( self, jobsCommands, status ):
+    """ Set the status of the commands of several jobs.
+        jobsCommands is a { jobID : [ command ] } dictionary
+    """
+    condList = []
+    for jobID, commands in jobsCommands.items():
+      for command in commands:
+        ret = self._escapeString( command )
+        if not ret['OK']:
+          return ret
+        condList.append( "( JobID=%d AND Command=%s )" % ( int( jobID ), ret['Value'] ) )
+    if not condList:
+      return S_OK()
+
+    ret = self._escapeString( status )
+    if not ret['OK']:
+      return ret
+    status = ret['Value']
+
+    req = "UPDATE JobCommands SET Status=%s WHERE %s" % ( status, ' OR '.join( condList ) )
+    return self._update( req )
+
 #####################################################################################
   def setJobCommandStatus( self, jobID, command, status ):
     """ Set the command status
@@ -2,12 +2,14 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
     getJobLoggingInfo()
     getWMSTimeStamps()
+    getLastStatusTimes()
 """
 
 import time
-from types                import StringTypes, IntType, LongType
+from types                import StringTypes, IntType, LongType, ListType, TupleType
 
 from DIRAC                import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Utilities import Time
@@ -44,12 +46,55 @@ class JobLoggingDB( DB ):
         components can be specified. Optionaly the time stamp of the status can
         be provided in a form of a string in a format '%Y-%m-%d %H:%M:%S' or
         as datetime.datetime object. If the time stamp is not provided the current
-        UTC time is used.
+        UTC time is used. jobID can also be a list of job IDs, then the same record
+        is added for all of them with a single insert.
     """
 
+    if type( jobID ) in ( ListType, TupleType ):
+      jobIDs = [ int( jid ) for jid in jobID ]
+    else:
+      jobIDs = [ int( jobID ) ]
+    if not jobIDs:
+      return S_OK( 0 )
+
     event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
-    self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
+    self.gLogger.info( "Adding record for job " + ",".join( [ str( jid ) for jid in jobIDs ] ) + ": '" + event + "' from " + source )
+
+    _date, time_order = self.__getTimeStamp( date )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES " + \
+          ",".join( [ "(%d,'%s','%s','%s','%s',%f,'%s')" % ( jid, status, minor, application, str( _date ),
+                                                           time_order, source ) for jid in jobIDs ] )
+
+    return self._update( cmd )
+
+#############################################################################
+  def addLoggingRecords( self, records ):
+    """ Add several entries to the JobLoggingDB table with a single insert. records is
+        a list of ( jobID, status, minor, application, date, source ) tuples, with the
+        same meaning as the addLoggingRecord arguments
+    """
+    if not records:
+      return S_OK( 0 )
+
+    self.gLogger.info( "Adding %d records for %d jobs" % ( len( records ),
+                                                           len( set( [ record[0] for record in records ] ) ) ) )
+    valuesList = []
+    for jobID, status, minor, application, date, source in records:
+      _date, time_order = self.__getTimeStamp( date )
+      valuesList.append( "(%d,'%s','%s','%s','%s',%f,'%s')" % ( int( jobID ), status, minor, application, str( _date ),
+                                                                time_order, source ) )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES " + ",".join( valuesList )
+
+    return self._update( cmd )
 
+#############################################################################
+  def __getTimeStamp( self, date ):
+    """ Get the UTC datetime and the time order for a logging record date
+    """
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -76,12 +121,7 @@ class JobLoggingDB( DB ):
         _date = Time.dateTime()
         epoc = time.mktime( _date.timetuple() ) - MAGIC_EPOC_NUMBER
         time_order = round( epoc, 3 )
-
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
-
-    return self._update( cmd )
+    return _date, time_order
 
 #############################################################################
   def getJobLoggingInfo( self, jobID ):
@@ -160,3 +200,22 @@ class JobLoggingDB( DB ):
       result['LastTime'] = "Unknown"
 
     return S_OK( result )
+
+#############################################################################
+  def getLastStatusTimes( self, jobIDs ):
+    """ Get the time stamp of the latest status transition for each of the jobs
+        return a {jobID:timestamp} dictionary. Jobs without logging info are not included
+    """
+    if not jobIDs:
+      return S_OK( {} )
+
+    cmd = 'SELECT JobID,MAX(StatusTimeOrder) FROM LoggingInfo WHERE JobID in (%s) GROUP BY JobID' % \
+          ','.join( [ str( int( jobID ) ) for jobID in jobIDs ] )
+    resCmd = self._query( cmd )
+    if not resCmd['OK']:
+      return resCmd
+
+    result = {}
+    for jobID, etime in resCmd['Value']:
+      result[int( jobID )] = float( etime ) + MAGIC_EPOC_NUMBER
+    return S_OK( result )
@@ -28,7 +28,7 @@ from DIRAC.Core.Utilities.SiteCEMapping import getSiteForCE, getCESiteMapping
 import DIRAC.Core.Utilities.Time as Time
 from DIRAC.Core.DISET.RPCClient import RPCClient
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getUsernameForDN, getDNForUsername
-from types import IntType, LongType, ListType
+from types import IntType, LongType, ListType, TupleType
 import threading
 
 DEBUG = 1
@@ -434,18 +434,24 @@ class PilotAgentsDB( DB ):
 
 ##########################################################################################
   def setJobForPilot( self, jobID, pilotRef, site = None, updateStatus = True ):
-    """ Store the jobID of the job executed by the pilot with reference pilotRef
+    """ Store the jobID of the job executed by the pilot with reference pilotRef.
+        jobID can also be a list of job IDs executed by the same pilot
     """
 
+    if type( jobID ) in ( ListType, TupleType ):
+      jobIDs = [ int( jid ) for jid in jobID ]
+    else:
+      jobIDs = [ int( jobID ) ]
     pilotID = self.__getPilotID( pilotRef )
     if pilotID:
       if updateStatus:
-        reason = 'Report from job %d' % int( jobID )
+        reason = 'Report from job %s' % ','.join( [ str( jid ) for jid in jobIDs ] )
         result = self.setPilotStatus( pilotRef, status = 'Running', statusReason = reason,
                                      gridSite = site )
         if not result['OK']:
           return result
-      req = "INSERT INTO JobToPilotMapping VALUES (%d,%d,UTC_TIMESTAMP())" % ( pilotID, jobID )
+      req = "INSERT INTO JobToPilotMapping VALUES %s" % ','.join( [ "(%d,%d,UTC_TIMESTAMP())" % ( pilotID, jid )
+                                                                    for jid in jobIDs ] )
       result = self._update( req )
       return result
     else:
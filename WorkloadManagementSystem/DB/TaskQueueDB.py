@@ -11,11 +11,14 @@ from DIRAC.WorkloadManagementSystem.private.Queues import maxCPUSegments
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Utilities import List
 from DIRAC.Core.Utilities.DictCache import DictCache
+from DIRAC.Core.Utilities.LRUCache import LRUCache
 from DIRAC.Core.Base.DB import DB
 from DIRAC.Core.Security import Properties, CS
 
 DEFAULT_GROUP_SHARE = 1000
 TQ_MIN_SHARE = 0.001
+#Placeholder for the CPUTime value in the cached match SQL
+CPUTIME_PLACEHOLDER = "@@CPUTime@@"
 
 class TaskQueueDB( DB ):
 
@@ -41,6 +44,12 @@ class TaskQueueDB( DB ):
     self.__opsHelper = Operations()
     self.__ensureInsertionIsSingle = False
     self.__sharesCorrector = SharesCorrector( self.__opsHelper )
+    self.__matchSQLCache = LRUCache( maxSize = self.getCSOption( "MatchSQLCacheSize", 1000 ),
+                                     validSeconds = self.getCSOption( "MatchSQLCacheLifeTime", 300 ) )
+    #Only these fields are used to generate the match SQL
+    self.__matchCacheKeyFields = [ 'OwnerDN', 'OwnerGroup', 'Setup', 'LHCbPlatform', 'SystemConfig' ]
+    for multiField in self.__multiValueMatchFields:
+      self.__matchCacheKeyFields.extend( [ multiField, "Banned%s" % multiField ] )
     result = self.__initializeDB()
     if not result[ 'OK' ]:
       raise Exception( "Can't create tables: %s" % result[ 'Message' ] )
@@ -70,6 +79,15 @@ class TaskQueueDB( DB ):
   def getMultiValueMatchFields( self ):
     return self.__multiValueMatchFields
 
+  def getTagMatchFields( self ):
+    return self.__tagMatchFields
+
+  def getBannedJobMatchFields( self ):
+    return self.__bannedJobMatchFields
+
+  def getStrictRequireMatchFields( self ):
+    return self.__strictRequireMatchFields
+
   def __getCSOption( self, optionName, defValue ):
     return self.__opsHelper.getValue( "JobScheduling/%s" % optionName, defValue )
 
@@ -226,9 +244,10 @@ class TaskQueueDB( DB ):
           return S_ERROR( "PilotType %s is invalid" % pilotType )
     return S_OK( tqDefDict )
 
-  def _checkMatchDefinition( self, tqMatchDict ):
+  def _checkMatchDefinition( self, tqMatchDict, escapeValues = True ):
     """
     Check a task queue match dict is valid
+      If escapeValues is False the values are type checked but not escaped
     """
     def travelAndCheckType( value, validTypes, escapeValues = True ):
       valueType = type( value )
@@ -263,7 +282,8 @@ class TaskQueueDB( DB ):
       if field in [ "CPUTime" ]:
         result = travelAndCheckType( fieldValue, ( types.IntType, types.LongType ), escapeValues = False )
       else:
-        result = travelAndCheckType( fieldValue, ( types.StringType, types.UnicodeType ) )
+        result = travelAndCheckType( fieldValue, ( types.StringType, types.UnicodeType ),
+                                     escapeValues = escapeValues )
       if not result[ 'OK' ]:
         return S_ERROR( "Match definition field %s failed : %s" % ( field, result[ 'Message' ] ) )
       tqMatchDict[ field ] = result[ 'Value' ]
@@ -272,7 +292,8 @@ class TaskQueueDB( DB ):
       for field in ( multiField, "Banned%s" % multiField ):
         if field in tqMatchDict:
           fieldValue = tqMatchDict[ field ]
-          result = travelAndCheckType( fieldValue, ( types.StringType, types.UnicodeType ) )
+          result = travelAndCheckType( fieldValue, ( types.StringType, types.UnicodeType ),
+                                       escapeValues = escapeValues )
           if not result[ 'OK' ]:
             return S_ERROR( "Match definition field %s failed : %s" % ( field, result[ 'Message' ] ) )
           tqMatchDict[ field ] = result[ 'Value' ]
@@ -506,13 +527,17 @@ class TaskQueueDB( DB ):
     """
     Match a job
     """
-    #Make a copy to avoid modification of original if escaping needs to be done
-    tqMatchDict = dict( tqMatchDict )
-    self.log.info( "Starting match for requirements", self.__strDict( tqMatchDict ) )
-    retVal = self._checkMatchDefinition( tqMatchDict )
+    if self.log.shown( 'INFO' ):
+      self.log.info( "Starting match for requirements", self.__strDict( tqMatchDict ) )
+    if 'JobID' in tqMatchDict:
+      # A certain JobID is required by the resource, so all TQ are to be considered
+      retVal = self.__getTQMatchSQL( tqMatchDict, numQueuesToGet = 0 )
+    else:
+      retVal = self.__getTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesPerTry, negativeCond = negativeCond )
     if not retVal[ 'OK' ]:
       self.log.error( "TQ match request check failed", retVal[ 'Message' ] )
       return retVal
+    matchSQL, tqMatchDict = retVal[ 'Value' ]
     retVal = self._getConnection()
     if not retVal[ 'OK' ]:
       return S_ERROR( "Can't connect to DB: %s" % retVal[ 'Message' ] )
@@ -522,15 +547,8 @@ class TaskQueueDB( DB ):
     postJobSQL = " ORDER BY `tq_Jobs`.JobId ASC LIMIT %s" % numJobsPerTry
     for _ in range( self.__maxMatchRetry ):
       if 'JobID' in tqMatchDict:
-        # A certain JobID is required by the resource, so all TQ are to be considered
-        retVal = self.matchAndGetTaskQueue( tqMatchDict, numQueuesToGet = 0, skipMatchDictDef = True, connObj = connObj )
         preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % ( preJobSQL, tqMatchDict['JobID'] )
-      else:
-        retVal = self.matchAndGetTaskQueue( tqMatchDict,
-                                            numQueuesToGet = numQueuesPerTry,
-                                            skipMatchDictDef = True,
-                                            negativeCond = negativeCond,
-                                            connObj = connObj )
+      retVal = self.__matchTaskQueuesWithSQL( matchSQL, connObj = connObj )
       if not retVal[ 'OK' ]:
         return retVal
       tqList = retVal[ 'Value' ]
@@ -538,7 +556,7 @@ class TaskQueueDB( DB ):
         self.log.info( "No TQ matches requirements" )
         return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
       for tqId, tqOwnerDN, tqOwnerGroup in tqList:
-        self.log.info( "Trying to extract jobs from TQ %s" % tqId )
+        self.log.info( "Trying to extract jobs from TQ", "%s", tqId )
         retVal = self._query( prioSQL % tqId, conn = connObj )
         if not retVal[ 'OK' ]:
           return S_ERROR( "Can't retrieve winning priority for matching job: %s" % retVal[ 'Message' ] )
@@ -550,11 +568,11 @@ class TaskQueueDB( DB ):
           return S_ERROR( "Can't begin transaction for matching job: %s" % retVal[ 'Message' ] )
         jobTQList = [ ( row[0], row[1] ) for row in retVal[ 'Value' ] ]
         if len( jobTQList ) == 0:
-          gLogger.info( "Task queue %s seems to be empty, triggering a cleaning" % tqId )
+          gLogger.info( "Task queue seems to be empty, triggering a cleaning", "%s", tqId )
           self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
         while len( jobTQList ) > 0:
           jobId, tqId = jobTQList.pop( random.randint( 0, len( jobTQList ) - 1 ) )
-          self.log.info( "Trying to extract job %s from TQ %s" % ( jobId, tqId ) )
+          self.log.info( "Trying to extract job", "%s from TQ %s", jobId, tqId )
           retVal = self.deleteJob( jobId, connObj = connObj )
           if not retVal[ 'OK' ]:
             msgFix = "Could not take job"
@@ -562,9 +580,60 @@ class TaskQueueDB( DB ):
             self.log.error( msgFix, msgVar )
             return S_ERROR( msgFix + msgVar )
           if retVal[ 'Value' ] == True :
-            self.log.info( "Extracted job %s with prio %s from TQ %s" % ( jobId, prio, tqId ) )
+            self.log.info( "Extracted job", "%s with prio %s from TQ %s", jobId, prio, tqId )
             return S_OK( { 'matchFound' : True, 'jobId' : jobId, 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
-        self.log.info( "No jobs could be extracted from TQ %s" % tqId )
+        self.log.info( "No jobs could be extracted from TQ", "%s", tqId )
+    self.log.info( "Could not find a match after %s match retries" % self.__maxMatchRetry )
+    return S_ERROR( "Could not find a match after %s match retries" % self.__maxMatchRetry )
+
+  def matchAndGetJobs( self, tqMatchDict, maxJobs, numQueuesPerTry = 10, negativeCond = {} ):
+    """
+    Match up to maxJobs jobs from the same task queue
+      Returns S_OK( { 'matchFound' : True/False, 'jobIds' : [ ... ], 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
+    """
+    if self.log.shown( 'INFO' ):
+      self.log.info( "Starting match of %s jobs for requirements" % maxJobs, self.__strDict( tqMatchDict ) )
+    if 'JobID' in tqMatchDict:
+      # A certain JobID is required by the resource, so all TQ are to be considered
+      retVal = self.__getTQMatchSQL( tqMatchDict, numQueuesToGet = 0 )
+    else:
+      retVal = self.__getTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesPerTry, negativeCond = negativeCond )
+    if not retVal[ 'OK' ]:
+      self.log.error( "TQ match request check failed", retVal[ 'Message' ] )
+      return retVal
+    matchSQL, tqMatchDict = retVal[ 'Value' ]
+    jobsSQL = "SELECT `tq_Jobs`.JobId FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s"
+    if 'JobID' in tqMatchDict:
+      jobsSQL = "%s AND `tq_Jobs`.JobId = %s" % ( jobsSQL, int( tqMatchDict['JobID'] ) )
+    jobsSQL = "%s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT %%s" % jobsSQL
+    for _ in range( self.__maxMatchRetry ):
+      retVal = self.__matchTaskQueuesWithSQL( matchSQL )
+      if not retVal[ 'OK' ]:
+        return retVal
+      tqList = retVal[ 'Value' ]
+      if len( tqList ) == 0:
+        self.log.info( "No TQ matches requirements" )
+        return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
+      for tqId, tqOwnerDN, tqOwnerGroup in tqList:
+        self.log.info( "Trying to extract jobs", "%s from TQ %s", maxJobs, tqId )
+        retVal = self._query( jobsSQL % ( tqId, maxJobs ) )
+        if not retVal[ 'OK' ]:
+          return S_ERROR( "Can't retrieve jobs for matching: %s" % retVal[ 'Message' ] )
+        jobList = [ row[0] for row in retVal[ 'Value' ] ]
+        if len( jobList ) == 0:
+          gLogger.info( "Task queue seems to be empty, triggering a cleaning", "%s", tqId )
+          self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
+          continue
+        retVal = self.deleteJobs( jobList )
+        if not retVal[ 'OK' ]:
+          msgFix = "Could not take jobs"
+          msgVar = " %s out from the TQ %s: %s" % ( jobList, tqId, retVal[ 'Message' ] )
+          self.log.error( msgFix, msgVar )
+          return S_ERROR( msgFix + msgVar )
+        if retVal[ 'Value' ]:
+          self.log.info( "Extracted jobs", "%s from TQ %s", retVal[ 'Value' ], tqId )
+          return S_OK( { 'matchFound' : True, 'jobIds' : retVal[ 'Value' ], 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
+        self.log.info( "No jobs could be extracted from TQ", "%s", tqId )
     self.log.info( "Could not find a match after %s match retries" % self.__maxMatchRetry )
     return S_ERROR( "Could not find a match after %s match retries" % self.__maxMatchRetry )
 
@@ -573,21 +642,85 @@ class TaskQueueDB( DB ):
     """
     Get a queue that matches the requirements
     """
-    #Make a copy to avoid modification of original if escaping needs to be done
-    tqMatchDict = dict( tqMatchDict )
-    if not skipMatchDictDef:
-      retVal = self._checkMatchDefinition( tqMatchDict )
+    if skipMatchDictDef:
+      #The dict is already checked and escaped
+      retVal = self.__generateTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond )
       if not retVal[ 'OK' ]:
         return retVal
-    retVal = self.__generateTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond )
-    if not retVal[ 'OK' ]:
-      return retVal
-    matchSQL = retVal[ 'Value' ]
+      matchSQL = retVal[ 'Value' ]
+    else:
+      retVal = self.__getTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond )
+      if not retVal[ 'OK' ]:
+        return retVal
+      matchSQL = retVal[ 'Value' ][0]
+    return self.__matchTaskQueuesWithSQL( matchSQL, connObj = connObj )
+
+  def __matchTaskQueuesWithSQL( self, matchSQL, connObj = False ):
     retVal = self._query( matchSQL, conn = connObj )
     if not retVal[ 'OK' ]:
       return retVal
     return S_OK( [ ( row[0], row[1], row[2] ) for row in retVal[ 'Value' ] ] )
 
+  def __toHashable( self, value ):
+    """ Convert a match definition value into something that can be used as cache key
+    """
+    if type( value ) in ( types.ListType, types.TupleType ):
+      return tuple( sorted( [ self.__toHashable( v ) for v in value ] ) )
+    if type( value ) == types.DictType:
+      return tuple( sorted( [ ( k, self.__toHashable( value[ k ] ) ) for k in value ] ) )
+    return value
+
+  def __getTQMatchSQL( self, tqMatchDict, numQueuesToGet = 1, negativeCond = {} ):
+    """
+    Get the SQL to match a task queue for a non checked match dict. The generated SQL is cached
+    using only the fields that take part in the match so pilots with the same capabilities share it.
+    A single CPUTime value is kept as a placeholder in the cached SQL.
+      Returns S_OK( ( SQL, checked tqMatchDict ) )
+    """
+    cpuTime = tqMatchDict.get( 'CPUTime' )
+    cpuTemplate = type( cpuTime ) in ( types.IntType, types.LongType )
+    keyFields = [ ( field, self.__toHashable( tqMatchDict[ field ] ) ) for field in self.__matchCacheKeyFields if field in tqMatchDict ]
+    if cpuTemplate:
+      keyFields.append( ( 'CPUTime', CPUTIME_PLACEHOLDER ) )
+    elif 'CPUTime' in tqMatchDict:
+      keyFields.append( ( 'CPUTime', self.__toHashable( cpuTime ) ) )
+    try:
+      cKey = ( tuple( keyFields ), numQueuesToGet, self.__toHashable( negativeCond ) )
+      cachedData = self.__matchSQLCache.get( cKey )
+    except TypeError:
+      #Something not hashable, do not use the cache
+      cKey = False
+      cachedData = None
+    if cachedData is None:
+      #Make a copy to avoid modification of original if escaping needs to be done
+      checkedDict = dict( tqMatchDict )
+      retVal = self._checkMatchDefinition( checkedDict )
+      if not retVal[ 'OK' ]:
+        return retVal
+      if cpuTemplate:
+        checkedDict[ 'CPUTime' ] = CPUTIME_PLACEHOLDER
+      retVal = self.__generateTQMatchSQL( checkedDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond )
+      if not retVal[ 'OK' ]:
+        return retVal
+      #Keep only the checked values of the fields used in the match
+      matchFields = self.__matchCacheKeyFields + [ 'Platform', 'CPUTime' ]
+      cachedData = ( retVal[ 'Value' ], dict( [ ( field, checkedDict[ field ] ) for field in matchFields if field in checkedDict ] ) )
+      if cKey:
+        self.__matchSQLCache.add( cKey, cachedData )
+    matchSQL, checkedValues = cachedData
+    checkedDict = dict( tqMatchDict )
+    checkedDict.update( checkedValues )
+    if cpuTemplate:
+      matchSQL = matchSQL.replace( CPUTIME_PLACEHOLDER, str( cpuTime ) )
+      checkedDict[ 'CPUTime' ] = cpuTime
+    return S_OK( ( matchSQL, checkedDict ) )
+
+  def getMatchSQLCacheStats( self ):
+    """
+    Get the hits, misses and size of the match SQL cache
+    """
+    return self.__matchSQLCache.getStats()
+
   def __generateSQLSubCond( self, sqlString, value, boolOp = 'OR' ):
     if type( value ) not in ( types.ListType, types.TupleType ):
       return sqlString % str( value ).strip()
@@ -780,6 +913,38 @@ class TaskQueueDB( DB ):
     self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
     return S_OK( True )
 
+  def deleteJobs( self, jobIdList ):
+    """
+    Delete a list of jobs from the task queues with a single statement
+    Return S_OK( [ jobIds actually deleted ] ) / S_ERROR
+    """
+    if not jobIdList:
+      return S_OK( [] )
+    jobString = ", ".join( [ str( int( jobId ) ) for jobId in jobIdList ] )
+    retVal = self.transactionStart()
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Can't delete jobs: %s" % retVal[ 'Message' ] )
+    #Lock the rows to know which jobs are really taken by this delete
+    retVal = self._query( "SELECT j.JobId, t.TQId, t.OwnerDN, t.OwnerGroup FROM `tq_TaskQueues` t, `tq_Jobs` j WHERE j.JobId in ( %s ) AND t.TQId = j.TQId FOR UPDATE" % jobString )
+    if not retVal[ 'OK' ]:
+      self.transactionRollback()
+      return S_ERROR( "Could not get jobs from task queues: %s" % retVal[ 'Message' ] )
+    data = retVal[ 'Value' ]
+    if not data:
+      self.transactionRollback()
+      return S_OK( [] )
+    self.log.info( "Deleting jobs %s" % ", ".join( [ str( row[0] ) for row in data ] ) )
+    retVal = self._update( "DELETE FROM `tq_Jobs` WHERE JobId in ( %s )" % ", ".join( [ str( row[0] ) for row in data ] ) )
+    if not retVal[ 'OK' ]:
+      self.transactionRollback()
+      return S_ERROR( "Could not delete jobs from task queues: %s" % retVal[ 'Message' ] )
+    retVal = self.transactionCommit()
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Could not delete jobs from task queues: %s" % retVal[ 'Message' ] )
+    for _jobId, tqId, tqOwnerDN, tqOwnerGroup in data:
+      self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
+    return S_OK( [ row[0] for row in data ] )
+
   def getTaskQueueForJob( self, jobId, connObj = False ):
     """
     Return TaskQueue for a given Job
@@ -992,6 +1157,76 @@ class TaskQueueDB( DB ):
       self.cleanOrphanedTaskQueues()
     return S_OK( tqData )
 
+  def retrieveTaskQueuesAttributes( self ):
+    """
+    Get the single value attributes, the priority and the enabled flag of all the task queues
+      Returns S_OK( { tqId : { 'Priority' : prio, 'Enabled' : enabled, 'OwnerDN' : ..., ... } } )
+    """
+    sqlFields = [ "TQId", "Priority", "Enabled" ] + list( self.__singleValueDefFields )
+    retVal = self._query( "SELECT %s FROM `tq_TaskQueues`" % ", ".join( sqlFields ) )
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Can't retrieve task queues attributes: %s" % retVal[ 'Message' ] )
+    tqData = {}
+    for record in retVal[ 'Value' ]:
+      tqData[ record[0] ] = dict( zip( sqlFields[1:], record[1:] ) )
+    return S_OK( tqData )
+
+  def retrieveTaskQueuesMultiValues( self, tqIdList, maxTQsInQuery = 1000 ):
+    """
+    Get the multi value definitions of the given task queues
+      Returns S_OK( { tqId : { 'Sites' : [ ... ], 'Platforms' : [ ... ], ... } } )
+    """
+    tqData = dict( [ ( tqId, {} ) for tqId in tqIdList ] )
+    tqIdList = list( tqIdList )
+    for iP in range( 0, len( tqIdList ), maxTQsInQuery ):
+      tqIds = ", ".join( [ str( tqId ) for tqId in tqIdList[ iP : iP + maxTQsInQuery ] ] )
+      for field in self.__multiValueDefFields:
+        sqlCmd = "SELECT TQId, Value FROM `tq_TQTo%s` WHERE TQId in ( %s )" % ( field, tqIds )
+        retVal = self._query( sqlCmd )
+        if not retVal[ 'OK' ]:
+          return S_ERROR( "Can't retrieve task queues field %s info: %s" % ( field, retVal[ 'Message' ] ) )
+        for tqId, value in retVal[ 'Value' ]:
+          if field not in tqData[ tqId ]:
+            tqData[ tqId ][ field ] = []
+          tqData[ tqId ][ field ].append( value )
+    return S_OK( tqData )
+
+  def retrieveTaskQueuesJobs( self, tqIdList = None, minJobId = 0, maxTQsInQuery = 1000 ):
+    """
+    Get the jobs in the task queues
+      tqIdList: only get the jobs of these task queues. All of them if None
+      minJobId: only get the jobs with a bigger JobId
+      Returns S_OK( { tqId : [ ( jobId, priority, realPriority ), ... ] } )
+    """
+    sqlCmd = "SELECT TQId, JobId, Priority, RealPriority FROM `tq_Jobs` WHERE JobId > %d" % minJobId
+    if tqIdList is None:
+      sqlCmds = [ sqlCmd ]
+    else:
+      tqIdList = list( tqIdList )
+      sqlCmds = [ "%s AND TQId in ( %s )" % ( sqlCmd, ", ".join( [ str( int( tqId ) ) for tqId in tqIdList[ iP : iP + maxTQsInQuery ] ] ) )
+                  for iP in range( 0, len( tqIdList ), maxTQsInQuery ) ]
+    tqJobs = {}
+    for sqlCmd in sqlCmds:
+      retVal = self._query( sqlCmd )
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Can't retrieve jobs in task queues: %s" % retVal[ 'Message' ] )
+      for tqId, jobId, priority, realPriority in retVal[ 'Value' ]:
+        if tqId not in tqJobs:
+          tqJobs[ tqId ] = []
+        tqJobs[ tqId ].append( ( jobId, priority, realPriority ) )
+    return S_OK( tqJobs )
+
+  def retrieveTaskQueuesJobsSummary( self ):
+    """
+    Get a summary of the jobs in each task queue, enough to know if they have changed
+      Returns S_OK( { tqId : ( numJobs, sum of JobIds, sum of priorities ) } )
+    """
+    retVal = self._query( "SELECT TQId, COUNT( JobId ), SUM( JobId ), SUM( Priority ) FROM `tq_Jobs` GROUP BY TQId" )
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Can't retrieve summary of jobs in task queues: %s" % retVal[ 'Message' ] )
+    return S_OK( dict( [ ( record[0], tuple( [ long( value ) for value in record[1:] ] ) )
+                         for record in retVal[ 'Value' ] ] ) )
+
   def __updateGlobalShares( self ):
     """
     Update internal structure for shares
@@ -0,0 +1,107 @@
+""" Test_JobStateBulk
+
+    unit tests for the bulk methods of the JobDB and the JobLoggingDB used by
+    setJobsStatusBulk, with the database calls mocked
+"""
+
+import unittest
+
+from mock import MagicMock
+
+from DIRAC import gLogger
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
+from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB, MAGIC_EPOC_NUMBER
+
+__RCSID__ = '$Id:  $'
+
+class NoConnectionJobDB( JobDB ):
+  """ JobDB without a database connection """
+  def __init__( self ):
+    pass
+
+class NoConnectionJobLoggingDB( JobLoggingDB ):
+  """ JobLoggingDB without a database connection """
+  def __init__( self ):
+    self.gLogger = gLogger
+
+################################################################################
+
+class JobDB_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    """ database calls mocked """
+    self.jobDB = NoConnectionJobDB()
+    self.jobDB.updateMany = MagicMock( return_value = { 'OK' : True, 'Value' : 2 } )
+
+  def test01setJobsAttributes( self ):
+    """ one updateMany call with integer job IDs """
+    result = self.jobDB.setJobsAttributes( { '1' : { 'Status' : 'Running' }, 2L : { 'Status' : 'Done' } } )
+    self.assertEqual( result, { 'OK' : True, 'Value' : 2 } )
+    self.jobDB.updateMany.assert_called_once_with( 'Jobs', 'JobID',
+                                                   { 1 : { 'Status' : 'Running' }, 2 : { 'Status' : 'Done' } },
+                                                   updateDict = {}, onlyIfNull = None )
+
+  def test02update( self ):
+    """ LastUpdateTime refresh and onlyIfNull fields """
+    self.jobDB.setJobsAttributes( { 1 : { 'Status' : 'Running' } }, update = True )
+    self.assertEqual( self.jobDB.updateMany.call_args[1]['updateDict'], { 'LastUpdateTime' : 'UTC_TIMESTAMP()' } )
+    self.jobDB.setJobsAttributes( { 1 : { 'EndExecTime' : '2014-01-01' } }, onlyIfNull = [ 'EndExecTime' ] )
+    self.assertEqual( self.jobDB.updateMany.call_args[1], { 'updateDict' : {}, 'onlyIfNull' : [ 'EndExecTime' ] } )
+
+  def test03failures( self ):
+    """ nothing to do and database errors """
+    self.assertEqual( self.jobDB.setJobsAttributes( {} )['OK'], True )
+    self.assertEqual( self.jobDB.updateMany.called, False )
+    self.jobDB.updateMany.return_value = { 'OK' : False, 'Message' : 'Lost connection' }
+    self.assertEqual( self.jobDB.setJobsAttributes( { 1 : { 'Status' : 'Running' } } )['OK'], False )
+
+################################################################################
+
+class JobLoggingDB_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    """ database calls mocked """
+    self.logDB = NoConnectionJobLoggingDB()
+    self.logDB._update = MagicMock( return_value = { 'OK' : True, 'Value' : 2 } )
+    self.logDB._query = MagicMock()
+
+  def test01addLoggingRecords( self ):
+    """ one INSERT for all the records """
+    result = self.logDB.addLoggingRecords( [ ( 1, 'Running', 'idem', 'idem', '2014-01-01 10:00:00', 'JobWrapper' ),
+                                             ( '2', 'Done', 'Execution Complete', 'idem', '2014-01-01 10:00:01',
+                                               'JobWrapper' ) ] )
+    self.assertEqual( result, { 'OK' : True, 'Value' : 2 } )
+    self.assertEqual( self.logDB._update.call_count, 1 )
+    cmd = self.logDB._update.call_args[0][0]
+    self.assertTrue( cmd.startswith( "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, "
+                                     "StatusTime, StatusTimeOrder, StatusSource) VALUES " ) )
+    self.assertTrue( "(1,'Running','idem','idem','2014-01-01 10:00:00'," in cmd )
+    self.assertTrue( "(2,'Done','Execution Complete','idem','2014-01-01 10:00:01'," in cmd )
+    # # the time orders keep the order of the dates
+    timeOrders = [ float( values.split( ',' )[5] ) for values in cmd.split( 'VALUES ' )[1].split( '),(' ) ]
+    self.assertEqual( timeOrders[1] - timeOrders[0], 1. )
+    self.assertEqual( cmd.count( "'JobWrapper')" ), 2 )
+
+  def test02noRecords( self ):
+    """ nothing to insert """
+    self.assertEqual( self.logDB.addLoggingRecords( [] ), { 'OK' : True, 'Value' : 0 } )
+    self.assertEqual( self.logDB._update.called, False )
+
+  def test03getLastStatusTimes( self ):
+    """ latest time order per job, as epoch """
+    self.logDB._query.return_value = { 'OK' : True, 'Value' : ( ( 1L, 100.5 ), ( 3L, 200.0 ) ) }
+    result = self.logDB.getLastStatusTimes( [ '1', 2, 3 ] )
+    self.assertEqual( result, { 'OK' : True, 'Value' : { 1 : 100.5 + MAGIC_EPOC_NUMBER,
+                                                         3 : 200.0 + MAGIC_EPOC_NUMBER } } )
+    self.assertEqual( self.logDB._query.call_args[0][0],
+                      'SELECT JobID,MAX(StatusTimeOrder) FROM LoggingInfo WHERE JobID in (1,2,3) GROUP BY JobID' )
+    self.assertEqual( self.logDB.getLastStatusTimes( [] ), { 'OK' : True, 'Value' : {} } )
+    self.logDB._query.return_value = { 'OK' : False, 'Message' : 'Lost connection' }
+    self.assertEqual( self.logDB.getLastStatusTimes( [ 1 ] )['OK'], False )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobDB_TestCase )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( JobLoggingDB_TestCase ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
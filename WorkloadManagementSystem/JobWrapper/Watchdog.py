@@ -22,6 +22,7 @@ __RCSID__ = "$Id$"
 
 from DIRAC.Core.Utilities                               import Time
 from DIRAC.Core.DISET.RPCClient                         import RPCClient
+from DIRAC.WorkloadManagementSystem.Client.JobStateUpdateQueue import getGlobalJobStateUpdateQueue
 from DIRAC.ConfigurationSystem.Client.Config            import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder        import getSystemInstance
 from DIRAC.Core.Utilities.ProcessMonitor                import ProcessMonitor
@@ -805,8 +806,8 @@ class Watchdog:
     """ Sends sign of life 'heartbeat' signal and triggers control signal
         interpretation.
     """
-    jobReport = RPCClient( 'WorkloadManagement/JobStateUpdate', timeout = 120 )
-    result = jobReport.sendHeartBeat( jobID, heartBeatDict, staticParamDict )
+    # Pending status updates of the job go with the heart beat
+    result = getGlobalJobStateUpdateQueue().sendHeartBeat( jobID, heartBeatDict, staticParamDict )
     if not result['OK']:
       self.log.warn( 'Problem sending sign of life' )
       self.log.warn( result )
@@ -45,7 +45,7 @@ class WatchdogLinux(Watchdog):
       result["CPU(MHz)"]   = string.replace(string.replace(string.split(info[6],":")[1]," ",""),"\n","")
       result["ModelName"] = string.replace(string.replace(string.split(info[4],":")[1]," ",""),"\n","")
       result["CacheSize(kB)"] = string.replace(string.replace(string.split(info[7],":")[1]," ",""),"\n","")
-      memInfo = open ( "/proc/meminfo", "r" )
+      memInfo = open( "/proc/meminfo", "r" )
       info = memInfo.readlines()
       memInfo.close()
       result["Memory(kB)"] =  string.replace(string.replace(string.split(info[3],":")[1]," ",""),"\n","")
@@ -68,12 +68,11 @@ class WatchdogLinux(Watchdog):
     """Obtains the load average.
     """
     result = S_OK()
-    comm = '/bin/cat /proc/loadavg'
-    loadAvgDict = shellCall(5,comm)
-    if loadAvgDict['OK']:
-      la = float(string.split(loadAvgDict['Value'][1])[0])
-      result['Value'] = la
-    else:
+    try:
+      loadAvg = open( "/proc/loadavg", "r" )
+      result['Value'] = float( loadAvg.readline().split()[0] )
+      loadAvg.close()
+    except Exception:
       result = S_ERROR('Could not obtain load average')
       self.log.warn('Could not obtain load average')
       result['Value'] = 0
@@ -82,15 +81,20 @@ class WatchdogLinux(Watchdog):
 
   #############################################################################
   def getMemoryUsed(self):
-    """Obtains the memory used.
+    """Obtains the memory used in kB, including buffers and cache as the "used"
+       column of free, from /proc/meminfo.
     """
     result = S_OK()
-    comm = '/usr/bin/free'
-    memDict = shellCall(5,comm)
-    if memDict['OK']:
-      mem = string.split(memDict['Value'][1]) [8]
-      result['Value'] = float(mem)
-    else:
+    try:
+      memInfo = open( "/proc/meminfo", "r" )
+      memDict = {}
+      for line in memInfo:
+        fields = line.split()
+        if len( fields ) > 1:
+          memDict[fields[0].rstrip( ':' )] = float( fields[1] )
+      memInfo.close()
+      result['Value'] = memDict['MemTotal'] - memDict['MemFree']
+    except Exception:
       result = S_ERROR('Could not obtain memory used')
       self.log.warn('Could not obtain memory used')
       result['Value'] = 0
@@ -8,6 +8,8 @@
     The following methods are available in the Service interface
 
     setJobStatus()
+    setJobStatusBulk()
+    setJobsStatusBulk()
 
 """
 
@@ -17,7 +19,7 @@ from types import StringType, IntType, LongType, ListType, DictType
 # from types import *
 import time
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC import gLogger, S_OK, S_ERROR, Time
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 
@@ -130,100 +132,178 @@ class JobStateUpdateHandler( RequestHandler ):
         logging information in the JobLoggingDB. The statusDict has datetime
         as a key and status information dictionary as values
     """
-
-    status = ""
-    minor = ""
-    application = ""
-    appCounter = ""
-    endDate = ''
-    startDate = ''
-    startFlag = ''
     jobID = int( jobID )
-
-    result = jobDB.getJobAttributes( jobID, ['Status'] )
+    result = self.__setJobsStatusBulk( { jobID : statusDict } )
     if not result['OK']:
       return result
+    if jobID in result['Value']:
+      return S_ERROR( result['Value'][jobID] )
+    return S_OK()
 
-    if not result['Value']:
-      # if there is no matching Job it returns an empty dictionary
-      return S_ERROR( 'No Matching Job' )
+  ###########################################################################
+  types_setJobsStatusBulk = [DictType]
+  def export_setJobsStatusBulk( self, jobsDict ):
+    """ Apply the status updates and the heart beats of many jobs at once.
+        jobsDict is a { jobID : { 'Status' : statusDict, 'HeartBeats' : [ ( dynamicData, staticData ) ] } }
+        dictionary, where statusDict is as in setJobStatusBulk. Both keys are optional.
+        Returns a dictionary with the commands to be passed to the jobs that sent
+        a heart beat as 'Successful' and the error messages of the failed jobs as 'Failed'
+    """
+    jobsDict = dict( [ ( int( jobID ), jobDict ) for jobID, jobDict in jobsDict.items() ] )
+    failed = {}
+
+    heartBeatList = []
+    for jobID, jobDict in jobsDict.items():
+      for dynamicData, staticData in jobDict.get( 'HeartBeats', [] ):
+        heartBeatList.append( ( jobID, staticData, dynamicData ) )
+    heartBeatJobs = set( [ heartBeat[0] for heartBeat in heartBeatList ] )
+    if heartBeatList:
+      result = jobDB.setHeartBeatDataBulk( heartBeatList )
+      if not result['OK']:
+        gLogger.warn( 'Failed to set the heart beat data for %d jobs' % len( heartBeatJobs ), result['Message'] )
+
+    statusDicts = dict( [ ( jobID, jobDict['Status'] ) for jobID, jobDict in jobsDict.items()
+                          if jobDict.get( 'Status' ) ] )
+    if statusDicts:
+      result = self.__setJobsStatusBulk( statusDicts )
+      if not result['OK']:
+        for jobID in statusDicts:
+          failed[jobID] = result['Message']
+      else:
+        failed.update( result['Value'] )
+
+    jobsCommands = {}
+    if heartBeatJobs:
+      result = jobDB.getJobsCommands( list( heartBeatJobs ) )
+      if result['OK']:
+        jobsCommands = result['Value']
+      if jobsCommands:
+        result = jobDB.setJobsCommandsStatus( dict( [ ( jobID, commands.keys() )
+                                                      for jobID, commands in jobsCommands.items() ] ), 'Sent' )
+        if not result['OK']:
+          gLogger.warn( 'Failed to set the status of the job commands', result['Message'] )
+
+    successful = {}
+    for jobID in jobsDict:
+      if jobID not in failed:
+        successful[jobID] = jobsCommands.get( jobID, {} )
+
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+  def __setJobsStatusBulk( self, statusDicts ):
+    """ Set the status of several jobs from their { date : status information } dictionaries
+        with a few bulk queries. Returns a { jobID : error } dictionary of the jobs that could
+        not be updated
+    """
+    failed = {}
+    jobIDs = statusDicts.keys()
 
-    new_status = result['Value']['Status']
-    if new_status == "Stalled":
-      status = 'Running'
+    result = jobDB.getAttributesForJobList( jobIDs, ['Status'] )
+    if not result['OK']:
+      return result
+    currentStatus = result['Value']
+    for jobID in jobIDs:
+      if jobID not in currentStatus:
+        # if there is no matching Job it is not returned
+        failed[jobID] = 'No Matching Job'
+    jobIDs = [ jobID for jobID in jobIDs if jobID not in failed ]
 
     # Get the latest WN time stamps of status updates
-    result = logDB.getWMSTimeStamps( int( jobID ) )
+    result = logDB.getLastStatusTimes( jobIDs )
     if not result['OK']:
       return result
-    lastTime = max( [float( t ) for s, t in result['Value'].items() if s != 'LastTime'] )
-    from DIRAC import Time
-    lastTime = Time.toString( Time.fromEpoch( lastTime ) )
-
-    # Get the last status values
-    dates = sorted( statusDict )
-    # We should only update the status if its time stamp is more recent than the last update
-    for date in [date for date in dates if date >= lastTime]:
-      sDict = statusDict[date]
-      if sDict['Status']:
+    lastTimes = result['Value']
+
+    jobsAttrDict = {}
+    startDates = {}
+    endDates = {}
+    loggingRecords = []
+    for jobID in jobIDs:
+      statusDict = statusDicts[jobID]
+      status = ""
+      minor = ""
+      application = ""
+      appCounter = ""
+      endDate = ''
+      startDate = ''
+      startFlag = ''
+
+      if currentStatus[jobID]['Status'] == "Stalled":
+        status = 'Running'
+
+      lastTime = ''
+      if jobID in lastTimes:
+        lastTime = Time.toString( Time.fromEpoch( lastTimes[jobID] ) )
+
+      # Get the last status values
+      dates = sorted( statusDict )
+      # We should only update the status if its time stamp is more recent than the last update
+      for date in [date for date in dates if date >= lastTime]:
+        sDict = statusDict[date]
+        if sDict['Status']:
+          status = sDict['Status']
+          if status in JOB_FINAL_STATES:
+            endDate = date
+          if status == "Running":
+            startFlag = 'Running'
+        if sDict['MinorStatus']:
+          minor = sDict['MinorStatus']
+          if minor == "Application" and startFlag == 'Running':
+            startDate = date
+        if sDict['ApplicationStatus']:
+          application = sDict['ApplicationStatus']
+        counter = sDict.get( 'ApplicationCounter' )
+        if counter:
+          appCounter = counter
+      attrDict = {}
+      if status:
+        attrDict['Status'] = status
+      if minor:
+        attrDict['MinorStatus'] = minor
+      if application:
+        attrDict['ApplicationStatus'] = application
+      if appCounter:
+        attrDict['ApplicationCounter'] = appCounter
+      jobsAttrDict[jobID] = attrDict
+
+      if endDate:
+        endDates[jobID] = { 'EndExecTime' : endDate }
+      if startDate:
+        startDates[jobID] = { 'StartExecTime' : startDate }
+
+      # Prepare the JobLoggingDB records
+      for date in dates:
+        sDict = statusDict[date]
         status = sDict['Status']
-        if status in JOB_FINAL_STATES:
-          endDate = date
-        if status == "Running":
-          startFlag = 'Running'
-      if sDict['MinorStatus']:
+        if not status:
+          status = 'idem'
         minor = sDict['MinorStatus']
-        if minor == "Application" and startFlag == 'Running':
-          startDate = date
-      if sDict['ApplicationStatus']:
+        if not minor:
+          minor = 'idem'
         application = sDict['ApplicationStatus']
-      counter = sDict.get( 'ApplicationCounter' )
-      if counter:
-        appCounter = counter
-    attrNames = []
-    attrValues = []
-    if status:
-      attrNames.append( 'Status' )
-      attrValues.append( status )
-    if minor:
-      attrNames.append( 'MinorStatus' )
-      attrValues.append( minor )
-    if application:
-      attrNames.append( 'ApplicationStatus' )
-      attrValues.append( application )
-    if appCounter:
-      attrNames.append( 'ApplicationCounter' )
-      attrValues.append( appCounter )
-    result = jobDB.setJobAttributes( jobID, attrNames, attrValues, update = True )
+        if not application:
+          application = 'idem'
+        else:
+          status = "Running"
+          minor = "Application"
+        loggingRecords.append( ( jobID, status, minor, application, date, sDict['Source'] ) )
+
+    result = jobDB.setJobsAttributes( jobsAttrDict, update = True )
     if not result['OK']:
       return result
 
-    if endDate:
-      result = jobDB.setEndExecTime( jobID, endDate )
-    if startDate:
-      result = jobDB.setStartExecTime( jobID, startDate )
+    for execDates in [ endDates, startDates ]:
+      if execDates:
+        result = jobDB.setJobsAttributes( execDates, onlyIfNull = execDates.values()[0].keys() )
+        if not result['OK']:
+          gLogger.warn( 'Failed to set the execution time stamps', result['Message'] )
 
     # Update the JobLoggingDB records
-    for date in dates:
-      sDict = statusDict[date]
-      status = sDict['Status']
-      if not status:
-        status = 'idem'
-      minor = sDict['MinorStatus']
-      if not minor:
-        minor = 'idem'
-      application = sDict['ApplicationStatus']
-      if not application:
-        application = 'idem'
-      else:
-        status = "Running"
-        minor = "Application"
-      source = sDict['Source']
-      result = logDB.addLoggingRecord( jobID, status, minor, application, date, source )
-      if not result['OK']:
-        return result
+    result = logDB.addLoggingRecords( loggingRecords )
+    if not result['OK']:
+      return result
 
-    return S_OK()
+    return S_OK( failed )
 
   ###########################################################################
   types_setJobSite = [[StringType, IntType, LongType], StringType]
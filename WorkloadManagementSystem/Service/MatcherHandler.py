@@ -10,17 +10,18 @@ It also provides an XMLRPC interface to the Matcher
 __RCSID__ = "$Id$"
 
 import time
-from   types import StringType, DictType, StringTypes
+from   types import StringType, DictType, StringTypes, IntType, LongType, ListType, TupleType
 import threading
 
 from DIRAC.ConfigurationSystem.Client.Helpers          import Registry, Operations
-from DIRAC.Core.DISET.RequestHandler                   import RequestHandler
+from DIRAC.Core.DISET.RequestHandler                   import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight         import ClassAd
 from DIRAC                                             import gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB           import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB    import JobLoggingDB
 from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB     import TaskQueueDB
 from DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB   import PilotAgentsDB
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
 from DIRAC.FrameworkSystem.Client.MonitoringClient     import gMonitor
 from DIRAC.Core.Utilities.ThreadScheduler              import gThreadScheduler
 from DIRAC.Core.Security                               import Properties
@@ -34,6 +35,8 @@ gJobDB = False
 gJobLoggingDB = False
 gTaskQueueDB = False
 gPilotAgentsDB = False
+gTaskQueueIndex = False
+gMatchSQLCacheStats = { 'Hits' : 0, 'Misses' : 0 }
 
 def initializeMatcherHandler( serviceInfo ):
   """  Matcher Service initialization
@@ -43,6 +46,7 @@ def initializeMatcherHandler( serviceInfo ):
   global gJobLoggingDB
   global gTaskQueueDB
   global gPilotAgentsDB
+  global gTaskQueueIndex
 
   gJobDB = JobDB()
   gJobLoggingDB = JobLoggingDB()
@@ -57,13 +61,28 @@ def initializeMatcherHandler( serviceInfo ):
                              'Matching', "matches" , gMonitor.OP_RATE, 300 )
   gMonitor.registerActivity( 'numTQs', "Number of Task Queues",
                              'Matching', "tqsk queues" , gMonitor.OP_MEAN, 300 )
+  gMonitor.registerActivity( 'matchSQLCacheHits', "Match SQL cache hits",
+                             'Matching', "hits" , gMonitor.OP_SUM, 300 )
+  gMonitor.registerActivity( 'matchSQLCacheMisses', "Match SQL cache misses",
+                             'Matching', "misses" , gMonitor.OP_SUM, 300 )
 
   gTaskQueueDB.recalculateTQSharesForAll()
   gThreadScheduler.addPeriodicTask( 120, gTaskQueueDB.recalculateTQSharesForAll )
   gThreadScheduler.addPeriodicTask( 60, sendNumTaskQueues )
+  gThreadScheduler.addPeriodicTask( 60, sendMatchSQLCacheStats )
 
   sendNumTaskQueues()
 
+  if getServiceOption( serviceInfo, "UseTaskQueueIndex", False ):
+    gTaskQueueIndex = TaskQueueIndex( gTaskQueueDB )
+    result = gTaskQueueIndex.refresh()
+    if not result[ 'OK' ]:
+      return result
+    refreshPeriod = getServiceOption( serviceInfo, "TaskQueueIndexRefreshPeriod", 30 )
+    gThreadScheduler.addPeriodicTask( refreshPeriod, gTaskQueueIndex.refresh )
+    gLogger.notice( "Matching with the in memory task queue index (%s TQs) refreshed every %s secs" % ( gTaskQueueIndex.getNumTaskQueues(),
+                                                                                                       refreshPeriod ) )
+
   return S_OK()
 
 def sendNumTaskQueues():
@@ -73,6 +92,12 @@ def sendNumTaskQueues():
   else:
     gLogger.error( "Cannot get the number of task queues", result[ 'Message' ] )
 
+def sendMatchSQLCacheStats():
+  stats = gTaskQueueDB.getMatchSQLCacheStats()
+  for key, activity in ( ( 'Hits', 'matchSQLCacheHits' ), ( 'Misses', 'matchSQLCacheMisses' ) ):
+    gMonitor.addMark( activity, stats[ key ] - gMatchSQLCacheStats[ key ] )
+    gMatchSQLCacheStats[ key ] = stats[ key ]
+
 
 class Limiter:
 
@@ -238,6 +263,8 @@ class Limiter:
     return S_OK( negCond )
 
   def updateDelayCounters( self, siteName, jid ):
+    """ Update the matching delay counters for the job or list of jobs matched at the site
+    """
     #Get the info from the CS
     siteSection = "%s/%s" % ( self.__matchingDelaySection, siteName )
     result = self.__extractCSData( siteSection )
@@ -253,23 +280,30 @@ class Limiter:
         gLogger.error( "Attribute %s does not exist in the JobDB. Please fix it!" % attName )
       else:
         attNames.append( attName )
-    result = gJobDB.getJobAttributes( jid, attNames )
+    if type( jid ) in ( ListType, TupleType ):
+      result = gJobDB.getAttributesForJobList( jid, attNames )
+      if result[ 'OK' ]:
+        attsList = result[ 'Value' ].values()
+    else:
+      result = gJobDB.getJobAttributes( jid, attNames )
+      if result[ 'OK' ]:
+        attsList = [ result[ 'Value' ] ]
     if not result[ 'OK' ]:
       gLogger.error( "While retrieving attributes coming from %s: %s" % ( siteSection, result[ 'Message' ] ) )
       return result
-    atts = result[ 'Value' ]
     #Create the DictCache if not there
     if siteName not in Limiter.__delayMem:
       Limiter.__delayMem[ siteName ] = DictCache()
     #Update the counters
     delayCounter = Limiter.__delayMem[ siteName ]
-    for attName in atts:
-      attValue = atts[ attName ]
-      if attValue in delayDict[ attName ]:
-        delayTime = delayDict[ attName ][ attValue ]
-        gLogger.notice( "Adding delay for %s/%s=%s of %s secs" % ( siteName, attName,
-                                                                   attValue, delayTime ) )
-        delayCounter.add( ( attName, attValue ), delayTime )
+    for atts in attsList:
+      for attName in attNames:
+        attValue = atts.get( attName )
+        if attValue in delayDict[ attName ]:
+          delayTime = delayDict[ attName ][ attValue ]
+          gLogger.notice( "Adding delay for %s/%s=%s of %s secs" % ( siteName, attName,
+                                                                     attValue, delayTime ) )
+          delayCounter.add( ( attName, attValue ), delayTime )
     return S_OK()
 
   def __getDelayCondition( self, siteName ):
@@ -360,12 +394,10 @@ class MatcherHandler( RequestHandler ):
 
     return resourceDict
 
-  def selectJob( self, resourceDescription ):
-    """ Main job selection function to find the highest priority job
-        matching the resource capacity
+  def __prepareMatch( self, resourceDescription ):
+    """ Build the resource dictionary to match from the resource description, check
+        the pilot credentials and version and update the pilot information
     """
-
-    startTime = time.time()
     resourceDict = self.__processResourceDescription( resourceDescription )
 
     credDict = self.getRemoteCredentials()
@@ -434,8 +466,9 @@ class MatcherHandler( RequestHandler ):
                                               destination = gridCE,
                                               benchmark = benchmark )
       if result['OK']:
-        pilotInfoReported = True                                        
-    
+        pilotInfoReported = True
+    resourceDict[ 'PilotInfoReportedFlag' ] = pilotInfoReported
+
     #Check the site mask
     if not 'Site' in resourceDict:
       return S_ERROR( 'Missing Site Name in Resource JDL' )
@@ -459,12 +492,32 @@ class MatcherHandler( RequestHandler ):
 
     resourceDict['Setup'] = self.serviceInfoDict['clientSetup']
 
-    gLogger.verbose( "Resource description:" )
-    for key in resourceDict:
-      gLogger.verbose( "%s : %s" % ( key.rjust( 20 ), resourceDict[ key ] ) )
+    if gLogger.shown( 'VERBOSE' ):
+      gLogger.verbose( "Resource description:" )
+      for key in resourceDict:
+        gLogger.verbose( key.rjust( 20 ), ": %s", resourceDict[ key ] )
+
+    return S_OK( resourceDict )
+
+  def selectJob( self, resourceDescription ):
+    """ Main job selection function to find the highest priority job
+        matching the resource capacity
+    """
+
+    startTime = time.time()
+    result = self.__prepareMatch( resourceDescription )
+    if not result[ 'OK' ]:
+      return result
+    resourceDict = result[ 'Value' ]
+    siteName = resourceDict[ 'Site' ]
+    pilotReference = resourceDict.get( 'PilotReference', '' )
+    pilotInfoReported = resourceDict[ 'PilotInfoReportedFlag' ]
 
     negativeCond = self.__limiter.getNegativeCondForSite( siteName )
-    result = gTaskQueueDB.matchAndGetJob( resourceDict, negativeCond = negativeCond )
+    if gTaskQueueIndex:
+      result = gTaskQueueIndex.matchAndGetJob( resourceDict, negativeCond = negativeCond )
+    else:
+      result = gTaskQueueDB.matchAndGetJob( resourceDict, negativeCond = negativeCond )
 
     if DEBUG:
       print result
@@ -506,7 +559,7 @@ class MatcherHandler( RequestHandler ):
     resultDict['JobID'] = jobID
 
     matchTime = time.time() - startTime
-    gLogger.info( "Match time: [%s]" % str( matchTime ) )
+    gLogger.info( "Match time:", "[%s]", matchTime )
     gMonitor.addMark( "matchTime", matchTime )
 
     # Get some extra stuff into the response returned
@@ -533,6 +586,95 @@ class MatcherHandler( RequestHandler ):
     resultDict['PilotInfoReportedFlag'] = pilotInfoReported
     return S_OK( resultDict )
 
+  def selectJobs( self, resourceDescription, maxJobs ):
+    """ Select up to maxJobs jobs from the same task queue matching the resource capacity.
+        Jobs are extracted with a single match and their attributes, logging records and
+        pilot associations are updated in bulk
+    """
+
+    startTime = time.time()
+    result = self.__prepareMatch( resourceDescription )
+    if not result[ 'OK' ]:
+      return result
+    resourceDict = result[ 'Value' ]
+    siteName = resourceDict[ 'Site' ]
+    pilotReference = resourceDict.get( 'PilotReference', '' )
+
+    negativeCond = self.__limiter.getNegativeCondForSite( siteName )
+    if gTaskQueueIndex:
+      result = gTaskQueueIndex.matchAndGetJobs( resourceDict, maxJobs, negativeCond = negativeCond )
+    else:
+      result = gTaskQueueDB.matchAndGetJobs( resourceDict, maxJobs, negativeCond = negativeCond )
+    if not result['OK']:
+      return result
+    result = result['Value']
+    if not result['matchFound']:
+      return S_ERROR( 'No match found' )
+
+    jobIDs = result['jobIds']
+    resAtt = gJobDB.getAttributesForJobList( jobIDs, ['OwnerDN', 'OwnerGroup', 'Status'] )
+    if not resAtt['OK']:
+      return S_ERROR( 'Could not retrieve job attributes' )
+    jobAttrs = resAtt['Value']
+    waitingJobs = []
+    for jobID in jobIDs:
+      if jobID not in jobAttrs:
+        gLogger.error( 'No attributes returned for job', str( jobID ) )
+      elif jobAttrs[ jobID ]['Status'] != 'Waiting':
+        gLogger.error( 'Job matched by the TQ is not in Waiting state', str( jobID ) )
+      else:
+        waitingJobs.append( jobID )
+    if not waitingJobs:
+      return S_ERROR( "Jobs %s are not in Waiting state" % ",".join( [ str( jobID ) for jobID in jobIDs ] ) )
+
+    attNames = ['Status','MinorStatus','ApplicationStatus','Site']
+    attValues = ['Matched','Assigned','Unknown',siteName]
+    result = gJobDB.setJobAttributes( waitingJobs, attNames, attValues )
+    if not result[ 'OK' ]:
+      gLogger.error( "Could not set jobs attributes", result[ 'Message' ] )
+    result = gJobLoggingDB.addLoggingRecord( waitingJobs,
+                                             status = 'Matched',
+                                             minor = 'Assigned',
+                                             source = 'Matcher' )
+    if not result[ 'OK' ]:
+      gLogger.error( "Could not add logging records", result[ 'Message' ] )
+
+    result = gJobDB.getJobsJDL( waitingJobs )
+    if not result['OK']:
+      return S_ERROR( 'Failed to get the jobs JDL' )
+    jdls = result['Value']
+    result = gJobDB.getJobsOptParameters( waitingJobs )
+    if result['OK']:
+      optParams = result['Value']
+    else:
+      optParams = {}
+
+    if self.__opsHelper.getValue( "JobScheduling/CheckMatchingDelay", True ):
+      self.__limiter.updateDelayCounters( siteName, waitingJobs )
+
+    # Report pilot-job association
+    if pilotReference:
+      result = gPilotAgentsDB.setCurrentJobID( pilotReference, waitingJobs[-1] )
+      result = gPilotAgentsDB.setJobForPilot( waitingJobs, pilotReference, updateStatus = False )
+
+    jobList = []
+    for jobID in waitingJobs:
+      if jobID not in jdls:
+        gLogger.error( 'Failed to get the job JDL', str( jobID ) )
+        continue
+      jobDict = dict( optParams.get( jobID, {} ) )
+      jobDict['JDL'] = jdls[ jobID ]
+      jobDict['JobID'] = jobID
+      jobDict['DN'] = jobAttrs[ jobID ]['OwnerDN']
+      jobDict['Group'] = jobAttrs[ jobID ]['OwnerGroup']
+      jobList.append( jobDict )
+
+    matchTime = time.time() - startTime
+    gLogger.info( "Match time for %s jobs: [%s]" % ( len( jobList ), str( matchTime ) ) )
+    gMonitor.addMark( "matchTime", matchTime )
+
+    return S_OK( { 'Jobs' : jobList, 'PilotInfoReportedFlag' : resourceDict[ 'PilotInfoReportedFlag' ] } )
+
 ##############################################################################
   types_requestJob = [ [StringType, DictType] ]
   def export_requestJob( self, resourceDescription ):
@@ -546,6 +688,21 @@ class MatcherHandler( RequestHandler ):
       gMonitor.addMark( "matchesOK" )
     return result
 
+##############################################################################
+  types_requestJobs = [ [StringType, DictType], [IntType, LongType] ]
+  def export_requestJobs( self, resourceDescription, maxJobs ):
+    """ Serve up to maxJobs jobs from the same task queue to a multi slot pilot.
+        Returns S_OK( { 'Jobs' : [ jobDict, ... ], 'PilotInfoReportedFlag' : flag } )
+        where each jobDict is as the one returned by requestJob
+    """
+    if maxJobs < 1:
+      return S_ERROR( "The number of jobs to match has to be positive" )
+    result = self.selectJobs( resourceDescription, maxJobs )
+    gMonitor.addMark( "matchesDone" )
+    if result[ 'OK' ]:
+      gMonitor.addMark( "matchesOK", len( result[ 'Value' ][ 'Jobs' ] ) )
+    return result
+
 ##############################################################################
   types_getActiveTaskQueues = []
   def export_getActiveTaskQueues( self ):
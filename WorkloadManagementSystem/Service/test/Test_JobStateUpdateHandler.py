@@ -0,0 +1,123 @@
+""" Test_JobStateUpdateHandler
+
+    unit tests for the bulk status updates of the JobStateUpdateHandler,
+    with the JobDB and the JobLoggingDB mocked
+"""
+
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import Time
+from DIRAC.WorkloadManagementSystem.Service import JobStateUpdateHandler as JobStateUpdateHandlerModule
+from DIRAC.WorkloadManagementSystem.Service.JobStateUpdateHandler import JobStateUpdateHandler
+
+__RCSID__ = '$Id:  $'
+
+class NoConnectionHandler( JobStateUpdateHandler ):
+  """ handler without a client connection """
+  def __init__( self ):
+    pass
+
+def sDict( status = '', minor = '', application = '' ):
+  """ status information as sent by the JobReport """
+  return { 'Status' : status, 'MinorStatus' : minor, 'ApplicationStatus' : application, 'Source' : 'JobWrapper' }
+
+################################################################################
+
+class JobStateUpdateHandler_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    """ the module databases are replaced by mocks """
+    self.jobDB = MagicMock()
+    self.jobDB.getAttributesForJobList.return_value = { 'OK' : True, 'Value' : { 1 : { 'Status' : 'Matched' },
+                                                                                  2 : { 'Status' : 'Stalled' } } }
+    self.jobDB.setJobsAttributes.return_value = { 'OK' : True, 'Value' : 1 }
+    self.jobDB.setHeartBeatDataBulk.return_value = { 'OK' : True, 'Value' : '' }
+    self.jobDB.getJobsCommands.return_value = { 'OK' : True, 'Value' : {} }
+    self.jobDB.setJobsCommandsStatus.return_value = { 'OK' : True, 'Value' : '' }
+    self.logDB = MagicMock()
+    self.logDB.getLastStatusTimes.return_value = { 'OK' : True, 'Value' : {} }
+    self.logDB.addLoggingRecords.return_value = { 'OK' : True, 'Value' : 1 }
+    self.patchers = [ patch.object( JobStateUpdateHandlerModule, 'jobDB', self.jobDB ),
+                      patch.object( JobStateUpdateHandlerModule, 'logDB', self.logDB ) ]
+    for patcher in self.patchers:
+      patcher.start()
+    self.handler = NoConnectionHandler()
+
+  def tearDown( self ):
+    for patcher in self.patchers:
+      patcher.stop()
+
+  def test01statusBulk( self ):
+    """ last status in the JobDB, all of them in the JobLoggingDB, execution times only if not set """
+    statusDicts = { '1' : { 'Status' : { '2014-01-01 10:00:00' : sDict( 'Running', 'Application' ),
+                                         '2014-01-01 10:00:02' : sDict( 'Done', 'Execution Complete' ),
+                                         '2014-01-01 10:00:01' : sDict( application = 'step 1' ) } },
+                    2 : { 'Status' : { '2014-01-01 10:00:00' : sDict( minor = 'Uploading' ) } } }
+    result = self.handler.export_setJobsStatusBulk( statusDicts )
+    self.assertEqual( result, { 'OK' : True, 'Value' : { 'Successful' : { 1 : {}, 2 : {} }, 'Failed' : {} } } )
+    self.assertEqual( sorted( self.jobDB.getAttributesForJobList.call_args[0][0] ), [ 1, 2 ] )
+
+    attrCalls = self.jobDB.setJobsAttributes.call_args_list
+    self.assertEqual( attrCalls[0][0][0], { 1 : { 'Status' : 'Done', 'MinorStatus' : 'Execution Complete',
+                                                  'ApplicationStatus' : 'step 1' },
+                                            2 : { 'Status' : 'Running', 'MinorStatus' : 'Uploading' } } )
+    self.assertEqual( attrCalls[0][1], { 'update' : True } )
+    self.assertEqual( attrCalls[1], ( ( { 1 : { 'EndExecTime' : '2014-01-01 10:00:02' } }, ),
+                                      { 'onlyIfNull' : [ 'EndExecTime' ] } ) )
+    self.assertEqual( attrCalls[2], ( ( { 1 : { 'StartExecTime' : '2014-01-01 10:00:00' } }, ),
+                                      { 'onlyIfNull' : [ 'StartExecTime' ] } ) )
+
+    self.assertEqual( self.logDB.addLoggingRecords.call_count, 1 )
+    records = sorted( self.logDB.addLoggingRecords.call_args[0][0] )
+    self.assertEqual( records, [ ( 1, 'Done', 'Execution Complete', 'idem', '2014-01-01 10:00:02', 'JobWrapper' ),
+                                 ( 1, 'Running', 'Application', 'idem', '2014-01-01 10:00:00', 'JobWrapper' ),
+                                 ( 1, 'Running', 'Application', 'step 1', '2014-01-01 10:00:01', 'JobWrapper' ),
+                                 ( 2, 'idem', 'Uploading', 'idem', '2014-01-01 10:00:00', 'JobWrapper' ) ] )
+
+  def test02olderUpdates( self ):
+    """ updates older than the last logged one only go to the JobLoggingDB """
+    # # as the JobLoggingDB computes it
+    lastTime = time.mktime( Time.fromString( '2014-01-01 10:00:01' ).timetuple() )
+    self.logDB.getLastStatusTimes.return_value = { 'OK' : True, 'Value' : { 1 : lastTime } }
+    result = self.handler.export_setJobStatusBulk( 1, { '2014-01-01 10:00:00' : sDict( 'Running' ),
+                                                         '2014-01-01 10:00:05' : sDict( minor = 'Downloading' ) } )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( self.jobDB.setJobsAttributes.call_args_list[0][0][0], { 1 : { 'MinorStatus' : 'Downloading' } } )
+    self.assertEqual( len( self.logDB.addLoggingRecords.call_args[0][0] ), 2 )
+
+  def test03failures( self ):
+    """ unknown jobs fail alone, database errors fail all the jobs """
+    result = self.handler.export_setJobsStatusBulk( { 1 : { 'Status' : { 'date' : sDict( 'Running' ) } },
+                                                      3 : { 'Status' : { 'date' : sDict( 'Running' ) } } } )
+    self.assertEqual( result['Value'], { 'Successful' : { 1 : {} }, 'Failed' : { 3 : 'No Matching Job' } } )
+    self.assertEqual( self.jobDB.setJobsAttributes.call_args_list[0][0][0].keys(), [ 1 ] )
+    self.assertEqual( self.handler.export_setJobStatusBulk( 3, { 'date' : sDict( 'Running' ) } ),
+                      { 'OK' : False, 'Message' : 'No Matching Job' } )
+
+    self.logDB.addLoggingRecords.return_value = { 'OK' : False, 'Message' : 'Lost connection' }
+    result = self.handler.export_setJobsStatusBulk( { 1 : { 'Status' : { 'date' : sDict( 'Running' ) } },
+                                                      2 : { 'Status' : { 'date' : sDict( 'Running' ) } } } )
+    self.assertEqual( result['Value'], { 'Successful' : {}, 'Failed' : { 1 : 'Lost connection',
+                                                                         2 : 'Lost connection' } } )
+    self.assertEqual( self.handler.export_setJobStatusBulk( 1, { 'date' : sDict( 'Running' ) } )['OK'], False )
+
+  def test04heartBeats( self ):
+    """ heart beats stored in bulk and the job commands returned and marked as sent """
+    self.jobDB.getJobsCommands.return_value = { 'OK' : True, 'Value' : { 2 : { 'Kill' : '' } } }
+    result = self.handler.export_setJobsStatusBulk( { 1 : { 'HeartBeats' : [ ( { 'CPU' : 1 }, { 'Node' : 'wn' } ) ] },
+                                                      2 : { 'HeartBeats' : [ ( { 'CPU' : 2 }, {} ) ],
+                                                            'Status' : { 'date' : sDict( 'Running' ) } } } )
+    self.assertEqual( result['Value'], { 'Successful' : { 1 : {}, 2 : { 'Kill' : '' } }, 'Failed' : {} } )
+    self.assertEqual( sorted( self.jobDB.setHeartBeatDataBulk.call_args[0][0] ),
+                      [ ( 1, { 'Node' : 'wn' }, { 'CPU' : 1 } ), ( 2, {}, { 'CPU' : 2 } ) ] )
+    self.jobDB.setJobsCommandsStatus.assert_called_once_with( { 2 : [ 'Kill' ] }, 'Sent' )
+    self.assertEqual( self.jobDB.getAttributesForJobList.call_args[0][0], [ 2 ] )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobStateUpdateHandler_TestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
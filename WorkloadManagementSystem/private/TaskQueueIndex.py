@@ -0,0 +1,526 @@
+""" In memory index of the TaskQueueDB task queues
+
+    The TaskQueueIndex keeps a copy of the task queue definitions and of the jobs in them so the
+    Matcher can select the task queues and the jobs to be served without querying the TaskQueueDB.
+    Task queues are indexed by Site, GridCE, Platform, SubmitPool, OwnerGroup and CPUTime segment.
+    The DB is only used to atomically extract the selected job from its task queue.
+
+    The index is refreshed periodically. Task queue definitions never change once created, so only
+    the multi value requirements of the new task queues are retrieved in each refresh. Jobs are
+    also loaded incrementally: the jobs with a JobId bigger than any seen before are added, and a
+    summary of each task queue (number of jobs, sum of JobIds and of priorities) computed by the DB
+    tells which task queues have changed otherwise and have to be reloaded. All the jobs are
+    reloaded every FULL_REFRESH_PERIOD seconds in any case.
+"""
+
+__RCSID__ = "$Id$"
+
+import heapq
+import random
+import threading
+import time
+import types
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Security import Properties, CS
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TQ_MIN_SHARE
+
+EMPTY_SET = frozenset()
+
+class TaskQueueIndex( object ):
+
+  #Seconds between reloads of all the jobs
+  FULL_REFRESH_PERIOD = 600
+
+  def __init__( self, tqDB, maxMatchRetry = 3 ):
+    random.seed()
+    self.__tqDB = tqDB
+    self.__log = gLogger.getSubLogger( "TaskQueueIndex" )
+    self.__maxMatchRetry = maxMatchRetry
+    self.__indexedFields = ( 'Site', 'GridCE', 'Platform', 'SubmitPool' )
+    self.__multiValueMatchFields = tqDB.getMultiValueMatchFields()
+    self.__tagMatchFields = tqDB.getTagMatchFields()
+    self.__bannedJobMatchFields = tqDB.getBannedJobMatchFields()
+    self.__strictRequireMatchFields = tqDB.getStrictRequireMatchFields()
+    self.__lock = threading.Lock()
+    self.__lastRefresh = 0
+    self.__lastFullJobsRefresh = 0
+    #Biggest JobId loaded from the DB
+    self.__maxJobId = 0
+    #tqId -> task queue definition
+    self.__tqs = {}
+    #tqId -> { priority : [ realPriority, set( jobIds ) ] }
+    self.__tqJobs = {}
+    #tqId -> [ numJobs, sum of JobIds, sum of priorities ] of the jobs in __tqJobs
+    self.__tqJobsSummary = {}
+    #field -> value -> set( tqIds )
+    self.__index = {}
+    #field -> set( tqIds ) that don't have any requirement for the field
+    self.__wildcards = {}
+    for field in self.__indexedFields + ( 'OwnerGroup', 'CPUTime' ):
+      self.__index[ field ] = {}
+      self.__wildcards[ field ] = set()
+
+  def getLastRefresh( self ):
+    return self.__lastRefresh
+
+  def getNumTaskQueues( self ):
+    return len( self.__tqs )
+
+  #
+  # Index maintenance
+  #
+
+  def refresh( self ):
+    """
+    Synchronize the index with the TaskQueueDB contents
+    """
+    start = time.time()
+    result = self.__tqDB.retrieveTaskQueuesAttributes()
+    if not result[ 'OK' ]:
+      self.__log.error( "Cannot refresh task queue index", result[ 'Message' ] )
+      return result
+    tqAttrs = result[ 'Value' ]
+    #Only take new TQs once enabled. Until then their definition may not be complete
+    newTQs = [ tqId for tqId in tqAttrs if tqId not in self.__tqs and tqAttrs[ tqId ][ 'Enabled' ] >= 1 ]
+    if newTQs:
+      result = self.__tqDB.retrieveTaskQueuesMultiValues( newTQs )
+      if not result[ 'OK' ]:
+        self.__log.error( "Cannot refresh task queue index", result[ 'Message' ] )
+        return result
+      multiValues = result[ 'Value' ]
+    else:
+      multiValues = {}
+    if time.time() - self.__lastFullJobsRefresh > self.FULL_REFRESH_PERIOD:
+      result = self.__reloadAllJobs()
+    else:
+      result = self.__refreshJobs()
+    if not result[ 'OK' ]:
+      self.__log.error( "Cannot refresh task queue index", result[ 'Message' ] )
+      return result
+
+    self.__lock.acquire()
+    try:
+      for tqId in [ tqId for tqId in self.__tqs if tqId not in tqAttrs ]:
+        self.__removeTaskQueue( tqId )
+      for tqId in tqAttrs:
+        if tqId in self.__tqs:
+          self.__tqs[ tqId ][ 'Priority' ] = tqAttrs[ tqId ][ 'Priority' ]
+        elif tqId in multiValues:
+          tqDef = tqAttrs[ tqId ]
+          for field, values in multiValues[ tqId ].items():
+            tqDef[ field ] = frozenset( values )
+          self.__addTaskQueue( tqId, tqDef )
+    finally:
+      self.__lock.release()
+    self.__lastRefresh = time.time()
+    self.__log.verbose( "Task queue index refreshed in %.3f secs: %s TQs (%s new)" % ( self.__lastRefresh - start,
+                                                                                       len( self.__tqs ),
+                                                                                       len( newTQs ) ) )
+    return S_OK()
+
+  def __reloadAllJobs( self ):
+    """
+    Replace the jobs in the index with all the jobs in the DB
+    """
+    start = time.time()
+    result = self.__tqDB.retrieveTaskQueuesJobs()
+    if not result[ 'OK' ]:
+      return result
+    self.__lock.acquire()
+    try:
+      self.__tqJobs = {}
+      self.__tqJobsSummary = {}
+      self.__addJobs( result[ 'Value' ] )
+    finally:
+      self.__lock.release()
+    self.__lastFullJobsRefresh = start
+    return S_OK()
+
+  def __refreshJobs( self ):
+    """
+    Add the new jobs and reload the task queues whose jobs have changed otherwise
+    """
+    result = self.__tqDB.retrieveTaskQueuesJobs( minJobId = self.__maxJobId )
+    if not result[ 'OK' ]:
+      return result
+    newJobs = result[ 'Value' ]
+    #Jobs added after this point change the summary and their task queue gets reloaded
+    result = self.__tqDB.retrieveTaskQueuesJobsSummary()
+    if not result[ 'OK' ]:
+      return result
+    dbSummary = result[ 'Value' ]
+    self.__lock.acquire()
+    try:
+      self.__addJobs( newJobs )
+      changedTQs = [ tqId for tqId in set( dbSummary ).union( self.__tqJobsSummary )
+                     if tuple( self.__tqJobsSummary.get( tqId, ( 0, 0, 0 ) ) ) != dbSummary.get( tqId, ( 0, 0, 0 ) ) ]
+    finally:
+      self.__lock.release()
+    if not changedTQs:
+      return S_OK()
+    result = self.__tqDB.retrieveTaskQueuesJobs( tqIdList = changedTQs )
+    if not result[ 'OK' ]:
+      return result
+    self.__lock.acquire()
+    try:
+      for tqId in changedTQs:
+        self.__tqJobs.pop( tqId, None )
+        self.__tqJobsSummary.pop( tqId, None )
+      self.__addJobs( result[ 'Value' ] )
+    finally:
+      self.__lock.release()
+    self.__log.verbose( "Reloaded the jobs of %s changed TQs" % len( changedTQs ) )
+    return S_OK()
+
+  def __addJobs( self, tqJobs ):
+    """
+    Add jobs to the index. Lock must be held
+
+    :param tqJobs: { tqId : [ ( jobId, priority, realPriority ), ... ] } as returned by the DB
+    """
+    for tqId, jobList in tqJobs.items():
+      prioDict = self.__tqJobs.setdefault( tqId, {} )
+      summary = self.__tqJobsSummary.setdefault( tqId, [ 0, 0, 0 ] )
+      for jobId, priority, realPriority in jobList:
+        self.__maxJobId = max( self.__maxJobId, jobId )
+        if [ True for prio in prioDict if jobId in prioDict[ prio ][1] ]:
+          continue
+        if priority not in prioDict:
+          prioDict[ priority ] = [ realPriority, set() ]
+        prioDict[ priority ][1].add( jobId )
+        summary[0] += 1
+        summary[1] += jobId
+        summary[2] += priority
+
+  def __getIndexValues( self, tqDef, field ):
+    if field == 'OwnerGroup':
+      return ( tqDef[ 'OwnerGroup' ], )
+    if field == 'CPUTime':
+      return ( tqDef[ 'CPUTime' ], )
+    return tqDef.get( "%ss" % field, EMPTY_SET )
+
+  def __addTaskQueue( self, tqId, tqDef ):
+    self.__tqs[ tqId ] = tqDef
+    for field in self.__index:
+      values = self.__getIndexValues( tqDef, field )
+      if not values:
+        self.__wildcards[ field ].add( tqId )
+        continue
+      fieldIndex = self.__index[ field ]
+      for value in values:
+        if value not in fieldIndex:
+          fieldIndex[ value ] = set()
+        fieldIndex[ value ].add( tqId )
+
+  def __removeTaskQueue( self, tqId ):
+    tqDef = self.__tqs.pop( tqId )
+    self.__tqJobs.pop( tqId, None )
+    self.__tqJobsSummary.pop( tqId, None )
+    for field in self.__index:
+      self.__wildcards[ field ].discard( tqId )
+      fieldIndex = self.__index[ field ]
+      for value in self.__getIndexValues( tqDef, field ):
+        if value in fieldIndex:
+          fieldIndex[ value ].discard( tqId )
+          if not fieldIndex[ value ]:
+            fieldIndex.pop( value )
+
+  def __removeJob( self, tqId, jobId ):
+    self.__lock.acquire()
+    try:
+      prioDict = self.__tqJobs.get( tqId, {} )
+      for prio in prioDict.keys():
+        jobSet = prioDict[ prio ][1]
+        if jobId in jobSet:
+          jobSet.discard( jobId )
+          if not jobSet:
+            prioDict.pop( prio )
+          summary = self.__tqJobsSummary[ tqId ]
+          summary[0] -= 1
+          summary[1] -= jobId
+          summary[2] -= prio
+          return
+    finally:
+      self.__lock.release()
+
+  #
+  # Matching
+  #
+
+  def __toList( self, value ):
+    if type( value ) in ( types.ListType, types.TupleType ):
+      return [ str( v ).strip() for v in value ]
+    return [ str( value ).strip() ]
+
+  def __getCandidates( self, tqMatchDict ):
+    """
+    Get the set of task queues that pass the indexed requirements
+    """
+    candidateSets = []
+    if 'OwnerGroup' in tqMatchDict:
+      fieldIndex = self.__index[ 'OwnerGroup' ]
+      tqIds = set()
+      for group in self.__toList( tqMatchDict[ 'OwnerGroup' ] ):
+        tqIds.update( fieldIndex.get( group, () ) )
+      candidateSets.append( tqIds )
+    if 'CPUTime' in tqMatchDict:
+      fieldIndex = self.__index[ 'CPUTime' ]
+      cpuTime = tqMatchDict[ 'CPUTime' ]
+      if type( cpuTime ) in ( types.ListType, types.TupleType ):
+        cpuTime = max( cpuTime )
+      tqIds = set()
+      for segment in fieldIndex:
+        if segment <= cpuTime:
+          tqIds.update( fieldIndex[ segment ] )
+      candidateSets.append( tqIds )
+    for field in self.__indexedFields:
+      if field in tqMatchDict and tqMatchDict[ field ]:
+        fieldIndex = self.__index[ field ]
+        tqIds = set( self.__wildcards[ field ] )
+        for value in self.__toList( tqMatchDict[ field ] ):
+          tqIds.update( fieldIndex.get( value, () ) )
+        candidateSets.append( tqIds )
+    if not candidateSets:
+      return set( self.__tqs )
+    candidateSets.sort( key = len )
+    candidates = candidateSets[0]
+    for tqIds in candidateSets[1:]:
+      if not candidates:
+        break
+      candidates = candidates.intersection( tqIds )
+    return candidates
+
+  def __getOwnerCondition( self, tqMatchDict ):
+    """
+    Generate the function that checks the owner of a task queue following the TaskQueueDB rules
+    """
+    if 'OwnerDN' in tqMatchDict and 'OwnerGroup' in tqMatchDict:
+      dns = set( self.__toList( tqMatchDict[ 'OwnerDN' ] ) )
+      sharingGroups = set()
+      groups = set()
+      for group in self.__toList( tqMatchDict[ 'OwnerGroup' ] ):
+        if Properties.JOB_SHARING in CS.getPropertiesForGroup( group ):
+          sharingGroups.add( group )
+        else:
+          groups.add( group )
+      return lambda tqDef: tqDef[ 'OwnerGroup' ] in sharingGroups or \
+                           ( tqDef[ 'OwnerGroup' ] in groups and tqDef[ 'OwnerDN' ] in dns )
+    ownerConds = []
+    for field in ( 'OwnerGroup', 'OwnerDN' ):
+      if field in tqMatchDict:
+        ownerConds.append( ( field, set( self.__toList( tqMatchDict[ field ] ) ) ) )
+    return lambda tqDef: not [ True for field, values in ownerConds if tqDef[ field ] not in values ]
+
+  def __matchesMultiValues( self, tqDef, tqMatchDict ):
+    for field in self.__multiValueMatchFields:
+      tqValues = tqDef.get( "%ss" % field, EMPTY_SET )
+      if field in tqMatchDict and tqMatchDict[ field ]:
+        values = self.__toList( tqMatchDict[ field ] )
+        if field in self.__tagMatchFields:
+          if values != [ 'Any' ] and not tqValues.issubset( values ):
+            return False
+        elif tqValues and not [ True for v in values if v in tqValues ]:
+          return False
+        if field in self.__bannedJobMatchFields:
+          bannedValues = tqDef.get( "Banned%ss" % field, EMPTY_SET )
+          if not [ True for v in values if v not in bannedValues ]:
+            return False
+      bannedField = "Banned%s" % field
+      if bannedField in tqMatchDict and tqMatchDict[ bannedField ]:
+        if not [ True for v in self.__toList( tqMatchDict[ bannedField ] ) if v not in tqValues ]:
+          return False
+    for field in self.__strictRequireMatchFields:
+      if field not in tqMatchDict and tqDef.get( "%ss" % field ):
+        return False
+    return True
+
+  def __passesNegativeCond( self, tqDef, negativeCond ):
+    """ Evaluate the negative conditions the same way TaskQueueDB.__generateNotSQL does
+    """
+    if type( negativeCond ) in ( types.ListType, types.TupleType ):
+      for condDict in negativeCond:
+        if self.__passesNegativeDictCond( tqDef, condDict ):
+          return True
+      return False
+    return self.__passesNegativeDictCond( tqDef, negativeCond )
+
+  def __passesNegativeDictCond( self, tqDef, negativeCond ):
+    condList = []
+    for field in negativeCond:
+      if field in self.__multiValueMatchFields:
+        tqValues = tqDef.get( "%ss" % field, EMPTY_SET )
+        condList.append( not [ True for v in self.__toList( negativeCond[ field ] ) if v in tqValues ] )
+      elif field in self.__tqDB.getSingleValueTQDefFields():
+        for value in self.__toList( negativeCond[ field ] ):
+          condList.append( str( value ) != str( tqDef[ field ] ) )
+    return not condList or True in condList
+
+  def __taskQueueMatches( self, tqDef, tqMatchDict, ownerCond, negativeCond ):
+    if not ownerCond( tqDef ):
+      return False
+    if 'CPUTime' in tqMatchDict:
+      if not [ True for cpuTime in self.__toList( tqMatchDict[ 'CPUTime' ] ) if tqDef[ 'CPUTime' ] <= long( cpuTime ) ]:
+        return False
+    if 'Setup' in tqMatchDict and tqDef[ 'Setup' ] not in self.__toList( tqMatchDict[ 'Setup' ] ):
+      return False
+    if not self.__matchesMultiValues( tqDef, tqMatchDict ):
+      return False
+    if negativeCond and not self.__passesNegativeCond( tqDef, negativeCond ):
+      return False
+    return True
+
+  def __checkMatchDict( self, tqMatchDict ):
+    #Make a copy to avoid modification of original
+    tqMatchDict = dict( tqMatchDict )
+    result = self.__tqDB._checkMatchDefinition( tqMatchDict, escapeValues = False )
+    if not result[ 'OK' ]:
+      self.__log.error( "TQ match request check failed", result[ 'Message' ] )
+    return result
+
+  def matchTaskQueues( self, tqMatchDict, numQueuesToGet = 1, negativeCond = {}, skipMatchDictDef = False ):
+    """
+    Get the task queues matching the requirements ordered by weighted random priority
+      Returns S_OK( [ ( tqId, ownerDN, ownerGroup ), ... ] ) as TaskQueueDB.matchAndGetTaskQueue
+    """
+    if not skipMatchDictDef:
+      result = self.__checkMatchDict( tqMatchDict )
+      if not result[ 'OK' ]:
+        return result
+      tqMatchDict = result[ 'Value' ]
+    ownerCond = self.__getOwnerCondition( tqMatchDict )
+    self.__lock.acquire()
+    try:
+      tqList = []
+      for tqId in self.__getCandidates( tqMatchDict ):
+        tqDef = self.__tqs[ tqId ]
+        if self.__taskQueueMatches( tqDef, tqMatchDict, ownerCond, negativeCond ):
+          tqList.append( ( tqId, tqDef ) )
+    finally:
+      self.__lock.release()
+    #Same ordering as ORDER BY RAND() / Priority
+    sortKeys = [ ( random.random() / max( tqDef[ 'Priority' ], TQ_MIN_SHARE ), tqId, tqDef ) for tqId, tqDef in tqList ]
+    if numQueuesToGet:
+      sortKeys = heapq.nsmallest( numQueuesToGet, sortKeys )
+    else:
+      sortKeys.sort()
+    return S_OK( [ ( tqId, tqDef[ 'OwnerDN' ], tqDef[ 'OwnerGroup' ] ) for _, tqId, tqDef in sortKeys ] )
+
+  def __selectJobs( self, tqId, numJobsPerTry ):
+    """
+    Select the priority of the job to extract as ORDER BY RAND() / RealPriority does and return
+    the jobs with that priority
+    """
+    self.__lock.acquire()
+    try:
+      prioDict = self.__tqJobs.get( tqId )
+      if not prioDict:
+        return False, []
+      winner = False
+      for prio in prioDict:
+        realPriority, jobSet = prioDict[ prio ]
+        #Minimum of len( jobSet ) uniform random numbers
+        key = ( 1 - random.random() ** ( 1.0 / len( jobSet ) ) ) / max( realPriority, TQ_MIN_SHARE )
+        if winner is False or key < winner[0]:
+          winner = ( key, prio )
+      prio = winner[1]
+      return prio, heapq.nsmallest( numJobsPerTry, prioDict[ prio ][1] )
+    finally:
+      self.__lock.release()
+
+  def matchAndGetJob( self, tqMatchDict, numJobsPerTry = 50, numQueuesPerTry = 10, negativeCond = {} ):
+    """
+    Match a job using the index. Same interface as TaskQueueDB.matchAndGetJob
+    """
+    if 'JobID' in tqMatchDict:
+      #A certain JobID is requested, the DB knows best
+      return self.__tqDB.matchAndGetJob( tqMatchDict, numJobsPerTry = numJobsPerTry,
+                                         numQueuesPerTry = numQueuesPerTry, negativeCond = negativeCond )
+    result = self.__checkMatchDict( tqMatchDict )
+    if not result[ 'OK' ]:
+      return result
+    tqMatchDict = result[ 'Value' ]
+    for _ in range( self.__maxMatchRetry ):
+      result = self.matchTaskQueues( tqMatchDict, numQueuesToGet = numQueuesPerTry,
+                                     negativeCond = negativeCond, skipMatchDictDef = True )
+      if not result[ 'OK' ]:
+        return result
+      tqList = result[ 'Value' ]
+      if not tqList:
+        self.__log.info( "No TQ matches requirements" )
+        return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
+      for tqId, _tqOwnerDN, _tqOwnerGroup in tqList:
+        prio, jobList = self.__selectJobs( tqId, numJobsPerTry )
+        while jobList:
+          jobId = jobList.pop( random.randint( 0, len( jobList ) - 1 ) )
+          self.__log.verbose( "Trying to extract job %s from TQ %s" % ( jobId, tqId ) )
+          result = self.__tqDB.deleteJob( jobId )
+          if not result[ 'OK' ]:
+            msgFix = "Could not take job"
+            msgVar = " %s out from the TQ %s: %s" % ( jobId, tqId, result[ 'Message' ] )
+            self.__log.error( msgFix, msgVar )
+            return S_ERROR( msgFix + msgVar )
+          #Either we got it or somebody else did
+          self.__removeJob( tqId, jobId )
+          if result[ 'Value' ]:
+            self.__log.info( "Extracted job %s with prio %s from TQ %s" % ( jobId, prio, tqId ) )
+            return S_OK( { 'matchFound' : True, 'jobId' : jobId, 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
+        self.__log.verbose( "No jobs could be extracted from TQ %s" % tqId )
+    self.__log.info( "Could not find a match after %s match retries" % self.__maxMatchRetry )
+    return S_ERROR( "Could not find a match after %s match retries" % self.__maxMatchRetry )
+
+  def __selectJobsForBatch( self, tqId, maxJobs ):
+    """
+    Select up to maxJobs jobs of the task queue as ORDER BY RAND() / RealPriority does
+    """
+    self.__lock.acquire()
+    try:
+      sortKeys = []
+      for realPriority, jobSet in self.__tqJobs.get( tqId, {} ).values():
+        realPriority = max( realPriority, TQ_MIN_SHARE )
+        sortKeys.extend( [ ( random.random() / realPriority, jobId ) for jobId in jobSet ] )
+    finally:
+      self.__lock.release()
+    return [ jobId for _, jobId in heapq.nsmallest( maxJobs, sortKeys ) ]
+
+  def matchAndGetJobs( self, tqMatchDict, maxJobs, numQueuesPerTry = 10, negativeCond = {} ):
+    """
+    Match up to maxJobs jobs from the same task queue using the index.
+    Same interface as TaskQueueDB.matchAndGetJobs
+    """
+    if 'JobID' in tqMatchDict:
+      #A certain JobID is requested, the DB knows best
+      return self.__tqDB.matchAndGetJobs( tqMatchDict, maxJobs, numQueuesPerTry = numQueuesPerTry,
+                                          negativeCond = negativeCond )
+    result = self.__checkMatchDict( tqMatchDict )
+    if not result[ 'OK' ]:
+      return result
+    tqMatchDict = result[ 'Value' ]
+    for _ in range( self.__maxMatchRetry ):
+      result = self.matchTaskQueues( tqMatchDict, numQueuesToGet = numQueuesPerTry,
+                                     negativeCond = negativeCond, skipMatchDictDef = True )
+      if not result[ 'OK' ]:
+        return result
+      tqList = result[ 'Value' ]
+      if not tqList:
+        self.__log.info( "No TQ matches requirements" )
+        return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
+      for tqId, _tqOwnerDN, _tqOwnerGroup in tqList:
+        jobList = self.__selectJobsForBatch( tqId, maxJobs )
+        if not jobList:
+          continue
+        result = self.__tqDB.deleteJobs( jobList )
+        if not result[ 'OK' ]:
+          msgFix = "Could not take jobs"
+          msgVar = " %s out from the TQ %s: %s" % ( jobList, tqId, result[ 'Message' ] )
+          self.__log.error( msgFix, msgVar )
+          return S_ERROR( msgFix + msgVar )
+        #Either we got them or somebody else did
+        for jobId in jobList:
+          self.__removeJob( tqId, jobId )
+        if result[ 'Value' ]:
+          self.__log.info( "Extracted jobs %s from TQ %s" % ( result[ 'Value' ], tqId ) )
+          return S_OK( { 'matchFound' : True, 'jobIds' : result[ 'Value' ], 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
+        self.__log.verbose( "No jobs could be extracted from TQ %s" % tqId )
+    self.__log.info( "Could not find a match after %s match retries" % self.__maxMatchRetry )
+    return S_ERROR( "Could not find a match after %s match retries" % self.__maxMatchRetry )
@@ -0,0 +1,139 @@
+########################################################################
+# $HeadURL$
+# File :    TaskQueueIndexBenchmark.py
+########################################################################
+"""
+  Compare the task queue matching latency of the TaskQueueDB SQL path and the in memory
+  TaskQueueIndex. The TaskQueueDB is filled with synthetic task queues (one job each) that
+  are removed at the end. Use a test TaskQueueDB!
+"""
+__RCSID__ = "$Id$"
+
+from DIRAC.Core.Base import Script
+from DIRAC import S_OK
+
+numTQs = 10000
+def setNumTQs( value ):
+  global numTQs
+  numTQs = int( value )
+  return S_OK()
+
+numMatches = 1000
+def setNumMatches( value ):
+  global numMatches
+  numMatches = int( value )
+  return S_OK()
+
+keepTQs = False
+def setKeepTQs( value ):
+  global keepTQs
+  keepTQs = True
+  return S_OK()
+
+Script.registerSwitch( "t:", "tqs=", "Number of task queues to create (default %s)" % numTQs, setNumTQs )
+Script.registerSwitch( "m:", "matches=", "Number of match requests (default %s)" % numMatches, setNumMatches )
+Script.registerSwitch( "k", "keep", "Do not delete the synthetic task queues at the end", setKeepTQs )
+Script.setUsageMessage( __doc__ )
+Script.parseCommandLine( ignoreErrors = True )
+
+import sys
+import time
+import random
+
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+from DIRAC.WorkloadManagementSystem.private.Queues import maxCPUSegments
+
+BASE_JOBID = 900000000
+SETUP = 'BenchmarkSetup'
+sites = [ 'BENCH.Site%03d.org' % i for i in range( 300 ) ]
+platforms = [ 'x86_64-slc%s-gcc%s-opt' % ( s, g ) for s in ( 5, 6 ) for g in ( 43, 44, 46, 48 ) ]
+submitPools = [ 'Pool%s' % i for i in range( 5 ) ]
+groups = [ 'bench_user', 'bench_prod', 'bench_mc' ]
+
+def tqDefinition( iTQ ):
+  tqDef = { 'OwnerDN' : '/DC=org/DC=bench/CN=user%03d' % ( iTQ % 100 ),
+            'OwnerGroup' : groups[ iTQ % len( groups ) ],
+            'Setup' : SETUP,
+            'CPUTime' : random.choice( maxCPUSegments ),
+            #Unique banned site to be sure all the TQs are different
+            'BannedSites' : [ 'BENCH.Banned%06d.org' % iTQ ] }
+  if random.random() < 0.7:
+    tqDef[ 'Sites' ] = random.sample( sites, random.randint( 1, 20 ) )
+  if random.random() < 0.5:
+    tqDef[ 'Platforms' ] = random.sample( platforms, random.randint( 1, 3 ) )
+  if random.random() < 0.2:
+    tqDef[ 'SubmitPools' ] = random.sample( submitPools, 1 )
+  return tqDef
+
+def resourceDescription():
+  return { 'Setup' : SETUP,
+           'CPUTime' : random.choice( maxCPUSegments ),
+           'Site' : random.choice( sites ),
+           'Platform' : random.choice( platforms ),
+           'SubmitPool' : random.choice( submitPools ),
+           'OwnerGroup' : groups }
+
+def stats( timings ):
+  timings = sorted( timings )
+  num = len( timings )
+  return "mean %.2f ms, median %.2f ms, p95 %.2f ms, max %.2f ms" % ( 1000 * sum( timings ) / num,
+                                                                        1000 * timings[ num / 2 ],
+                                                                        1000 * timings[ int( num * 0.95 ) ],
+                                                                        1000 * timings[-1] )
+
+tqDB = TaskQueueDB()
+
+print "Creating %s task queues..." % numTQs
+start = time.time()
+for iTQ in range( numTQs ):
+  result = tqDB.insertJob( BASE_JOBID + iTQ, tqDefinition( iTQ ), 1 )
+  if not result[ 'OK' ]:
+    print "ERROR: Cannot insert job: %s" % result[ 'Message' ]
+    sys.exit( 1 )
+print "Created in %.2f secs" % ( time.time() - start )
+
+tqIndex = TaskQueueIndex( tqDB )
+start = time.time()
+result = tqIndex.refresh()
+if not result[ 'OK' ]:
+  print "ERROR: Cannot build the index: %s" % result[ 'Message' ]
+  sys.exit( 1 )
+print "Index with %s task queues built in %.2f secs" % ( tqIndex.getNumTaskQueues(), time.time() - start )
+start = time.time()
+tqIndex.refresh()
+print "Incremental refresh in %.2f secs" % ( time.time() - start )
+
+requests = [ resourceDescription() for _ in range( numMatches ) ]
+sqlTimes = []
+indexTimes = []
+mismatches = 0
+for resDict in requests:
+  start = time.time()
+  sqlResult = tqDB.matchAndGetTaskQueue( resDict, numQueuesToGet = 10 )
+  sqlTimes.append( time.time() - start )
+  start = time.time()
+  indexResult = tqIndex.matchTaskQueues( resDict, numQueuesToGet = 10 )
+  indexTimes.append( time.time() - start )
+  if not sqlResult[ 'OK' ] or not indexResult[ 'OK' ]:
+    print "ERROR: %s / %s" % ( sqlResult.get( 'Message' ), indexResult.get( 'Message' ) )
+    sys.exit( 1 )
+
+#Check both paths agree on the full list of matching task queues
+for resDict in requests[:100]:
+  sqlTQs = set( [ tqTuple[0] for tqTuple in tqDB.matchAndGetTaskQueue( resDict, numQueuesToGet = 0 )[ 'Value' ] ] )
+  indexTQs = set( [ tqTuple[0] for tqTuple in tqIndex.matchTaskQueues( resDict, numQueuesToGet = 0 )[ 'Value' ] ] )
+  if sqlTQs != indexTQs:
+    mismatches += 1
+
+print "SQL match   : %s" % stats( sqlTimes )
+print "Index match : %s" % stats( indexTimes )
+print "Speedup     : %.1fx" % ( sum( sqlTimes ) / max( sum( indexTimes ), 1e-9 ) )
+print "Mismatching results: %s out of %s" % ( mismatches, min( 100, numMatches ) )
+
+if not keepTQs:
+  print "Removing the synthetic task queues..."
+  result = tqDB.getTaskQueueForJobs( range( BASE_JOBID, BASE_JOBID + numTQs ) )
+  if result[ 'OK' ]:
+    for tqId in set( result[ 'Value' ].values() ):
+      tqDB.deleteTaskQueue( tqId )